@@ -0,0 +1,142 @@
+"""
+Benchmark: serving beatmap assets from extracted files vs. from the .osz.
+
+Builds synthetic beatmapsets, stores them once extracted (the current
+``StaticFiles`` mount) and once in archive storage mode, then measures
+whole-file audio requests, random range requests (audio seeking) and small
+storyboard images against both, plus the disk footprint of each layout.
+
+Usage (from backend/):
+    python -m benchmarks.bench_archive_serving [--sets 10] [--requests 300]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.beatmap_archive import archive_cache
+from services.beatmap_extraction import ExtractionPolicy, extract_archive, retain_archive
+from services.beatmap_manifest import build_manifest, write_manifest
+from services.beatmap_static import BeatmapStaticFiles
+from services.beatmap_storage import BeatmapStorage
+
+AUDIO_BYTES = 4 * 1024 * 1024
+SPRITES = 40
+SPRITE_BYTES = 16 * 1024
+OSU_TEXT = "osu file format v14\n\n[General]\nAudioFilename: audio.mp3\nMode: 3\n\n[HitObjects]\n" + (
+    "64,192,1000,1,0,0:0:0:0:\n" * 2000
+)
+
+
+def build_osz(path: Path) -> None:
+    """Write a set shaped like a typical ranked mania set (audio/images stored)."""
+    rng = random.Random(path.stem)
+    with zipfile.ZipFile(path, "w") as zf:
+        for version in ("Easy", "Normal", "Hard", "Insane"):
+            zf.writestr(f"Artist - Title (Mapper) [{version}].osu", OSU_TEXT, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("audio.mp3", rng.randbytes(AUDIO_BYTES))
+        zf.writestr("bg.jpg", rng.randbytes(300 * 1024))
+        for i in range(SPRITES):
+            zf.writestr(f"sb/sprite{i}.png", rng.randbytes(SPRITE_BYTES))
+
+
+def layout_size(root: Path) -> tuple[int, int]:
+    """Total bytes and file count below ``root``."""
+    total = count = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            total += os.path.getsize(os.path.join(dirpath, name))
+            count += 1
+    return total, count
+
+
+def prepare(root: Path, sets: int) -> tuple[Path, Path]:
+    """Store every set both extracted and in archive mode."""
+    extracted, archived = root / "extracted", root / "archived"
+    policy = ExtractionPolicy({".osu", ".osb", ".mp3", ".ogg", ".wav", ".jpg", ".jpeg", ".png"})
+    for i in range(sets):
+        set_id = str(1000 + i)
+        for target in (extracted, archived):
+            osz_path = root / f"{set_id}.osz"
+            build_osz(osz_path)
+            set_path = target / set_id
+            if target is extracted:
+                extraction = extract_archive(osz_path, set_path, policy)
+                files = {e["name"]: e["size"] for e in extraction["extracted"]}
+                write_manifest(set_path, build_manifest(set_id, files))
+                osz_path.unlink()
+            else:
+                set_path.mkdir(parents=True)
+                retain_archive(osz_path, set_path)
+                files = archive_cache.get(set_path / ".archive.osz").file_sizes()
+                write_manifest(set_path, build_manifest(set_id, files, storage_mode="archive"))
+    return extracted, archived
+
+
+async def run_requests(client: httpx.AsyncClient, requests: list[tuple[str, dict]]) -> list[float]:
+    """Issue requests sequentially and return per-request latencies in ms."""
+    latencies = []
+    for url, headers in requests:
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name: str, latencies: list[float]) -> str:
+    p95 = statistics.quantiles(latencies, n=20)[18]
+    rps = len(latencies) / (sum(latencies) / 1000)
+    return f"  {name:<22} p50 {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms   {rps:8.0f} req/s"
+
+
+async def benchmark(root: Path, sets: int, count: int) -> None:
+    extracted, archived = prepare(root, sets)
+    rng = random.Random(42)
+    set_ids = [str(1000 + i) for i in range(sets)]
+
+    workloads = {
+        "full audio": [(f"/beatmaps/{rng.choice(set_ids)}/audio.mp3", {}) for _ in range(max(count // 10, 10))],
+        "range (audio seek)": [
+            (f"/beatmaps/{rng.choice(set_ids)}/audio.mp3", {"Range": f"bytes={offset}-{offset + 65535}"})
+            for offset in (rng.randrange(0, AUDIO_BYTES - 65536) for _ in range(count))
+        ],
+        "storyboard sprite": [
+            (f"/beatmaps/{rng.choice(set_ids)}/sb/sprite{rng.randrange(SPRITES)}.png", {}) for _ in range(count)
+        ],
+    }
+
+    for label, directory in (("extracted (StaticFiles)", extracted), ("archive (.osz)", archived)):
+        app = FastAPI()
+        app.mount("/beatmaps", BeatmapStaticFiles(storage=BeatmapStorage(directory), directory=str(directory)))
+        size, files = layout_size(directory)
+        print(f"{label}: {size / 1024 / 1024:.1f} MB on disk in {files} files")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name, requests in workloads.items():
+                await run_requests(client, requests[:5])  # Warm caches
+                print(summarize(name, await run_requests(client, requests)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sets", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(benchmark(Path(tmp), args.sets, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark: mixed slow and fast requests with sync vs. async database sessions.
+
+Serves two endpoints from a temporary SQLite database: a fast one (primary
+key lookup of a user) and a slow one whose query takes ``--slow-ms`` inside
+the database (a ``sleep()`` SQL function stands in for a heavy report
+query or a lock wait). Concurrent clients send a mix of both, first
+through ``async def`` handlers calling a synchronous ``Session`` (how the
+routers used to work), then through an ``AsyncSession`` on the asyncio
+engine.
+
+With the synchronous session every slow query blocks the event loop, so
+fast requests queue behind it; with the async session they keep flowing.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_db [--requests 400] [--concurrency 32] [--slow-ratio 0.1] [--slow-ms 100]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.base import Base
+from models.user import User
+from utils.database import async_url
+
+USERS = 100
+
+
+def install_sleep(dbapi_conn, connection_record):
+    """SQL function ``sleep(ms)`` that holds the query for ``ms`` milliseconds."""
+    dbapi_conn.create_function("sleep", 1, lambda ms: time.sleep(ms / 1000) or 0)
+
+
+def prepare(root: Path) -> str:
+    """Create the database with ``USERS`` users; returns its URL."""
+    database_url = f"sqlite:///{root / 'bench.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(User(osu_id=i, username=f"user{i}", flag_code="PE") for i in range(1, USERS + 1))
+        db.commit()
+    engine.dispose()
+    return database_url
+
+
+def sync_app(database_url: str, slow_ms: int, pool_size: int) -> tuple[FastAPI, object]:
+    """Handlers as the routers were written: ``async def`` calling a blocking Session."""
+    engine = create_engine(database_url, pool_size=pool_size, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", install_sleep)
+    session_factory = sessionmaker(bind=engine)
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/fast/{user_id}")
+    async def fast(user_id: int, db: Session = Depends(get_db)):
+        return {"username": db.scalar(select(User.username).where(User.id == user_id))}
+
+    @app.get("/slow")
+    async def slow(db: Session = Depends(get_db)):
+        return {"slept": db.scalar(text("SELECT sleep(:ms)"), {"ms": slow_ms})}
+
+    return app, engine.dispose
+
+
+def async_app(database_url: str, slow_ms: int, pool_size: int) -> tuple[FastAPI, object]:
+    """The same handlers on the asyncio engine, as the routers are written now."""
+    # aiosqlite file databases use NullPool: a connection (thread) per session
+    engine = create_async_engine(async_url(database_url))
+    event.listen(engine.sync_engine, "connect", install_sleep)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/fast/{user_id}")
+    async def fast(user_id: int, db: AsyncSession = Depends(get_db)):
+        return {"username": await db.scalar(select(User.username).where(User.id == user_id))}
+
+    @app.get("/slow")
+    async def slow(db: AsyncSession = Depends(get_db)):
+        return {"slept": await db.scalar(text("SELECT sleep(:ms)"), {"ms": slow_ms})}
+
+    return app, engine.dispose
+
+
+async def run_load(app: FastAPI, urls: list[str], concurrency: int) -> tuple[float, dict[str, list[float]]]:
+    """Send ``urls`` from ``concurrency`` clients; returns wall time and latencies (ms) per endpoint."""
+    queue = list(reversed(urls))
+    latencies: dict[str, list[float]] = {"fast": [], "slow": []}
+
+    async def client_loop(client: httpx.AsyncClient):
+        while queue:
+            url = queue.pop()
+            start = time.perf_counter()
+            response = await client.get(url)
+            assert response.status_code == 200, response.status_code
+            latencies["slow" if url == "/slow" else "fast"].append((time.perf_counter() - start) * 1000)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/fast/1")  # Open the first connection outside the measurement
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        return time.perf_counter() - start, latencies
+
+
+def summarize(name: str, elapsed: float, latencies: dict[str, list[float]]) -> str:
+    fast = latencies["fast"]
+    p95 = statistics.quantiles(fast, n=20)[18]
+    total = len(fast) + len(latencies["slow"])
+    return (
+        f"  {name:<15} {total / elapsed:7.0f} req/s   "
+        f"fast p50 {statistics.median(fast):7.1f} ms  p95 {p95:7.1f} ms   "
+        f"slow p50 {statistics.median(latencies['slow']):7.1f} ms"
+    )
+
+
+async def benchmark(root: Path, requests: int, concurrency: int, slow_ratio: float, slow_ms: int) -> None:
+    database_url = prepare(root)
+    rng = random.Random(42)
+    urls = [
+        "/slow" if rng.random() < slow_ratio else f"/fast/{rng.randint(1, USERS)}"
+        for _ in range(requests)
+    ]
+    slow_count = urls.count("/slow")
+    print(f"{requests} requests ({slow_count} slow x {slow_ms} ms), {concurrency} concurrent clients")
+
+    for name, build in (("sync Session", sync_app), ("AsyncSession", async_app)):
+        app, dispose = build(database_url, slow_ms, concurrency)
+        elapsed, latencies = await run_load(app, urls, concurrency)
+        print(summarize(name, elapsed, latencies))
+        result = dispose()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--slow-ratio", type=float, default=0.1)
+    parser.add_argument("--slow-ms", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(benchmark(Path(tmp), args.requests, args.concurrency, args.slow_ratio, args.slow_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark: bracket generation, per-round commits vs. one bulk transaction.
+
+Generates full double elimination tournaments of each size into a
+temporary SQLite database on the asyncio engine, two ways:
+
+- per round: the old generator's shape. Matches are added round by round,
+  each round committed to obtain IDs, then links set on the ORM objects
+  and committed again.
+- bulk: :func:`services.bracket_topology.save_topology`. The topology is
+  built in memory, matches are inserted with ``INSERT ... RETURNING`` and
+  linked with one executemany ``UPDATE``, in a single commit.
+
+Both persist the same topology, so only the database work differs. Reports
+the in-memory build time, the persist time (best of ``--repeat``), and the
+statements and commits each approach issues. SQLite receives ordered
+``RETURNING`` inserts one row at a time, so its statement counts stay
+close; on PostgreSQL the bulk inserts are batched as well.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bracket_generation [--sizes 8,32,128,256] [--repeat 3]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from itertools import groupby
+from pathlib import Path
+
+from sqlalchemy import create_engine, delete, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.base import Base
+from models.bracket import Bracket
+from models.match import Match
+from models.user import User
+from services.bracket_topology import BRACKET_TYPES, build_double_elimination, default_map_id, save_topology
+from utils.database import async_url
+
+
+def prepare(root: Path, players: int) -> tuple[str, list[int]]:
+    """Create the database with ``players`` seeded users; returns its URL and their IDs."""
+    database_url = f"sqlite:///{root / 'bench.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        users = [User(osu_id=i, username=f"user{i}", flag_code="PE", seed_number=i) for i in range(1, players + 1)]
+        db.add_all(users)
+        db.commit()
+        player_ids = [user.id for user in users]
+    engine.dispose()
+    return database_url, player_ids
+
+
+async def save_per_round(db: AsyncSession, topology) -> None:
+    """Persist ``topology`` the way the old generator did: a commit per round, then link."""
+    await db.execute(delete(Match))
+    await db.execute(delete(Bracket))
+    await db.commit()
+    map_id = await default_map_id(db)
+
+    brackets = {}
+    for order, bracket_type in enumerate(BRACKET_TYPES, start=1):
+        brackets[bracket_type] = Bracket(
+            bracket_size=topology["bracket_size"],
+            bracket_name=bracket_type,
+            bracket_type=bracket_type,
+            bracket_order=order,
+        )
+        db.add(brackets[bracket_type])
+    await db.commit()
+
+    created: list[Match] = []
+    for _, round_matches in groupby(topology["matches"], key=lambda m: (m["bracket_type"], m["round_name"])):
+        for planned in round_matches:
+            match = Match(
+                bracket_id=brackets[planned["bracket_type"]].id,
+                player1_id=planned["player1_id"],
+                player2_id=planned["player2_id"],
+                map_id=map_id,
+                round_name=planned["round_name"],
+                match_status="scheduled",
+            )
+            db.add(match)
+            created.append(match)
+        await db.commit()
+
+    for match, planned in zip(created, topology["matches"]):
+        if planned["next_index"] is not None:
+            match.next_match_id = created[planned["next_index"]].id
+        if planned["loser_next_index"] is not None:
+            match.loser_next_match_id = created[planned["loser_next_index"]].id
+    await db.commit()
+
+
+async def save_bulk(db: AsyncSession, topology) -> None:
+    await save_topology(db, topology)
+    await db.commit()
+
+
+async def measure(session_factory, counters: dict, save, topology, repeat: int) -> tuple[float, int, int]:
+    """Best persist time (ms) over ``repeat`` runs, with statements and commits of one run."""
+    best = float("inf")
+    for _ in range(repeat):
+        counters.update(statements=0, commits=0)
+        async with session_factory() as db:
+            start = time.perf_counter()
+            await save(db, topology)
+            best = min(best, (time.perf_counter() - start) * 1000)
+    return best, counters["statements"], counters["commits"]
+
+
+async def benchmark(root: Path, sizes: list[int], repeat: int) -> None:
+    database_url, player_ids = prepare(root, max(sizes))
+    engine = create_async_engine(async_url(database_url))
+    counters = {"statements": 0, "commits": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counters["statements"] += 1
+
+    @event.listens_for(engine.sync_engine, "commit")
+    def count_commit(conn):
+        counters["commits"] += 1
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    print(f"{'size':>5} {'matches':>8} {'build':>9}   {'per round':>28}   {'bulk':>28}")
+    for size in sizes:
+        start = time.perf_counter()
+        topology = build_double_elimination(player_ids[:size], size)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        results = []
+        for save in (save_per_round, save_bulk):
+            elapsed, statements, commits = await measure(session_factory, counters, save, topology, repeat)
+            results.append(f"{elapsed:8.1f} ms {statements:5} stmts {commits:3} commits")
+        print(f"{size:>5} {len(topology['matches']):>8} {build_ms:6.2f} ms   {results[0]}   {results[1]}")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="8,32,128,256", help="Comma-separated bracket sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(benchmark(Path(tmp), sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
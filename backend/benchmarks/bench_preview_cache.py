@@ -0,0 +1,160 @@
+"""
+Benchmark: preview requests with and without the preview payload cache.
+
+Stores synthetic beatmapsets with large charts, registers their maps in a
+temporary SQLite database and requests ``GET /mappools/preview/{id}``
+through the real router: first with the cache disabled (DB query, manifest
+lookup and file read per request), then with it enabled, then with
+``If-None-Match`` revalidation answered by 304.
+
+Usage (from backend/):
+    python -m benchmarks.bench_preview_cache [--maps 20] [--requests 2000]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.base import Base
+from models.mappool import Mappool, MappoolMap
+from routers import mappool as mappool_router
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_extraction import ExtractionPolicy, extract_archive
+from services.beatmap_manifest import build_manifest, write_manifest
+from services.preview_cache import preview_cache
+from utils.database import async_url, get_db
+
+NOTES = 6000
+
+
+def osu_text(version: str, beatmap_id: int) -> str:
+    """A 4K chart with ``NOTES`` notes (roughly a 6-minute dense map)."""
+    hit_objects = "\n".join(
+        f"{64 + 128 * (i % 4)},192,{1000 + 60 * i},{128 if i % 7 == 0 else 1},0,{1000 + 60 * i + 240}:0:0:0:0:"
+        for i in range(NOTES)
+    )
+    return (
+        f"osu file format v14\n\n[General]\nAudioFilename: audio.mp3\nMode: 3\n\n"
+        f"[Metadata]\nTitle:Bench\nArtist:Bench\nCreator:Bench\nVersion:{version}\nBeatmapID:{beatmap_id}\n\n"
+        f"[Difficulty]\nCircleSize:4\n\n[TimingPoints]\n0,500,4,1,0,100,1,0\n\n[HitObjects]\n{hit_objects}\n"
+    )
+
+
+def prepare(root: Path, maps: int) -> tuple[BeatmapDownloader, str]:
+    """Install one set per map and register the maps in a fresh database; returns its URL."""
+    downloader = BeatmapDownloader(storage_path=str(root), policy=ExtractionPolicy({".osu", ".mp3", ".jpg"}))
+    database_url = f"sqlite:///{root / 'bench.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+
+    db = sessionmaker(bind=engine)()
+    pool = Mappool(stage_name="Bench", is_visible=True)
+    db.add(pool)
+    db.flush()
+    for i in range(maps):
+        set_id, beatmap_id = str(1000 + i), 50000 + i
+        osz_path = root / f"{set_id}.osz"
+        with zipfile.ZipFile(osz_path, "w") as zf:
+            zf.writestr("Bench [Hard].osu", osu_text("Hard", beatmap_id))
+            zf.writestr("audio.mp3", b"\x00" * 1024)
+        set_path = downloader.get_beatmapset_path(set_id)
+        extraction = extract_archive(osz_path, set_path, downloader.policy)
+        write_manifest(set_path, build_manifest(set_id, {e["name"]: e["size"] for e in extraction["extracted"]}))
+        osz_path.unlink()
+        downloader.generate_notes_json(set_id)
+        db.add(MappoolMap(
+            mappool_id=pool.id, slot=f"NM{i + 1}", beatmap_id=str(beatmap_id), beatmapset_id=set_id,
+            artist="a", title="t", difficulty_name="Hard", star_rating=5.0, bpm=180,
+            length_seconds=360, od=8.0, hp=8.0, mapper="m",
+        ))
+    db.commit()
+    db.close()
+    engine.dispose()
+    return downloader, database_url
+
+
+async def run_requests(client: httpx.AsyncClient, requests: list[tuple[str, dict]], expect: int) -> list[float]:
+    """Issue requests sequentially and return per-request latencies in ms."""
+    latencies = []
+    for url, headers in requests:
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        assert response.status_code == expect, response.status_code
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name: str, latencies: list[float]) -> str:
+    p95 = statistics.quantiles(latencies, n=20)[18]
+    rps = len(latencies) / (sum(latencies) / 1000)
+    return f"  {name:<28} p50 {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms   {rps:8.0f} req/s"
+
+
+async def benchmark(root: Path, maps: int, count: int) -> None:
+    downloader, database_url = prepare(root, maps)
+    mappool_router.beatmap_downloader = downloader
+    async_engine = create_async_engine(async_url(database_url))
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(mappool_router.router)
+    app.dependency_overrides[get_db] = override_get_db
+
+    rng = random.Random(42)
+    urls = [f"/mappools/preview/{50000 + rng.randrange(maps)}" for _ in range(count)]
+    notes_size = (root / "1000" / "notes" / "50000.json").stat().st_size
+    print(f"{maps} maps, notes JSON {notes_size / 1024:.0f} KB each")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for encoding in ("identity", "gzip"):
+            print(f"Accept-Encoding: {encoding}")
+            requests = [(url, {"Accept-Encoding": encoding}) for url in urls]
+
+            max_bytes = preview_cache.max_bytes
+            preview_cache.max_bytes = 0
+            preview_cache.clear()
+            print(summarize("cache disabled", await run_requests(client, requests, 200)))
+            preview_cache.max_bytes = max_bytes
+
+            await run_requests(client, requests[:maps * 4], 200)  # Fill the cache
+            print(summarize("cache enabled", await run_requests(client, requests, 200)))
+
+            etags = {}
+            for url in set(urls):
+                response = await client.get(url, headers={"Accept-Encoding": encoding})
+                etags[url] = response.headers["etag"]
+            conditional = [(url, {"Accept-Encoding": encoding, "If-None-Match": etags[url]}) for url in urls]
+            print(summarize("cache + If-None-Match (304)", await run_requests(client, conditional, 304)))
+            print(f"  cache: {preview_cache.stats()}")
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(benchmark(Path(tmp), args.maps, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,22 @@ FastAPI Backend
 import logging
 import os
 import traceback
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from config import Config
+from services.beatmap_static import BeatmapStaticFiles
+from services.beatmap_storage import beatmap_storage
+from services.beatmap_warmup import warmup_service
+from services.loop_monitor import RequestTracker, loop_monitor
+from services.progress_hub import progress_hub
+from services.workers import workers
+from utils.database import async_engine
 from routers import auth, users, tournament, brackets, maps, matches, notifications, api_keys, internal, timeline, news, mappool, slot, whitelist, scheduling, wheel, polls
 
 # Configure logging
@@ -22,13 +29,34 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the event-loop lag monitor and warm visible mappools in the
+    background; stop them, preview download jobs and the worker pools on
+    shutdown, and close the database connection pool.
+    """
+    if Config.LOOP_LAG_MONITOR:
+        loop_monitor.start()
+    if warmup_service.enabled:
+        await warmup_service.warm_visible_pools()
+    yield
+    await warmup_service.shutdown()
+    await progress_hub.shutdown()
+    await loop_monitor.stop()
+    workers.shutdown(wait=False)
+    await async_engine.dispose()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Peru Mania Cup API",
     description="Torneo de osu! Peru Mania Cup",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -55,6 +83,9 @@ app.add_middleware(
     allow_headers=["Authorization", "Content-Type", "X-Admin-Password", "X-API-Key"],
 )
 
+# Track in-flight requests so event-loop stalls can be attributed
+app.add_middleware(RequestTracker)
+
 # Global exception handler for detailed error responses
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -114,11 +145,15 @@ app.include_router(polls.router)
 app.include_router(internal.router)
 
 # Create beatmaps directory if it doesn't exist
-BEATMAPS_DIR = Path("beatmaps")
+BEATMAPS_DIR = Path(Config.BEATMAP_STORAGE_PATH)
 BEATMAPS_DIR.mkdir(exist_ok=True)
 
-# Mount beatmaps directory for static file access
-app.mount("/beatmaps", StaticFiles(directory="beatmaps"), name="beatmaps")
+# Mount beatmaps directory for static file access (tracks LRU access per set)
+app.mount(
+    "/beatmaps",
+    BeatmapStaticFiles(storage=beatmap_storage, directory=str(BEATMAPS_DIR)),
+    name="beatmaps",
+)
 
 
 @app.get("/")
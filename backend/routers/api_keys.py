@@ -2,7 +2,8 @@
 API Key management endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
@@ -36,7 +37,7 @@ class APIKeyResponse(BaseModel):
 @router.post("")
 async def create_api_key(
     data: APIKeyCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Generar una nueva API key (solo staff). La key solo se muestra una vez."""
@@ -51,8 +52,8 @@ async def create_api_key(
     )
 
     db.add(api_key)
-    db.commit()
-    db.refresh(api_key)
+    await db.commit()
+    await db.refresh(api_key)
 
     return {
         "api_key": {
@@ -70,11 +71,11 @@ async def create_api_key(
 
 @router.get("", response_model=dict)
 async def list_api_keys(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Listar todas las API keys (solo staff)"""
-    keys = db.query(APIKey).all()
+    keys = (await db.scalars(select(APIKey))).all()
     return {
         "api_keys": [
             {
@@ -96,16 +97,16 @@ async def list_api_keys(
 @router.delete("/{key_id}")
 async def revoke_api_key(
     key_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Revocar una API key (solo staff)"""
-    api_key = db.query(APIKey).filter(APIKey.id == key_id).first()
+    api_key = await db.scalar(select(APIKey).where(APIKey.id == key_id))
     if not api_key:
         raise HTTPException(status_code=404, detail="API key not found")
 
     api_key.is_active = False
-    db.commit()
+    await db.commit()
 
     return {
         "message": "API key revoked",
@@ -1,9 +1,9 @@
 """
 Endpoints de gestión de llaves
 """
-import math
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from utils.auth import get_current_staff_user
@@ -11,7 +11,16 @@ from utils.database import get_db
 from models.bracket import Bracket
 from models.match import Match
 from models.user import User
-from models.map import Map
+from services.bracket_read_model import bracket_read_model
+from services.bracket_stats import bracket_stats
+from services.bracket_topology import (
+    CROSSOVER_PATTERNS,
+    DEFAULT_CROSSOVER,
+    SUPPORTED_SIZES,
+    build_double_elimination,
+    save_topology,
+    smallest_bracket,
+)
 
 router = APIRouter(prefix="/brackets", tags=["Brackets"])
 
@@ -19,294 +28,173 @@ router = APIRouter(prefix="/brackets", tags=["Brackets"])
 class GenerateBracketsRequest(BaseModel):
     """Request body for generating brackets."""
     bracket_size: int = 8
+    crossover: str = DEFAULT_CROSSOVER
+    player_ids: list[int] | None = None  # Seed order override, best first
+
+
+class PreviewBracketsRequest(BaseModel):
+    """Request body for previewing a seeding; the size defaults to the smallest that fits."""
+    bracket_size: int | None = None
+    crossover: str = DEFAULT_CROSSOVER
+    player_ids: list[int] | None = None  # Seed order override, best first
+
+
+async def seeded_players(db: AsyncSession, player_ids: list[int] | None) -> list[User]:
+    """
+    Registered players in seed order, or in the order of ``player_ids``.
+
+    Raises:
+        HTTPException: ``player_ids`` repeats a player or names one who is
+            not registered.
+    """
+    players = (await db.scalars(select(User).where(
+        User.is_registered.is_(True)
+    ).order_by(User.seed_number.asc().nullslast()))).all()
+    if player_ids is None:
+        return list(players)
+
+    by_id = {player.id: player for player in players}
+    if len(set(player_ids)) != len(player_ids):
+        raise HTTPException(status_code=400, detail="Un jugador aparece más de una vez")
+    unknown = [player_id for player_id in player_ids if player_id not in by_id]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Jugadores no registrados: {unknown}")
+    return [by_id[player_id] for player_id in player_ids]
+
+
+def validate_options(bracket_size: int, crossover: str) -> None:
+    """Reject an unsupported bracket size or an unknown crossover pattern."""
+    if bracket_size not in SUPPORTED_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El tamaño debe ser {', '.join(map(str, SUPPORTED_SIZES[:-1]))} o {SUPPORTED_SIZES[-1]}"
+        )
+    if crossover not in CROSSOVER_PATTERNS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El cruce debe ser uno de: {', '.join(CROSSOVER_PATTERNS)}"
+        )
 
 
 @router.get("")
-async def get_all_brackets(db: Session = Depends(get_db)):
-    """Obtener todas las llaves con estadísticas de partidas"""
-    brackets = db.query(Bracket).order_by(Bracket.bracket_order).all()
-
-    result = []
-    for bracket in brackets:
-        total_matches = db.query(Match).filter(Match.bracket_id == bracket.id).count()
-        completed_matches = db.query(Match).filter(
-            Match.bracket_id == bracket.id,
-            Match.is_completed.is_(True)
-        ).count()
-
-        result.append({
-            "id": bracket.id,
-            "bracket_size": bracket.bracket_size,
-            "bracket_name": bracket.bracket_name,
-            "bracket_type": bracket.bracket_type,
-            "bracket_order": bracket.bracket_order,
-            "is_completed": bracket.is_completed,
-            "total_matches": total_matches,
-            "completed_matches": completed_matches
-        })
-
-    return {"brackets": result}
+async def get_all_brackets(db: AsyncSession = Depends(get_db)):
+    """
+    Obtener todas las llaves con estadísticas de partidas
+
+    Each bracket has its total, completed and in-progress match counts,
+    counts per status, and the same per round.
+    """
+    stats = await bracket_stats.get(db)
+    return {"brackets": stats["brackets"]}
+
+
+@router.get("/graph")
+async def get_bracket_graph(since_version: int | None = None, db: AsyncSession = Depends(get_db)):
+    """
+    Get the whole tournament graph in one response.
+
+    Returns every bracket in order with its matches, players and
+    ``next_match_id`` / ``loser_next_match_id`` edges, plus each match's
+    ``round`` (layout column) and ``position`` (row in that column), and
+    the read model ``version``.
+
+    With ``since_version`` (the ``version`` of an earlier response) the
+    answer is 304 if nothing changed, ``{"partial": true, "matches": [...]}``
+    with just the changed matches, or the full graph if brackets or the
+    layout changed.
+    """
+    if since_version is None:
+        return await bracket_read_model.get(db)
+    changes = await bracket_read_model.changes_since(db, since_version)
+    if changes is None:
+        return Response(status_code=304)
+    return changes
 
 
 @router.delete("")
 async def delete_all_brackets(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete all brackets and their matches (staff only)."""
-    matches_deleted = db.query(Match).delete()
-    brackets_deleted = db.query(Bracket).delete()
-    db.commit()
+    matches_deleted = (await db.execute(delete(Match))).rowcount
+    brackets_deleted = (await db.execute(delete(Bracket))).rowcount
+    await db.commit()
     return {"message": f"Eliminados {brackets_deleted} brackets y {matches_deleted} partidas"}
 
 
 @router.post("/generate")
 async def generate_brackets(
     request: GenerateBracketsRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """
     Generate full double elimination bracket structure (staff only).
 
-    Creates winner bracket, loser bracket, and grand finals with registered players.
+    Creates winner bracket, loser bracket, and grand finals with registered players,
+    placed in standard seeding order (by seed, or by ``player_ids``). Empty seed
+    slots are byes: those seeds start in the next round.
     """
-    # Get registered players ordered by seed
-    players = db.query(User).filter(
-        User.is_registered.is_(True)
-    ).order_by(User.seed_number.asc().nullslast()).all()
-
+    players = await seeded_players(db, request.player_ids)
     if len(players) < 2:
         raise HTTPException(status_code=400, detail="Se necesitan al menos 2 jugadores registrados")
+    validate_options(request.bracket_size, request.crossover)
 
-    bracket_size = request.bracket_size
-    if bracket_size not in [4, 8, 16, 32]:
-        raise HTTPException(status_code=400, detail="El tamaño debe ser 4, 8, 16 o 32")
-
-    if len(players) > bracket_size:
-        players = players[:bracket_size]
-
-    # Clear existing brackets and matches
-    db.query(Match).delete()
-    db.query(Bracket).delete()
-    db.commit()
-
-    # Get or create default map
-    default_map = db.query(Map).first()
-    if not default_map:
-        default_map = Map(
-            map_url="https://osu.ppy.sh/beatmaps/0",
-            map_name="TBD",
-            difficulty_name="TBD",
-            mapper_name="TBD"
-        )
-        db.add(default_map)
-        db.commit()
-        db.refresh(default_map)
+    topology = build_double_elimination([p.id for p in players], request.bracket_size, request.crossover)
+    bracket_ids = await save_topology(db, topology)
+    await db.commit()
 
-    # Create Winner Bracket
-    winner_bracket = Bracket(
-        bracket_size=bracket_size,
-        bracket_name="Winner Bracket",
-        bracket_type="winner",
-        bracket_order=1
-    )
-    db.add(winner_bracket)
-
-    # Create Loser Bracket
-    loser_bracket = Bracket(
-        bracket_size=bracket_size,
-        bracket_name="Loser Bracket",
-        bracket_type="loser",
-        bracket_order=2
-    )
-    db.add(loser_bracket)
-
-    # Create Grand Finals
-    gf_bracket = Bracket(
-        bracket_size=2,
-        bracket_name="Grand Finals",
-        bracket_type="grandfinals",
-        bracket_order=3
-    )
-    db.add(gf_bracket)
-    db.commit()
-
-    # Generate seeded matchups
-    def get_seeded_matchups(num_players):
-        matchups = []
-        half = num_players // 2
-        for i in range(half):
-            seed1 = i
-            seed2 = num_players - 1 - i
-            matchups.append((seed1, seed2))
-        return matchups
-
-    num_winner_rounds = int(math.log2(bracket_size))
-    matchups = get_seeded_matchups(bracket_size)
-    winner_rounds = []
-
-    # WR1: First round with seeded players
-    wr1 = []
-    for seed1_idx, seed2_idx in matchups:
-        p1_id = players[seed1_idx].id if seed1_idx < len(players) else None
-        p2_id = players[seed2_idx].id if seed2_idx < len(players) else None
-
-        match = Match(
-            bracket_id=winner_bracket.id,
-            player1_id=p1_id,
-            player2_id=p2_id,
-            map_id=default_map.id,
-            round_name=f"Round of {bracket_size}",
-            match_status="scheduled"
-        )
-        db.add(match)
-        wr1.append(match)
-    db.commit()
-    winner_rounds.append(wr1)
-
-    # Subsequent winner rounds
-    for round_idx in range(1, num_winner_rounds):
-        prev_round = winner_rounds[-1]
-        matches_in_round = len(prev_round) // 2
-
-        round_name = ("Winner Finals" if matches_in_round == 1 else
-                      "Winner Semifinals" if matches_in_round == 2 else
-                      "Winner Quarterfinals" if matches_in_round == 4 else
-                      f"Winner Round {round_idx + 1}")
-
-        curr_round = []
-        for _ in range(matches_in_round):
-            match = Match(
-                bracket_id=winner_bracket.id,
-                player1_id=None,
-                player2_id=None,
-                map_id=default_map.id,
-                round_name=round_name,
-                match_status="scheduled"
-            )
-            db.add(match)
-            curr_round.append(match)
-        db.commit()
-
-        for i, prev_match in enumerate(prev_round):
-            prev_match.next_match_id = curr_round[i // 2].id
-        db.commit()
-        winner_rounds.append(curr_round)
-
-    # Generate Loser Bracket matches
-    # Structure: 2*(numWR-1) rounds alternating internal/drop-down
-    # Odd rounds: internal (previous LR winners pair up or feed 1:1)
-    # Even rounds: drop-down (LR survivors + WR losers from next winner round)
-    num_loser_rounds = 2 * (num_winner_rounds - 1)
-    loser_rounds = []
-
-    for lr_idx in range(num_loser_rounds):
-        # Matches per round: pairs alternate at same count
-        # LR1,LR2: N/4 each; LR3,LR4: N/8 each; etc.
-        pair_idx = lr_idx // 2  # 0,0,1,1,2,2,...
-        matches_in_round = bracket_size // (2 ** (pair_idx + 2))
-        matches_in_round = max(matches_in_round, 1)
-
-        # Round naming
-        if lr_idx == num_loser_rounds - 1:
-            round_name = "Loser Finals"
-        elif lr_idx == num_loser_rounds - 2:
-            round_name = "Loser Semifinals"
-        else:
-            round_name = f"Loser Round {lr_idx + 1}"
-
-        curr_round = []
-        for _ in range(matches_in_round):
-            match = Match(
-                bracket_id=loser_bracket.id,
-                player1_id=None,
-                player2_id=None,
-                map_id=default_map.id,
-                round_name=round_name,
-                match_status="scheduled"
-            )
-            db.add(match)
-            curr_round.append(match)
-        db.commit()
-        loser_rounds.append(curr_round)
-
-    # Link loser bracket matches internally (next_match_id)
-    for lr_idx in range(num_loser_rounds - 1):
-        curr = loser_rounds[lr_idx]
-        next_round = loser_rounds[lr_idx + 1]
-
-        if len(curr) == len(next_round):
-            # 1:1 mapping (odd→even transition: internal feeds drop-down)
-            for j, m in enumerate(curr):
-                m.next_match_id = next_round[j].id
-        else:
-            # 2:1 mapping (even→odd transition: pairs merge)
-            for j, m in enumerate(curr):
-                m.next_match_id = next_round[j // 2].id
-    db.commit()
-
-    # Set loser_next_match_id on winner bracket matches
-    # Uses Challonge-style mirrored seeding to prevent early rematches:
-    # top-seed losers pair with bottom-seed losers (fold pattern)
-    if loser_rounds:
-        wr1_matches = winner_rounds[0]
-        lr1_matches = loser_rounds[0]
-        # Mirror WR1 losers into LR1: pair match 0 with match N-1, match 1 with N-2, etc.
-        n = len(wr1_matches)
-        for j in range(n):
-            mirrored_j = n - 1 - j if j % 2 == 1 else j
-            wr1_matches[j].loser_next_match_id = lr1_matches[mirrored_j // 2].id
-
-        # WR(k) losers → LR(2*(k-1)) for k >= 2
-        # WR2 → LR2, WR3 → LR4, WR4 → LR6, etc.
-        # Reverse the order so losers enter from opposite ends
-        for wr_round_idx in range(1, num_winner_rounds):
-            lr_target_idx = 2 * wr_round_idx - 1  # LR index (0-based): 1, 3, 5, ...
-            if lr_target_idx < num_loser_rounds:
-                wr_matches = winner_rounds[wr_round_idx]
-                lr_targets = loser_rounds[lr_target_idx]
-                # Reverse mapping: WR match 0 → last LR slot, etc.
-                m = len(wr_matches)
-                for j, wr_match in enumerate(wr_matches):
-                    reversed_j = m - 1 - j
-                    if reversed_j < len(lr_targets):
-                        wr_match.loser_next_match_id = lr_targets[reversed_j].id
-    db.commit()
-
-    # Grand Finals match
-    gf_match = Match(
-        bracket_id=gf_bracket.id,
-        player1_id=None,
-        player2_id=None,
-        map_id=default_map.id,
-        round_name="Grand Finals",
-        match_status="scheduled"
-    )
-    db.add(gf_match)
-    db.commit()
+    return {
+        "message": "Brackets generados exitosamente",
+        "brackets": bracket_ids,
+        "players_seeded": topology["players"],
+        "byes": topology["byes"],
+        "total_matches": len(topology["matches"]),
+        "loser_bracket_matches": sum(1 for m in topology["matches"] if m["bracket_type"] == "loser")
+    }
 
-    # Link Winner Finals → Grand Finals
-    if winner_rounds:
-        winner_finals = winner_rounds[-1][0]
-        winner_finals.next_match_id = gf_match.id
 
-    # Link Loser Finals → Grand Finals
-    if loser_rounds:
-        loser_finals = loser_rounds[-1][0]
-        loser_finals.next_match_id = gf_match.id
+@router.post("/preview")
+async def preview_brackets(
+    request: PreviewBracketsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Preview the tournament a seeding would generate, without saving it (staff only).
 
-    db.commit()
+    Takes the same options as ``POST /brackets/generate``. Matches come in
+    play order; ``next_index`` and ``loser_next_index`` point into the list.
+    """
+    players = await seeded_players(db, request.player_ids)
+    if len(players) < 2:
+        raise HTTPException(status_code=400, detail="Se necesitan al menos 2 jugadores registrados")
+    bracket_size = request.bracket_size or smallest_bracket(len(players))
+    validate_options(bracket_size, request.crossover)
 
+    topology = build_double_elimination([p.id for p in players], bracket_size, request.crossover)
+    by_id = {
+        player.id: {"id": player.id, "username": player.username, "seed_number": player.seed_number}
+        for player in players
+    }
     return {
-        "message": "Brackets generados exitosamente",
-        "brackets": {
-            "winner": winner_bracket.id,
-            "loser": loser_bracket.id,
-            "grandfinals": gf_bracket.id
-        },
-        "players_seeded": len(players),
-        "loser_bracket_matches": sum(len(r) for r in loser_rounds)
+        "bracket_size": topology["bracket_size"],
+        "crossover": request.crossover,
+        "players_seeded": topology["players"],
+        "byes": topology["byes"],
+        "matches": [
+            {
+                "index": index,
+                "bracket_type": match["bracket_type"],
+                "round_name": match["round_name"],
+                "player1": by_id.get(match["player1_id"]),
+                "player2": by_id.get(match["player2_id"]),
+                "next_index": match["next_index"],
+                "loser_next_index": match["loser_next_index"],
+            }
+            for index, match in enumerate(topology["matches"])
+        ],
     }
 
 
@@ -316,7 +204,7 @@ async def create_bracket(
     bracket_name: str,
     bracket_order: int,
     bracket_type: str = "winner",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Crear estructura de llave (solo staff)"""
@@ -327,57 +215,46 @@ async def create_bracket(
         bracket_type=bracket_type
     )
     db.add(bracket)
-    db.commit()
-    db.refresh(bracket)
+    await db.commit()
+    await db.refresh(bracket)
     return bracket
 
 
 @router.get("/{bracket_id}")
-async def get_bracket(bracket_id: int, db: Session = Depends(get_db)):
+async def get_bracket(bracket_id: int, db: AsyncSession = Depends(get_db)):
     """Obtener detalles de una llave específica"""
-    bracket = db.query(Bracket).filter(Bracket.id == bracket_id).first()
+    bracket = await db.scalar(select(Bracket).where(Bracket.id == bracket_id))
     if not bracket:
         raise HTTPException(status_code=404, detail="Bracket not found")
     return bracket
 
 
 @router.get("/{bracket_id}/matches")
-async def get_bracket_matches(bracket_id: int, db: Session = Depends(get_db)):
-    """Obtener todas las partidas de una llave con detalles de jugadores"""
-    bracket = db.query(Bracket).filter(Bracket.id == bracket_id).first()
+async def get_bracket_matches(bracket_id: int, since_version: int | None = None, db: AsyncSession = Depends(get_db)):
+    """
+    Obtener todas las partidas de una llave con detalles de jugadores
+
+    Served from the bracket read model; ``since_version`` works as in
+    ``GET /brackets/graph``, limited to this bracket's matches.
+    """
+    graph = await bracket_read_model.get(db)
+    bracket = next((b for b in graph["brackets"] if b["id"] == bracket_id), None)
     if not bracket:
         raise HTTPException(status_code=404, detail="Bracket not found")
 
-    matches = db.query(Match).filter(Match.bracket_id == bracket_id).order_by(Match.id).all()
-
-    result = []
-    for match in matches:
-        player1 = db.query(User).filter(User.id == match.player1_id).first()
-        player2 = db.query(User).filter(User.id == match.player2_id).first()
-        winner = db.query(User).filter(User.id == match.winner_id).first() if match.winner_id else None
-
-        result.append({
-            "id": match.id,
-            "bracket_id": match.bracket_id,
-            "player1_id": match.player1_id,
-            "player1_username": player1.username if player1 else "TBD",
-            "player1_osu_id": player1.osu_id if player1 else None,
-            "player1_seed": player1.seed_number if player1 else None,
-            "player2_id": match.player2_id,
-            "player2_username": player2.username if player2 else "TBD",
-            "player2_osu_id": player2.osu_id if player2 else None,
-            "player2_seed": player2.seed_number if player2 else None,
-            "player1_score": match.player1_score,
-            "player2_score": match.player2_score,
-            "winner_id": match.winner_id,
-            "winner_username": winner.username if winner else None,
-            "match_status": match.match_status,
-            "is_completed": match.is_completed,
-            "scheduled_time": match.scheduled_time,
-            "round_name": match.round_name,
-            "next_match_id": match.next_match_id,
-            "loser_next_match_id": match.loser_next_match_id,
-            "is_grandfinals_reset": match.is_grandfinals_reset
-        })
-
-    return {"matches": result, "total": len(result), "bracket": {"id": bracket.id, "name": bracket.bracket_name, "size": bracket.bracket_size, "type": bracket.bracket_type}}
+    if since_version is not None:
+        changes = await bracket_read_model.changes_since(db, since_version)
+        if changes is None:
+            return Response(status_code=304)
+        if changes.get("partial"):
+            matches = [m for m in changes["matches"] if m["bracket_id"] == bracket_id]
+            if not matches:
+                return Response(status_code=304)  # Only other brackets changed
+            return {**changes, "matches": matches}
+
+    return {
+        "matches": bracket["matches"],
+        "total": len(bracket["matches"]),
+        "bracket": {"id": bracket["id"], "name": bracket["name"], "size": bracket["size"], "type": bracket["type"]},
+        "version": graph["version"],
+    }
@@ -1,18 +1,33 @@
 """Endpoints for tournament mappool management."""
-import asyncio
 import json
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
+from config import Config
 from utils.auth import get_current_staff_user
-from utils.database import get_db
+from utils.database import get_db, pool_stats
 from models.mappool import Mappool, MappoolMap
 from models.user import User
 from services.osu_api import osu_api
-from services.beatmap_downloader import beatmap_downloader
+from services.beatmap_downloader import beatmap_downloader, notes_urls
+from services.beatmap_mirrors import mirror_registry
+from services.beatmap_storage import beatmap_storage, load_pinned_beatmapsets
+from services.beatmap_warmup import warmup_service
+from services.download_scheduler import BULK, download_scheduler
+from services.image_derivatives import DERIVED_DIR, FILENAME_PATTERN, MEDIA_TYPES
+from services.loop_monitor import loop_monitor
+from services.notes_encoding import available_encodings, choose_encoding
+from services.osu_parser import decode_text, parse_partial_preview
+from services.preview_cache import PreviewPayload, etag_matches, preview_cache
+from services.progress_hub import parse_event_id, progress_hub
+from services.workers import workers
 
 router = APIRouter(prefix="/mappools", tags=["Mappools"])
 
@@ -24,6 +39,23 @@ def format_length(seconds: int) -> str:
     return f"{minutes}:{secs:02d}"
 
 
+async def refresh_storage_pins(db: AsyncSession) -> None:
+    """Pin beatmapsets of visible mappools so the disk budget never evicts them."""
+    pinned = await db.run_sync(load_pinned_beatmapsets)
+    # Writes the shared storage index under its file lock
+    await workers.run_io(beatmap_storage.set_pins, pinned)
+
+
+async def load_mappool(db: AsyncSession, pool_id: int) -> Mappool | None:
+    """Load a mappool with its maps, replacing any stale copy in the session."""
+    return await db.scalar(
+        select(Mappool)
+        .options(selectinload(Mappool.maps))
+        .where(Mappool.id == pool_id)
+        .execution_options(populate_existing=True)
+    )
+
+
 def serialize_map(m: MappoolMap) -> dict:
     """Serialize a mappool map to dict."""
     return {
@@ -120,9 +152,14 @@ class MapUpdate(BaseModel):
 # === Mappool endpoints ===
 
 @router.get("")
-async def get_all_mappools(db: Session = Depends(get_db)):
+async def get_all_mappools(db: AsyncSession = Depends(get_db)):
     """Get all mappools with their maps (public, only visible pools)."""
-    pools = db.query(Mappool).filter(Mappool.is_visible.is_(True)).order_by(Mappool.stage_order).all()
+    pools = (await db.scalars(
+        select(Mappool)
+        .options(selectinload(Mappool.maps))
+        .where(Mappool.is_visible.is_(True))
+        .order_by(Mappool.stage_order)
+    )).all()
     total_maps = sum(len(pool.maps) for pool in pools)
     return {
         "total_maps": total_maps,
@@ -132,11 +169,13 @@ async def get_all_mappools(db: Session = Depends(get_db)):
 
 @router.get("/all")
 async def get_all_mappools_admin(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Get all mappools including hidden ones (staff only)."""
-    pools = db.query(Mappool).order_by(Mappool.stage_order).all()
+    pools = (await db.scalars(
+        select(Mappool).options(selectinload(Mappool.maps)).order_by(Mappool.stage_order)
+    )).all()
     total_maps = sum(len(pool.maps) for pool in pools)
     return {
         "total_maps": total_maps,
@@ -145,9 +184,9 @@ async def get_all_mappools_admin(
 
 
 @router.get("/{pool_id}")
-async def get_mappool(pool_id: int, db: Session = Depends(get_db)):
+async def get_mappool(pool_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific mappool with maps (public)."""
-    pool = db.query(Mappool).filter(Mappool.id == pool_id).first()
+    pool = await load_mappool(db, pool_id)
     if not pool:
         raise HTTPException(status_code=404, detail="Mappool not found")
     if not pool.is_visible:
@@ -158,50 +197,50 @@ async def get_mappool(pool_id: int, db: Session = Depends(get_db)):
 @router.post("")
 async def create_mappool(
     data: MappoolCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Create a new mappool (staff only)."""
     pool = Mappool(**data.model_dump())
     db.add(pool)
-    db.commit()
-    db.refresh(pool)
-    return serialize_mappool(pool)
+    await db.commit()
+    return serialize_mappool(await load_mappool(db, pool.id))
 
 
 @router.put("/{pool_id}")
 async def update_mappool(
     pool_id: int,
     data: MappoolUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Update a mappool (staff only)."""
-    pool = db.query(Mappool).filter(Mappool.id == pool_id).first()
+    pool = await db.scalar(select(Mappool).where(Mappool.id == pool_id))
     if not pool:
         raise HTTPException(status_code=404, detail="Mappool not found")
 
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(pool, key, value)
 
-    db.commit()
-    db.refresh(pool)
-    return serialize_mappool(pool)
+    await db.commit()
+    await refresh_storage_pins(db)
+    return serialize_mappool(await load_mappool(db, pool_id))
 
 
 @router.delete("/{pool_id}")
 async def delete_mappool(
     pool_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete a mappool and all its maps (staff only)."""
-    pool = db.query(Mappool).filter(Mappool.id == pool_id).first()
+    pool = await db.scalar(select(Mappool).where(Mappool.id == pool_id))
     if not pool:
         raise HTTPException(status_code=404, detail="Mappool not found")
 
-    db.delete(pool)
-    db.commit()
+    await db.delete(pool)
+    await db.commit()
+    await refresh_storage_pins(db)
     return {"message": "Mappool deleted"}
 
 
@@ -246,11 +285,16 @@ async def lookup_beatmapset(
 async def add_map_to_pool(
     pool_id: int,
     data: MapCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
-    """Add a map to a mappool (staff only)."""
-    pool = db.query(Mappool).filter(Mappool.id == pool_id).first()
+    """
+    Add a map to a mappool (staff only).
+
+    Starts a background warm-up (download and parse) so the map's preview
+    is ready before the first visitor opens it.
+    """
+    pool = await db.scalar(select(Mappool).where(Mappool.id == pool_id))
     if not pool:
         raise HTTPException(status_code=404, detail="Mappool not found")
 
@@ -263,8 +307,11 @@ async def add_map_to_pool(
 
     new_map = MappoolMap(**map_data)
     db.add(new_map)
-    db.commit()
-    db.refresh(new_map)
+    await db.commit()
+    await refresh_storage_pins(db)
+    await db.refresh(new_map)
+    preview_cache.invalidate(new_map.beatmap_id)
+    warmup_service.enqueue(new_map.beatmap_id, new_map.beatmapset_id)
     return serialize_map(new_map)
 
 
@@ -272,11 +319,11 @@ async def add_map_to_pool(
 async def update_map(
     map_id: int,
     data: MapUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
-    """Update a map in a mappool (staff only)."""
-    map_obj = db.query(MappoolMap).filter(MappoolMap.id == map_id).first()
+    """Update a map in a mappool (staff only). Re-warms the map in the background."""
+    map_obj = await db.scalar(select(MappoolMap).where(MappoolMap.id == map_id))
     if not map_obj:
         raise HTTPException(status_code=404, detail="Map not found")
 
@@ -289,27 +336,38 @@ async def update_map(
     if "hp" in update_data:
         update_data["hp"] = Decimal(str(update_data["hp"]))
 
+    # A different beatmap invalidates the stored set ID; the warm-up resolves it again
+    if update_data.get("beatmap_id", map_obj.beatmap_id) != map_obj.beatmap_id:
+        update_data["beatmapset_id"] = None
+
+    # Previews of both the old and the new beatmap may change
+    preview_cache.invalidate(map_obj.beatmap_id)
     for key, value in update_data.items():
         setattr(map_obj, key, value)
 
-    db.commit()
-    db.refresh(map_obj)
+    await db.commit()
+    await refresh_storage_pins(db)
+    await db.refresh(map_obj)
+    preview_cache.invalidate(map_obj.beatmap_id)
+    warmup_service.enqueue(map_obj.beatmap_id, map_obj.beatmapset_id)
     return serialize_map(map_obj)
 
 
 @router.delete("/maps/{map_id}")
 async def delete_map(
     map_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete a map from a mappool (staff only)."""
-    map_obj = db.query(MappoolMap).filter(MappoolMap.id == map_id).first()
+    map_obj = await db.scalar(select(MappoolMap).where(MappoolMap.id == map_id))
     if not map_obj:
         raise HTTPException(status_code=404, detail="Map not found")
 
-    db.delete(map_obj)
-    db.commit()
+    await db.delete(map_obj)
+    await db.commit()
+    await refresh_storage_pins(db)
+    preview_cache.invalidate(map_obj.beatmap_id)
     return {"message": "Map deleted"}
 
 
@@ -317,7 +375,7 @@ async def delete_map(
 
 @router.post("/sync")
 async def sync_all_beatmaps(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """
@@ -329,7 +387,8 @@ async def sync_all_beatmaps(
 
     Returns summary of sync results.
     """
-    maps = db.query(MappoolMap).all()
+    maps = (await db.scalars(select(MappoolMap))).all()
+    await refresh_storage_pins(db)
 
     results = {
         "total": len(maps),
@@ -349,7 +408,7 @@ async def sync_all_beatmaps(
                 beatmapset_id = beatmap_data.get("beatmapset_id")
                 # Save it to database for future
                 m.beatmapset_id = beatmapset_id
-                db.commit()
+                await db.commit()
 
         if not beatmapset_id:
             results["errors"] += 1
@@ -362,7 +421,7 @@ async def sync_all_beatmaps(
             continue
 
         # Download the beatmapset
-        download_result = await beatmap_downloader.download(beatmapset_id)
+        download_result = await beatmap_downloader.download(beatmapset_id, priority=BULK)
 
         if download_result["status"] == "downloaded":
             results["downloaded"] += 1
@@ -383,15 +442,16 @@ async def sync_all_beatmaps(
 
 @router.get("/sync/status")
 async def get_sync_status(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """
     Check download status of all mappool beatmaps (staff only).
 
-    Returns which beatmaps are downloaded and which are missing.
+    Returns which beatmaps are downloaded and which are missing, with the
+    background warm-up state of each map.
     """
-    maps = db.query(MappoolMap).all()
+    maps = (await db.scalars(select(MappoolMap))).all()
 
     results = {
         "total": len(maps),
@@ -407,14 +467,15 @@ async def get_sync_status(
             "beatmapset_id": m.beatmapset_id,
             "slot": m.slot,
             "title": m.title,
+            "warmup": warmup_service.get_state(m.beatmap_id),
         }
 
         if not m.beatmapset_id:
             map_info["status"] = "no_beatmapset_id"
             results["no_beatmapset_id"] += 1
-        elif beatmap_downloader.exists(m.beatmapset_id):
+        elif await workers.run_io(beatmap_downloader.exists, m.beatmapset_id):
             map_info["status"] = "downloaded"
-            map_info["files"] = beatmap_downloader.get_beatmap_files(m.beatmapset_id)
+            map_info["files"] = await workers.run_io(beatmap_downloader.get_beatmap_files, m.beatmapset_id)
             results["downloaded"] += 1
         else:
             map_info["status"] = "missing"
@@ -422,25 +483,48 @@ async def get_sync_status(
 
         results["maps"].append(map_info)
 
+    results["storage"] = await workers.run_io(beatmap_storage.stats)
+    results["warmup"] = warmup_service.stats()
+    results["preview_cache"] = preview_cache.stats()
     return results
 
 
-@router.get("/preview/{beatmap_id}")
-async def get_beatmap_preview_data(
-    beatmap_id: str,
-    db: Session = Depends(get_db),
+@router.get("/sync/mirrors")
+async def get_mirror_health(
+    current_user: User = Depends(get_current_staff_user)
 ):
     """
-    Get parsed notes data for beatmap preview (public).
+    Get health statistics of the beatmap download mirrors (staff only).
 
-    Returns notes JSON for rendering in the frontend preview component.
-    Auto-downloads and parses beatmapset if not already available.
+    Mirrors are listed best first, with rolling latency, error rate and
+    remaining backoff for mirrors that have been failing.
+    """
+    return {"mirrors": mirror_registry.stats()}
 
-    Args:
-        beatmap_id: The osu! beatmap ID.
+
+@router.get("/sync/queue")
+async def get_download_queue(
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Get download scheduler metrics (staff only).
+
+    Returns active and queued downloads per priority class (interactive
+    previews, staff actions, bulk sync), the class limits, average
+    time spent waiting for a slot and background preview download jobs.
+    """
+    return {**download_scheduler.stats(), "preview_jobs": progress_hub.stats()}
+
+
+async def load_preview_payload(beatmap_id: str, accept_encoding: str | None, db: AsyncSession) -> PreviewPayload:
+    """
+    Resolve, download if needed and read a map's preview payload.
+
+    Raises:
+        HTTPException: If the map cannot be found, downloaded or parsed.
     """
     # Find the map in database to get beatmapset_id and difficulty_name
-    map_obj = db.query(MappoolMap).filter(MappoolMap.beatmap_id == beatmap_id).first()
+    map_obj = await db.scalar(select(MappoolMap).where(MappoolMap.beatmap_id == beatmap_id))
 
     beatmapset_id = None
     difficulty_name = None
@@ -457,49 +541,231 @@ async def get_beatmap_preview_data(
         beatmapset_id = str(beatmap_data.get("beatmapset_id"))
         # Also get difficulty name from API if we don't have it
         if not difficulty_name:
-            difficulty_name = beatmap_data.get("version")
+            difficulty_name = beatmap_data.get("difficulty_name")
 
         # Save beatmapset_id to database for future
         if map_obj and beatmapset_id:
             map_obj.beatmapset_id = beatmapset_id
-            db.commit()
+            await db.commit()
 
     if not beatmapset_id:
         raise HTTPException(status_code=404, detail="Could not determine beatmapset_id")
 
-    # Download if not exists
-    if not beatmap_downloader.exists(beatmapset_id):
+    # Download if not exists (sets written by older code get a manifest built here)
+    if not await workers.run_io(beatmap_downloader.exists, beatmapset_id):
+        await refresh_storage_pins(db)
         download_result = await beatmap_downloader.download(beatmapset_id)
         if download_result["status"] == "error":
             raise HTTPException(status_code=500, detail=download_result.get("error", "Download failed"))
         if download_result["status"] == "not_found":
             raise HTTPException(status_code=404, detail="Beatmapset not found on mirror")
 
-    # Use difficulty_name from database/API to get correct difficulty
-    notes_data = beatmap_downloader.get_notes_json(beatmapset_id, difficulty_name)
-    if not notes_data:
-        # Try to regenerate
-        beatmap_downloader.generate_notes_json(beatmapset_id)
-        notes_data = beatmap_downloader.get_notes_json(beatmapset_id, difficulty_name)
+    # Resolve the difficulty by beatmap ID (name only for unsubmitted difficulties)
+    # May regenerate notes of sets written by older versions, so off the loop
+    notes_file = await workers.run_cpu(
+        beatmap_downloader.get_notes_file,
+        beatmapset_id, difficulty_name, beatmap_id=beatmap_id,
+        accept_encoding=accept_encoding,
+    )
+    if not notes_file:
+        raise HTTPException(status_code=404, detail="Could not parse beatmap")
 
-    if not notes_data:
+    try:
+        body = await workers.run_io(notes_file["path"].read_bytes)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Could not parse beatmap")
 
-    # Add URLs for audio and background
-    notes_data["audio_url"] = f"/beatmaps/{beatmapset_id}/{notes_data.get('audio_file', '')}"
-    notes_data["background_url"] = f"/beatmaps/{beatmapset_id}/{notes_data.get('background_file', '')}"
+    # The stored file already carries the audio/background/storyboard URLs;
+    # they are repeated as headers for clients that only need the assets
+    manifest = await workers.run_io(beatmap_downloader.get_manifest, beatmapset_id) or {}
+    urls = notes_urls(
+        beatmapset_id, notes_file["difficulty"]["audio_file"],
+        manifest.get("background_file"), has_storyboard=False,
+    )
+    headers = {
+        "X-Beatmapset-Id": str(beatmapset_id),
+        # Percent-encoded: file names may contain non-latin-1 characters
+        "X-Audio-Url": quote(urls["audio_url"]),
+        "X-Background-Url": quote(urls["background_url"]),
+    }
+    generation = await workers.run_io(beatmap_downloader.get_generation, beatmapset_id)
+    return PreviewPayload(body, notes_file["encoding"], str(beatmapset_id), generation, headers)
+
+
+@router.get("/sync/workers")
+async def get_worker_stats(
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Get worker pool, event-loop and database pool metrics (staff only).
+
+    Returns running and queued calls of the IO and CPU worker pools, the
+    event-loop lag seen by the monitor, including the requests in flight
+    during the last stall, and for both database engines the checked-out
+    and overflow connections, wait and checkout-duration histograms, and
+    pool timeouts.
+    """
+    return {
+        "pools": workers.stats(),
+        "event_loop": loop_monitor.stats(),
+        "database": pool_stats(),
+    }
+
+
+@router.get("/sync/blobs")
+async def get_blob_stats(
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Get deduplication figures of the beatmap blob store (staff only).
+
+    Reports how many bytes the extracted sets would take without sharing
+    identical files, how many their blobs actually take, and the ratio.
+    """
+    return await workers.run_io(beatmap_downloader.blobs.stats)
+
+
+@router.post("/sync/blobs/gc")
+async def collect_blobs(
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Remove blobs no beatmapset links to any more (staff only).
+
+    Blobs of evicted and replaced sets are collected automatically; this
+    sweeps whatever is left, e.g. after sets were deleted by hand.
+    """
+    return await workers.run_io(beatmap_downloader.blobs.collect)
+
+
+@router.get("/images/{beatmapset_id}/{filename}")
+async def get_image_derivative(beatmapset_id: str, filename: str):
+    """
+    Serve a resized background or storyboard sprite derivative (public).
+
+    Derivative names are derived from the source image's bytes, so the
+    response never changes and is cached for a year.
+    """
+    match = FILENAME_PATTERN.match(filename)
+    if not beatmapset_id.isdigit() or match is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path = beatmap_downloader.get_beatmapset_path(beatmapset_id) / DERIVED_DIR / filename
+    if not await workers.run_io(path.is_file):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # May measure the set and save the storage index
+    await workers.run_io(beatmap_storage.touch, beatmapset_id)
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[match.group(1)],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@router.get("/preview/{beatmap_id}")
+async def get_beatmap_preview_data(
+    beatmap_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get parsed notes data for beatmap preview (public).
+
+    Returns notes JSON for rendering in the frontend preview component.
+    Auto-downloads and parses beatmapset if not already available. The
+    notes file is sent as stored, gzip- or brotli-compressed when the
+    client accepts it, without being parsed or re-serialized.
+
+    Payloads are kept in an in-memory LRU keyed by beatmap ID and
+    encoding, and revalidated against the set's notes generation. A
+    strong ETag allows ``If-None-Match`` requests to be answered with 304.
 
-    # Add base URL for storyboard images
-    if notes_data.get("storyboard"):
-        notes_data["storyboard_base_url"] = f"/beatmaps/{beatmapset_id}/"
+    Args:
+        beatmap_id: The osu! beatmap ID.
+    """
+    accept_encoding = request.headers.get("accept-encoding")
+    preferred = choose_encoding(accept_encoding, available_encodings())
+
+    payload = preview_cache.get(beatmap_id, preferred, current_generation=beatmap_downloader.get_generation)
+    if payload is None:
+        payload = await load_preview_payload(beatmap_id, accept_encoding, db)
+        preview_cache.put(beatmap_id, preferred, payload)
+
+    headers = {
+        **payload.headers,
+        "ETag": payload.etag,
+        "Cache-Control": f"public, max-age={Config.PREVIEW_MAX_AGE}, must-revalidate",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    if payload.encoding:
+        headers["Content-Encoding"] = payload.encoding
+    return Response(content=payload.body, media_type="application/json", headers=headers)
 
-    return notes_data
+
+def download_job(beatmapset_id: str):
+    """
+    Background job downloading a set for preview streams.
+
+    Publishes the download's progress into the set's hub channel; it runs
+    to completion even if every subscriber disconnects. Each difficulty
+    whose .osu file arrives before the rest of the archive is published
+    as a ``partial`` event with its metadata, timing points and opening
+    notes.
+    """
+    async def job(channel):
+        channel.publish("progress", {"step": "download", "message": "Conectando al mirror..."})
+        download_result = None
+
+        async for event in beatmap_downloader.download_with_progress(beatmapset_id):
+            if event["type"] == "queued":
+                channel.publish("queue", {
+                    "step": "download",
+                    "position": event["position"],
+                    "message": f"En cola de descarga (posición {event['position']})...",
+                })
+            elif event["type"] == "progress":
+                loaded_mb = event["loaded"] / 1024 / 1024
+                total_mb = event["total"] / 1024 / 1024
+                percent = round((event["loaded"] / event["total"]) * 100) if event["total"] > 0 else 0
+                channel.publish("progress", {
+                    "step": "download",
+                    "message": f"Descargando ({loaded_mb:.1f}/{total_mb:.1f} MB)...",
+                    "progress": percent,
+                })
+            elif event["type"] == "member":
+                # A difficulty arrived before the rest of the archive: send its opening
+                try:
+                    partial = await workers.run_cpu(
+                        parse_partial_preview, decode_text(event["data"]), Config.PREVIEW_PROGRESSIVE_SECONDS
+                    )
+                except ValueError:
+                    continue
+                channel.publish("partial", partial)
+            elif event["type"] == "extracting":
+                channel.publish("progress", {"step": "download", "message": "Extrayendo archivos..."})
+            elif event["type"] in ("complete", "error"):
+                download_result = event["result"]
+
+        if not download_result or download_result["status"] == "error":
+            error = download_result.get("error") if download_result else "Unknown"
+            channel.publish("error", {"message": f"Error de descarga: {error}"})
+        elif download_result["status"] == "not_found":
+            channel.publish("error", {"message": "Beatmap no encontrado en mirror"})
+        else:
+            channel.publish("progress", {"step": "download", "message": "Beatmap descargado", "done": True})
+
+    return job
 
 
 @router.get("/preview/{beatmap_id}/stream")
 async def get_beatmap_preview_stream(
     beatmap_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    # Closed when this function returns, before the (long) stream starts
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
     """
     Stream progress events while loading beatmap preview data (SSE).
@@ -509,95 +775,109 @@ async def get_beatmap_preview_stream(
     - osu! API lookup
     - Beatmap download
     - Extraction and parsing
+
+    Progressive events let the page show the map before it is ready:
+    ``metadata`` (from the DB row or the osu! API) right after the lookup,
+    and ``partial`` with the requested difficulty's metadata, timing points
+    and first ``PREVIEW_PROGRESSIVE_SECONDS`` of notes as soon as its .osu
+    file has been downloaded, ahead of the rest of the archive. The full
+    notes and storyboard follow in ``complete``.
+
+    The download runs as a background job publishing into the progress
+    hub, so it continues if the client disconnects. Download events carry
+    IDs; a reconnecting client sending ``Last-Event-ID`` resumes after the
+    last event it received. The DB session is only used for the lookup.
     """
-    async def event_generator():
-        def send_event(event: str, data: dict):
-            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    def send_event(event: str, data: dict, event_id: str | None = None):
+        prefix = f"id: {event_id}\n" if event_id else ""
+        return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    # Lookup (DB, then osu! API) before streaming; events are replayed below
+    lookup_events = [send_event("progress", {"step": "database", "message": "Buscando en base de datos..."})]
+    map_obj = await db.scalar(select(MappoolMap).where(MappoolMap.beatmap_id == beatmap_id))
+    beatmapset_id = map_obj.beatmapset_id if map_obj else None
+    difficulty_name = map_obj.difficulty_name if map_obj else None
+    message = "Encontrado en base de datos" if map_obj else "No encontrado localmente"
+    lookup_events.append(send_event("progress", {"step": "database", "message": message, "done": True}))
+
+    lookup_error = None
+    metadata = None
+    if map_obj:
+        metadata = {"title": map_obj.title, "artist": map_obj.artist, "version": map_obj.difficulty_name}
+    if not beatmapset_id:
+        lookup_events.append(send_event("progress", {"step": "osu_api", "message": "Consultando osu! API..."}))
+        beatmap_data = await osu_api.get_beatmap(int(beatmap_id))
+        if not beatmap_data:
+            lookup_error = "Beatmap no encontrado en osu!"
+        else:
+            beatmapset_id = str(beatmap_data.get("beatmapset_id"))
+            if not difficulty_name:
+                difficulty_name = beatmap_data.get("difficulty_name")
+            if map_obj and beatmapset_id:
+                map_obj.beatmapset_id = beatmapset_id
+                await db.commit()
+            metadata = metadata or {
+                "title": beatmap_data.get("title", ""),
+                "artist": beatmap_data.get("artist", ""),
+                "version": beatmap_data.get("difficulty_name", ""),
+            }
+            lookup_events.append(send_event("progress", {"step": "osu_api", "message": "Datos obtenidos de osu!", "done": True}))
+
+    needs_download = bool(beatmapset_id) and not await workers.run_io(beatmap_downloader.exists, beatmapset_id)
+    if needs_download:
+        await refresh_storage_pins(db)
+    resume = parse_event_id(request.headers.get("last-event-id"))
+
+    def is_requested(metadata: dict) -> bool:
+        """Whether a partial preview is of the requested difficulty."""
+        if metadata["beatmap_id"]:
+            return str(metadata["beatmap_id"]) == str(beatmap_id)
+        return metadata["version"] == difficulty_name
 
+    async def event_generator():
         try:
-            # Step 1: Check database
-            yield send_event("progress", {"step": "database", "message": "Buscando en base de datos..."})
-            await asyncio.sleep(0.1)  # Small delay to ensure event is sent
-
-            map_obj = db.query(MappoolMap).filter(MappoolMap.beatmap_id == beatmap_id).first()
-            beatmapset_id = None
-            difficulty_name = None
-
-            if map_obj:
-                beatmapset_id = map_obj.beatmapset_id
-                difficulty_name = map_obj.difficulty_name
-                yield send_event("progress", {"step": "database", "message": "Encontrado en base de datos", "done": True})
-            else:
-                yield send_event("progress", {"step": "database", "message": "No encontrado localmente", "done": True})
-
-            # Step 2: osu! API lookup if needed
-            if not beatmapset_id:
-                yield send_event("progress", {"step": "osu_api", "message": "Consultando osu! API..."})
-                beatmap_data = await osu_api.get_beatmap(int(beatmap_id))
-                if not beatmap_data:
-                    yield send_event("error", {"message": "Beatmap no encontrado en osu!"})
-                    return
-                beatmapset_id = str(beatmap_data.get("beatmapset_id"))
-                if not difficulty_name:
-                    difficulty_name = beatmap_data.get("version")
-                if map_obj and beatmapset_id:
-                    map_obj.beatmapset_id = beatmapset_id
-                    db.commit()
-                yield send_event("progress", {"step": "osu_api", "message": "Datos obtenidos de osu!", "done": True})
-
-            # Step 3: Download if needed (with progress streaming)
-            if not beatmap_downloader.exists(beatmapset_id):
-                yield send_event("progress", {"step": "download", "message": "Conectando al mirror..."})
-                download_result = None
-
-                async for event in beatmap_downloader.download_with_progress(beatmapset_id):
-                    if event["type"] == "progress":
-                        loaded_mb = event["loaded"] / 1024 / 1024
-                        total_mb = event["total"] / 1024 / 1024
-                        percent = round((event["loaded"] / event["total"]) * 100) if event["total"] > 0 else 0
-                        yield send_event("progress", {
-                            "step": "download",
-                            "message": f"Descargando ({loaded_mb:.1f}/{total_mb:.1f} MB)...",
-                            "progress": percent,
-                        })
-                    elif event["type"] == "extracting":
-                        yield send_event("progress", {"step": "download", "message": "Extrayendo archivos..."})
-                    elif event["type"] == "complete":
-                        download_result = event["result"]
-                    elif event["type"] == "error":
-                        download_result = event["result"]
-
-                if not download_result or download_result["status"] == "error":
-                    yield send_event("error", {"message": f"Error de descarga: {download_result.get('error') if download_result else 'Unknown'}"})
-                    return
-                if download_result["status"] == "not_found":
-                    yield send_event("error", {"message": "Beatmap no encontrado en mirror"})
+            for event in lookup_events:
+                yield event
+            if lookup_error:
+                yield send_event("error", {"message": lookup_error})
+                return
+            # Known metadata first, so the page can show the map while it loads
+            yield send_event("metadata", {"beatmapset_id": beatmapset_id, **metadata})
+
+            # Download if needed, following (or resuming) the set's background job
+            if needs_download:
+                channel = progress_hub.start(beatmapset_id, download_job(beatmapset_id), resume and resume[0])
+                after = resume[1] if resume and resume[0] == channel.job_id else 0
+                async for event in channel.subscribe(after):
+                    if event["event"] == "partial" and not is_requested(event["data"]["metadata"]):
+                        continue
+                    yield send_event(event["event"], event["data"], event["id"])
+                last = channel.last_event
+                if last is None or last["event"] == "error":
                     return
-                yield send_event("progress", {"step": "download", "message": "Beatmap descargado", "done": True})
             else:
                 yield send_event("progress", {"step": "download", "message": "Beatmap en cache", "done": True})
 
-            # Step 4: Parse notes
+            # Parse notes
             yield send_event("progress", {"step": "parsing", "message": "Procesando notas..."})
-            notes_data = beatmap_downloader.get_notes_json(beatmapset_id, difficulty_name)
-            if not notes_data:
-                beatmap_downloader.generate_notes_json(beatmapset_id)
-                notes_data = beatmap_downloader.get_notes_json(beatmapset_id, difficulty_name)
-
-            if not notes_data:
+            notes_file = await workers.run_cpu(
+                beatmap_downloader.get_notes_file, beatmapset_id, difficulty_name, beatmap_id=beatmap_id
+            )
+            notes_body = None
+            if notes_file:
+                try:
+                    notes_body = await workers.run_io(notes_file["path"].read_text, encoding="utf-8")
+                except FileNotFoundError:
+                    pass
+
+            if not notes_body:
                 yield send_event("error", {"message": "No se pudo procesar el beatmap"})
                 return
 
             yield send_event("progress", {"step": "parsing", "message": "Notas procesadas", "done": True})
 
-            # Add URLs
-            notes_data["audio_url"] = f"/beatmaps/{beatmapset_id}/{notes_data.get('audio_file', '')}"
-            notes_data["background_url"] = f"/beatmaps/{beatmapset_id}/{notes_data.get('background_file', '')}"
-            if notes_data.get("storyboard"):
-                notes_data["storyboard_base_url"] = f"/beatmaps/{beatmapset_id}/"
-
-            # Step 5: Complete - send full data
-            yield send_event("complete", notes_data)
+            # Complete - send the stored notes JSON (URLs included) as is
+            yield f"event: complete\ndata: {notes_body}\n\n"
 
         except Exception as e:
             yield send_event("error", {"message": str(e)})
@@ -2,7 +2,8 @@
 Endpoints de gestión del mappool
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from utils.auth import get_current_staff_user
@@ -28,30 +29,30 @@ class MapUpdate(BaseModel):
 
 
 @router.get("")
-async def get_all_maps(db: Session = Depends(get_db)):
+async def get_all_maps(db: AsyncSession = Depends(get_db)):
     """Obtener todos los mapas del pool (público)"""
-    maps = db.query(Map).all()
+    maps = (await db.scalars(select(Map))).all()
     return {"maps": maps, "total": len(maps)}
 
 
 @router.post("")
 async def add_map(
     map_data: MapCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Agregar mapa al pool (solo staff)"""
     new_map = Map(**map_data.dict())
     db.add(new_map)
-    db.commit()
-    db.refresh(new_map)
+    await db.commit()
+    await db.refresh(new_map)
     return new_map
 
 
 @router.get("/{map_id}")
-async def get_map(map_id: int, db: Session = Depends(get_db)):
+async def get_map(map_id: int, db: AsyncSession = Depends(get_db)):
     """Obtener detalles de un mapa específico"""
-    map_obj = db.query(Map).filter(Map.id == map_id).first()
+    map_obj = await db.scalar(select(Map).where(Map.id == map_id))
     if not map_obj:
         raise HTTPException(status_code=404, detail="Map not found")
     return map_obj
@@ -61,33 +62,33 @@ async def get_map(map_id: int, db: Session = Depends(get_db)):
 async def update_map(
     map_id: int,
     map_data: MapUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Actualizar información del mapa (solo staff)"""
-    map_obj = db.query(Map).filter(Map.id == map_id).first()
+    map_obj = await db.scalar(select(Map).where(Map.id == map_id))
     if not map_obj:
         raise HTTPException(status_code=404, detail="Map not found")
 
     for key, value in map_data.dict(exclude_unset=True).items():
         setattr(map_obj, key, value)
 
-    db.commit()
-    db.refresh(map_obj)
+    await db.commit()
+    await db.refresh(map_obj)
     return map_obj
 
 
 @router.delete("/{map_id}")
 async def delete_map(
     map_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Eliminar mapa del pool (solo staff)"""
-    map_obj = db.query(Map).filter(Map.id == map_id).first()
+    map_obj = await db.scalar(select(Map).where(Map.id == map_id))
     if not map_obj:
         raise HTTPException(status_code=404, detail="Map not found")
 
-    db.delete(map_obj)
-    db.commit()
+    await db.delete(map_obj)
+    await db.commit()
     return {"message": "Map deleted successfully"}
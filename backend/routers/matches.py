@@ -2,7 +2,8 @@
 Endpoints de gestión de partidas
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
@@ -11,6 +12,7 @@ from utils.auth import get_current_user, get_current_staff_user
 from utils.database import get_db
 from models.match import Match
 from models.user import User
+from services.batch_progression import apply_results, parse_results_csv
 from services.bracket_progression import BracketProgressionService
 
 router = APIRouter(prefix="/matches", tags=["Matches"])
@@ -31,6 +33,21 @@ class ScoreUpdate(BaseModel):
     winner_id: int
 
 
+class ResultRow(BaseModel):
+    """One result of a batch; without ``winner_id`` the higher score wins."""
+    match_id: int
+    player1_score: int
+    player2_score: int
+    winner_id: Optional[int] = None
+
+
+class BatchResults(BaseModel):
+    """A batch of results, as JSON rows or as pasted CSV (one of the two)."""
+    results: Optional[list[ResultRow]] = None
+    csv: Optional[str] = None  # match_id,player1_score,player2_score[,winner_id] with a header
+    dry_run: bool = False
+
+
 class MatchUpdate(BaseModel):
     """Schema for updating match details (staff only)."""
     player1_id: Optional[int] = None
@@ -51,38 +68,71 @@ class MatchUpdate(BaseModel):
 async def get_matches(
     bracket_id: Optional[int] = Query(None),
     status: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Obtener todas las partidas con filtros opcionales"""
-    query = db.query(Match)
+    query = select(Match)
 
     if bracket_id:
-        query = query.filter(Match.bracket_id == bracket_id)
+        query = query.where(Match.bracket_id == bracket_id)
     if status:
-        query = query.filter(Match.match_status == status)
+        query = query.where(Match.match_status == status)
 
-    matches = query.all()
+    matches = (await db.scalars(query)).all()
     return {"matches": matches, "total": len(matches)}
 
 
 @router.post("")
 async def create_match(
     match_data: MatchCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Crear una nueva partida (solo staff)"""
     new_match = Match(**match_data.dict())
     db.add(new_match)
-    db.commit()
-    db.refresh(new_match)
+    await db.commit()
+    await db.refresh(new_match)
     return new_match
 
 
+@router.post("/results")
+async def submit_results(
+    batch: BatchResults,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Report a batch of results and progress the bracket in one commit (staff only).
+
+    Results may span several rounds; each is applied after the reported
+    matches that feed it. The response lists the completed matches, every
+    player placement, eliminated players and any bracket reset. If a result
+    is rejected nothing is saved and the errors are returned with status
+    400; with ``dry_run`` nothing is saved either way.
+    """
+    if (batch.results is None) == (batch.csv is None):
+        raise HTTPException(status_code=400, detail="Send either results or csv")
+    if batch.csv is not None:
+        try:
+            results = parse_results_csv(batch.csv)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        results = [row.model_dump(exclude_none=True) for row in batch.results]
+    if not results:
+        raise HTTPException(status_code=400, detail="No results to apply")
+
+    outcome = await apply_results(db, results, dry_run=batch.dry_run)
+    if outcome["errors"] and not batch.dry_run:
+        raise HTTPException(status_code=400, detail={"message": "No results were saved", "errors": outcome["errors"]})
+    return {"dry_run": batch.dry_run, "applied": not batch.dry_run, **outcome}
+
+
 @router.get("/{match_id}")
-async def get_match(match_id: int, db: Session = Depends(get_db)):
+async def get_match(match_id: int, db: AsyncSession = Depends(get_db)):
     """Obtener detalles de una partida específica"""
-    match = db.query(Match).filter(Match.id == match_id).first()
+    match = await db.scalar(select(Match).where(Match.id == match_id))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     return match
@@ -92,7 +142,7 @@ async def get_match(match_id: int, db: Session = Depends(get_db)):
 async def update_match(
     match_id: int,
     data: MatchUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """
@@ -100,7 +150,7 @@ async def update_match(
 
     Allows editing players, scores, status, scheduling, and other match fields.
     """
-    match = db.query(Match).filter(Match.id == match_id).first()
+    match = await db.scalar(select(Match).where(Match.id == match_id))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
 
@@ -114,11 +164,11 @@ async def update_match(
 
     # Validate player IDs if provided
     if data.player1_id:
-        player1 = db.query(User).filter(User.id == data.player1_id).first()
+        player1 = await db.scalar(select(User).where(User.id == data.player1_id))
         if not player1:
             raise HTTPException(status_code=400, detail="Player 1 not found")
     if data.player2_id:
-        player2 = db.query(User).filter(User.id == data.player2_id).first()
+        player2 = await db.scalar(select(User).where(User.id == data.player2_id))
         if not player2:
             raise HTTPException(status_code=400, detail="Player 2 not found")
 
@@ -133,14 +183,15 @@ async def update_match(
     elif data.match_status in {'scheduled', 'in_progress'}:
         match.is_completed = False
 
-    db.commit()
-    db.refresh(match)
+    await db.commit()
+    await db.refresh(match)
 
     # Trigger progression if match is completed with a winner
     if match.is_completed and match.winner_id:
         try:
-            progression_service = BracketProgressionService(db)
-            progression_result = progression_service.progress_match(match)
+            progression_result = await db.run_sync(
+                lambda session: BracketProgressionService(session).progress_match(match)
+            )
             return {"match": match, "progression": progression_result}
         except Exception as e:
             print(f"Match progression error: {str(e)}")
@@ -153,11 +204,11 @@ async def update_match(
 async def update_match_score(
     match_id: int,
     score_data: ScoreUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Enviar/actualizar puntajes de la partida (staff o jugadores de la partida)"""
-    match = db.query(Match).filter(Match.id == match_id).first()
+    match = await db.scalar(select(Match).where(Match.id == match_id))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
 
@@ -172,13 +223,14 @@ async def update_match_score(
     match.is_completed = True
     match.match_status = "completed"
 
-    db.commit()
-    db.refresh(match)
+    await db.commit()
+    await db.refresh(match)
 
     # Auto-progress players to next matches
     try:
-        progression_service = BracketProgressionService(db)
-        progression_result = progression_service.progress_match(match)
+        progression_result = await db.run_sync(
+            lambda session: BracketProgressionService(session).progress_match(match)
+        )
 
         return {
             "match": match,
@@ -197,32 +249,32 @@ async def update_match_score(
 @router.patch("/{match_id}/complete")
 async def complete_match(
     match_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Marcar partida como completada (solo staff)"""
-    match = db.query(Match).filter(Match.id == match_id).first()
+    match = await db.scalar(select(Match).where(Match.id == match_id))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
 
     match.is_completed = True
     match.match_status = "completed"
-    db.commit()
-    db.refresh(match)
+    await db.commit()
+    await db.refresh(match)
     return match
 
 
 @router.delete("/{match_id}")
 async def delete_match(
     match_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Eliminar partida (solo staff)"""
-    match = db.query(Match).filter(Match.id == match_id).first()
+    match = await db.scalar(select(Match).where(Match.id == match_id))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
 
-    db.delete(match)
-    db.commit()
+    await db.delete(match)
+    await db.commit()
     return {"message": "Match deleted successfully"}
@@ -1,6 +1,7 @@
 """Endpoints for tournament news management."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from utils.auth import get_current_staff_user
@@ -20,12 +21,12 @@ DEFAULT_NEWS = [
 ]
 
 
-def seed_news_if_empty(db: Session):
+async def seed_news_if_empty(db: AsyncSession):
     """Seed news items if table is empty."""
-    if db.query(NewsItem).count() == 0:
+    if await db.scalar(select(func.count()).select_from(NewsItem)) == 0:
         for item_data in DEFAULT_NEWS:
             db.add(NewsItem(**item_data))
-        db.commit()
+        await db.commit()
 
 
 class NewsItemUpdate(BaseModel):
@@ -40,10 +41,10 @@ class NewsItemCreate(BaseModel):
 
 
 @router.get("")
-async def get_news(db: Session = Depends(get_db)):
+async def get_news(db: AsyncSession = Depends(get_db)):
     """Get all news items (public)."""
-    seed_news_if_empty(db)
-    items = db.query(NewsItem).order_by(NewsItem.sort_order).all()
+    await seed_news_if_empty(db)
+    items = (await db.scalars(select(NewsItem).order_by(NewsItem.sort_order))).all()
     return {
         "items": [
             {
@@ -59,11 +60,11 @@ async def get_news(db: Session = Depends(get_db)):
 @router.put("")
 async def update_all_news(
     items: list[NewsItemUpdate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Update all news items at once (staff only)."""
-    db_items = db.query(NewsItem).order_by(NewsItem.sort_order).all()
+    db_items = (await db.scalars(select(NewsItem).order_by(NewsItem.sort_order))).all()
 
     if len(items) != len(db_items):
         raise HTTPException(status_code=400, detail="Item count mismatch")
@@ -72,7 +73,7 @@ async def update_all_news(
         for key, value in update_data.model_dump(exclude_unset=True).items():
             setattr(db_item, key, value)
 
-    db.commit()
+    await db.commit()
 
     return {
         "items": [
@@ -89,14 +90,14 @@ async def update_all_news(
 @router.post("")
 async def add_news_item(
     data: NewsItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Add a new news item (staff only)."""
     item = NewsItem(**data.model_dump())
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return {
         "id": item.id,
         "date": item.date,
@@ -108,19 +109,19 @@ async def add_news_item(
 async def update_news_item(
     item_id: int,
     data: NewsItemUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Update a single news item (staff only)."""
-    item = db.query(NewsItem).filter(NewsItem.id == item_id).first()
+    item = await db.scalar(select(NewsItem).where(NewsItem.id == item_id))
     if not item:
         raise HTTPException(status_code=404, detail="News item not found")
 
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(item, key, value)
 
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return {
         "id": item.id,
         "date": item.date,
@@ -131,14 +132,14 @@ async def update_news_item(
 @router.delete("/{item_id}")
 async def delete_news_item(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete a news item (staff only)."""
-    item = db.query(NewsItem).filter(NewsItem.id == item_id).first()
+    item = await db.scalar(select(NewsItem).where(NewsItem.id == item_id))
     if not item:
         raise HTTPException(status_code=404, detail="News item not found")
 
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await db.commit()
     return {"message": "News item deleted"}
@@ -2,7 +2,8 @@
 Endpoints de gestión de notificaciones
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from utils.auth import get_current_user
 from utils.database import get_db
@@ -15,20 +16,20 @@ router = APIRouter(prefix="/notifications", tags=["Notifications"])
 @router.get("")
 async def get_notifications(
     unread_only: bool = Query(False),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener notificaciones del usuario"""
-    query = db.query(Notification).filter(Notification.user_id == current_user.id)
+    query = select(Notification).where(Notification.user_id == current_user.id)
 
     if unread_only:
-        query = query.filter(Notification.is_read.is_(False))
+        query = query.where(Notification.is_read.is_(False))
 
-    notifications = query.order_by(Notification.created_at.desc()).all()
-    unread_count = db.query(Notification).filter(
+    notifications = (await db.scalars(query.order_by(Notification.created_at.desc()))).all()
+    unread_count = await db.scalar(select(func.count()).select_from(Notification).where(
         Notification.user_id == current_user.id,
         Notification.is_read.is_(False)
-    ).count()
+    ))
 
     return {
         "notifications": notifications,
@@ -39,39 +40,39 @@ async def get_notifications(
 @router.patch("/{notification_id}/read")
 async def mark_notification_read(
     notification_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Marcar notificación como leída"""
-    notification = db.query(Notification).filter(
+    notification = await db.scalar(select(Notification).where(
         Notification.id == notification_id,
         Notification.user_id == current_user.id
-    ).first()
+    ))
 
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
 
     notification.is_read = True
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     return notification
 
 
 @router.delete("/{notification_id}")
 async def delete_notification(
     notification_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Eliminar notificación"""
-    notification = db.query(Notification).filter(
+    notification = await db.scalar(select(Notification).where(
         Notification.id == notification_id,
         Notification.user_id == current_user.id
-    ).first()
+    ))
 
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
 
-    db.delete(notification)
-    db.commit()
+    await db.delete(notification)
+    await db.commit()
     return {"message": "Notification deleted successfully"}
@@ -5,7 +5,9 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel, field_validator
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Optional
 
 from utils.auth import get_current_user, get_current_staff_user, optional_security, decode_access_token
@@ -73,30 +75,32 @@ class VoteRequest(BaseModel):
     option_id: int
 
 
-def _serialize_poll(poll: Poll, db: Session, user_id: int = None) -> dict:
+async def _serialize_poll(poll: Poll, db: AsyncSession, user_id: int = None) -> dict:
     """Serialize a poll with options, vote counts, and user's vote."""
     # Auto-close expired polls
     if poll.is_active and poll.closes_at and poll.closes_at <= datetime.now(timezone.utc):
         poll.is_active = False
-        db.commit()
+        await db.commit()
 
     options = []
-    total_votes = db.query(PollVote).filter(PollVote.poll_id == poll.id).count()
+    total_votes = await db.scalar(select(func.count()).select_from(PollVote).where(PollVote.poll_id == poll.id))
     user_vote = None
 
     if user_id:
-        vote = db.query(PollVote).filter(
+        vote = await db.scalar(select(PollVote).where(
             PollVote.poll_id == poll.id,
             PollVote.user_id == user_id
-        ).first()
+        ))
         if vote:
             user_vote = vote.option_id
 
+    creator = await poll.awaitable_attrs.creator
+
     # Only show stats if user has voted or poll is closed
     show_stats = user_vote is not None or not poll.is_active
 
-    for opt in poll.options:
-        vote_count = db.query(PollVote).filter(PollVote.option_id == opt.id).count()
+    for opt in await poll.awaitable_attrs.options:
+        vote_count = await db.scalar(select(func.count()).select_from(PollVote).where(PollVote.option_id == opt.id))
         options.append({
             "id": opt.id,
             "option_text": opt.option_text,
@@ -113,7 +117,7 @@ def _serialize_poll(poll: Poll, db: Session, user_id: int = None) -> dict:
         "is_active": poll.is_active,
         "closes_at": poll.closes_at.isoformat() if poll.closes_at else None,
         "created_at": poll.created_at.isoformat() if poll.created_at else None,
-        "created_by": poll.creator.username if poll.creator else None,
+        "created_by": creator.username if creator else None,
         "options": options,
         "total_votes": total_votes,
         "user_vote": user_vote,
@@ -122,7 +126,7 @@ def _serialize_poll(poll: Poll, db: Session, user_id: int = None) -> dict:
 
 @router.get("")
 async def get_polls(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
 ):
     """Obtener todas las encuestas activas (con voto del usuario si está logueado)"""
@@ -132,37 +136,46 @@ async def get_polls(
         if payload:
             user_id = payload.get("user_id")
 
-    polls = db.query(Poll).filter(Poll.is_active.is_(True)).order_by(Poll.created_at.desc()).all()
-    return {"polls": [_serialize_poll(p, db, user_id=user_id) for p in polls]}
+    polls = (await db.scalars(
+        select(Poll)
+        .options(selectinload(Poll.options), selectinload(Poll.creator))
+        .where(Poll.is_active.is_(True))
+        .order_by(Poll.created_at.desc())
+    )).all()
+    return {"polls": [await _serialize_poll(p, db, user_id=user_id) for p in polls]}
 
 
 @router.get("/all")
 async def get_all_polls(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Obtener todas las encuestas incluyendo inactivas (solo staff)"""
-    polls = db.query(Poll).order_by(Poll.created_at.desc()).all()
-    return {"polls": [_serialize_poll(p, db) for p in polls]}
+    polls = (await db.scalars(
+        select(Poll)
+        .options(selectinload(Poll.options), selectinload(Poll.creator))
+        .order_by(Poll.created_at.desc())
+    )).all()
+    return {"polls": [await _serialize_poll(p, db) for p in polls]}
 
 
 @router.get("/{poll_id}")
 async def get_poll(
     poll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Obtener una encuesta con opciones y votos"""
-    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    poll = await db.scalar(select(Poll).where(Poll.id == poll_id))
     if not poll:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
-    return _serialize_poll(poll, db, user_id=current_user.id)
+    return await _serialize_poll(poll, db, user_id=current_user.id)
 
 
 @router.post("")
 async def create_poll(
     data: PollCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Crear una encuesta (solo staff)"""
@@ -174,7 +187,7 @@ async def create_poll(
         created_by=current_user.id,
     )
     db.add(poll)
-    db.flush()
+    await db.flush()
 
     for i, opt in enumerate(data.options):
         option = PollOption(
@@ -184,44 +197,44 @@ async def create_poll(
         )
         db.add(option)
 
-    db.commit()
-    db.refresh(poll)
-    return _serialize_poll(poll, db)
+    await db.commit()
+    await db.refresh(poll)
+    return await _serialize_poll(poll, db)
 
 
 @router.patch("/{poll_id}")
 async def update_poll(
     poll_id: int,
     data: PollUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Actualizar una encuesta (solo staff)"""
-    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    poll = await db.scalar(select(Poll).where(Poll.id == poll_id))
     if not poll:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
 
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(poll, key, value)
 
-    db.commit()
-    db.refresh(poll)
-    return _serialize_poll(poll, db)
+    await db.commit()
+    await db.refresh(poll)
+    return await _serialize_poll(poll, db)
 
 
 @router.delete("/{poll_id}")
 async def delete_poll(
     poll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Eliminar una encuesta (solo staff)"""
-    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    poll = await db.scalar(select(Poll).where(Poll.id == poll_id))
     if not poll:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
 
-    db.delete(poll)
-    db.commit()
+    await db.delete(poll)
+    await db.commit()
     return {"message": "Encuesta eliminada"}
 
 
@@ -229,12 +242,12 @@ async def delete_poll(
 async def vote(
     poll_id: int,
     data: VoteRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Votar en una encuesta (usuarios logueados)"""
 
-    poll = db.query(Poll).filter(Poll.id == poll_id).first()
+    poll = await db.scalar(select(Poll).where(Poll.id == poll_id))
     if not poll:
         raise HTTPException(status_code=404, detail="Encuesta no encontrada")
 
@@ -243,22 +256,22 @@ async def vote(
 
     if poll.closes_at and poll.closes_at <= datetime.now(timezone.utc):
         poll.is_active = False
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=400, detail="Esta encuesta ha expirado")
 
     # Verify option belongs to poll
-    option = db.query(PollOption).filter(
+    option = await db.scalar(select(PollOption).where(
         PollOption.id == data.option_id,
         PollOption.poll_id == poll_id
-    ).first()
+    ))
     if not option:
         raise HTTPException(status_code=400, detail="Opción no válida")
 
     # Check for existing vote — no changing allowed
-    existing = db.query(PollVote).filter(
+    existing = await db.scalar(select(PollVote).where(
         PollVote.poll_id == poll_id,
         PollVote.user_id == current_user.id
-    ).first()
+    ))
 
     if existing:
         raise HTTPException(status_code=400, detail="Ya votaste en esta encuesta")
@@ -269,27 +282,27 @@ async def vote(
         user_id=current_user.id,
     )
     db.add(vote)
-    db.commit()
-    return _serialize_poll(poll, db, user_id=current_user.id)
+    await db.commit()
+    return await _serialize_poll(poll, db, user_id=current_user.id)
 
 
 @router.delete("/{poll_id}/vote")
 async def remove_vote(
     poll_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Quitar voto de una encuesta"""
-    vote = db.query(PollVote).filter(
+    vote = await db.scalar(select(PollVote).where(
         PollVote.poll_id == poll_id,
         PollVote.user_id == current_user.id
-    ).first()
+    ))
 
     if not vote:
         raise HTTPException(status_code=404, detail="No has votado en esta encuesta")
 
-    db.delete(vote)
-    db.commit()
+    await db.delete(vote)
+    await db.commit()
 
-    poll = db.query(Poll).filter(Poll.id == poll_id).first()
-    return _serialize_poll(poll, db, user_id=current_user.id)
+    poll = await db.scalar(select(Poll).where(Poll.id == poll_id))
+    return await _serialize_poll(poll, db, user_id=current_user.id)
@@ -4,8 +4,8 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.match import Match
 from models.notification import Notification
@@ -34,8 +34,8 @@ class ProposalResponse(BaseModel):
     status: str  # "accepted" or "rejected"
 
 
-def _get_match_or_404(match_id: int, db: Session) -> Match:
-    match = db.query(Match).filter(Match.id == match_id).first()
+async def _get_match_or_404(match_id: int, db: AsyncSession) -> Match:
+    match = await db.scalar(select(Match).where(Match.id == match_id))
     if not match:
         raise HTTPException(status_code=404, detail="Match not found")
     return match
@@ -69,13 +69,13 @@ def _compute_overlap(windows_a: list, windows_b: list) -> list[dict]:
 
 
 @router.get("/{match_id}/availability")
-async def get_availability(match_id: int, db: Session = Depends(get_db)):
+async def get_availability(match_id: int, db: AsyncSession = Depends(get_db)):
     """Get availability windows for both players and computed overlap."""
-    match = _get_match_or_404(match_id, db)
+    match = await _get_match_or_404(match_id, db)
 
-    all_windows = db.query(MatchAvailability).filter(
+    all_windows = (await db.scalars(select(MatchAvailability).where(
         MatchAvailability.match_id == match_id
-    ).order_by(MatchAvailability.start_time).all()
+    ).order_by(MatchAvailability.start_time))).all()
 
     p1_windows = [w for w in all_windows if w.user_id == match.player1_id]
     p2_windows = [w for w in all_windows if w.user_id == match.player2_id]
@@ -101,11 +101,11 @@ async def get_availability(match_id: int, db: Session = Depends(get_db)):
 async def add_availability(
     match_id: int,
     data: AvailabilitySubmit,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Add availability windows for the current player. Replaces existing windows."""
-    match = _get_match_or_404(match_id, db)
+    match = await _get_match_or_404(match_id, db)
     _require_player_or_staff(current_user, match)
 
     # Validate windows
@@ -114,10 +114,10 @@ async def add_availability(
             raise HTTPException(status_code=400, detail="end_time must be after start_time")
 
     # Clear existing windows for this user/match
-    db.query(MatchAvailability).filter(
+    await db.execute(delete(MatchAvailability).where(
         MatchAvailability.match_id == match_id,
         MatchAvailability.user_id == current_user.id,
-    ).delete()
+    ))
 
     # Insert new windows
     new_windows = []
@@ -143,7 +143,7 @@ async def add_availability(
         )
         db.add(notif)
 
-    db.commit()
+    await db.commit()
 
     return {
         "message": "Availability saved",
@@ -157,19 +157,19 @@ async def add_availability(
 @router.delete("/{match_id}/availability")
 async def clear_availability(
     match_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Clear all availability windows for the current player."""
-    match = _get_match_or_404(match_id, db)
+    match = await _get_match_or_404(match_id, db)
     _require_player_or_staff(current_user, match)
 
-    deleted = db.query(MatchAvailability).filter(
+    deleted = (await db.execute(delete(MatchAvailability).where(
         MatchAvailability.match_id == match_id,
         MatchAvailability.user_id == current_user.id,
-    ).delete()
+    ))).rowcount
 
-    db.commit()
+    await db.commit()
     return {"message": f"Cleared {deleted} availability windows"}
 
 
@@ -177,11 +177,11 @@ async def clear_availability(
 async def propose_time(
     match_id: int,
     data: ProposeTime,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Propose a specific time for the match."""
-    match = _get_match_or_404(match_id, db)
+    match = await _get_match_or_404(match_id, db)
     _require_player_or_staff(current_user, match)
 
     proposal = MatchTimeProposal(
@@ -205,8 +205,8 @@ async def propose_time(
         )
         db.add(notif)
 
-    db.commit()
-    db.refresh(proposal)
+    await db.commit()
+    await db.refresh(proposal)
 
     return {
         "id": proposal.id,
@@ -216,13 +216,13 @@ async def propose_time(
 
 
 @router.get("/{match_id}/proposals")
-async def get_proposals(match_id: int, db: Session = Depends(get_db)):
+async def get_proposals(match_id: int, db: AsyncSession = Depends(get_db)):
     """List all time proposals for a match."""
-    _get_match_or_404(match_id, db)
+    await _get_match_or_404(match_id, db)
 
-    proposals = db.query(MatchTimeProposal).filter(
+    proposals = (await db.scalars(select(MatchTimeProposal).where(
         MatchTimeProposal.match_id == match_id
-    ).order_by(MatchTimeProposal.created_at.desc()).all()
+    ).order_by(MatchTimeProposal.created_at.desc()))).all()
 
     return {
         "proposals": [
@@ -244,17 +244,17 @@ async def respond_to_proposal(
     match_id: int,
     proposal_id: int,
     data: ProposalResponse,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Accept or reject a time proposal. Only the opponent can respond."""
-    match = _get_match_or_404(match_id, db)
+    match = await _get_match_or_404(match_id, db)
     _require_player_or_staff(current_user, match)
 
-    proposal = db.query(MatchTimeProposal).filter(
+    proposal = await db.scalar(select(MatchTimeProposal).where(
         MatchTimeProposal.id == proposal_id,
         MatchTimeProposal.match_id == match_id,
-    ).first()
+    ))
     if not proposal:
         raise HTTPException(status_code=404, detail="Proposal not found")
 
@@ -285,7 +285,7 @@ async def respond_to_proposal(
     )
     db.add(notif)
 
-    db.commit()
+    await db.commit()
 
     return {
         "id": proposal.id,
@@ -1,6 +1,7 @@
 """Endpoints for tournament slot management."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from utils.auth import get_current_staff_user
@@ -34,27 +35,27 @@ class SlotUpdate(BaseModel):
 
 
 @router.get("")
-async def get_all_slots(db: Session = Depends(get_db)):
+async def get_all_slots(db: AsyncSession = Depends(get_db)):
     """Get all slots ordered by slot_order."""
-    slots = db.query(Slot).order_by(Slot.slot_order).all()
+    slots = (await db.scalars(select(Slot).order_by(Slot.slot_order))).all()
     return [serialize_slot(s) for s in slots]
 
 
 @router.post("")
 async def create_slot(
     data: SlotCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Create a new slot (staff only)."""
-    existing = db.query(Slot).filter(Slot.name == data.name).first()
+    existing = await db.scalar(select(Slot).where(Slot.name == data.name))
     if existing:
         raise HTTPException(status_code=400, detail="Slot name already exists")
 
     slot = Slot(**data.model_dump())
     db.add(slot)
-    db.commit()
-    db.refresh(slot)
+    await db.commit()
+    await db.refresh(slot)
     return serialize_slot(slot)
 
 
@@ -62,63 +63,63 @@ async def create_slot(
 async def update_slot(
     slot_id: int,
     data: SlotUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Update a slot (staff only)."""
-    slot = db.query(Slot).filter(Slot.id == slot_id).first()
+    slot = await db.scalar(select(Slot).where(Slot.id == slot_id))
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
 
     update_data = data.model_dump(exclude_unset=True)
 
     if "name" in update_data:
-        existing = db.query(Slot).filter(Slot.name == update_data["name"], Slot.id != slot_id).first()
+        existing = await db.scalar(select(Slot).where(Slot.name == update_data["name"], Slot.id != slot_id))
         if existing:
             raise HTTPException(status_code=400, detail="Slot name already exists")
 
     for key, value in update_data.items():
         setattr(slot, key, value)
 
-    db.commit()
-    db.refresh(slot)
+    await db.commit()
+    await db.refresh(slot)
     return serialize_slot(slot)
 
 
 @router.delete("/{slot_id}")
 async def delete_slot(
     slot_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete a slot (staff only)."""
-    slot = db.query(Slot).filter(Slot.id == slot_id).first()
+    slot = await db.scalar(select(Slot).where(Slot.id == slot_id))
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
 
-    db.delete(slot)
-    db.commit()
+    await db.delete(slot)
+    await db.commit()
     return {"message": "Slot deleted"}
 
 
 @router.delete("/purge")
 async def purge_all_slots(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete all slots (staff only)."""
-    count = db.query(Slot).delete()
-    db.commit()
+    count = (await db.execute(delete(Slot))).rowcount
+    await db.commit()
     return {"message": f"Deleted {count} slots"}
 
 
 @router.post("/seed")
 async def seed_default_slots(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Seed default slots if none exist (staff only)."""
-    existing = db.query(Slot).first()
+    existing = await db.scalar(select(Slot))
     if existing:
         raise HTTPException(status_code=400, detail="Slots already exist")
 
@@ -142,5 +143,5 @@ async def seed_default_slots(
         slot = Slot(**slot_data)
         db.add(slot)
 
-    db.commit()
+    await db.commit()
     return {"message": f"Created {len(default_slots)} default slots"}
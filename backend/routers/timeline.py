@@ -1,6 +1,7 @@
 """Endpoints for tournament timeline/schedule management."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
 from utils.auth import get_current_staff_user
@@ -24,12 +25,12 @@ DEFAULT_TIMELINE = [
 ]
 
 
-def seed_timeline_if_empty(db: Session):
+async def seed_timeline_if_empty(db: AsyncSession):
     """Seed timeline events if table is empty."""
-    if db.query(TimelineEvent).count() == 0:
+    if await db.scalar(select(func.count()).select_from(TimelineEvent)) == 0:
         for event_data in DEFAULT_TIMELINE:
             db.add(TimelineEvent(**event_data))
-        db.commit()
+        await db.commit()
 
 
 class TimelineEventUpdate(BaseModel):
@@ -45,10 +46,10 @@ class TimelineEventCreate(BaseModel):
 
 
 @router.get("")
-async def get_timeline(db: Session = Depends(get_db)):
+async def get_timeline(db: AsyncSession = Depends(get_db)):
     """Get all timeline events (public)."""
-    seed_timeline_if_empty(db)
-    events = db.query(TimelineEvent).order_by(TimelineEvent.sort_order).all()
+    await seed_timeline_if_empty(db)
+    events = (await db.scalars(select(TimelineEvent).order_by(TimelineEvent.sort_order))).all()
     return {
         "events": [
             {
@@ -65,19 +66,19 @@ async def get_timeline(db: Session = Depends(get_db)):
 async def update_timeline_event(
     event_id: str,
     data: TimelineEventUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Update a timeline event (staff only)."""
-    event = db.query(TimelineEvent).filter(TimelineEvent.event_id == event_id).first()
+    event = await db.scalar(select(TimelineEvent).where(TimelineEvent.event_id == event_id))
     if not event:
         raise HTTPException(status_code=404, detail="Timeline event not found")
 
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(event, key, value)
 
-    db.commit()
-    db.refresh(event)
+    await db.commit()
+    await db.refresh(event)
     return {
         "id": event.event_id,
         "date": event.date_range,
@@ -88,11 +89,11 @@ async def update_timeline_event(
 @router.put("")
 async def update_all_timeline_events(
     events: list[TimelineEventUpdate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Update all timeline events at once (staff only)."""
-    db_events = db.query(TimelineEvent).order_by(TimelineEvent.sort_order).all()
+    db_events = (await db.scalars(select(TimelineEvent).order_by(TimelineEvent.sort_order))).all()
 
     if len(events) != len(db_events):
         raise HTTPException(status_code=400, detail="Event count mismatch")
@@ -101,7 +102,7 @@ async def update_all_timeline_events(
         for key, value in update_data.model_dump(exclude_unset=True).items():
             setattr(db_event, key, value)
 
-    db.commit()
+    await db.commit()
 
     return {
         "events": [
@@ -123,14 +124,14 @@ class TimelineEventCreateSimple(BaseModel):
 @router.post("")
 async def add_timeline_event(
     data: TimelineEventCreateSimple,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Add a new timeline event (staff only)."""
     # Generate event_id from title
     event_id = data.title.lower().replace(" ", "_")[:20]
     # Get max sort_order
-    max_order = db.query(TimelineEvent).count()
+    max_order = await db.scalar(select(func.count()).select_from(TimelineEvent))
 
     event = TimelineEvent(
         event_id=event_id,
@@ -139,8 +140,8 @@ async def add_timeline_event(
         sort_order=max_order
     )
     db.add(event)
-    db.commit()
-    db.refresh(event)
+    await db.commit()
+    await db.refresh(event)
     return {
         "id": event.event_id,
         "date": event.date_range,
@@ -151,14 +152,14 @@ async def add_timeline_event(
 @router.delete("/{event_id}")
 async def delete_timeline_event(
     event_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Delete a timeline event (staff only)."""
-    event = db.query(TimelineEvent).filter(TimelineEvent.event_id == event_id).first()
+    event = await db.scalar(select(TimelineEvent).where(TimelineEvent.event_id == event_id))
     if not event:
         raise HTTPException(status_code=404, detail="Timeline event not found")
 
-    db.delete(event)
-    db.commit()
+    await db.delete(event)
+    await db.commit()
     return {"message": "Timeline event deleted"}
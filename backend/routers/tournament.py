@@ -5,13 +5,16 @@ import logging
 import re
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, field_validator
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 
 from utils.auth import get_current_user
 from utils.database import get_db
 from models.user import User
 from models.tournament_state import TournamentState
+from services.bracket_stats import bracket_stats, find_bracket
 
 
 class RegisterRequest(BaseModel):
@@ -39,14 +42,14 @@ router = APIRouter(prefix="/tournament", tags=["Tournament"])
 @router.post("/register")
 async def register_for_tournament(
     request: RegisterRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Registrar al usuario actual en el torneo"""
     logger.info(f"[REGISTER] User {current_user.username} (id={current_user.id}) attempting to register with discord: {request.discord_username}")
 
     # Check if tournament registration is open
-    tournament_state = db.query(TournamentState).first()
+    tournament_state = await db.scalar(select(TournamentState))
     if tournament_state and not tournament_state.registration_open:
         logger.warning(f"[REGISTER] Registration closed - user {current_user.username} denied")
         raise HTTPException(status_code=400, detail="Registration is closed")
@@ -58,8 +61,8 @@ async def register_for_tournament(
     current_user.is_registered = True
     current_user.registered_at = datetime.utcnow()
     current_user.discord_username = request.discord_username
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
 
     logger.info(f"[REGISTER] User {current_user.username} successfully registered at {current_user.registered_at}")
 
@@ -71,7 +74,7 @@ async def register_for_tournament(
 
 @router.delete("/register")
 async def unregister_from_tournament(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Cancelar registro del usuario actual del torneo"""
@@ -84,7 +87,7 @@ async def unregister_from_tournament(
     current_user.is_registered = False
     current_user.registered_at = None
     current_user.discord_username = None
-    db.commit()
+    await db.commit()
 
     logger.info(f"[UNREGISTER] User {current_user.username} successfully unregistered")
 
@@ -92,10 +95,10 @@ async def unregister_from_tournament(
 
 
 @router.get("/registrations")
-async def get_registration_stats(db: Session = Depends(get_db)):
+async def get_registration_stats(db: AsyncSession = Depends(get_db)):
     """Obtener estadísticas de registro del torneo"""
-    tournament_state = db.query(TournamentState).first()
-    registered_users = db.query(User).filter(User.is_registered.is_(True)).all()
+    tournament_state = await db.scalar(select(TournamentState))
+    registered_users = (await db.scalars(select(User).where(User.is_registered.is_(True)))).all()
 
     total_registered = len(registered_users)
     registration_open = tournament_state.registration_open if tournament_state else False
@@ -109,9 +112,11 @@ async def get_registration_stats(db: Session = Depends(get_db)):
 
 
 @router.get("/status")
-async def get_tournament_status(db: Session = Depends(get_db)):
+async def get_tournament_status(db: AsyncSession = Depends(get_db)):
     """Obtener estado actual del torneo"""
-    tournament_state = db.query(TournamentState).first()
+    tournament_state = await db.scalar(
+        select(TournamentState).options(selectinload(TournamentState.current_bracket))
+    )
     if not tournament_state:
         return {
             "status": "not_started",
@@ -119,7 +124,7 @@ async def get_tournament_status(db: Session = Depends(get_db)):
             "total_registered_players": 0
         }
 
-    total_registered = db.query(User).filter(User.is_registered.is_(True)).count()
+    total_registered = await db.scalar(select(func.count()).select_from(User).where(User.is_registered.is_(True)))
 
     result = {
         "status": tournament_state.status,
@@ -129,11 +134,24 @@ async def get_tournament_status(db: Session = Depends(get_db)):
         "ended_at": tournament_state.ended_at
     }
 
+    stats = await bracket_stats.get(db)
+    result["matches"] = {
+        "total": stats["total_matches"],
+        "completed": stats["completed_matches"],
+        "in_progress": stats["in_progress_matches"],
+        "by_status": stats["by_status"],
+    }
+
     if tournament_state.current_bracket:
         result["current_bracket"] = {
             "id": tournament_state.current_bracket.id,
             "bracket_name": tournament_state.current_bracket.bracket_name,
             "bracket_size": tournament_state.current_bracket.bracket_size,
         }
+        bracket = find_bracket(stats, tournament_state.current_bracket.id)
+        if bracket:
+            result["current_bracket"]["total_matches"] = bracket["total_matches"]
+            result["current_bracket"]["completed_matches"] = bracket["completed_matches"]
+            result["current_bracket"]["in_progress_matches"] = bracket["in_progress_matches"]
 
     return result
@@ -3,7 +3,8 @@ Endpoints de gestión de usuarios
 """
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from utils.auth import get_current_staff_user, get_user_or_api_key
 from utils.database import get_db
@@ -15,11 +16,11 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 @router.get("", response_model=dict)
 async def get_all_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Obtener todos los usuarios (solo staff)"""
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     return {
         "users": users,
         "total": len(users)
@@ -27,9 +28,9 @@ async def get_all_users(
 
 
 @router.get("/all")
-async def get_all_users_public(db: Session = Depends(get_db)):
+async def get_all_users_public(db: AsyncSession = Depends(get_db)):
     """Obtener todos los usuarios (público - solo para testing)"""
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     return {
         "users": [
             {
@@ -54,11 +55,11 @@ async def get_all_users_public(db: Session = Depends(get_db)):
 
 @router.get("/registered", response_model=dict)
 async def get_registered_players(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     _auth = Depends(get_user_or_api_key)
 ):
     """Obtener todos los jugadores registrados (requiere autenticación o API key)"""
-    users = db.query(User).filter(User.is_registered.is_(True)).all()
+    users = (await db.scalars(select(User).where(User.is_registered.is_(True)))).all()
     return {
         "users": users,
         "total": len(users)
@@ -66,9 +67,9 @@ async def get_registered_players(
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """Obtener detalles de un usuario específico (público)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -78,28 +79,28 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 async def update_user_staff(
     user_id: int,
     is_staff: bool,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Asignar rol de staff a usuario (solo admin)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user.is_staff = is_staff
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.delete("/{user_id}/registration")
 async def admin_unregister_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Cancelar registro de un usuario del torneo (solo staff)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -109,18 +110,18 @@ async def admin_unregister_user(
     user.is_registered = False
     user.registered_at = None
     user.discord_username = None
-    db.commit()
+    await db.commit()
     return {"message": f"User {user.username} unregistered successfully"}
 
 
 @router.delete("/{user_id}")
 async def admin_delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Eliminar un usuario completamente (solo staff)"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -128,8 +129,8 @@ async def admin_delete_user(
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
 
     username = user.username
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
     return {"message": f"User {username} deleted successfully"}
 
 
@@ -141,41 +142,41 @@ class SetStaysPlayingRequest(BaseModel):
 async def update_user_stays_playing(
     user_id: int,
     stays_playing: bool,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Toggle stays_playing status for a user (staff only)."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user.stays_playing = stays_playing
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post("/set-stays-playing")
 async def bulk_set_stays_playing(
     body: SetStaysPlayingRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Bulk-set stays_playing=True for a list of usernames (staff only)."""
     # Reset all users first
-    db.query(User).update({User.stays_playing: False})
+    await db.execute(update(User).values(stays_playing=False))
 
     matched = []
     not_found = []
     for username in body.usernames:
-        user = db.query(User).filter(User.username == username).first()
+        user = await db.scalar(select(User).where(User.username == username))
         if user:
             user.stays_playing = True
             matched.append(username)
         else:
             not_found.append(username)
 
-    db.commit()
+    await db.commit()
     return {
         "matched": len(matched),
         "not_found": not_found,
@@ -185,14 +186,14 @@ async def bulk_set_stays_playing(
 
 @router.post("/sync-stats")
 async def sync_user_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_staff_user)
 ):
     """Sync mania ranks/PP for all users from osu! API (staff only)."""
     import asyncio
     from services.osu_api import osu_api
 
-    users = db.query(User).all()
+    users = (await db.scalars(select(User))).all()
     updated = []
     errors = []
 
@@ -217,7 +218,7 @@ async def sync_user_stats(
         except Exception as e:
             errors.append({"username": user.username, "error": str(e)})
 
-    db.commit()
+    await db.commit()
 
     return {
         "updated": len(updated),
@@ -2,7 +2,8 @@
 import random
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.user import User
 from models.wheel_score import WheelScore
@@ -93,15 +94,14 @@ def _compute_spin(ws: WheelScore) -> dict:
 
 
 @router.get("/leaderboard")
-async def get_leaderboard(db: Session = Depends(get_db)):
+async def get_leaderboard(db: AsyncSession = Depends(get_db)):
     """Obtener ranking de la rueda PMC."""
-    results = (
-        db.query(WheelScore, User)
+    results = (await db.execute(
+        select(WheelScore, User)
         .join(User, User.id == WheelScore.user_id)
         .order_by(WheelScore.score.desc())
         .limit(50)
-        .all()
-    )
+    )).all()
     return {
         "rankings": [
             {
@@ -119,10 +119,10 @@ async def get_leaderboard(db: Session = Depends(get_db)):
 @router.get("/score")
 async def get_score(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get current user's wheel score."""
-    ws = db.query(WheelScore).filter(WheelScore.user_id == current_user.id).first()
+    ws = await db.scalar(select(WheelScore).where(WheelScore.user_id == current_user.id))
     if not ws:
         return {"score": 0, "spins": 0, "super_mode": False}
     return {"score": ws.score, "spins": ws.spins, "super_mode": ws.super_mode}
@@ -131,16 +131,16 @@ async def get_score(
 @router.post("/spin")
 async def record_spin(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Compute and record a spin result server-side."""
-    ws = db.query(WheelScore).filter(WheelScore.user_id == current_user.id).first()
+    ws = await db.scalar(select(WheelScore).where(WheelScore.user_id == current_user.id))
     if not ws:
         ws = WheelScore(user_id=current_user.id, score=0, spins=0, has_hit_pmc=False)
         db.add(ws)
-        db.flush()
+        await db.flush()
 
     result = _compute_spin(ws)
-    db.commit()
-    db.refresh(ws)
+    await db.commit()
+    await db.refresh(ws)
     return result
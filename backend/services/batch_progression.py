@@ -0,0 +1,334 @@
+"""
+Batch match results and bracket progression.
+
+Referees finishing a round submit all its results at once (pasted CSV or
+JSON). Instead of running :class:`~services.bracket_progression.BracketProgressionService`
+once per match (three lookups and a commit each), a batch:
+
+1. loads the affected subgraph in one query: the reported matches and the
+   matches their winners and losers go to, with each match's bracket type;
+2. orders the results topologically, so a batch may hold several rounds
+   (a match fed by another reported match is applied after it);
+3. applies them to plain in-memory copies, checking scores, players and
+   slot conflicts, and records every placement;
+4. writes everything back and commits once, unless it is a dry run or a
+   result was rejected, in which case nothing is written.
+
+Progression rules are those of ``BracketProgressionService``: winners fill
+the first free slot of their next match, losers without a loser-bracket
+match are eliminated, and a Grand Finals result creates the bracket reset
+match (its loser stays in for the reset).
+"""
+import csv
+import io
+from collections import Counter, deque
+from typing import TypedDict
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.bracket import Bracket
+from models.match import Match
+from models.user import User
+
+CSV_COLUMNS = ("match_id", "player1_score", "player2_score")
+
+
+class MatchResult(TypedDict, total=False):
+    """One reported result; without ``winner_id`` the higher score wins."""
+    match_id: int
+    player1_score: int
+    player2_score: int
+    winner_id: int | None
+
+
+class Placement(TypedDict):
+    """A player moved into a match slot by a result."""
+    from_match_id: int
+    player_id: int
+    role: str  # "winner" or "loser"
+    to_match_id: int
+    slot: str  # "player1" or "player2"
+
+
+class BatchOutcome(TypedDict):
+    """What a batch did, or would do in a dry run."""
+    completed: list[dict]
+    placements: list[Placement]
+    eliminated: list[int]
+    grandfinals_reset: dict | None
+    errors: list[dict]
+
+
+def parse_results_csv(text: str) -> list[MatchResult]:
+    """
+    Parse ``match_id,player1_score,player2_score[,winner_id]`` rows with a header.
+
+    Header names are matched case-insensitively and values may be padded
+    with spaces (``Match_ID, Player1_Score, ...``).
+
+    Raises:
+        ValueError: Missing columns or a value that is not an integer.
+    """
+    reader = csv.DictReader(io.StringIO(text.strip()), skipinitialspace=True)
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    results: list[MatchResult] = []
+    for line, row in enumerate(reader, start=2):
+        try:
+            result: MatchResult = {column: int(row[column]) for column in CSV_COLUMNS}
+            if (row.get("winner_id") or "").strip():
+                result["winner_id"] = int(row["winner_id"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Line {line}: match_id and scores must be integers")
+        results.append(result)
+    return results
+
+
+async def load_subgraph(db: AsyncSession, match_ids: list[int]) -> dict[int, dict]:
+    """
+    The reported matches and the matches they feed, as plain dicts, in one query.
+
+    Returns:
+        Match state by ID, with the bracket type and a reference to the row.
+    """
+    reported = Match.id.in_(match_ids)
+    rows = (await db.execute(
+        select(Match, Bracket.bracket_type)
+        .join(Bracket, Bracket.id == Match.bracket_id)
+        .where(or_(
+            reported,
+            Match.id.in_(select(Match.next_match_id).where(reported)),
+            Match.id.in_(select(Match.loser_next_match_id).where(reported)),
+        ))
+    )).all()
+    return {
+        match.id: {
+            "row": match,
+            "bracket_id": match.bracket_id,
+            "bracket_type": bracket_type,
+            "map_id": match.map_id,
+            "player1_id": match.player1_id,
+            "player2_id": match.player2_id,
+            "next_match_id": match.next_match_id,
+            "loser_next_match_id": match.loser_next_match_id,
+            "is_completed": match.is_completed,
+            "is_grandfinals_reset": match.is_grandfinals_reset,
+        }
+        for match, bracket_type in rows
+    }
+
+
+def topological_order(results: list[MatchResult], matches: dict[int, dict]) -> list[MatchResult]:
+    """
+    Results ordered so that every match comes after the reported matches feeding it.
+
+    Raises:
+        ValueError: The links between the reported matches form a cycle.
+    """
+    by_id = {result["match_id"]: result for result in results}
+    feeds: dict[int, list[int]] = {match_id: [] for match_id in by_id}
+    waiting = dict.fromkeys(by_id, 0)
+    for match_id in by_id:
+        match = matches.get(match_id)
+        if match is None:
+            continue
+        for target in (match["next_match_id"], match["loser_next_match_id"]):
+            if target in by_id:
+                feeds[match_id].append(target)
+                waiting[target] += 1
+
+    ready = deque(match_id for match_id in by_id if not waiting[match_id])
+    ordered = []
+    while ready:
+        match_id = ready.popleft()
+        ordered.append(by_id[match_id])
+        for target in feeds[match_id]:
+            waiting[target] -= 1
+            if not waiting[target]:
+                ready.append(target)
+    if len(ordered) != len(by_id):
+        raise ValueError("Match links form a cycle")
+    return ordered
+
+
+def _place(match: dict, player_id: int) -> str | None:
+    """
+    Put ``player_id`` in the first free slot of ``match``.
+
+    Returns:
+        The slot used, or None if the player was already there.
+
+    Raises:
+        ValueError: Both slots hold other players.
+    """
+    if player_id in (match["player1_id"], match["player2_id"]):
+        return None
+    for slot in ("player1", "player2"):
+        if not match[f"{slot}_id"]:
+            match[f"{slot}_id"] = player_id
+            return slot
+    raise ValueError("both slots are already taken")
+
+
+def _resolve(result: MatchResult, match: dict | None, matches: dict[int, dict]) -> tuple[int, int, list[tuple]]:
+    """
+    Check one result against the current in-memory state.
+
+    Returns:
+        ``(winner_id, loser_id, moves)``, where moves are ``(role, player_id,
+        target_match_id)`` for the winner and (if any) the loser.
+
+    Raises:
+        ValueError: Why the result cannot be applied.
+    """
+    if match is None:
+        raise ValueError("match not found")
+    if match["is_completed"]:
+        raise ValueError("match is already completed")
+    player1, player2 = match["player1_id"], match["player2_id"]
+    if not player1 or not player2:
+        raise ValueError("match is missing a player")
+
+    winner_id = result.get("winner_id")
+    if winner_id is None:
+        if result["player1_score"] == result["player2_score"]:
+            raise ValueError("scores are tied and no winner_id was given")
+        winner_id = player1 if result["player1_score"] > result["player2_score"] else player2
+    if winner_id not in (player1, player2):
+        raise ValueError(f"winner {winner_id} is not playing this match")
+    loser_id = player2 if winner_id == player1 else player1
+
+    moves = []
+    claimed: dict[int, int] = {}  # Free slots taken by earlier moves (winner and loser may share a target)
+    for role, player_id, target_id in (
+        ("winner", winner_id, match["next_match_id"]),
+        ("loser", loser_id, match["loser_next_match_id"]),
+    ):
+        if target_id is None:
+            continue
+        target = matches[target_id]
+        occupants = (target["player1_id"], target["player2_id"])
+        if player_id not in occupants:
+            free = sum(not occupant for occupant in occupants) - claimed.get(target_id, 0)
+            if free < 1:
+                raise ValueError(f"{role} cannot move to match {target_id}: both slots are already taken")
+            claimed[target_id] = claimed.get(target_id, 0) + 1
+        moves.append((role, player_id, target_id))
+    return winner_id, loser_id, moves
+
+
+def plan_batch(matches: dict[int, dict], results: list[MatchResult]) -> BatchOutcome:
+    """
+    Apply ``results`` to the in-memory ``matches`` (modified in place).
+
+    A rejected result is reported in ``errors``; the results after it are
+    still checked, so one run lists every problem.
+    """
+    outcome: BatchOutcome = {
+        "completed": [],
+        "placements": [],
+        "eliminated": [],
+        "grandfinals_reset": None,
+        "errors": [],
+    }
+    counts = Counter(result["match_id"] for result in results)
+    duplicates = sorted(match_id for match_id, count in counts.items() if count > 1)
+    if duplicates:
+        outcome["errors"] = [{"match_id": match_id, "error": "reported more than once"} for match_id in duplicates]
+        return outcome
+    try:
+        ordered = topological_order(results, matches)
+    except ValueError as e:
+        outcome["errors"].append({"match_id": None, "error": str(e)})
+        return outcome
+
+    for result in ordered:
+        match_id = result["match_id"]
+        match = matches.get(match_id)
+        try:
+            winner_id, loser_id, moves = _resolve(result, match, matches)
+        except ValueError as e:
+            outcome["errors"].append({"match_id": match_id, "error": str(e)})
+            continue
+
+        player1, player2 = match["player1_id"], match["player2_id"]
+        match.update(is_completed=True, winner_id=winner_id)
+        outcome["completed"].append({
+            "match_id": match_id,
+            "winner_id": winner_id,
+            "loser_id": loser_id,
+            "player1_score": result["player1_score"],
+            "player2_score": result["player2_score"],
+        })
+        for role, player_id, target_id in moves:
+            slot = _place(matches[target_id], player_id)
+            if slot:
+                outcome["placements"].append({
+                    "from_match_id": match_id,
+                    "player_id": player_id,
+                    "role": role,
+                    "to_match_id": target_id,
+                    "slot": slot,
+                })
+        if match["bracket_type"] == "grandfinals" and not match["is_grandfinals_reset"]:
+            # Both finalists play the reset, so nobody is out yet
+            outcome["grandfinals_reset"] = {"after_match_id": match_id, "player1_id": player1, "player2_id": player2}
+        elif match["loser_next_match_id"] is None:
+            outcome["eliminated"].append(loser_id)
+
+    return outcome
+
+
+async def apply_results(db: AsyncSession, results: list[MatchResult], dry_run: bool = False) -> BatchOutcome:
+    """
+    Report a batch of results and progress the bracket.
+
+    Writes and commits once, only when every result is valid and
+    ``dry_run`` is false.
+
+    Returns:
+        The :class:`BatchOutcome`; ``errors`` is empty when it was applied.
+    """
+    matches = await load_subgraph(db, [result["match_id"] for result in results])
+    outcome = plan_batch(matches, results)
+    if dry_run or outcome["errors"]:
+        return outcome
+
+    for state in matches.values():
+        match = state["row"]
+        match.player1_id = state["player1_id"]
+        match.player2_id = state["player2_id"]
+    for completed in outcome["completed"]:
+        match = matches[completed["match_id"]]["row"]
+        match.player1_score = completed["player1_score"]
+        match.player2_score = completed["player2_score"]
+        match.winner_id = completed["winner_id"]
+        match.is_completed = True
+        match.match_status = "completed"
+    if outcome["eliminated"]:
+        await db.execute(
+            update(User).where(User.id.in_(outcome["eliminated"])).values(stays_playing=False)
+        )
+
+    reset = outcome["grandfinals_reset"]
+    if reset:
+        original = matches[reset["after_match_id"]]
+        reset_match = Match(
+            bracket_id=original["bracket_id"],
+            player1_id=reset["player1_id"],
+            player2_id=reset["player2_id"],
+            map_id=original["map_id"],
+            round_name="Grand Finals Reset",
+            is_grandfinals_reset=True,
+            match_status="scheduled",
+        )
+        db.add(reset_match)
+        await db.flush()
+        reset["match_id"] = reset_match.id
+
+    await db.commit()
+    return outcome
@@ -0,0 +1,307 @@
+"""
+Read access to beatmapset archives without extracting them.
+
+In archive storage mode the downloaded ``.osz`` is kept as is and assets are
+read straight from it. Opening an archive reads only its central directory;
+the resulting member index (names, sizes, compression and the offset of each
+member's data) is cached in memory and validated by the archive's mtime, so
+serving a file costs one ``stat`` plus the reads of the bytes themselves.
+Stored (uncompressed) members, typically audio and images, are read at
+their offset, so HTTP range requests never touch the rest of the archive.
+"""
+import os
+import struct
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator
+
+# Local file header: signature .. extra field length (see APPNOTE 4.3.7)
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+class ArchiveMember:
+    """
+    A member of an archive and where its data lives.
+
+    Attributes:
+        name: Member path inside the archive.
+        file_size: Uncompressed size in bytes.
+        compress_size: Size of the member's data in the archive.
+        compress_type: ZIP compression method (``zipfile.ZIP_STORED`` etc.).
+        crc: CRC-32 of the uncompressed data.
+        data_offset: Offset of the member's data in the archive file.
+    """
+
+    def __init__(self, info: zipfile.ZipInfo, data_offset: int):
+        self.name = info.filename
+        self.file_size = info.file_size
+        self.compress_size = info.compress_size
+        self.compress_type = info.compress_type
+        self.crc = info.CRC
+        self.data_offset = data_offset
+
+    @property
+    def is_stored(self) -> bool:
+        """Whether the data is uncompressed and can be read at an offset."""
+        return self.compress_type == zipfile.ZIP_STORED
+
+
+class OszArchive:
+    """
+    Index of an .osz archive's members, built from its central directory.
+
+    Args:
+        path: The archive file.
+
+    Raises:
+        zipfile.BadZipFile: If the file is not a valid ZIP.
+
+    Example:
+        >>> archive = OszArchive(Path("beatmaps/123/.archive.osz"))
+        >>> member = archive.find("audio.mp3")
+        >>> head = b"".join(archive.iter_range(member, 0, 1023))
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.members: dict[str, ArchiveMember] = {}
+        self._by_lower: dict[str, ArchiveMember] = {}
+
+        with open(self.path, "rb") as f, zipfile.ZipFile(f) as zf:
+            for info in zf.infolist():
+                # Directories and encrypted members cannot be served
+                if info.is_dir() or info.flag_bits & 0x1:
+                    continue
+                f.seek(info.header_offset)
+                header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+                if header[0] != _LOCAL_HEADER_SIGNATURE:
+                    raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+                name_length, extra_length = header[-2:]
+                data_offset = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+                member = ArchiveMember(info, data_offset)
+                self.members[member.name] = member
+                self._by_lower.setdefault(member.name.lower(), member)
+
+    def file_sizes(self) -> dict[str, int]:
+        """All members as ``{name: uncompressed size}`` (manifest format)."""
+        return {name: member.file_size for name, member in self.members.items()}
+
+    def find(self, name: str) -> ArchiveMember | None:
+        """
+        Look up a member by path.
+
+        Falls back to a case-insensitive match, as osu! resolves storyboard
+        and audio paths case-insensitively.
+        """
+        name = name.replace("\\", "/")
+        return self.members.get(name) or self._by_lower.get(name.lower())
+
+    def read(self, name: str) -> bytes:
+        """
+        Read a whole member.
+
+        Raises:
+            KeyError: If the archive has no such member.
+        """
+        member = self.find(name)
+        if member is None:
+            raise KeyError(name)
+        return b"".join(self.iter_range(member, 0, member.file_size - 1))
+
+    def iter_range(self, member: ArchiveMember, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Yield the bytes ``start..end`` (inclusive) of a member's uncompressed data.
+
+        Stored members are read at their offset; compressed members are
+        decompressed from the start up to ``end``.
+
+        Args:
+            member: Member from :meth:`find`.
+            start: First byte.
+            end: Last byte (inclusive).
+            chunk_size: Largest chunk yielded.
+        """
+        remaining = end - start + 1
+        if remaining <= 0:
+            return
+
+        if member.is_stored:
+            with open(self.path, "rb") as f:
+                f.seek(member.data_offset + start)
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            return
+
+        with zipfile.ZipFile(self.path) as zf, zf.open(member.name) as stream:
+            if start:
+                stream.seek(start)
+            while remaining > 0:
+                chunk = stream.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class StreamScanner:
+    """
+    Extracts chosen members from a ZIP while it is still being downloaded.
+
+    Members are preceded by local headers carrying their name and sizes, so
+    small members (the ``.osu`` difficulties) can be returned as soon as
+    their bytes arrive, long before the central directory at the end of the
+    archive. Scanning stops, and the caller waits for the full archive, if
+    a member's sizes are deferred to a data descriptor or the data is not
+    a plain stored/deflated member.
+
+    Args:
+        wanted: Predicate on member names selecting what to return.
+        max_member_size: Larger members are skipped, not buffered.
+
+    Example:
+        >>> scanner = StreamScanner(lambda name: name.endswith(".osu"))
+        >>> for chunk in response_chunks:
+        ...     for name, data in scanner.feed(chunk):
+        ...         ...  # a complete .osu file
+    """
+
+    def __init__(self, wanted, max_member_size: int = 8 * 1024 * 1024):
+        self.wanted = wanted
+        self.max_member_size = max_member_size
+        self.stopped = False
+        self._buffer = bytearray()
+        self._skip = 0
+        self._member: tuple[str, int, int] | None = None
+
+    def _stop(self) -> None:
+        self.stopped = True
+        self._buffer.clear()
+
+    def feed(self, chunk: bytes) -> list[tuple[str, bytes]]:
+        """
+        Consume the next downloaded bytes.
+
+        Returns:
+            ``(name, uncompressed data)`` for every wanted member completed by
+            this chunk.
+        """
+        found = []
+        if self.stopped:
+            return found
+        view = memoryview(chunk)
+        if self._skip:
+            # Bytes of an unwanted member are dropped without buffering
+            skipped = min(self._skip, len(view))
+            self._skip -= skipped
+            view = view[skipped:]
+        self._buffer += view
+
+        while not self.stopped:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer))
+                del self._buffer[:skipped]
+                self._skip -= skipped
+                if self._skip:
+                    break
+
+            if self._member is None:
+                if len(self._buffer) < _LOCAL_HEADER.size:
+                    break
+                (signature, _, flags, method, _, _, _, compress_size,
+                 file_size, name_length, extra_length) = _LOCAL_HEADER.unpack_from(self._buffer)
+                if signature != _LOCAL_HEADER_SIGNATURE:
+                    # Central directory (or garbage): nothing more to stream
+                    self._stop()
+                    break
+                header_size = _LOCAL_HEADER.size + name_length + extra_length
+                if len(self._buffer) < header_size:
+                    break
+                raw_name = bytes(self._buffer[_LOCAL_HEADER.size:_LOCAL_HEADER.size + name_length])
+                name = raw_name.decode("utf-8" if flags & 0x800 else "cp437", errors="replace")
+                del self._buffer[:header_size]
+                if flags & 0x8:
+                    # Sizes follow the data; the end of the member cannot be found
+                    self._stop()
+                    break
+                if (
+                    not flags & 0x1
+                    and method in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+                    and file_size <= self.max_member_size
+                    and self.wanted(name)
+                ):
+                    self._member = (name, method, compress_size)
+                else:
+                    self._skip = compress_size
+                continue
+
+            name, method, compress_size = self._member
+            if len(self._buffer) < compress_size:
+                break
+            data = bytes(self._buffer[:compress_size])
+            del self._buffer[:compress_size]
+            self._member = None
+            try:
+                found.append((name, zlib.decompress(data, -15) if method == zipfile.ZIP_DEFLATED else data))
+            except zlib.error:
+                self._stop()
+        return found
+
+
+class ArchiveIndexCache:
+    """
+    LRU cache of archive indexes, invalidated by file identity.
+
+    Args:
+        max_entries: Number of archive indexes kept in memory.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Path, tuple[tuple[int, int, int], OszArchive]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> OszArchive | None:
+        """
+        Return the index of an archive, or None if the file does not exist.
+
+        Raises:
+            zipfile.BadZipFile: If the archive is corrupt.
+        """
+        path = Path(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        key = (st.st_mtime_ns, st.st_ino, st.st_size)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached and cached[0] == key:
+                self._entries.move_to_end(path)
+                return cached[1]
+
+        archive = OszArchive(path)
+        with self._lock:
+            self._entries[path] = (key, archive)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return archive
+
+    def invalidate(self, path: Path) -> None:
+        """Forget an archive (e.g. after its set was evicted)."""
+        with self._lock:
+            self._entries.pop(Path(path), None)
+
+
+# Singleton instance
+archive_cache = ArchiveIndexCache()
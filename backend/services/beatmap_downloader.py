@@ -1,32 +1,119 @@
 """
 Service for downloading and extracting osu! beatmaps.
 
-Downloads .osz files from mirror and extracts them to local storage.
+Downloads .osz files from the healthiest mirror (racing a second one when
+the first is slow) and extracts them to local storage. Sets are prepared in
+a staging directory and published atomically (see beatmap_publish), so
+backends sharing the store never see or redo each other's partial work.
 """
+import asyncio
 import json
+import os
 import re
+import time
 import zipfile
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import httpx
 
 from config import Config
-from services.osb_parser import merge_storyboards, parse_osb_file
-from services.osu_parser import parse_osu_file
+from services.beatmap_archive import StreamScanner, archive_cache
+from services.beatmap_extraction import ARCHIVE_FILE, ExtractionPolicy, extract_archive
+from services.beatmap_manifest import (
+    build_manifest,
+    manifest_cache,
+    pick_background,
+    read_manifest,
+    scan_files,
+    write_manifest,
+)
+from services.beatmap_mirrors import Mirror, MirrorRegistry, mirror_registry
+from services.beatmap_publish import (
+    SetLocks,
+    discard,
+    make_staging_path,
+    new_generation,
+    publish,
+    sweep_staging,
+)
+from services.beatmap_storage import BeatmapStorage, beatmap_storage
+from services.blob_store import BLOB_DIR, BlobStore, blob_store
+from services.download_scheduler import INTERACTIVE, DownloadScheduler, DownloadTicket, download_scheduler
+from services.image_derivatives import DERIVED_DIR, build_derivatives, derived_url
+from services.notes_encoding import choose_encoding, variant_path, write_variants
+from services.osb_parser import merge_storyboards, parse_osb_content
+from services.osu_parser import analyze_notes, decode_text, parse_osu_content
+from services.preview_cache import preview_cache
+from services.storyboard_atlas import animation_groups, build_atlases
+from services.workers import workers
+
+
+class MirrorNotFound(Exception):
+    """Raised when every mirror answered 404 for a beatmapset."""
+
+
+class MirrorStream:
+    """An open mirror response that has already produced its first chunk."""
+
+    def __init__(self, mirror: Mirror, response: httpx.Response, chunks, first_chunk: bytes, latency: float):
+        self.mirror = mirror
+        self.response = response
+        self.chunks = chunks
+        self.first_chunk = first_chunk
+        self.latency = latency
+
+
+# Bumped when the notes JSON layout changes; older sets are regenerated once
+NOTES_FORMAT = 5
+
+
+def notes_urls(beatmapset_id: str, audio_file: str, background_file: str | None, has_storyboard: bool) -> dict:
+    """URL fields of a notes payload (relative to the API root)."""
+    urls = {
+        "audio_url": f"/beatmaps/{beatmapset_id}/{audio_file}",
+        "background_url": f"/beatmaps/{beatmapset_id}/{background_file or ''}",
+    }
+    if has_storyboard:
+        urls["storyboard_base_url"] = f"/beatmaps/{beatmapset_id}/"
+    return urls
+
+
+def _release_orphaned(hold, acquire: asyncio.Future) -> None:
+    """Release a set lock whose acquiring task was cancelled while it waited."""
+    if not acquire.cancelled() and acquire.exception() is None:
+        hold.__exit__(None, None, None)
 
 
 class BeatmapDownloader:
     """Downloads and extracts osu! beatmaps from mirror sites."""
 
-    MIRROR_URL = "https://catboy.best/d/{beatmapset_id}"
-
-    def __init__(self, storage_path: str | None = None):
+    def __init__(
+        self,
+        storage_path: str | None = None,
+        mirrors: MirrorRegistry | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        storage: BeatmapStorage | None = None,
+        policy: ExtractionPolicy | None = None,
+        storage_mode: str | None = None,
+        scheduler: DownloadScheduler | None = None,
+        blobs: BlobStore | None = None,
+    ):
         """
         Initialize the downloader.
 
         Args:
             storage_path: Directory to store extracted beatmaps.
                          Defaults to BEATMAP_STORAGE_PATH from config or ./beatmaps
+            mirrors: Mirror registry to download from. Defaults to the shared registry.
+            transport: Optional httpx transport (used by tests to stand in for mirrors).
+            storage: Disk budget manager. Defaults to the shared manager, or an
+                     unbudgeted one when a custom storage_path is given.
+            policy: Which archive members to extract. Defaults to the configured policy.
+            storage_mode: ``"extract"`` or ``"archive"``. Defaults to BEATMAP_STORAGE_MODE.
+            scheduler: Priority scheduler granting download slots. Defaults to the shared one.
+            blobs: Content-addressed store deduplicating extracted files. Defaults to
+                   the shared store, or one inside a custom storage_path.
         """
         self.storage_path = Path(
             storage_path
@@ -34,126 +121,351 @@ class BeatmapDownloader:
             or './beatmaps'
         )
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.mirrors = mirrors or mirror_registry
+        if storage is None:
+            storage = beatmap_storage if storage_path is None else BeatmapStorage(self.storage_path)
+        self.storage = storage
+        self.policy = policy or ExtractionPolicy.from_config()
+        self.storage_mode = storage_mode or Config.BEATMAP_STORAGE_MODE
+        self.scheduler = scheduler or download_scheduler
+        if blobs is None:
+            blobs = blob_store if storage_path is None else BlobStore(self.storage_path / BLOB_DIR)
+        self.blobs = blobs
+        self.dedup = Config.BEATMAP_DEDUP
+        # The storage's locks when it manages this path, so eviction sees our holds in-process too
+        self.locks = storage.locks if storage.storage_path == self.storage_path else SetLocks(self.storage_path)
+        sweep_staging(self.storage_path)
+        self._inflight: dict[str, list] = {}
+        self.transport = transport
+        self.latency_budget = Config.MIRROR_LATENCY_BUDGET
+        self.timeout = Config.MIRROR_TIMEOUT
 
     def get_beatmapset_path(self, beatmapset_id: str) -> Path:
         """Get the storage path for a beatmapset."""
         return self.storage_path / beatmapset_id
 
+    def get_manifest(self, beatmapset_id: str) -> dict | None:
+        """
+        Get the manifest of a downloaded beatmapset.
+
+        Served from the in-memory manifest cache (one ``stat`` per call). Sets
+        extracted before manifests existed get one built from a directory scan,
+        once.
+
+        Returns:
+            The manifest dict, or None if the set is not on disk.
+        """
+        path = self.get_beatmapset_path(beatmapset_id)
+        manifest = manifest_cache.get(path)
+        if manifest is not None or not path.is_dir():
+            return manifest
+
+        write_manifest(path, build_manifest(beatmapset_id, scan_files(path)))
+        return manifest_cache.get(path)
+
     def exists(self, beatmapset_id: str) -> bool:
         """Check if a beatmapset is already downloaded and extracted."""
-        path = self.get_beatmapset_path(beatmapset_id)
-        if not path.exists():
-            return False
-        # Check if it has any .osu files (valid extraction)
-        osu_files = list(path.glob("*.osu"))
-        return len(osu_files) > 0
+        manifest = self.get_manifest(beatmapset_id)
+        # A valid extraction has at least one .osu file
+        return bool(manifest and manifest["osu_files"])
+
+    def get_generation(self, beatmapset_id: str) -> str | None:
+        """Generation marker of a set's published notes (None if absent or unstamped)."""
+        manifest = self.get_manifest(beatmapset_id)
+        return manifest.get("generation") if manifest else None
 
-    async def download(self, beatmapset_id: str, force: bool = False) -> dict:
+    async def _open_mirror(self, client: httpx.AsyncClient, mirror: Mirror, beatmapset_id: str) -> MirrorStream:
+        """
+        Start a download from one mirror and wait for its first chunk.
+
+        Raises:
+            MirrorNotFound: If the mirror answered 404.
+            httpx.HTTPError: On connection or HTTP errors.
+        """
+        start = time.monotonic()
+        request = client.build_request("GET", mirror.url_for(beatmapset_id))
+        response = await client.send(request, stream=True)
+        try:
+            if response.status_code == 404:
+                raise MirrorNotFound(mirror.name)
+            response.raise_for_status()
+            chunks = response.aiter_bytes(chunk_size=65536)
+            try:
+                first_chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                first_chunk = b""
+        except BaseException:
+            # Also covers cancellation when another mirror wins the race
+            await response.aclose()
+            raise
+        return MirrorStream(mirror, response, chunks, first_chunk, time.monotonic() - start)
+
+    async def _race_mirrors(self, client: httpx.AsyncClient, beatmapset_id: str) -> MirrorStream:
+        """
+        Open a download stream from the best available mirror.
+
+        Starts with the best-ranked mirror. If it has not produced bytes within
+        ``latency_budget`` seconds, the next mirror is raced against it; a
+        failed mirror is replaced by the next one immediately. The first
+        mirror to produce bytes wins and the others are cancelled.
+
+        Raises:
+            MirrorNotFound: If every mirror that answered returned 404.
+            httpx.HTTPError: The last error when every mirror failed.
+        """
+        queue = self.mirrors.ranked()
+        running: dict[asyncio.Task, Mirror] = {}
+        last_error: Exception | None = None
+
+        def launch_next() -> None:
+            if queue:
+                mirror = queue.pop(0)
+                task = asyncio.create_task(self._open_mirror(client, mirror, beatmapset_id))
+                running[task] = mirror
+
+        launch_next()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running, timeout=self.latency_budget, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Nobody produced bytes within the budget: race another mirror
+                    launch_next()
+                    continue
+
+                winner = None
+                for task in done:
+                    mirror = running.pop(task)
+                    try:
+                        stream = task.result()
+                    except MirrorNotFound:
+                        # The mirror is healthy, it just doesn't have this set
+                        launch_next()
+                        continue
+                    except Exception as e:
+                        last_error = e
+                        self.mirrors.record_failure(mirror)
+                        launch_next()
+                        continue
+
+                    self.mirrors.record_success(mirror, stream.latency)
+                    if winner is None:
+                        winner = stream
+                    else:
+                        await stream.response.aclose()
+
+                if winner is not None:
+                    return winner
+        finally:
+            for task in running:
+                task.cancel()
+            for result in await asyncio.gather(*running, return_exceptions=True):
+                if isinstance(result, MirrorStream):
+                    await result.response.aclose()
+
+        if last_error is not None:
+            raise last_error
+        raise MirrorNotFound(beatmapset_id)
+
+    async def download(self, beatmapset_id: str, force: bool = False, priority: str = INTERACTIVE) -> dict:
         """
         Download and extract a beatmapset.
 
         Args:
             beatmapset_id: The osu! beatmapset ID.
             force: Re-download even if already exists.
+            priority: Scheduler class (``"interactive"``, ``"staff"`` or ``"bulk"``).
 
         Returns:
             Dict with status and path info.
         """
         # Use the streaming version but ignore progress events
         result = None
-        async for event in self.download_with_progress(beatmapset_id, force):
+        async for event in self.download_with_progress(beatmapset_id, force, priority):
             if event.get("type") == "complete":
                 result = event.get("result")
             elif event.get("type") == "error":
                 result = event.get("result")
         return result or {"status": "error", "error": "Unknown error"}
 
-    async def download_with_progress(self, beatmapset_id: str, force: bool = False):
+    async def download_with_progress(self, beatmapset_id: str, force: bool = False, priority: str = INTERACTIVE):
         """
         Download and extract a beatmapset with progress events.
 
         Yields progress events during download:
+        - {"type": "queued", "position": n} (while waiting for a scheduler slot)
         - {"type": "progress", "loaded": bytes, "total": bytes}
+        - {"type": "member", "name": str, "data": bytes} (a .osu file, as
+          soon as it has arrived; only if the archive can be scanned)
         - {"type": "extracting"}
         - {"type": "complete", "result": {...}}
         - {"type": "error", "result": {...}}
 
+        The set holds a storage lease for the whole download so it cannot be
+        evicted half-written.
+
         Args:
             beatmapset_id: The osu! beatmapset ID.
             force: Re-download even if already exists.
+            priority: Scheduler class (``"interactive"``, ``"staff"`` or ``"bulk"``).
         """
-        if not force and self.exists(beatmapset_id):
-            yield {
-                "type": "complete",
-                "result": {
-                    "status": "exists",
-                    "beatmapset_id": beatmapset_id,
-                    "path": str(self.get_beatmapset_path(beatmapset_id)),
-                },
-            }
-            return
+        with self.storage.lease(beatmapset_id):
+            async for event in self._download_events(beatmapset_id, force, priority):
+                yield event
+
+    def _exists_event(self, beatmapset_id: str) -> dict:
+        self.storage.touch(beatmapset_id)
+        return {
+            "type": "complete",
+            "result": {
+                "status": "exists",
+                "beatmapset_id": beatmapset_id,
+                "path": str(self.get_beatmapset_path(beatmapset_id)),
+            },
+        }
+
+    @asynccontextmanager
+    async def _single_flight(self, beatmapset_id: str):
+        """
+        Queue this process's requests for a set one behind another.
 
-        url = self.MIRROR_URL.format(beatmapset_id=beatmapset_id)
+        A request arriving while the set is being downloaded waits here and
+        then finds it published, so only one of them fetches it.
+        """
+        entry = self._inflight.setdefault(beatmapset_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._inflight.pop(beatmapset_id, None)
+
+    @asynccontextmanager
+    async def _exclusive(self, beatmapset_id: str):
+        """
+        Hold a set's writer lock from async code.
 
+        The cross-process lock is taken in a worker thread so the event loop
+        never blocks on another backend. The worker thread cannot be
+        interrupted: if the waiting task is cancelled, the thread still ends
+        up holding the lock, so it is released as soon as that acquire
+        completes.
+        """
+        hold = self.locks.hold(beatmapset_id)
+        acquire = asyncio.ensure_future(workers.run_io(hold.__enter__))
         try:
-            async with httpx.AsyncClient(follow_redirects=True, timeout=120.0) as client:
-                async with client.stream("GET", url) as response:
-                    if response.status_code == 404:
-                        yield {
-                            "type": "error",
-                            "result": {
-                                "status": "not_found",
-                                "beatmapset_id": beatmapset_id,
-                                "error": "Beatmapset not found on mirror",
-                            },
-                        }
-                        return
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            acquire.add_done_callback(lambda done: _release_orphaned(hold, done))
+            raise
+        try:
+            yield
+        finally:
+            hold.__exit__(None, None, None)
+
+    async def _wait_for_slot(self, ticket: DownloadTicket):
+        """Yield queue-position events until the scheduler grants the ticket."""
+        last_position = None
+        while not ticket.granted.is_set():
+            position = self.scheduler.position(ticket)
+            if position != last_position:
+                last_position = position
+                yield {"type": "queued", "position": position}
+            try:
+                await asyncio.wait_for(ticket.granted.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
 
-                    response.raise_for_status()
+    async def _download_events(self, beatmapset_id: str, force: bool, priority: str = INTERACTIVE):
+        """Event generator behind :meth:`download_with_progress`."""
+        if not force and self.exists(beatmapset_id):
+            yield self._exists_event(beatmapset_id)
+            return
 
-                    # Get total size from Content-Length header
-                    total = int(response.headers.get("content-length", 0))
-                    loaded = 0
+        # Requests for a set in flight queue behind it instead of taking slots.
+        # Whoever gets through and still finds the set missing (the first
+        # request, or one retrying after it failed) takes a scheduler ticket.
+        async with self._single_flight(beatmapset_id):
+            if not force and self.exists(beatmapset_id):
+                yield self._exists_event(beatmapset_id)
+                return
+            ticket = self.scheduler.enqueue(priority, beatmapset_id)
+            try:
+                async for event in self._wait_for_slot(ticket):
+                    yield event
 
-                    # Stream download to file
-                    osz_path = self.storage_path / f"{beatmapset_id}.osz"
-                    chunks = []
+                async with self._exclusive(beatmapset_id):
+                    # Another backend may have published the set while we waited
+                    if not force and self.exists(beatmapset_id):
+                        yield self._exists_event(beatmapset_id)
+                        return
+                    async for event in self._fetch_and_publish(beatmapset_id, ticket):
+                        yield event
+            finally:
+                self.scheduler.release(ticket)
 
-                    async for chunk in response.aiter_bytes(chunk_size=65536):
+    async def _fetch_and_publish(self, beatmapset_id: str, ticket: DownloadTicket):
+        """Download a set, then prepare and publish it in a worker thread."""
+        try:
+            async with httpx.AsyncClient(
+                follow_redirects=True, timeout=self.timeout, transport=self.transport
+            ) as client:
+                try:
+                    stream = await self._race_mirrors(client, beatmapset_id)
+                except MirrorNotFound:
+                    yield {
+                        "type": "error",
+                        "result": {
+                            "status": "not_found",
+                            "beatmapset_id": beatmapset_id,
+                            "error": "Beatmapset not found on mirror",
+                        },
+                    }
+                    return
+
+                try:
+                    # Get total size from Content-Length header
+                    total = int(stream.response.headers.get("content-length", 0))
+                    loaded = len(stream.first_chunk)
+                    chunks = [stream.first_chunk]
+                    # Difficulties are handed out as soon as their bytes arrive
+                    scanner = StreamScanner(lambda name: name.lower().endswith(".osu"))
+                    for name, data in scanner.feed(stream.first_chunk):
+                        yield {"type": "member", "name": name, "data": data}
+                    if total > 0:
+                        yield {"type": "progress", "loaded": loaded, "total": total}
+
+                    async for chunk in stream.chunks:
+                        await self.scheduler.throttle(ticket, len(chunk))
                         chunks.append(chunk)
                         loaded += len(chunk)
+                        for name, data in scanner.feed(chunk):
+                            yield {"type": "member", "name": name, "data": data}
                         if total > 0:
                             yield {"type": "progress", "loaded": loaded, "total": total}
-
-                    # Write all chunks to file
-                    osz_path.write_bytes(b"".join(chunks))
+                except Exception:
+                    # The mirror died mid-transfer
+                    self.mirrors.record_failure(stream.mirror)
+                    raise
+                finally:
+                    await stream.response.aclose()
 
                 # Extraction phase
                 yield {"type": "extracting"}
-
-                extract_path = self.get_beatmapset_path(beatmapset_id)
-                extract_path.mkdir(parents=True, exist_ok=True)
-
-                with zipfile.ZipFile(osz_path, 'r') as zf:
-                    zf.extractall(extract_path)
-
-                # Remove the .osz file after extraction
-                osz_path.unlink()
-
-                # Get list of extracted files
-                files = list(extract_path.iterdir())
-
-                # Auto-generate notes.json files
-                notes_result = self.generate_notes_json(beatmapset_id)
+                data = b"".join(chunks)
+                del chunks
+                prepared = await workers.run_cpu(self._prepare_and_publish, beatmapset_id, data)
 
                 yield {
                     "type": "complete",
                     "result": {
                         "status": "downloaded",
                         "beatmapset_id": beatmapset_id,
-                        "path": str(extract_path),
-                        "files_count": len(files),
-                        "notes_generated": notes_result.get("generated", []),
+                        "mirror": stream.mirror.name,
+                        **prepared,
                     },
                 }
 
@@ -185,44 +497,153 @@ class BeatmapDownloader:
                 },
             }
 
+    def _prepare_and_publish(self, beatmapset_id: str, data: bytes) -> dict:
+        """
+        Extract a downloaded archive, generate its notes and publish the set.
+
+        Runs in the CPU worker pool with the set's writer lock held.
+        Everything is prepared in a private staging directory and published
+        with a rename, so readers never see partial files.
+
+        Returns:
+            Result fields for the ``complete`` event.
+        """
+        stage_path = make_staging_path(self.storage_path, beatmapset_id)
+        try:
+            osz_path = stage_path / ARCHIVE_FILE
+            osz_path.write_bytes(data)
+
+            extract_path = self.get_beatmapset_path(beatmapset_id)
+            if self.storage_mode == "archive":
+                # Keep the archive as is; assets are served from it
+                archive = archive_cache.get(osz_path)
+                extraction = {
+                    "extracted": [{"name": name, "size": size} for name, size in archive.file_sizes().items()],
+                    "skipped": [],
+                }
+                manifest = build_manifest(beatmapset_id, archive.file_sizes(), storage_mode="archive")
+            else:
+                extraction = extract_archive(osz_path, stage_path, self.policy)
+
+                # Keep the archive only if skipped members may be requested later
+                lazy = self.policy.lazy and bool(extraction["skipped"])
+                if not lazy:
+                    osz_path.unlink()
+
+                manifest = build_manifest(
+                    beatmapset_id,
+                    {entry["name"]: entry["size"] for entry in extraction["extracted"]},
+                    skipped=extraction["skipped"],
+                    lazy_extract=lazy,
+                )
+                if self.dedup:
+                    # Share identical files with other sets through the blob store
+                    manifest["blobs"] = self.blobs.add_files(stage_path, list(manifest["files"]))
+
+            # Generate notes JSON files, then stamp and publish the set
+            notes_result = self._generate_notes(stage_path, beatmapset_id, manifest)
+            manifest["generation"] = new_generation()
+            write_manifest(stage_path, manifest)
+            previous = read_manifest(extract_path)
+            publish(stage_path, extract_path)
+            archive_cache.invalidate(osz_path)
+            preview_cache.invalidate_set(beatmapset_id)
+            stage_path = None
+        finally:
+            if stage_path is not None:
+                discard(stage_path)
+
+        # Account for the new set and make room if over budget
+        self.storage.record(beatmapset_id)
+        evicted = self.storage.enforce_budget()
+
+        # Drop blobs only the replaced or evicted sets linked to
+        if evicted:
+            self.blobs.collect()
+        elif previous and previous.get("blobs"):
+            self.blobs.collect(previous["blobs"].values())
+
+        return {
+            "path": str(extract_path),
+            "files_count": len(extraction["extracted"]),
+            "skipped_count": len(extraction["skipped"]),
+            "notes_generated": notes_result.get("generated", []),
+        }
+
     def get_beatmap_files(self, beatmapset_id: str) -> dict:
         """
         Get info about files in a downloaded beatmapset.
 
         Returns:
-            Dict with file listings by type.
+            Dict with file listings by type, read from the set manifest.
         """
-        path = self.get_beatmapset_path(beatmapset_id)
-        if not path.exists():
+        manifest = self.get_manifest(beatmapset_id)
+        if manifest is None:
             return {"exists": False}
 
-        files = {
+        listed = set(manifest["osu_files"] + manifest["audio_files"] + manifest["image_files"])
+        return {
             "exists": True,
-            "path": str(path),
-            "osu_files": [],
-            "audio_files": [],
-            "image_files": [],
-            "other_files": [],
+            "path": str(self.get_beatmapset_path(beatmapset_id)),
+            "osu_files": manifest["osu_files"],
+            "audio_files": manifest["audio_files"],
+            "image_files": manifest["image_files"],
+            "other_files": sorted(name for name in manifest["files"] if name not in listed),
+            "skipped_files": [entry["name"] for entry in manifest["skipped"]],
+            "total_bytes": sum(manifest["files"].values()),
+            "difficulties": manifest["difficulties"],
         }
 
-        for f in path.iterdir():
-            name = f.name.lower()
-            if name.endswith(".osu"):
-                files["osu_files"].append(f.name)
-            elif name.endswith((".mp3", ".ogg", ".wav")):
-                files["audio_files"].append(f.name)
-            elif name.endswith((".jpg", ".jpeg", ".png", ".gif")):
-                files["image_files"].append(f.name)
-            else:
-                files["other_files"].append(f.name)
+    def _read_bytes(self, path: Path, manifest: dict, name: str) -> bytes:
+        """Read a member of a set, from disk or from its archive."""
+        if manifest.get("storage_mode") == "archive":
+            archive = archive_cache.get(path / ARCHIVE_FILE)
+            if archive is None:
+                raise FileNotFoundError(name)
+            return archive.read(name)
+        return (path / name).read_bytes()
+
+    def _read_text(self, path: Path, manifest: dict, name: str) -> str:
+        """Read a text member of a set, from disk or from its archive."""
+        return decode_text(self._read_bytes(path, manifest, name))
 
-        return files
+    def _resolve_member(self, manifest: dict, name: str) -> str:
+        """
+        Path of a set member as stored, for a path referenced by a beatmap.
+
+        Storyboard paths use backslashes and are matched case-insensitively,
+        as osu! does.
+        """
+        name = name.replace("\\", "/")
+        if name in manifest["files"]:
+            return name
+        lowered = name.lower()
+        return next((member for member in manifest["files"] if member.lower() == lowered), name)
+
+    def _derive_image(self, path: Path, manifest: dict, name: str, **options) -> dict | None:
+        """
+        Build derivatives of one image of the set into its ``.derived`` directory.
+
+        Returns None when derivatives are disabled or the image is missing
+        or unreadable.
+        """
+        if not Config.IMAGE_DERIVATIVES:
+            return None
+        name = self._resolve_member(manifest, name)
+        try:
+            data = self._read_bytes(path, manifest, name)
+        except (OSError, KeyError):
+            return None
+        return build_derivatives(path / DERIVED_DIR, name, data, **options)
 
     def generate_notes_json(self, beatmapset_id: str) -> dict:
         """
         Parse all .osu files in a beatmapset and generate notes JSON files.
 
-        Creates a 'notes' subdirectory with JSON files for each difficulty.
+        Creates a 'notes' subdirectory with JSON files for each difficulty and
+        records the difficulties in the set manifest, stamped with a new
+        generation. Runs under the set's writer lock, so it never overlaps
+        with a download or another regeneration of the same set.
 
         Args:
             beatmapset_id: The osu! beatmapset ID.
@@ -230,38 +651,76 @@ class BeatmapDownloader:
         Returns:
             Dict with status and list of generated files.
         """
+        with self.locks.hold(beatmapset_id):
+            return self._regenerate(beatmapset_id)
+
+    def _regenerate(self, beatmapset_id: str) -> dict:
+        """Regenerate notes in place and publish a new generation (lock held)."""
         path = self.get_beatmapset_path(beatmapset_id)
-        if not path.exists():
+        manifest = self.get_manifest(beatmapset_id)
+        if manifest is None:
             return {"status": "error", "error": "Beatmapset not found"}
+        manifest = dict(manifest)
+
+        result = self._generate_notes(path, beatmapset_id, manifest)
+        manifest["generation"] = new_generation()
+        write_manifest(path, manifest)
+        preview_cache.invalidate_set(beatmapset_id)
+        return result
+
+    def _regenerate_once(self, beatmapset_id: str, seen_generation: str | None) -> None:
+        """
+        Regenerate notes unless someone else already did.
+
+        Readers that find a set without a generation call this with the
+        generation they saw; after taking the lock the manifest is re-read,
+        and if another worker (in any process) published meanwhile, the
+        work is skipped.
+        """
+        with self.locks.hold(beatmapset_id):
+            manifest = self.get_manifest(beatmapset_id)
+            if manifest is None or manifest.get("generation") != seen_generation:
+                return
+            self._regenerate(beatmapset_id)
 
+    def _generate_notes(self, path: Path, beatmapset_id: str, manifest: dict) -> dict:
+        """
+        Write notes JSON files for the set at ``path`` and update ``manifest``.
+
+        ``path`` is either a staging directory or the published set; each
+        notes file is replaced atomically. The caller writes the manifest.
+        """
         notes_dir = path / "notes"
         notes_dir.mkdir(exist_ok=True)
 
         generated = []
         errors = []
+        difficulties = []
+        notes_index = {}
 
-        # Find background image
-        bg_file = None
-        for f in path.iterdir():
-            if f.suffix.lower() in (".jpg", ".jpeg", ".png") and "bg" in f.name.lower():
-                bg_file = f.name
-                break
-        # Fallback to first image if no bg found
-        if not bg_file:
-            for f in path.iterdir():
-                if f.suffix.lower() in (".jpg", ".jpeg", ".png"):
-                    bg_file = f.name
-                    break
+        # Find background image and encode its resized derivatives
+        bg_file = pick_background(manifest)
+        background = self._derive_image(path, manifest, bg_file) if bg_file else None
+        if background is not None:
+            for variant in background["variants"]:
+                variant["url"] = derived_url(beatmapset_id, variant["file"])
+
+        # Storyboard atlases and sprite derivatives, shared by all difficulties
+        sprites = {}
+        atlases = {}
 
         # Find and parse .osb storyboard file (applies to all difficulties)
         osb_storyboard = None
-        osb_files = list(path.glob("*.osb"))
-        if osb_files:
-            osb_storyboard = parse_osb_file(str(osb_files[0]))
+        if manifest["osb_files"]:
+            try:
+                osb_storyboard = parse_osb_content(self._read_text(path, manifest, manifest["osb_files"][0]))
+            except (OSError, KeyError):
+                pass
 
-        for osu_file in path.glob("*.osu"):
+        for osu_name in manifest["osu_files"]:
+            osu_file = path / osu_name
             try:
-                parsed = parse_osu_file(str(osu_file))
+                parsed = parse_osu_content(self._read_text(path, manifest, osu_name), source=osu_name)
 
                 # Use audio file from the .osu file's [General] section
                 audio_file = parsed["metadata"].get("audio_filename", "")
@@ -274,31 +733,57 @@ class BeatmapDownloader:
                 # (the flag is in [General] section, not [Events], so may be lost if .osu has no storyboard)
                 if merged_storyboard is not None:
                     merged_storyboard["widescreen"] = parsed["metadata"].get("widescreen_storyboard", False)
+                    self._prepare_storyboard_images(path, beatmapset_id, manifest, merged_storyboard, sprites, atlases)
 
                 # Add audio, background, timing, and storyboard info
+                # URLs are baked in so the file can be served byte for byte
                 output = {
                     "metadata": parsed["metadata"],
                     "audio_file": audio_file,
                     "background_file": bg_file,
+                    "background_image": background,
                     "notes": parsed["notes"],
                     "timing_points": parsed.get("timing_points", []),
                     "storyboard": merged_storyboard,
+                    **notes_urls(beatmapset_id, audio_file, bg_file, merged_storyboard is not None),
                 }
 
-                # Use a sanitized filename based on difficulty name
+                # Key notes files by BeatmapID; unsubmitted difficulties (ID 0)
+                # fall back to a sanitized difficulty name, prefixed so that a
+                # numeric name can never overwrite another difficulty's file
                 diff_name = parsed["metadata"]["version"]
-                safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in diff_name)
-                json_filename = f"{safe_name}.json"
+                diff_id = parsed["metadata"]["beatmap_id"]
+                if diff_id and str(diff_id) not in notes_index:
+                    json_filename = f"{diff_id}.json"
+                else:
+                    safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in diff_name)
+                    json_filename = f"name-{safe_name}.json"
                 json_path = notes_dir / json_filename
 
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(output, f, ensure_ascii=False)
+                data = json.dumps(output, ensure_ascii=False).encode("utf-8")
+                tmp_path = notes_dir / f".{json_filename}.{os.getpid()}.tmp"
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, json_path)
+                encodings = write_variants(json_path, data)
 
+                if diff_id:
+                    notes_index.setdefault(str(diff_id), json_filename)
                 generated.append({
                     "osu_file": osu_file.name,
                     "json_file": json_filename,
                     "notes_count": len(parsed["notes"]),
                 })
+                difficulties.append({
+                    "osu_file": osu_name,
+                    "beatmap_id": diff_id,
+                    "version": diff_name,
+                    "audio_file": audio_file,
+                    "notes_file": json_filename,
+                    "notes_size": json_path.stat().st_size,
+                    "notes_count": len(parsed["notes"]),
+                    "encodings": encodings,
+                    "analysis": analyze_notes(parsed["notes"], parsed["metadata"]["keys"]),
+                })
 
             except Exception as e:
                 errors.append({
@@ -306,6 +791,27 @@ class BeatmapDownloader:
                     "error": str(e),
                 })
 
+        manifest["background_file"] = bg_file
+        manifest["images"] = {
+            "background": background,
+            "sprites": {name: info for name, info in sprites.items() if info is not None},
+            "atlases": [atlas for atlas in atlases.values() if atlas is not None],
+        }
+        # Drop notes files no difficulty uses any more (renamed or removed
+        # difficulties, older naming schemes)
+        current = {
+            variant_path(notes_dir / entry["notes_file"], encoding).name
+            for entry in difficulties
+            for encoding in (None, *entry["encodings"])
+        }
+        for stale in notes_dir.iterdir():
+            if not stale.name.startswith(".") and stale.name not in current:
+                stale.unlink(missing_ok=True)
+
+        manifest["difficulties"] = difficulties
+        manifest["notes_index"] = notes_index
+        manifest["notes_format"] = NOTES_FORMAT
+
         return {
             "status": "success" if generated else "error",
             "beatmapset_id": beatmapset_id,
@@ -313,47 +819,214 @@ class BeatmapDownloader:
             "errors": errors,
         }
 
-    def get_notes_json(self, beatmapset_id: str, difficulty: str | None = None) -> dict | None:
+    def _prepare_storyboard_images(
+        self,
+        path: Path,
+        beatmapset_id: str,
+        manifest: dict,
+        storyboard: dict,
+        sprites: dict,
+        atlases: dict,
+    ) -> None:
         """
-        Get parsed notes JSON for a beatmapset.
+        Add the ``atlas`` and ``image_derivatives`` sections to a storyboard.
+
+        Images are packed into atlas pages when ``Config.STORYBOARD_ATLAS``
+        is set; the rest are mapped to a smaller same-size WebP where one
+        helps (sprites keep their dimensions, as the renderer sizes them by
+        texture). ``sprites`` and ``atlases`` cache results across
+        difficulties, which usually share the .osb storyboard; at most
+        ``Config.IMAGE_MAX_SPRITES`` sprites per set are encoded.
+        """
+        images = [image.replace("\\", "/") for image in storyboard["images"]]
+
+        atlas = None
+        if Config.STORYBOARD_ATLAS and Config.IMAGE_DERIVATIVES:
+            key = tuple(sorted(set(images)))
+            if key not in atlases:
+                atlases[key] = self._build_atlas(path, manifest, storyboard)
+            atlas = atlases[key]
+        if atlas is not None:
+            atlas = {
+                "pages": [{**page, "url": derived_url(beatmapset_id, page["file"])} for page in atlas["pages"]],
+                "sprites": atlas["sprites"],
+            }
+        storyboard["atlas"] = atlas
+
+        derivatives = {}
+        for image in images:
+            if atlas is not None and image in atlas["sprites"]:
+                continue
+            if image not in sprites and len(sprites) < Config.IMAGE_MAX_SPRITES:
+                sprites[image] = self._derive_image(
+                    path, manifest, image, widths=None, formats=["webp"], smaller_only=True
+                )
+            info = sprites.get(image)
+            if info and info["variants"]:
+                derivatives[image] = derived_url(beatmapset_id, info["variants"][0]["file"])
+        storyboard["image_derivatives"] = derivatives
+
+    def _build_atlas(self, path: Path, manifest: dict, storyboard: dict) -> dict | None:
+        """Pack a storyboard's images into atlas pages (None if nothing was packed)."""
+        groups = animation_groups(storyboard)
+        images = {}
+        for group in groups:
+            for image in group:
+                try:
+                    images[image] = self._read_bytes(path, manifest, self._resolve_member(manifest, image))
+                except (OSError, KeyError):
+                    continue
+        return build_atlases(path / DERIVED_DIR, images, groups, size=Config.STORYBOARD_ATLAS_SIZE)
+
+    def build_artifacts(self, beatmapset_id: str) -> dict:
+        """
+        Make sure every derived artifact of a downloaded set exists.
+
+        Artifacts are the per-difficulty notes JSON files with their
+        precompressed variants, the manifest's notes index and the chart
+        analysis. Sets published by older code
+        that lack any of them are regenerated (once, under the set lock).
 
         Args:
             beatmapset_id: The osu! beatmapset ID.
-            difficulty: Optional specific difficulty name. If None, returns first found.
 
         Returns:
-            Parsed notes data or None if not found.
+            Dict with status, generation and number of difficulties.
         """
-        path = self.get_beatmapset_path(beatmapset_id)
-        notes_dir = path / "notes"
+        manifest = self.get_manifest(beatmapset_id)
+        if manifest is None:
+            return {"status": "error", "error": "Beatmapset not found"}
 
-        if not notes_dir.exists():
-            # Try to generate if not exists
-            self.generate_notes_json(beatmapset_id)
+        complete = "generation" in manifest and manifest.get("notes_format") == NOTES_FORMAT
+        if not complete:
+            self._regenerate_once(beatmapset_id, manifest.get("generation"))
+            manifest = self.get_manifest(beatmapset_id)
 
-        if not notes_dir.exists():
-            return None
+        return {
+            "status": "success" if manifest["difficulties"] else "error",
+            "beatmapset_id": beatmapset_id,
+            "generation": manifest.get("generation"),
+            "difficulties": len(manifest["difficulties"]),
+        }
+
+    def find_difficulty(
+        self,
+        beatmapset_id: str,
+        difficulty: str | None = None,
+        beatmap_id: int | str | None = None,
+    ) -> dict | None:
+        """
+        Find a difficulty's manifest entry (with its notes file).
+
+        Difficulties are resolved through the set manifest's ``notes_index``
+        (``beatmap_id`` -> notes file), never by scanning the notes directory.
+        The difficulty name is only consulted, as an exact match, for
+        difficulties without a BeatmapID. If neither matches but the set has
+        exactly one difficulty without a BeatmapID, a ``beatmap_id`` lookup
+        falls back to it: it is the only chart the ID could belong to. A
+        published set (one whose manifest has a ``generation``) is complete,
+        so lookups that miss never trigger regeneration; sets written by
+        older code are upgraded once.
 
-        json_files = list(notes_dir.glob("*.json"))
-        if not json_files:
+        Args:
+            beatmapset_id: The osu! beatmapset ID.
+            difficulty: Optional difficulty name, used when ``beatmap_id`` is
+                not in the index.
+            beatmap_id: Optional osu! beatmap ID of the wanted difficulty.
+
+        Returns:
+            The difficulty entry, or None if not found. With neither
+            ``beatmap_id`` nor ``difficulty`` the first difficulty is returned.
+        """
+        manifest = self.get_manifest(beatmapset_id)
+        if manifest is None:
+            return None
+        self.storage.touch(beatmapset_id)
+
+        if manifest.get("notes_format") != NOTES_FORMAT:
+            # Set written by older code: regenerate its notes once, however
+            # many readers arrive at the same time
+            self._regenerate_once(beatmapset_id, manifest.get("generation"))
+            manifest = self.get_manifest(beatmapset_id)
+            if manifest is None:
+                return None
+
+        difficulties = manifest["difficulties"]
+        if not difficulties:
             return None
 
-        # Find specific difficulty or return first
-        target_file = None
+        if beatmap_id:
+            notes_file = manifest["notes_index"].get(str(beatmap_id))
+            for entry in difficulties:
+                if notes_file and entry["notes_file"] == notes_file:
+                    return entry
         if difficulty:
             # Strip [#K] prefix (e.g., "[4K] " or "[7K] ") that osu! API adds
-            clean_diff = re.sub(r'^\[\d+K\]\s*', '', difficulty)
-            safe_diff = "".join(c if c.isalnum() or c in "._- " else "_" for c in clean_diff)
-            for jf in json_files:
-                # Check both directions - difficulty in filename or filename in difficulty
-                if safe_diff.lower() in jf.stem.lower() or jf.stem.lower() in safe_diff.lower():
-                    target_file = jf
-                    break
-        if not target_file:
-            target_file = json_files[0]
-
-        with open(target_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+            clean_diff = re.sub(r'^\[\d+K\]\s*', '', difficulty).strip().lower()
+            for entry in difficulties:
+                if entry["version"].strip().lower() == clean_diff:
+                    return entry
+        if beatmap_id:
+            unidentified = [entry for entry in difficulties if not entry["beatmap_id"]]
+            if len(unidentified) == 1:
+                return unidentified[0]
+        if beatmap_id or difficulty:
+            return None
+        return difficulties[0]
+
+    def get_notes_file(
+        self,
+        beatmapset_id: str,
+        difficulty: str | None = None,
+        beatmap_id: int | str | None = None,
+        accept_encoding: str | None = None,
+    ) -> dict | None:
+        """
+        Locate the stored notes bytes to send for a difficulty.
+
+        Args:
+            beatmapset_id: The osu! beatmapset ID.
+            difficulty: Optional difficulty name (see :meth:`find_difficulty`).
+            beatmap_id: Optional osu! beatmap ID of the wanted difficulty.
+            accept_encoding: The client's ``Accept-Encoding`` header.
+
+        Returns:
+            Dict with ``path`` (file to send), ``encoding`` (its
+            Content-Encoding, or None) and ``difficulty`` (the manifest
+            entry), or None if not found.
+        """
+        entry = self.find_difficulty(beatmapset_id, difficulty, beatmap_id)
+        if entry is None:
+            return None
+        json_path = self.get_beatmapset_path(beatmapset_id) / "notes" / entry["notes_file"]
+        encoding = choose_encoding(accept_encoding, list(entry.get("encodings", {})))
+        return {"path": variant_path(json_path, encoding), "encoding": encoding, "difficulty": entry}
+
+    def get_notes_json(
+        self,
+        beatmapset_id: str,
+        difficulty: str | None = None,
+        beatmap_id: int | str | None = None,
+    ) -> dict | None:
+        """
+        Get parsed notes JSON for a beatmapset.
+
+        Args:
+            beatmapset_id: The osu! beatmapset ID.
+            difficulty: Optional difficulty name (see :meth:`find_difficulty`).
+            beatmap_id: Optional osu! beatmap ID of the wanted difficulty.
+
+        Returns:
+            Parsed notes data, or None if not found.
+        """
+        notes_file = self.get_notes_file(beatmapset_id, difficulty, beatmap_id)
+        if notes_file is None:
+            return None
+        try:
+            with open(notes_file["path"], "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
 
 
 # Singleton instance
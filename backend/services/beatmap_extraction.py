@@ -0,0 +1,145 @@
+"""
+Selective extraction of .osz archives.
+
+Only members the preview can use are unpacked: an allow-list of file types
+and a per-member size cap keep video backgrounds and oversized assets out of
+the store. Skipped members are recorded in the set manifest and can be
+extracted lazily from the retained archive on first request.
+"""
+import os
+import shutil
+import zipfile
+from pathlib import Path, PurePosixPath
+
+from config import Config
+from services.beatmap_manifest import read_manifest
+
+ARCHIVE_FILE = ".archive.osz"
+
+
+class ExtractionPolicy:
+    """
+    Rules deciding which archive members are extracted.
+
+    Args:
+        allowed_extensions: Lower-case extensions (with dot) to extract.
+        max_member_bytes: Largest uncompressed member to extract (0 = no cap).
+        lazy: Keep the archive so skipped members can be extracted on demand.
+
+    Example:
+        >>> policy = ExtractionPolicy({".osu", ".mp3"}, max_member_bytes=0)
+        >>> policy.skip_reason("video.mp4", 1024)
+        'type'
+    """
+
+    def __init__(self, allowed_extensions: set[str], max_member_bytes: int = 0, lazy: bool = False):
+        self.allowed_extensions = {ext.lower() for ext in allowed_extensions}
+        self.max_member_bytes = max_member_bytes
+        self.lazy = lazy
+
+    @classmethod
+    def from_config(cls) -> "ExtractionPolicy":
+        """Build the policy from application configuration."""
+        return cls(
+            set(Config.BEATMAP_EXTRACT_EXTENSIONS),
+            max_member_bytes=Config.BEATMAP_MAX_MEMBER_MB * 1024 * 1024,
+            lazy=Config.BEATMAP_LAZY_EXTRACT,
+        )
+
+    def skip_reason(self, name: str, size: int) -> str | None:
+        """Why a member would be skipped (``'type'`` or ``'size'``), or None to extract it."""
+        if PurePosixPath(name).suffix.lower() not in self.allowed_extensions:
+            return "type"
+        if self.max_member_bytes and size > self.max_member_bytes:
+            return "size"
+        return None
+
+
+def _referenced_audio(zf: zipfile.ZipFile) -> set[str]:
+    """AudioFilename values from every .osu member (always extracted)."""
+    audio = set()
+    for info in zf.infolist():
+        if not info.filename.lower().endswith(".osu"):
+            continue
+        text = zf.read(info).decode("utf-8-sig", errors="replace")
+        for line in text.splitlines():
+            key, _, value = line.partition(":")
+            if key.strip() == "AudioFilename":
+                audio.add(value.strip().lower())
+                break
+    return audio
+
+
+def extract_archive(osz_path: Path, extract_path: Path, policy: ExtractionPolicy) -> dict:
+    """
+    Extract the members of an .osz allowed by ``policy``.
+
+    Audio files referenced by a difficulty are always extracted, whatever
+    their size, since the preview cannot play without them.
+
+    Args:
+        osz_path: The downloaded archive.
+        extract_path: Destination directory (created if missing).
+        policy: Extraction rules.
+
+    Returns:
+        Dict with ``extracted`` (``{"name", "size"}`` entries) and
+        ``skipped`` (``{"name", "size", "reason"}`` entries).
+
+    Raises:
+        zipfile.BadZipFile: If the archive is not a valid ZIP.
+    """
+    extract_path.mkdir(parents=True, exist_ok=True)
+    extracted = []
+    skipped = []
+
+    with zipfile.ZipFile(osz_path, "r") as zf:
+        required = _referenced_audio(zf)
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            reason = policy.skip_reason(info.filename, info.file_size)
+            if reason and info.filename.lower() not in required:
+                skipped.append({"name": info.filename, "size": info.file_size, "reason": reason})
+                continue
+            # ZipFile.extract sanitizes absolute paths and '..' components
+            zf.extract(info, extract_path)
+            extracted.append({"name": info.filename, "size": info.file_size})
+
+    return {"extracted": extracted, "skipped": skipped}
+
+
+def retain_archive(osz_path: Path, extract_path: Path) -> None:
+    """Keep the archive inside the set directory for lazy extraction."""
+    shutil.move(str(osz_path), str(extract_path / ARCHIVE_FILE))
+
+
+def extract_skipped_member(set_path: Path, name: str) -> bool:
+    """
+    Extract a member that was skipped at download time.
+
+    Args:
+        set_path: The beatmapset directory.
+        name: Member path relative to the set (as requested over HTTP).
+
+    Returns:
+        True if the member is now on disk.
+    """
+    archive = set_path / ARCHIVE_FILE
+    manifest = read_manifest(set_path)
+    if not manifest or not archive.exists():
+        return False
+
+    wanted = name.replace("\\", "/").lower()
+    for entry in manifest.get("skipped", []):
+        if entry["name"].replace("\\", "/").lower() == wanted:
+            # Write beside the target and rename, so concurrent readers (or
+            # another backend sharing the store) never see a partial file
+            target = set_path / entry["name"].replace("\\", "/")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+            with zipfile.ZipFile(archive, "r") as zf, zf.open(entry["name"]) as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, target)
+            return True
+    return False
@@ -0,0 +1,157 @@
+"""
+Per-beatmapset manifest stored next to the extracted files.
+
+The manifest lists every extracted asset with its size, the difficulties
+with their beatmap IDs, audio and notes files, an index from beatmap ID
+to notes file, and the chosen background.
+It is written atomically after extraction and after notes generation, and
+an in-memory cache validated by the file's mtime lets hot paths answer
+"what is in this set?" with a single ``stat`` instead of a directory scan.
+"""
+import json
+import os
+import threading
+from pathlib import Path, PurePosixPath
+
+MANIFEST_FILE = ".manifest.json"
+MANIFEST_VERSION = 1
+
+AUDIO_EXTENSIONS = (".mp3", ".ogg", ".wav")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+
+
+def manifest_path(set_path: Path) -> Path:
+    """Location of the manifest for an extracted beatmapset."""
+    return set_path / MANIFEST_FILE
+
+
+def read_manifest(set_path: Path) -> dict | None:
+    """Load a set's manifest, or None if missing or unreadable."""
+    try:
+        with open(manifest_path(set_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(set_path: Path, manifest: dict) -> None:
+    """Atomically write a set's manifest (temp file + rename)."""
+    target = manifest_path(set_path)
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, target)
+
+
+def scan_files(set_path: Path) -> dict[str, int]:
+    """
+    Walk a set directory and return ``{relative posix path: size}``.
+
+    Only used when building a manifest for a set extracted before manifests
+    existed; derived ``notes/`` files and dotfiles are excluded.
+    """
+    files = {}
+    for root, dirs, names in os.walk(set_path):
+        rel_root = Path(root).relative_to(set_path)
+        if rel_root == Path("."):
+            dirs[:] = [d for d in dirs if d != "notes" and not d.startswith(".")]
+        for name in names:
+            if name.startswith("."):
+                continue
+            rel = (rel_root / name).as_posix()
+            try:
+                files[rel] = os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return files
+
+
+def build_manifest(
+    beatmapset_id: str,
+    files: dict[str, int],
+    skipped: list[dict] | None = None,
+    lazy_extract: bool = False,
+    storage_mode: str = "extract",
+) -> dict:
+    """
+    Build the asset part of a manifest from the extracted file list.
+
+    Difficulties are filled in by notes generation.
+
+    Args:
+        beatmapset_id: The osu! beatmapset ID.
+        files: Extracted files as ``{relative posix path: size}``.
+        skipped: Members skipped by the extraction policy.
+        lazy_extract: Whether the archive was kept for lazy extraction.
+        storage_mode: ``"extract"`` if the files are on disk, ``"archive"``
+            if they are read from the retained archive.
+    """
+    top_level = sorted(name for name in files if "/" not in name)
+    return {
+        "version": MANIFEST_VERSION,
+        "beatmapset_id": beatmapset_id,
+        "files": files,
+        "osu_files": [n for n in top_level if n.lower().endswith(".osu")],
+        "osb_files": [n for n in top_level if n.lower().endswith(".osb")],
+        "audio_files": [n for n in top_level if n.lower().endswith(AUDIO_EXTENSIONS)],
+        "image_files": [n for n in top_level if n.lower().endswith(IMAGE_EXTENSIONS)],
+        "background_file": None,
+        "difficulties": [],
+        "notes_index": {},
+        "skipped": skipped or [],
+        "lazy_extract": lazy_extract,
+        "storage_mode": storage_mode,
+    }
+
+
+def pick_background(manifest: dict) -> str | None:
+    """Background image by filename heuristics: a name containing 'bg', else the first image."""
+    images = [n for n in manifest["image_files"] if PurePosixPath(n).suffix.lower() != ".gif"]
+    for name in images:
+        if "bg" in name.lower():
+            return name
+    return images[0] if images else None
+
+
+class ManifestCache:
+    """
+    In-memory cache of parsed manifests, invalidated by file identity.
+
+    Each lookup costs one ``stat``; the manifest is re-read only when its
+    mtime or inode changed (atomic rewrites always produce a new inode).
+    """
+
+    def __init__(self):
+        self._entries: dict[Path, tuple[tuple[int, int], dict]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, set_path: Path) -> dict | None:
+        """Return the current manifest of a set, or None if it has none."""
+        path = manifest_path(set_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(set_path, None)
+            return None
+
+        key = (st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            cached = self._entries.get(set_path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        manifest = read_manifest(set_path)
+        if manifest is not None:
+            with self._lock:
+                self._entries[set_path] = (key, manifest)
+        return manifest
+
+    def invalidate(self, set_path: Path) -> None:
+        """Forget a set (e.g. after it was deleted)."""
+        with self._lock:
+            self._entries.pop(set_path, None)
+
+
+# Singleton instance
+manifest_cache = ManifestCache()
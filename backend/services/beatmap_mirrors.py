@@ -0,0 +1,157 @@
+"""
+Mirror registry with health scoring for beatmapset downloads.
+
+Tracks rolling latency and error rate per mirror, ranks mirrors for new
+downloads and backs off mirrors that keep failing.
+"""
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from config import Config
+
+
+class Mirror:
+    """
+    A single beatmap mirror and its rolling health statistics.
+
+    Attributes:
+        name: Short display name (the mirror's host).
+        url_template: Download URL with a ``{beatmapset_id}`` placeholder.
+        latencies: Recent time-to-first-byte samples in seconds.
+        outcomes: Recent request outcomes (True = success).
+        consecutive_failures: Failures since the last success.
+        backoff_until: Monotonic time until which the mirror is skipped.
+    """
+
+    def __init__(self, url_template: str, window: int = 20):
+        self.url_template = url_template
+        self.name = urlparse(url_template).netloc or url_template
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.backoff_until = 0.0
+
+    def url_for(self, beatmapset_id: str) -> str:
+        """Build the download URL for a beatmapset."""
+        return self.url_template.format(beatmapset_id=beatmapset_id)
+
+    @property
+    def avg_latency(self) -> float | None:
+        """Mean time-to-first-byte over the window, or None without samples."""
+        if not self.latencies:
+            return None
+        return sum(self.latencies) / len(self.latencies)
+
+    @property
+    def error_rate(self) -> float:
+        """Fraction of failed requests over the window."""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def __repr__(self):
+        return f"<Mirror(name='{self.name}', error_rate={self.error_rate:.2f})>"
+
+
+class MirrorRegistry:
+    """
+    Ranks mirrors by health and applies exponential backoff to failing ones.
+
+    A mirror's score is its average latency inflated by its error rate, so a
+    fast mirror that fails half the time ranks below a slower reliable one.
+    Mirrors without samples get ``unknown_latency`` so they are still tried.
+
+    Args:
+        url_templates: Mirror URL templates in preference order.
+        window: Number of samples kept per mirror.
+        base_backoff: Backoff in seconds after the first consecutive failure.
+        max_backoff: Upper bound for the backoff.
+        unknown_latency: Assumed latency for mirrors without samples.
+        clock: Monotonic clock, injectable for tests.
+
+    Example:
+        >>> registry = MirrorRegistry(["https://a/d/{beatmapset_id}"])
+        >>> best = registry.ranked()[0]
+    """
+
+    def __init__(
+        self,
+        url_templates: list[str],
+        window: int = 20,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        unknown_latency: float = 1.0,
+        clock=time.monotonic,
+    ):
+        if not url_templates:
+            raise ValueError("At least one mirror URL template is required")
+        self.mirrors = [Mirror(url, window) for url in url_templates]
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.unknown_latency = unknown_latency
+        self.clock = clock
+
+    def score(self, mirror: Mirror) -> float:
+        """Lower is better."""
+        latency = mirror.avg_latency
+        if latency is None:
+            latency = self.unknown_latency
+        return latency * (1.0 + 4.0 * mirror.error_rate)
+
+    def is_backed_off(self, mirror: Mirror) -> bool:
+        """Whether the mirror is currently being skipped after failures."""
+        return mirror.backoff_until > self.clock()
+
+    def ranked(self) -> list[Mirror]:
+        """
+        Mirrors ordered best first.
+
+        Healthy mirrors come first by score; backed-off mirrors are appended
+        last (soonest-available first) so a download is still attempted when
+        every mirror is backing off.
+        """
+        healthy = [m for m in self.mirrors if not self.is_backed_off(m)]
+        backed_off = [m for m in self.mirrors if self.is_backed_off(m)]
+        # Stable sort keeps configuration order as the tie-breaker
+        healthy.sort(key=self.score)
+        backed_off.sort(key=lambda m: m.backoff_until)
+        return healthy + backed_off
+
+    def record_success(self, mirror: Mirror, latency: float) -> None:
+        """Record a request that produced bytes after ``latency`` seconds."""
+        mirror.latencies.append(latency)
+        mirror.outcomes.append(True)
+        mirror.consecutive_failures = 0
+        mirror.backoff_until = 0.0
+
+    def record_failure(self, mirror: Mirror) -> None:
+        """Record a failed request and extend the mirror's backoff."""
+        mirror.outcomes.append(False)
+        mirror.consecutive_failures += 1
+        backoff = min(
+            self.base_backoff * (2 ** (mirror.consecutive_failures - 1)),
+            self.max_backoff,
+        )
+        mirror.backoff_until = self.clock() + backoff
+
+    def stats(self) -> list[dict]:
+        """Health snapshot of every mirror, in ranked order."""
+        now = self.clock()
+        return [
+            {
+                "name": m.name,
+                "url_template": m.url_template,
+                "avg_latency": round(m.avg_latency, 3) if m.avg_latency is not None else None,
+                "error_rate": round(m.error_rate, 3),
+                "samples": len(m.outcomes),
+                "consecutive_failures": m.consecutive_failures,
+                "backoff_remaining": round(max(0.0, m.backoff_until - now), 1),
+                "score": round(self.score(m), 3),
+            }
+            for m in self.ranked()
+        ]
+
+
+# Singleton instance
+mirror_registry = MirrorRegistry(Config.BEATMAP_MIRRORS)
@@ -0,0 +1,170 @@
+"""
+Staged, atomic publication of beatmapsets in a shared store.
+
+The beatmaps volume can be mounted by several backends at once (production
+and staging share ``./beatmaps``). To keep readers from ever seeing a
+half-written set:
+
+- A set is extracted and its notes generated in a private staging directory
+  on the same filesystem, then published with a single ``rename``.
+- Every publication stamps the manifest with a new ``generation`` marker;
+  the manifest is written last, so a set with a stamped manifest is complete.
+- Writers of the same set are serialized by a per-set lock that works across
+  threads and processes (``flock`` on a lock file in the store), and re-check
+  the generation after acquiring it, so work done by another worker is never
+  repeated.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of this process
+    fcntl = None
+
+STAGING_DIR = ".staging"
+LOCKS_DIR = ".locks"
+
+
+def new_generation() -> str:
+    """A unique, roughly time-ordered generation marker."""
+    return f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+
+
+class SetLocks:
+    """
+    Exclusive per-beatmapset locks shared by threads and processes.
+
+    Args:
+        storage_path: Root of the beatmaps store (lock files live in ``.locks/``).
+
+    Example:
+        >>> locks = SetLocks(Path("./beatmaps"))
+        >>> with locks.hold("123"):
+        ...     ...  # Only one worker in any process gets here at a time
+    """
+
+    def __init__(self, storage_path: Path):
+        self.lock_dir = Path(storage_path) / LOCKS_DIR
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        self._guard = threading.Lock()
+        self._thread_locks: dict[str, list] = {}  # beatmapset_id -> [lock, holders and waiters]
+
+    @contextmanager
+    def _thread_lock(self, beatmapset_id: str):
+        """The set's thread lock, kept only while someone holds or waits for it."""
+        with self._guard:
+            entry = self._thread_locks.setdefault(beatmapset_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._thread_locks[beatmapset_id]
+
+    @contextmanager
+    def hold(self, beatmapset_id: str):
+        """Hold the set's lock for the duration of the block (blocking)."""
+        with self._thread_lock(beatmapset_id) as thread_lock, thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_dir / f"{beatmapset_id}.lock", "a+b") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def try_hold(self, beatmapset_id: str):
+        """
+        Hold the set's lock if it is free right now, without waiting.
+
+        Yields:
+            True if the lock is held for the block, False if another thread
+            or process has it.
+        """
+        with self._thread_lock(beatmapset_id) as thread_lock:
+            if not thread_lock.acquire(blocking=False):
+                yield False
+                return
+            try:
+                if fcntl is None:
+                    yield True
+                    return
+                with open(self.lock_dir / f"{beatmapset_id}.lock", "a+b") as f:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        yield False
+                        return
+                    try:
+                        yield True
+                    finally:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            finally:
+                thread_lock.release()
+
+
+def make_staging_path(storage_path: Path, beatmapset_id: str) -> Path:
+    """Create an empty private staging directory for a set."""
+    staging_root = Path(storage_path) / STAGING_DIR
+    staging_root.mkdir(parents=True, exist_ok=True)
+    path = staging_root / f"{beatmapset_id}.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+    path.mkdir()
+    return path
+
+
+def publish(stage_path: Path, target_path: Path) -> None:
+    """
+    Move a fully prepared staging directory into place.
+
+    A new set appears with one atomic ``rename``. An existing set (forced
+    re-download) is first renamed aside and deleted after the swap, so the
+    target is never a partially written directory. Callers hold the set lock.
+    """
+    if target_path.exists():
+        retired = stage_path.with_name(f"{stage_path.name}.old")
+        os.rename(target_path, retired)
+        os.rename(stage_path, target_path)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.rename(stage_path, target_path)
+
+
+def discard(stage_path: Path) -> None:
+    """Remove an abandoned staging directory."""
+    shutil.rmtree(stage_path, ignore_errors=True)
+
+
+def sweep_staging(storage_path: Path, max_age: float = 86400.0) -> int:
+    """
+    Remove staging directories left behind by crashed workers.
+
+    Only directories older than ``max_age`` seconds are removed, so work in
+    progress in another backend sharing the store is left alone.
+
+    Returns:
+        Number of directories removed.
+    """
+    staging_root = Path(storage_path) / STAGING_DIR
+    if not staging_root.is_dir():
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for child in staging_root.iterdir():
+        try:
+            if child.stat().st_mtime < cutoff:
+                shutil.rmtree(child, ignore_errors=True)
+                removed += 1
+        except OSError:
+            pass
+    return removed
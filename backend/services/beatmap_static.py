@@ -0,0 +1,175 @@
+"""
+Static file serving for the beatmaps store.
+
+Wraps Starlette's StaticFiles so every served file refreshes its set's LRU
+access time and holds a storage lease until the response is fully sent.
+Members skipped at extraction time are extracted on first request when the
+set kept its archive. Sets kept in archive storage mode are served straight
+from the ``.osz``, with HTTP range support for audio seeking.
+"""
+import os
+import re
+from mimetypes import guess_type
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from services.beatmap_archive import ArchiveMember, OszArchive, archive_cache
+from services.beatmap_extraction import ARCHIVE_FILE, extract_skipped_member
+from services.beatmap_manifest import manifest_cache
+from services.beatmap_storage import BeatmapStorage
+from services.workers import workers
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range ``Range`` header into inclusive byte bounds.
+
+    Args:
+        header: The ``Range`` header value, if any.
+        size: Size of the resource in bytes.
+
+    Returns:
+        ``(start, end)``, or None to serve the whole resource (no header,
+        or a form this server ignores such as multiple ranges).
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+
+    Example:
+        >>> parse_range("bytes=-100", 1000)
+        (900, 999)
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+class ArchiveMemberResponse(Response):
+    """
+    Response streaming one archive member, honouring a single byte range.
+
+    Args:
+        archive: Index of the archive holding the member.
+        member: The member to send.
+        range_header: The request's ``Range`` header, if any.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, archive: OszArchive, member: ArchiveMember, range_header: str | None = None):
+        self.archive = archive
+        self.member = member
+        self.background = None
+        self.media_type = guess_type(member.name)[0] or "application/octet-stream"
+        self.status_code = 200
+        self.start, self.end = 0, member.file_size - 1
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": f'"{member.crc:08x}-{member.file_size}"',
+        }
+        try:
+            byte_range = parse_range(range_header, member.file_size)
+        except ValueError:
+            self.status_code = 416
+            self.start, self.end = 0, -1
+            headers["content-range"] = f"bytes */{member.file_size}"
+            byte_range = None
+        if byte_range is not None:
+            self.status_code = 206
+            self.start, self.end = byte_range
+            headers["content-range"] = f"bytes {self.start}-{self.end}/{member.file_size}"
+        headers["content-length"] = str(self.end - self.start + 1)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or self.end < self.start:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        chunks = self.archive.iter_range(self.member, self.start, self.end, self.chunk_size)
+        try:
+            while True:
+                chunk = await workers.run_io(next, chunks, None)
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            # Release the archive file handle even if the client went away
+            chunks.close()
+        await send({"type": "http.response.body", "body": b""})
+
+
+class BeatmapStaticFiles(StaticFiles):
+    """
+    StaticFiles mount for ``/beatmaps/{beatmapset_id}/{file}``.
+
+    Args:
+        storage: Storage manager to notify of accesses.
+        **kwargs: Passed through to :class:`StaticFiles`.
+    """
+
+    def __init__(self, storage: BeatmapStorage, **kwargs):
+        super().__init__(**kwargs)
+        self.storage = storage
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = self.get_path(scope)
+        parts = path.split(os.sep)
+        beatmapset_id = parts[0]
+
+        # Bookkeeping files (index, manifests, retained archives) are private
+        if any(part.startswith(".") for part in parts):
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+
+        # May measure the set and save the storage index
+        await workers.run_io(self.storage.touch, beatmapset_id)
+        with self.storage.lease(beatmapset_id):
+            if len(parts) > 1:
+                set_path = self.storage.storage_path / beatmapset_id
+                rel = "/".join(parts[1:])
+                if not (set_path / os.path.join(*parts[1:])).exists():
+                    manifest = manifest_cache.get(set_path)
+                    if manifest and manifest.get("storage_mode") == "archive":
+                        await self.serve_from_archive(set_path, rel, scope, receive, send)
+                        return
+                    await workers.run_cpu(extract_skipped_member, set_path, rel)
+            await super().__call__(scope, receive, send)
+
+    async def serve_from_archive(self, set_path: Path, name: str, scope: Scope, receive: Receive, send: Send) -> None:
+        """Send a member of a set kept in archive storage mode."""
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        else:
+            archive = await workers.run_io(archive_cache.get, set_path / ARCHIVE_FILE)
+            member = archive.find(name) if archive else None
+            if member is None:
+                response = PlainTextResponse("Not Found", status_code=404)
+            else:
+                range_header = Headers(scope=scope).get("range")
+                response = ArchiveMemberResponse(archive, member, range_header)
+        await response(scope, receive, send)
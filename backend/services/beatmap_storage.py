@@ -0,0 +1,371 @@
+"""
+Disk budget management for the beatmaps store.
+
+Tracks the size and last access of every extracted beatmapset in a small
+JSON index and evicts least recently used sets when the store exceeds its
+byte budget. Sets belonging to visible mappools are pinned, and sets that
+are being downloaded or served hold a lease that protects them from eviction.
+
+The store may be mounted by several backends at once (production and
+staging share ``./beatmaps``), so the index is shared state: every write
+takes a lock on it, re-reads it and merges it with what this process
+knows (the newest entry of each set wins, and removals on either side
+stick). Each deployment also publishes its pins in the index, so one never
+evicts a set pinned by the other. Leases are per process, but a set is
+only deleted while holding its set lock, so it is never removed while
+another backend is extracting it.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from config import Config
+from models.mappool import Mappool, MappoolMap
+from services.beatmap_publish import SetLocks
+
+try:
+    import fcntl
+except ImportError:  # Windows: the index lock only covers this process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def directory_size(path: Path) -> int:
+    """
+    Bytes of disk attributable to the files below ``path``.
+
+    A hard-linked file (deduplicated through the blob store) counts as its
+    share of the inode, ``st_size / st_nlink``: sets linking the same blob
+    split it instead of each being charged in full, and evicting one of
+    them is not credited with bytes the other links keep alive. Shares are
+    taken when a set is measured, so they add up to at most the inode size.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            total += stat.st_size // max(stat.st_nlink, 1)
+    return total
+
+
+def load_pinned_beatmapsets(db: Session) -> set[str]:
+    """Beatmapset IDs referenced by any visible mappool."""
+    rows = (
+        db.query(MappoolMap.beatmapset_id)
+        .join(Mappool, MappoolMap.mappool_id == Mappool.id)
+        .filter(Mappool.is_visible.is_(True), MappoolMap.beatmapset_id.isnot(None))
+        .distinct()
+        .all()
+    )
+    return {row[0] for row in rows}
+
+
+def default_owner() -> str:
+    """Name of this deployment in the shared index (derived from its database, without credentials)."""
+    return hashlib.sha256(Config.DATABASE_URL.encode()).hexdigest()[:12]
+
+
+class BeatmapStorage:
+    """
+    LRU storage manager for extracted beatmapsets.
+
+    Args:
+        storage_path: Root directory of the beatmaps store.
+        budget_bytes: Maximum bytes to keep on disk (0 disables eviction).
+        grace_seconds: Sets accessed more recently than this are never evicted.
+            Access times from other backends arrive with their next index
+            write (at most ``SAVE_INTERVAL`` seconds late), so this must be
+            well above that interval.
+        clock: Wall clock, injectable for tests.
+        owner: Name under which this deployment's pins are shared. Defaults
+            to one derived from the database URL.
+        locks: Per-set locks of the store. Defaults to locks on ``storage_path``.
+
+    Example:
+        >>> storage = BeatmapStorage("./beatmaps", budget_bytes=5 * 1024**3)
+        >>> with storage.lease("123"):
+        ...     storage.record("123")
+        >>> storage.enforce_budget()
+    """
+
+    INDEX_FILE = ".storage_index.json"
+    INDEX_LOCK_FILE = ".storage_index.lock"
+    SAVE_INTERVAL = 30.0
+    # Pins of a deployment that stopped updating them are dropped after this
+    PIN_TTL = 7 * 86400.0
+
+    def __init__(
+        self,
+        storage_path: str | Path,
+        budget_bytes: int = 0,
+        grace_seconds: float = 600.0,
+        clock=time.time,
+        owner: str | None = None,
+        locks: SetLocks | None = None,
+    ):
+        self.storage_path = Path(storage_path)
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = budget_bytes
+        self.grace_seconds = grace_seconds
+        self.clock = clock
+        self.owner = owner or default_owner()
+        self.locks = locks or SetLocks(self.storage_path)
+        self.index_path = self.storage_path / self.INDEX_FILE
+        self._lock = threading.RLock()
+        self._leases: dict[str, int] = {}
+        self._pins: set[str] = set()
+        self._shared_pins: dict[str, dict] = {}  # Other deployments' pins, by owner
+        self._removed: set[str] = set()  # Deleted here since the last index write
+        self._dirty = False
+        self._last_save = 0.0
+        self._entries: dict[str, dict] = {}
+        self._loaded = False
+
+    # --- Index persistence ---
+
+    def _load(self) -> None:
+        """Read the index (or rebuild it by scanning the store) on first use, not at import."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            index = self._read_index()
+            if index is None:
+                self._entries = self._scan()
+            else:
+                self._merge(*index)
+
+    def _read_index(self) -> tuple[dict[str, dict], dict[str, dict]] | None:
+        """Entries and pins from the index file, or None if it is missing or corrupt."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        if isinstance(data.get("entries"), dict):
+            return data["entries"], data.get("pins") or {}
+        return data, {}  # Written before pins were shared: entries only
+
+    @contextmanager
+    def _index_lock(self):
+        """Exclusive access to the index file across processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.storage_path / self.INDEX_LOCK_FILE, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _merge(self, entries: dict[str, dict], pins: dict[str, dict]) -> None:
+        """Fold the index file's contents into ours (caller holds ``_lock``)."""
+        for beatmapset_id, theirs in entries.items():
+            if beatmapset_id in self._removed:
+                continue
+            ours = self._entries.get(beatmapset_id)
+            if ours is None or theirs["last_access"] > ours["last_access"]:
+                self._entries[beatmapset_id] = theirs
+        for beatmapset_id in self._entries.keys() - entries.keys():
+            # Known here only: new since our last write, or removed by another backend
+            if not (self.storage_path / beatmapset_id).is_dir():
+                del self._entries[beatmapset_id]
+        now = self.clock()
+        self._shared_pins = {
+            owner: pinned for owner, pinned in pins.items()
+            if owner != self.owner and now - pinned.get("updated", 0) < self.PIN_TTL
+        }
+
+    def _scan(self) -> dict[str, dict]:
+        """Rebuild index entries by walking the store."""
+        now = self.clock()
+        entries = {}
+        for child in self.storage_path.iterdir():
+            if child.is_dir() and not child.name.startswith("."):
+                entries[child.name] = {"size": directory_size(child), "last_access": now}
+        self._dirty = True
+        return entries
+
+    def save(self) -> None:
+        """Merge the index file with our state and write the result back atomically."""
+        self._load()
+        with self._lock, self._index_lock():
+            index = self._read_index()
+            if index is not None:
+                self._merge(*index)
+            pins = {**self._shared_pins, self.owner: {"ids": sorted(self._pins), "updated": self.clock()}}
+            tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries, "pins": pins}, f)
+            os.replace(tmp_path, self.index_path)
+            self._removed.clear()
+            self._dirty = False
+            self._last_save = self.clock()
+
+    def _maybe_save(self) -> None:
+        if self._dirty and self.clock() - self._last_save >= self.SAVE_INTERVAL:
+            self.save()
+
+    # --- Tracking ---
+
+    def record(self, beatmapset_id: str) -> int:
+        """Measure a set after it was (re)written and mark it as just used."""
+        size = directory_size(self.storage_path / beatmapset_id)
+        self._load()
+        with self._lock:
+            self._entries[beatmapset_id] = {"size": size, "last_access": self.clock()}
+            self._removed.discard(beatmapset_id)
+            self.save()
+        return size
+
+    def touch(self, beatmapset_id: str) -> None:
+        """Mark a set as accessed. Index writes are throttled."""
+        self._load()
+        with self._lock:
+            entry = self._entries.get(beatmapset_id)
+            if entry is None:
+                path = self.storage_path / beatmapset_id
+                if not path.is_dir():
+                    return
+                entry = self._entries[beatmapset_id] = {"size": directory_size(path), "last_access": 0.0}
+                self._removed.discard(beatmapset_id)
+            entry["last_access"] = self.clock()
+            self._dirty = True
+            self._maybe_save()
+
+    def forget(self, beatmapset_id: str) -> None:
+        """Drop a set from the index (it was removed from disk)."""
+        self._load()
+        with self._lock:
+            if self._entries.pop(beatmapset_id, None) is not None:
+                self._removed.add(beatmapset_id)
+                self.save()
+
+    @contextmanager
+    def lease(self, beatmapset_id: str):
+        """Protect a set from eviction while it is downloaded or served."""
+        with self._lock:
+            self._leases[beatmapset_id] = self._leases.get(beatmapset_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                remaining = self._leases[beatmapset_id] - 1
+                if remaining:
+                    self._leases[beatmapset_id] = remaining
+                else:
+                    del self._leases[beatmapset_id]
+
+    def is_leased(self, beatmapset_id: str) -> bool:
+        """Whether a set currently holds a lease."""
+        return beatmapset_id in self._leases
+
+    def set_pins(self, beatmapset_ids: set[str]) -> None:
+        """Replace the set of pinned beatmapsets (those in this deployment's visible mappools)."""
+        with self._lock:
+            self._pins = {str(b) for b in beatmapset_ids}
+        self.save()
+
+    def is_pinned(self, beatmapset_id: str) -> bool:
+        """Whether any deployment sharing the store pins a set."""
+        self._load()
+        return beatmapset_id in self._pins or any(
+            beatmapset_id in pinned.get("ids", ()) for pinned in self._shared_pins.values()
+        )
+
+    # --- Eviction ---
+
+    def usage(self) -> int:
+        """Total tracked bytes."""
+        self._load()
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def _is_evictable(self, beatmapset_id: str, entry: dict, now: float) -> bool:
+        return (
+            not self.is_pinned(beatmapset_id)
+            and beatmapset_id not in self._leases
+            and now - entry["last_access"] >= self.grace_seconds
+        )
+
+    def enforce_budget(self) -> list[str]:
+        """
+        Evict least recently used sets until usage fits the budget.
+
+        Pinned, leased and recently accessed sets are skipped, so usage can
+        stay above budget if everything left is protected. The index is
+        merged first, so pins and accesses of other backends count. A set is
+        deleted only under its set lock, taken without waiting: a set whose
+        lock is busy is being written and is skipped.
+
+        Returns:
+            IDs of the evicted beatmapsets.
+        """
+        if self.budget_bytes <= 0:
+            return []
+
+        self.save()
+        with self._lock:
+            now = self.clock()
+            usage = self.usage()
+            candidates = [
+                beatmapset_id
+                for beatmapset_id, _ in sorted(self._entries.items(), key=lambda item: item[1]["last_access"])
+            ]
+
+        # The set lock is never waited for while holding ``_lock``: its holder may need ``_lock`` to record
+        evicted = []
+        for beatmapset_id in candidates:
+            if usage <= self.budget_bytes:
+                break
+            with self.locks.try_hold(beatmapset_id) as held:
+                if not held:
+                    continue
+                with self._lock:
+                    entry = self._entries.get(beatmapset_id)
+                    if entry is None or not self._is_evictable(beatmapset_id, entry, now):
+                        continue
+                    shutil.rmtree(self.storage_path / beatmapset_id, ignore_errors=True)
+                    del self._entries[beatmapset_id]
+                    self._removed.add(beatmapset_id)
+                    usage -= entry["size"]
+                    evicted.append(beatmapset_id)
+        if evicted:
+            self.save()
+            logger.info(f"[STORAGE] Evicted {len(evicted)} beatmapsets, usage now {usage} bytes")
+        return evicted
+
+    def stats(self) -> dict:
+        """Usage summary for monitoring."""
+        self._load()
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.usage(),
+                "beatmapsets": len(self._entries),
+                "pinned": sum(self.is_pinned(beatmapset_id) for beatmapset_id in self._entries),
+                "leased": len(self._leases),
+            }
+
+
+# Singleton instance
+beatmap_storage = BeatmapStorage(
+    getattr(Config, 'BEATMAP_STORAGE_PATH', None) or './beatmaps',
+    budget_bytes=Config.BEATMAP_STORAGE_BUDGET_MB * 1024 * 1024,
+    grace_seconds=Config.BEATMAP_EVICTION_GRACE,
+)
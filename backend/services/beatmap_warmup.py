@@ -0,0 +1,225 @@
+"""
+Background warm-up of mappool beatmaps.
+
+When staff add or edit a mappool map, a warm-up job resolves its
+beatmapset, downloads it through the scheduler's staff class and builds
+every derived artifact, so the first visitor to open the preview finds it
+ready. A startup pass warms every map in visible pools. The state of each
+map's job is kept in memory for ``/mappools/sync/status``.
+"""
+import asyncio
+import logging
+import time
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from config import Config
+from models.mappool import Mappool, MappoolMap
+from services.beatmap_downloader import BeatmapDownloader, beatmap_downloader
+from services.beatmap_storage import load_pinned_beatmapsets
+from services.download_scheduler import STAFF
+from services.osu_api import osu_api
+from services.workers import workers
+from utils.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Job states, in the order a successful job goes through them
+PENDING = "pending"
+RESOLVING = "resolving"
+DOWNLOADING = "downloading"
+PARSING = "parsing"
+READY = "ready"
+ERROR = "error"
+
+ACTIVE_STATES = (PENDING, RESOLVING, DOWNLOADING, PARSING)
+
+
+class WarmupService:
+    """
+    Runs warm-up jobs for mappool maps.
+
+    Args:
+        downloader: Downloader used to fetch and parse sets.
+        session_factory: Creates DB sessions for background work. Defaults
+            to the application's ``SessionLocal``.
+        concurrency: Jobs running at once (downloads are further limited
+            by the scheduler).
+        enabled: When False, :meth:`enqueue` is a no-op.
+        clock: Wall clock, injectable for tests.
+
+    Example:
+        >>> warmup_service.enqueue("4243262", beatmapset_id="2053359")
+        >>> warmup_service.get_state("4243262")["state"]
+        'pending'
+    """
+
+    def __init__(
+        self,
+        downloader: BeatmapDownloader | None = None,
+        session_factory: sessionmaker | None = None,
+        concurrency: int = 2,
+        enabled: bool = True,
+        clock=time.time,
+    ):
+        self.downloader = downloader or beatmap_downloader
+        self.session_factory = session_factory or SessionLocal
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self.clock = clock
+        self._states: dict[str, dict] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    # --- State ---
+
+    def _set_state(self, beatmap_id: str, state: str, **fields) -> None:
+        entry = self._states.setdefault(beatmap_id, {})
+        entry.update(fields)
+        entry["state"] = state
+        entry["updated_at"] = self.clock()
+        if state != ERROR:
+            entry.pop("error", None)
+
+    def get_state(self, beatmap_id: str) -> dict | None:
+        """Warm-up state of a map, or None if it was never warmed."""
+        entry = self._states.get(str(beatmap_id))
+        return dict(entry) if entry else None
+
+    def stats(self) -> dict:
+        """Number of maps in each state."""
+        counts: dict[str, int] = {}
+        for entry in self._states.values():
+            counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+        return {"enabled": self.enabled, "running": len(self._tasks), "states": counts}
+
+    # --- Jobs ---
+
+    def enqueue(self, beatmap_id: str, beatmapset_id: str | None = None) -> bool:
+        """
+        Start a warm-up job for a map in the background.
+
+        Must be called from a running event loop (e.g. a request handler).
+
+        Args:
+            beatmap_id: The osu! beatmap ID.
+            beatmapset_id: The set ID if known; otherwise resolved via the osu! API.
+
+        Returns:
+            True if a job was started, False if disabled or already running.
+        """
+        beatmap_id = str(beatmap_id)
+        if not self.enabled:
+            return False
+        current = self._states.get(beatmap_id)
+        if current and current["state"] in ACTIVE_STATES:
+            return False
+
+        self._set_state(beatmap_id, PENDING, beatmapset_id=beatmapset_id)
+        task = asyncio.create_task(self._run(beatmap_id, beatmapset_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, beatmap_id: str, beatmapset_id: str | None) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                await self.warm(beatmap_id, beatmapset_id)
+            except Exception as e:
+                logger.exception(f"[WARMUP] Map {beatmap_id} failed")
+                self._set_state(beatmap_id, ERROR, error=str(e))
+
+    async def warm(self, beatmap_id: str, beatmapset_id: str | None = None) -> dict:
+        """
+        Resolve, download and parse one map, recording its state as it goes.
+
+        Returns:
+            The final state entry.
+        """
+        beatmap_id = str(beatmap_id)
+        if not beatmapset_id:
+            self._set_state(beatmap_id, RESOLVING)
+            beatmap_data = await osu_api.get_beatmap(int(beatmap_id))
+            if not beatmap_data or not beatmap_data.get("beatmapset_id"):
+                self._set_state(beatmap_id, ERROR, error="Beatmap not found on osu!")
+                return self.get_state(beatmap_id)
+            beatmapset_id = str(beatmap_data["beatmapset_id"])
+            await workers.run_io(self._save_beatmapset_id, beatmap_id, beatmapset_id)
+
+        self._set_state(beatmap_id, DOWNLOADING, beatmapset_id=beatmapset_id)
+        result = await self.downloader.download(beatmapset_id, priority=STAFF)
+        if result["status"] not in ("downloaded", "exists"):
+            self._set_state(beatmap_id, ERROR, error=result.get("error", result["status"]))
+            return self.get_state(beatmap_id)
+
+        self._set_state(beatmap_id, PARSING)
+        artifacts = await workers.run_cpu(self.downloader.build_artifacts, beatmapset_id)
+        if artifacts["status"] != "success":
+            self._set_state(beatmap_id, ERROR, error=artifacts.get("error", "No playable difficulties"))
+        else:
+            self._set_state(
+                beatmap_id, READY,
+                generation=artifacts["generation"],
+                difficulties=artifacts["difficulties"],
+            )
+        return self.get_state(beatmap_id)
+
+    def _save_beatmapset_id(self, beatmap_id: str, beatmapset_id: str) -> None:
+        """Store a resolved beatmapset ID on every map row for the beatmap."""
+        db: Session = self.session_factory()
+        try:
+            db.query(MappoolMap).filter(
+                MappoolMap.beatmap_id == beatmap_id,
+                MappoolMap.beatmapset_id.is_(None),
+            ).update({MappoolMap.beatmapset_id: beatmapset_id}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    # --- Startup ---
+
+    def _visible_maps(self) -> list[tuple[str, str | None]]:
+        """Beatmap and set IDs of every map in visible pools; refreshes storage pins."""
+        db: Session = self.session_factory()
+        try:
+            self.downloader.storage.set_pins(load_pinned_beatmapsets(db))
+            rows = (
+                db.query(MappoolMap.beatmap_id, MappoolMap.beatmapset_id)
+                .join(Mappool, Mappool.id == MappoolMap.mappool_id)
+                .filter(Mappool.is_visible.is_(True))
+                .all()
+            )
+            return [(str(beatmap_id), beatmapset_id) for beatmap_id, beatmapset_id in rows]
+        finally:
+            db.close()
+
+    async def warm_visible_pools(self) -> int:
+        """
+        Enqueue a warm-up job for every map in visible pools.
+
+        Returns:
+            Number of jobs started.
+        """
+        try:
+            maps = await workers.run_io(self._visible_maps)
+        except Exception:
+            logger.exception("[WARMUP] Could not load visible mappools")
+            return 0
+        started = sum(self.enqueue(beatmap_id, beatmapset_id) for beatmap_id, beatmapset_id in maps)
+        logger.info(f"[WARMUP] Startup pass queued {started} maps")
+        return started
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# Singleton instance
+warmup_service = WarmupService(
+    concurrency=Config.BEATMAP_WARMUP_CONCURRENCY,
+    enabled=Config.BEATMAP_WARMUP,
+)
@@ -0,0 +1,207 @@
+"""
+Content-addressed store for extracted beatmap files.
+
+Many beatmapsets share identical files: hitsound samples, skin elements,
+and whole audio tracks in remaps and re-uploads. After extraction every
+member is hashed (SHA-256) into ``{storage}/.blobs/{ab}/{digest}`` and the
+set's file is replaced with a hard link to that blob, so identical content
+is stored once however many sets contain it.
+
+Hard links keep the rest of the system unchanged: sets are still plain
+directories served byte for byte, and deleting a set (eviction, forced
+re-download) just drops its links. A blob whose link count has fallen to 1
+is referenced by no set, and :meth:`BlobStore.collect` removes it.
+
+All writers in the store replace files (temp file + rename) rather than
+writing into them, which is what makes sharing inodes between sets safe.
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = ".blobs"
+
+
+def file_digest(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Hard-link based deduplication of set files.
+
+    Args:
+        root: Blob directory (normally ``{storage}/.blobs``).
+
+    Example:
+        >>> blobs = BlobStore(Path("./beatmaps") / BLOB_DIR)
+        >>> blobs.add_files(stage_path, ["audio.mp3", "sb/star.png"])
+        {'audio.mp3': '9f86d0...', 'sb/star.png': '60303a...'}
+        >>> blobs.collect()
+        {'removed': 0, 'freed_bytes': 0}
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self.linked = 0
+        self.saved_bytes = 0
+        self.unsupported = 0
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def add(self, path: Path) -> str | None:
+        """
+        Move a file's content into the store and link the file to it.
+
+        If the content is new, the file itself becomes the blob (one extra
+        link, no copy). If a blob with the same content exists, the file is
+        replaced with a link to it.
+
+        Returns:
+            The content digest, or None if the filesystem does not support
+            hard links (the file is left as is).
+        """
+        digest = file_digest(path)
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        for _ in range(3):
+            try:
+                os.link(path, blob)
+                return digest
+            except FileExistsError:
+                pass
+            except OSError as e:
+                with self._lock:
+                    self.unsupported += 1
+                logger.warning(f"[BLOBS] Cannot link {path}: {e}")
+                return None
+
+            if os.path.samefile(path, blob):
+                return digest
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.link")
+            try:
+                os.link(blob, tmp_path)
+            except FileNotFoundError:
+                continue  # Collected in between; adopt this file as the blob instead
+            size = path.stat().st_size
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.linked += 1
+                self.saved_bytes += size
+            return digest
+        return None
+
+    def add_files(self, root: Path, names: list[str]) -> dict[str, str]:
+        """
+        Deduplicate the files ``names`` below ``root``.
+
+        Returns:
+            ``{name: digest}`` for every file now linked to a blob.
+        """
+        digests = {}
+        for name in names:
+            path = root / name
+            try:
+                digest = self.add(path)
+            except OSError as e:
+                logger.warning(f"[BLOBS] Cannot add {path}: {e}")
+                continue
+            if digest is not None:
+                digests[name] = digest
+        return digests
+
+    def _iter_blobs(self):
+        """Paths of all blobs."""
+        if not self.root.is_dir():
+            return
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield entry.path
+
+    def collect(self, digests=None) -> dict:
+        """
+        Remove blobs no set links to any more.
+
+        Args:
+            digests: Only check these blobs (e.g. those of a set that was
+                just replaced) instead of walking the whole store.
+
+        Returns:
+            Number of removed blobs and bytes freed.
+        """
+        removed = 0
+        freed = 0
+        paths = self._iter_blobs() if digests is None else (self.blob_path(d) for d in set(digests))
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                if stat.st_nlink > 1:
+                    continue
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        if removed:
+            logger.info(f"[BLOBS] Collected {removed} unreferenced blobs ({freed} bytes)")
+        return {"removed": removed, "freed_bytes": freed}
+
+    def stats(self) -> dict:
+        """
+        Deduplication figures for the whole store.
+
+        ``logical_bytes`` is what the sets would take without sharing,
+        ``stored_bytes`` what their blobs take; ``dedup_ratio`` is the
+        quotient of the two.
+        """
+        blobs = 0
+        stored = 0
+        logical = 0
+        shared = 0
+        unreferenced = 0
+        for path in self._iter_blobs():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            references = stat.st_nlink - 1
+            if references <= 0:
+                unreferenced += 1
+                continue
+            blobs += 1
+            stored += stat.st_size
+            logical += stat.st_size * references
+            if references > 1:
+                shared += 1
+        return {
+            "blobs": blobs,
+            "shared_blobs": shared,
+            "unreferenced_blobs": unreferenced,
+            "stored_bytes": stored,
+            "logical_bytes": logical,
+            "saved_bytes": logical - stored,
+            "dedup_ratio": round(logical / stored, 3) if stored else 1.0,
+            "linked_since_start": self.linked,
+            "saved_since_start": self.saved_bytes,
+            "link_failures": self.unsupported,
+        }
+
+
+# Singleton instance
+blob_store = BlobStore(Path(getattr(Config, 'BEATMAP_STORAGE_PATH', None) or './beatmaps') / BLOB_DIR)
@@ -0,0 +1,152 @@
+"""
+Whole-tournament bracket graph.
+
+Builds the payload of ``GET /brackets/graph``: every bracket (winner,
+loser, grand finals) with all its matches, their players and their
+``next_match_id`` / ``loser_next_match_id`` edges, from two set-based
+queries (brackets, then matches joined to their three users).
+
+Each match also carries the layout ``BracketTree`` used to compute in the
+browser: ``round`` is its depth in the bracket (0 for matches nothing in
+the same bracket feeds into, otherwise one more than its deepest feeder),
+which is the column it is drawn in, and ``position`` is its row within
+that round, ordered by match ID.
+"""
+from typing import TypedDict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from models.bracket import Bracket
+from models.match import Match
+
+
+class RoundLayout(TypedDict):
+    """One column of a bracket."""
+    round: int
+    name: str
+    match_ids: list[int]
+
+
+def match_query():
+    """Select matches with their players and winner joined in (no per-match lookups)."""
+    return select(Match).options(
+        joinedload(Match.player1),
+        joinedload(Match.player2),
+        joinedload(Match.winner),
+    ).order_by(Match.id)
+
+
+def serialize_match(match: Match) -> dict:
+    """Match fields shown in the bracket views; player relationships must be loaded."""
+    player1 = match.player1
+    player2 = match.player2
+    return {
+        "id": match.id,
+        "bracket_id": match.bracket_id,
+        "player1_id": match.player1_id,
+        "player1_username": player1.username if player1 else "TBD",
+        "player1_osu_id": player1.osu_id if player1 else None,
+        "player1_seed": player1.seed_number if player1 else None,
+        "player2_id": match.player2_id,
+        "player2_username": player2.username if player2 else "TBD",
+        "player2_osu_id": player2.osu_id if player2 else None,
+        "player2_seed": player2.seed_number if player2 else None,
+        "player1_score": match.player1_score,
+        "player2_score": match.player2_score,
+        "winner_id": match.winner_id,
+        "winner_username": match.winner.username if match.winner else None,
+        "match_status": match.match_status,
+        "is_completed": match.is_completed,
+        "scheduled_time": match.scheduled_time,
+        "round_name": match.round_name,
+        "next_match_id": match.next_match_id,
+        "loser_next_match_id": match.loser_next_match_id,
+        "is_grandfinals_reset": match.is_grandfinals_reset,
+    }
+
+
+def layout_rounds(matches: list[dict]) -> list[RoundLayout]:
+    """
+    Assign ``round`` and ``position`` to the serialized matches of one bracket.
+
+    Only ``next_match_id`` edges inside the bracket count: losers dropping
+    in from the winner bracket do not push a loser-bracket match right.
+
+    Args:
+        matches: Serialized matches of a single bracket, updated in place.
+
+    Returns:
+        The rounds in column order, named after their first match.
+    """
+    by_id = {m["id"]: m for m in matches}
+    feeders: dict[int, list[int]] = {m["id"]: [] for m in matches}
+    for m in matches:
+        if m["next_match_id"] in by_id:
+            feeders[m["next_match_id"]].append(m["id"])
+
+    depth: dict[int, int] = {}
+    for m in matches:
+        # Iterative DFS: a 256-player loser bracket is deeper than is safe to recurse
+        stack = [m["id"]]
+        while stack:
+            match_id = stack[-1]
+            if match_id in depth:
+                stack.pop()
+                continue
+            pending = [f for f in feeders[match_id] if f not in depth and f not in stack]
+            if pending:
+                stack.extend(pending)
+                continue
+            depth[match_id] = max((depth.get(f, 0) + 1 for f in feeders[match_id]), default=0)
+            stack.pop()
+
+    rounds: list[RoundLayout] = []
+    for m in sorted(matches, key=lambda m: (depth[m["id"]], m["id"])):
+        index = depth[m["id"]]
+        while len(rounds) <= index:
+            rounds.append({"round": len(rounds), "name": "", "match_ids": []})
+        column = rounds[index]
+        if not column["match_ids"]:
+            column["name"] = m["round_name"] or f"Round {index + 1}"
+        m["round"] = index
+        m["position"] = len(column["match_ids"])
+        column["match_ids"].append(m["id"])
+    return rounds
+
+
+def build_graph(brackets: list[Bracket], matches: list[Match]) -> dict:
+    """
+    Assemble the tournament graph from loaded brackets and matches.
+
+    Returns:
+        ``{"brackets": [...], "total_matches": n}``; each bracket has its
+        ``rounds`` and its ``matches`` (serialized, with layout).
+    """
+    grouped: dict[int, list[dict]] = {bracket.id: [] for bracket in brackets}
+    for match in matches:
+        if match.bracket_id in grouped:
+            grouped[match.bracket_id].append(serialize_match(match))
+
+    result = []
+    for bracket in brackets:
+        bracket_matches = grouped[bracket.id]
+        result.append({
+            "id": bracket.id,
+            "name": bracket.bracket_name,
+            "size": bracket.bracket_size,
+            "type": bracket.bracket_type,
+            "order": bracket.bracket_order,
+            "is_completed": bracket.is_completed,
+            "rounds": layout_rounds(bracket_matches),
+            "matches": bracket_matches,
+        })
+    return {"brackets": result, "total_matches": sum(len(b["matches"]) for b in result)}
+
+
+async def load_graph(db: AsyncSession) -> dict:
+    """Load and assemble the whole tournament graph in two queries."""
+    brackets = (await db.scalars(select(Bracket).order_by(Bracket.bracket_order))).all()
+    matches = (await db.scalars(match_query())).all()
+    return build_graph(list(brackets), list(matches))
@@ -0,0 +1,192 @@
+"""
+Versioned bracket read model.
+
+Keeps the last built tournament graph (see :mod:`services.bracket_graph`)
+in memory with a version number, so bracket polls are answered without
+touching the database while nothing changes.
+
+Invalidation is driven by ORM session events, so every writer is covered
+(match updates, progression, generation, seeding, staff tools) without
+each handler having to remember it:
+
+- a flush that inserts, updates or deletes a ``Match`` or ``Bracket``, or
+  changes a user's name, osu! ID or seed, marks the session;
+- an ORM bulk ``INSERT``/``UPDATE``/``DELETE`` on those tables marks it too;
+- when a marked session commits, the model is invalidated (a rollback
+  clears the mark).
+
+The next read rebuilds the graph (two queries). The version is bumped only
+if the result actually differs, and every match records the version at
+which it last changed, so a client that sends the version it has gets
+``None`` (nothing new), only the changed matches, or the full graph when
+brackets or the layout changed.
+
+Versions start from the process start time in milliseconds, so a client
+holding a version from before a restart never sees a newer-looking one
+that means something else. The model lives in the process: it assumes the
+single uvicorn worker the backend runs with.
+"""
+import json
+import logging
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models.bracket import Bracket
+from models.match import Match
+from models.user import User
+from services.bracket_graph import load_graph
+
+logger = logging.getLogger(__name__)
+
+# User columns shown in the bracket graph
+USER_FIELDS = ("username", "osu_id", "seed_number")
+
+SESSION_FLAG = "bracket_read_model_changed"
+
+
+class BracketReadModel:
+    """
+    In-memory tournament graph with change-based reads.
+
+    Args:
+        clock: Wall clock in seconds; the first version is derived from it.
+
+    Example:
+        >>> graph = await bracket_read_model.get(db)
+        >>> graph["version"]
+        1760000000001
+        >>> await bracket_read_model.changes_since(db, graph["version"]) is None
+        True
+    """
+
+    def __init__(self, clock=time.time):
+        self.version = int(clock() * 1000)
+        self.structure_version = self.version + 1
+        self.graph: dict | None = None
+        self._structure: str | None = None
+        self._matches: dict[int, dict] = {}
+        self._match_versions: dict[int, int] = {}
+        # Bumped by every committed bracket change; other caches of bracket data key on it
+        self.generation = 0
+        self._built_generation = -1
+        self.builds = 0
+
+    def invalidate(self) -> None:
+        """Mark the snapshot stale; the next read rebuilds it."""
+        self.generation += 1
+
+    @property
+    def is_stale(self) -> bool:
+        return self._built_generation != self.generation
+
+    async def get(self, db: AsyncSession) -> dict:
+        """
+        Current graph, rebuilding it first if it is stale.
+
+        Returns:
+            The graph from :func:`~services.bracket_graph.load_graph` plus
+            its ``version``. Callers must not modify it.
+        """
+        if self.is_stale:
+            generation = self.generation
+            graph = await load_graph(db)
+            self._apply(graph, generation)
+        return self.graph
+
+    async def changes_since(self, db: AsyncSession, since_version: int) -> dict | None:
+        """
+        What a client holding ``since_version`` is missing.
+
+        Returns:
+            None if it is up to date; ``{"version", "since_version",
+            "partial": True, "matches": [...]}`` with the changed matches if
+            only matches changed since then; otherwise the full graph.
+        """
+        graph = await self.get(db)
+        if since_version == self.version:
+            return None
+        if since_version > self.version or since_version < self.structure_version:
+            return graph
+        return {
+            "version": self.version,
+            "since_version": since_version,
+            "partial": True,
+            "matches": [
+                match for match_id, match in self._matches.items()
+                if self._match_versions[match_id] > since_version
+            ],
+        }
+
+    def _apply(self, graph: dict, generation: int) -> None:
+        """Install a freshly built graph, versioning what changed (runs without awaiting)."""
+        if generation <= self._built_generation:
+            return  # A concurrent rebuild that started later already won
+        self._built_generation = generation
+        self.builds += 1
+
+        structure = json.dumps(
+            [{key: value for key, value in bracket.items() if key != "matches"} for bracket in graph["brackets"]],
+            default=str,
+        )
+        matches = {match["id"]: match for bracket in graph["brackets"] for match in bracket["matches"]}
+        changed = [match_id for match_id, match in matches.items() if self._matches.get(match_id) != match]
+        if self.graph is not None and structure == self._structure and not changed and matches.keys() == self._matches.keys():
+            return
+
+        version = self.version + 1
+        if structure != self._structure or matches.keys() != self._matches.keys():
+            self.structure_version = version
+        for match_id in changed:
+            self._match_versions[match_id] = version
+        self._match_versions = {match_id: self._match_versions[match_id] for match_id in matches}
+        self._matches = matches
+        self._structure = structure
+        self.version = version
+        self.graph = {**graph, "version": version}
+        logger.info(f"[BRACKETS] Read model at version {version} ({len(changed)} matches changed)")
+
+
+def _touches_brackets(session: Session) -> bool:
+    """Whether the pending flush changes anything shown in the bracket graph."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Match, Bracket)):
+            return True
+        if isinstance(obj, User):
+            if obj in session.new or obj in session.deleted:
+                return True
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in USER_FIELDS):
+                return True
+    return False
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_flush(session, flush_context, instances):
+    if _touches_brackets(session):
+        session.info[SESSION_FLAG] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if any(mapper.class_ in (Match, Bracket, User) for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info[SESSION_FLAG] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop(SESSION_FLAG, False):
+        bracket_read_model.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop(SESSION_FLAG, None)
+
+
+# Singleton instance
+bracket_read_model = BracketReadModel()
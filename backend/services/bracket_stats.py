@@ -0,0 +1,146 @@
+"""
+Bracket statistics from a single grouped query.
+
+Counts matches per bracket, per round and per status with one
+``GROUP BY`` over brackets outer-joined to their matches, so brackets
+without matches still appear. ``GET /brackets``, ``GET /tournament/status``
+and ``GET /internal/admin/tournament-state`` all read from here.
+
+The result is cached until the next committed bracket change, using the
+change counter of :mod:`services.bracket_read_model` (its session hooks
+see every match and bracket write).
+"""
+from typing import TypedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.bracket import Bracket
+from models.match import Match
+from services.bracket_read_model import bracket_read_model
+
+
+class MatchCounts(TypedDict):
+    """Counts for a set of matches."""
+    total_matches: int
+    completed_matches: int
+    in_progress_matches: int
+    by_status: dict[str, int]
+
+
+def empty_counts() -> MatchCounts:
+    return {"total_matches": 0, "completed_matches": 0, "in_progress_matches": 0, "by_status": {}}
+
+
+def add_counts(counts: MatchCounts, status: str, is_completed: bool, count: int) -> None:
+    counts["total_matches"] += count
+    if is_completed:
+        counts["completed_matches"] += count
+    if status == "in_progress":
+        counts["in_progress_matches"] += count
+    counts["by_status"][status] = counts["by_status"].get(status, 0) + count
+
+
+def stats_query():
+    """One row per (bracket, round, status, completed) with its match count."""
+    return (
+        select(
+            Bracket.id,
+            Bracket.bracket_name,
+            Bracket.bracket_type,
+            Bracket.bracket_size,
+            Bracket.bracket_order,
+            Bracket.is_completed,
+            Match.round_name,
+            Match.match_status,
+            Match.is_completed,
+            func.count(Match.id),
+        )
+        .outerjoin(Match, Match.bracket_id == Bracket.id)
+        .group_by(
+            Bracket.id,
+            Bracket.bracket_name,
+            Bracket.bracket_type,
+            Bracket.bracket_size,
+            Bracket.bracket_order,
+            Bracket.is_completed,
+            Match.round_name,
+            Match.match_status,
+            Match.is_completed,
+        )
+        .order_by(Bracket.bracket_order, func.min(Match.id))
+    )
+
+
+def build_stats(rows) -> dict:
+    """
+    Fold grouped rows into per-bracket, per-round and tournament totals.
+
+    Returns:
+        ``{"brackets": [...], **totals}``; each bracket has its counts and
+        ``rounds`` (in order of their first match).
+    """
+    brackets: dict[int, dict] = {}
+    totals = empty_counts()
+    for bracket_id, name, bracket_type, size, order, bracket_completed, round_name, status, is_completed, count in rows:
+        bracket = brackets.get(bracket_id)
+        if bracket is None:
+            bracket = brackets[bracket_id] = {
+                "id": bracket_id,
+                "bracket_size": size,
+                "bracket_name": name,
+                "bracket_type": bracket_type,
+                "bracket_order": order,
+                "is_completed": bracket_completed,
+                **empty_counts(),
+                "rounds": {},
+            }
+        if not count:
+            continue  # Bracket without matches
+        rounds = bracket["rounds"]
+        if round_name not in rounds:
+            rounds[round_name] = {"round_name": round_name, **empty_counts()}
+        for counts in (bracket, rounds[round_name], totals):
+            add_counts(counts, status, is_completed, count)
+
+    result = []
+    for bracket in brackets.values():
+        bracket["rounds"] = list(bracket["rounds"].values())
+        result.append(bracket)
+    return {"brackets": result, **totals}
+
+
+def find_bracket(stats: dict, bracket_id: int) -> dict | None:
+    """Statistics of one bracket, or None if it does not exist."""
+    return next((b for b in stats["brackets"] if b["id"] == bracket_id), None)
+
+
+class BracketStats:
+    """
+    Cached bracket statistics.
+
+    Example:
+        >>> stats = await bracket_stats.get(db)
+        >>> stats["brackets"][0]["completed_matches"], stats["in_progress_matches"]
+        (3, 1)
+    """
+
+    def __init__(self):
+        self._stats: dict | None = None
+        self._generation = -1
+        self.queries = 0
+
+    async def get(self, db: AsyncSession) -> dict:
+        """Statistics as of the last committed bracket change. Callers must not modify them."""
+        generation = bracket_read_model.generation
+        if self._stats is None or self._generation != generation:
+            rows = (await db.execute(stats_query())).all()
+            self.queries += 1
+            # Keyed on the counter read before querying: a change committed meanwhile forces a re-query
+            self._stats = build_stats(rows)
+            self._generation = generation
+        return self._stats
+
+
+# Singleton instance
+bracket_stats = BracketStats()
@@ -0,0 +1,370 @@
+"""
+Double elimination bracket topology.
+
+:func:`build_double_elimination` lays out the whole tournament (winner
+bracket, loser bracket, grand finals) in memory, for any field that fits
+a power-of-two bracket up to :data:`MAX_BRACKET_SIZE`. Empty seed slots
+are byes:
+
+1. The full skeleton for ``bracket_size`` slots is built, each match
+   knowing where its two players come from (a seed, or the winner or
+   loser of another match).
+2. Matches are resolved in play order. A match that can receive only one
+   player is a walkover and is dropped: whoever would reach it goes
+   straight to where its winner would have gone. A match that can
+   receive none is dropped as well (its winner and loser are empty).
+3. Every remaining match is real. Links are local indices into the
+   returned list, and byed seeds sit directly in their first real match.
+
+:func:`save_topology` writes the result in one transaction: a bulk
+``INSERT ... RETURNING`` for the brackets and one for the matches, then
+a single executemany ``UPDATE`` that maps the local indices to the
+returned IDs. It replaces dozens of commits, one per round, which were
+only there to obtain IDs. PostgreSQL batches the ordered ``RETURNING``
+inserts; SQLite cannot guarantee their order, so SQLAlchemy sends its rows
+one by one, still inside the single transaction.
+
+Seeds are placed in standard bracket order (:func:`standard_seed_order`),
+so the top two seeds can only meet in the final, the top four only from
+the semifinals on, and so on; byes go to the top seeds. How winner-bracket
+losers enter the loser bracket is a crossover pattern
+(:data:`CROSSOVER_PATTERNS`), chosen to keep players from meeting someone
+they already played. Every step is linear in the bracket size, so staff
+can preview alternative seedings before generating.
+"""
+import math
+from typing import TypedDict
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.bracket import Bracket
+from models.map import Map
+from models.match import Match
+
+MIN_BRACKET_SIZE = 4
+MAX_BRACKET_SIZE = 256
+SUPPORTED_SIZES = tuple(2 ** k for k in range(2, int(math.log2(MAX_BRACKET_SIZE)) + 1))
+
+BRACKET_TYPES = ("winner", "loser", "grandfinals")
+
+
+class PlannedMatch(TypedDict):
+    """A match of a built topology; links are indices into ``Topology["matches"]``."""
+    bracket_type: str
+    round_name: str
+    player1_id: int | None
+    player2_id: int | None
+    next_index: int | None
+    loser_next_index: int | None
+
+
+class Topology(TypedDict):
+    """A built double elimination tournament."""
+    bracket_size: int
+    players: int
+    byes: int
+    matches: list[PlannedMatch]
+
+
+def smallest_bracket(players: int) -> int:
+    """Smallest supported bracket size that fits ``players``."""
+    return max(MIN_BRACKET_SIZE, 1 << max(players - 1, 1).bit_length())
+
+
+def winner_round_name(round_index: int, matches_in_round: int, bracket_size: int) -> str:
+    if round_index == 0:
+        return f"Round of {bracket_size}"
+    if matches_in_round == 1:
+        return "Winner Finals"
+    if matches_in_round == 2:
+        return "Winner Semifinals"
+    if matches_in_round == 4:
+        return "Winner Quarterfinals"
+    return f"Winner Round {round_index + 1}"
+
+
+def loser_round_name(round_index: int, num_rounds: int) -> str:
+    if round_index == num_rounds - 1:
+        return "Loser Finals"
+    if round_index == num_rounds - 2:
+        return "Loser Semifinals"
+    return f"Loser Round {round_index + 1}"
+
+
+def standard_seed_order(bracket_size: int) -> list[int]:
+    """
+    Seed indices (0-based) in bracket slot order.
+
+    Built by doubling: each seed ``s`` of the bracket of half the size is
+    paired with ``size - 1 - s``, so the pairs always add up to the same
+    total and every half holds one of the two best remaining seeds. The
+    doublings add up to under ``2 * bracket_size`` steps.
+
+    Example:
+        >>> [seed + 1 for seed in standard_seed_order(8)]
+        [1, 8, 4, 5, 2, 7, 3, 6]
+    """
+    order = [0]
+    while len(order) < bracket_size:
+        size = len(order) * 2
+        order = [seed for top in order for seed in (top, size - 1 - top)]
+    return order
+
+
+def seeded_matchups(bracket_size: int) -> list[tuple[int, int]]:
+    """First-round seed index pairs, in bracket order: ``(0, N-1), (N/2-1, N/2), ...``."""
+    order = standard_seed_order(bracket_size)
+    return list(zip(order[::2], order[1::2]))
+
+
+# Where the j-th of n matches of a dropping winner round sends its loser
+DROP_ORDERS = {
+    "straight": lambda j, n: j,
+    "reverse": lambda j, n: n - 1 - j,
+    "half_swap": lambda j, n: (j + n // 2) % n,
+    "reverse_half_swap": lambda j, n: n - 1 - (j + n // 2) % n,
+}
+
+# How first-round losers pair up in loser round 1
+FIRST_ROUND_ORDERS = {
+    # Neighbouring matches: losers of matches 2k and 2k+1 meet
+    "adjacent": lambda j, n: j // 2,
+    # Fold: match 2k meets the mirror of match 2k+1 from the other end
+    "fold": lambda j, n: (n - 1 - j if j % 2 else j) // 2,
+}
+
+
+class CrossoverPattern(TypedDict):
+    """Loser-bracket entry order: first round pairing, then drop orders by drop round (cycled)."""
+    first_round: str
+    drops: tuple[str, ...]
+
+
+CROSSOVER_PATTERNS: dict[str, CrossoverPattern] = {
+    # Rotating drop orders: no rematch can happen in the first half of the loser rounds
+    "standard": {"first_round": "adjacent", "drops": ("reverse", "half_swap", "reverse_half_swap")},
+    # Reversed drops only; rematches become possible from loser round 4
+    "simple": {"first_round": "adjacent", "drops": ("reverse",)},
+    # The layout of the original generator (folded first round, reversed drops)
+    "classic": {"first_round": "fold", "drops": ("reverse",)},
+}
+DEFAULT_CROSSOVER = "standard"
+
+
+def _skeleton(bracket_size: int, crossover: CrossoverPattern) -> tuple[list[dict], list[list]]:
+    """
+    Every match of a full bracket with its slot sources, in play order.
+
+    Sources are ``("seed", index)``, ``("winner", match)`` or
+    ``("loser", match)``, where ``match`` indexes the returned list.
+    """
+    matches: list[dict] = []
+    sources: list[list] = []
+
+    def add(bracket_type: str, round_name: str) -> int:
+        matches.append({"bracket_type": bracket_type, "round_name": round_name})
+        sources.append([])
+        return len(matches) - 1
+
+    num_winner_rounds = int(math.log2(bracket_size))
+    winner_rounds: list[list[int]] = []
+    for round_index in range(num_winner_rounds):
+        count = bracket_size >> (round_index + 1)
+        name = winner_round_name(round_index, count, bracket_size)
+        winner_rounds.append([add("winner", name) for _ in range(count)])
+    for match, (seed1, seed2) in zip(winner_rounds[0], seeded_matchups(bracket_size)):
+        sources[match] += [("seed", seed1), ("seed", seed2)]
+    for previous, current in zip(winner_rounds, winner_rounds[1:]):
+        for i, match in enumerate(previous):
+            sources[current[i // 2]].append(("winner", match))
+
+    num_loser_rounds = 2 * (num_winner_rounds - 1)
+    loser_rounds: list[list[int]] = []
+    for round_index in range(num_loser_rounds):
+        count = max(bracket_size >> (round_index // 2 + 2), 1)
+        name = loser_round_name(round_index, num_loser_rounds)
+        loser_rounds.append([add("loser", name) for _ in range(count)])
+    for round_index, current in enumerate(loser_rounds):
+        if round_index:
+            previous = loser_rounds[round_index - 1]
+            ratio = len(previous) // len(current)
+            for i, match in enumerate(previous):
+                sources[current[i // ratio]].append(("winner", match))
+        if round_index == 0:
+            first = winner_rounds[0]
+            position = FIRST_ROUND_ORDERS[crossover["first_round"]]
+            for j, match in enumerate(first):
+                sources[current[position(j, len(first))]].append(("loser", match))
+        elif round_index % 2:
+            # Losers of winner round k drop into loser round 2k
+            drop_round = (round_index + 1) // 2
+            dropping = winner_rounds[drop_round]
+            drops = crossover["drops"]
+            position = DROP_ORDERS[drops[(drop_round - 1) % len(drops)]]
+            for j, match in enumerate(dropping):
+                sources[current[position(j, len(dropping))]].append(("loser", match))
+
+    grand_finals = add("grandfinals", "Grand Finals")
+    sources[grand_finals].append(("winner", winner_rounds[-1][0]))
+    if loser_rounds:
+        sources[grand_finals].append(("winner", loser_rounds[-1][0]))
+    else:
+        sources[grand_finals].append(("loser", winner_rounds[-1][0]))
+    return matches, sources
+
+
+def build_double_elimination(
+    player_ids: list[int],
+    bracket_size: int | None = None,
+    crossover: str = DEFAULT_CROSSOVER,
+) -> Topology:
+    """
+    Build a double elimination tournament for ``player_ids``.
+
+    Args:
+        player_ids: Players ordered by seed, best first.
+        bracket_size: Slots in the winner bracket (a power of two); defaults
+            to the smallest that fits. Players beyond it are left out.
+        crossover: Name of the loser-bracket pattern in :data:`CROSSOVER_PATTERNS`.
+
+    Returns:
+        The real matches in play order (winner rounds, loser rounds, grand
+        finals) with links and byed seeds placed.
+
+    Raises:
+        ValueError: Fewer than two players, an unsupported size or an
+            unknown crossover pattern.
+    """
+    if bracket_size is None:
+        bracket_size = smallest_bracket(len(player_ids))
+    if bracket_size not in SUPPORTED_SIZES:
+        raise ValueError(f"Bracket size must be one of {', '.join(map(str, SUPPORTED_SIZES))}")
+    if crossover not in CROSSOVER_PATTERNS:
+        raise ValueError(f"Crossover must be one of {', '.join(CROSSOVER_PATTERNS)}")
+    player_ids = list(player_ids[:bracket_size])
+    if len(player_ids) < 2:
+        raise ValueError("At least 2 players are needed")
+
+    skeleton, sources = _skeleton(bracket_size, CROSSOVER_PATTERNS[crossover])
+    # What each skeleton match passes on: None (nobody), ("seed", player_id),
+    # or ("winner" | "loser", real match)
+    winner_out: list = [None] * len(skeleton)
+    loser_out: list = [None] * len(skeleton)
+    real: list[int] = []
+    resolved: dict[int, list] = {}
+    for match, slot_sources in enumerate(sources):
+        slots = []
+        for kind, ref in slot_sources:
+            if kind == "seed":
+                slots.append(("seed", player_ids[ref]) if ref < len(player_ids) else None)
+            else:
+                slots.append(winner_out[ref] if kind == "winner" else loser_out[ref])
+        arriving = [slot for slot in slots if slot is not None]
+        if len(arriving) == 2:
+            real.append(match)
+            resolved[match] = arriving
+            winner_out[match] = ("winner", match)
+            loser_out[match] = ("loser", match)
+        elif arriving:
+            winner_out[match] = arriving[0]  # Walkover: the only player goes on
+
+    index_of = {match: index for index, match in enumerate(real)}
+    planned: list[PlannedMatch] = [
+        {
+            "bracket_type": skeleton[match]["bracket_type"],
+            "round_name": skeleton[match]["round_name"],
+            "player1_id": None,
+            "player2_id": None,
+            "next_index": None,
+            "loser_next_index": None,
+        }
+        for match in real
+    ]
+    for match in real:
+        target = index_of[match]
+        for slot, (kind, ref) in enumerate(resolved[match], start=1):
+            if kind == "seed":
+                planned[target][f"player{slot}_id"] = ref
+            elif kind == "winner":
+                planned[index_of[ref]]["next_index"] = target
+            else:
+                planned[index_of[ref]]["loser_next_index"] = target
+
+    return {
+        "bracket_size": bracket_size,
+        "players": len(player_ids),
+        "byes": bracket_size - len(player_ids),
+        "matches": planned,
+    }
+
+
+# --- Persistence ---
+
+async def default_map_id(db: AsyncSession) -> int:
+    """ID of the first map, creating a TBD placeholder if there is none."""
+    map_id = await db.scalar(select(Map.id).limit(1))
+    if map_id is None:
+        placeholder = Map(
+            map_url="https://osu.ppy.sh/beatmaps/0",
+            map_name="TBD",
+            difficulty_name="TBD",
+            mapper_name="TBD"
+        )
+        db.add(placeholder)
+        await db.flush()
+        map_id = placeholder.id
+    return map_id
+
+
+async def save_topology(db: AsyncSession, topology: Topology) -> dict[str, int]:
+    """
+    Replace all brackets and matches with ``topology`` (caller commits).
+
+    Returns:
+        Bracket IDs by type (``winner``, ``loser``, ``grandfinals``).
+    """
+    await db.execute(delete(Match))
+    await db.execute(delete(Bracket))
+    map_id = await default_map_id(db)
+
+    bracket_rows = [
+        {"bracket_size": topology["bracket_size"], "bracket_name": "Winner Bracket", "bracket_type": "winner", "bracket_order": 1},
+        {"bracket_size": topology["bracket_size"], "bracket_name": "Loser Bracket", "bracket_type": "loser", "bracket_order": 2},
+        {"bracket_size": 2, "bracket_name": "Grand Finals", "bracket_type": "grandfinals", "bracket_order": 3},
+    ]
+    bracket_ids = (await db.scalars(
+        insert(Bracket).returning(Bracket.id, sort_by_parameter_order=True), bracket_rows
+    )).all()
+    bracket_id = dict(zip(BRACKET_TYPES, bracket_ids))
+
+    matches = topology["matches"]
+    match_ids = (await db.scalars(
+        insert(Match).returning(Match.id, sort_by_parameter_order=True),
+        [
+            {
+                "bracket_id": bracket_id[match["bracket_type"]],
+                "player1_id": match["player1_id"],
+                "player2_id": match["player2_id"],
+                "map_id": map_id,
+                "round_name": match["round_name"],
+                "match_status": "scheduled",
+            }
+            for match in matches
+        ],
+        # Keep empty player slots as NULLs so all rows form one batch
+        execution_options={"render_nulls": True},
+    )).all()
+
+    links = [
+        {
+            "id": match_ids[index],
+            "next_match_id": match_ids[match["next_index"]] if match["next_index"] is not None else None,
+            "loser_next_match_id": match_ids[match["loser_next_index"]] if match["loser_next_index"] is not None else None,
+        }
+        for index, match in enumerate(matches)
+        if match["next_index"] is not None or match["loser_next_index"] is not None
+    ]
+    if links:
+        await db.execute(update(Match), links)
+    return bracket_id
@@ -0,0 +1,214 @@
+"""
+Priority scheduling of beatmap downloads.
+
+Every download that has to hit a mirror takes a slot from the scheduler
+first. Slots are granted by priority class (interactive preview > staff >
+bulk sync), with a global concurrency cap plus a cap per class, so a bulk
+sync can never occupy the slots a visitor's preview needs. Bulk downloads
+can additionally be bandwidth-shaped with a token bucket.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from config import Config
+
+INTERACTIVE = "interactive"
+STAFF = "staff"
+BULK = "bulk"
+
+PRIORITIES = {INTERACTIVE: 0, STAFF: 1, BULK: 2}
+
+
+class TokenBucket:
+    """
+    Token bucket limiting a byte rate.
+
+    Args:
+        rate: Sustained bytes per second.
+        burst: Largest burst in bytes. Defaults to one second of ``rate``.
+        clock: Monotonic clock, injectable for tests.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or rate
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def delay_for(self, amount: int) -> float:
+        """Take ``amount`` tokens and return how long to wait before using them."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+    async def consume(self, amount: int) -> None:
+        """Wait until ``amount`` bytes may pass."""
+        delay = self.delay_for(amount)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class DownloadTicket:
+    """
+    A download's place in the scheduler.
+
+    Attributes:
+        priority: Priority class name.
+        beatmapset_id: The set being downloaded (for metrics).
+        granted: Set once the download may start.
+    """
+
+    def __init__(self, priority: str, beatmapset_id: str, seq: int, enqueued_at: float):
+        self.priority = priority
+        self.beatmapset_id = beatmapset_id
+        self.seq = seq
+        self.enqueued_at = enqueued_at
+        self.granted = asyncio.Event()
+        self.started_at: float | None = None
+        self.released = False
+
+    def sort_key(self) -> tuple[int, int]:
+        return PRIORITIES[self.priority], self.seq
+
+
+class DownloadScheduler:
+    """
+    Grants download slots by priority class.
+
+    Args:
+        max_concurrent: Downloads allowed at once across all classes.
+        class_limits: Downloads allowed at once per class.
+        bulk_bandwidth: Byte rate shared by bulk downloads (0 = unlimited).
+        clock: Monotonic clock, injectable for tests.
+
+    Example:
+        >>> ticket = download_scheduler.enqueue(INTERACTIVE, "123")
+        >>> await ticket.granted.wait()
+        >>> try:
+        ...     ...  # download
+        ... finally:
+        ...     download_scheduler.release(ticket)
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        class_limits: dict[str, int] | None = None,
+        bulk_bandwidth: int = 0,
+        clock=time.monotonic,
+    ):
+        self.max_concurrent = max_concurrent
+        self.class_limits = {INTERACTIVE: max_concurrent, STAFF: max_concurrent, BULK: 1, **(class_limits or {})}
+        self.bulk_bucket = TokenBucket(bulk_bandwidth) if bulk_bandwidth > 0 else None
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting: list[tuple[tuple[int, int], DownloadTicket]] = []
+        self._active: dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._completed: dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._wait_total: dict[str, float] = {name: 0.0 for name in PRIORITIES}
+
+    @classmethod
+    def from_config(cls) -> "DownloadScheduler":
+        """Build the scheduler from application configuration."""
+        return cls(
+            max_concurrent=Config.DOWNLOAD_MAX_CONCURRENT,
+            class_limits={
+                INTERACTIVE: Config.DOWNLOAD_INTERACTIVE_LIMIT,
+                STAFF: Config.DOWNLOAD_STAFF_LIMIT,
+                BULK: Config.DOWNLOAD_BULK_LIMIT,
+            },
+            bulk_bandwidth=Config.DOWNLOAD_BULK_BANDWIDTH_KBPS * 1024,
+        )
+
+    def enqueue(self, priority: str, beatmapset_id: str = "") -> DownloadTicket:
+        """
+        Queue a download. The ticket's ``granted`` event fires when it may start.
+
+        Raises:
+            ValueError: If ``priority`` is not a known class.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown download priority: {priority}")
+        ticket = DownloadTicket(priority, beatmapset_id, next(self._seq), self.clock())
+        with self._lock:
+            heapq.heappush(self._waiting, (ticket.sort_key(), ticket))
+            self._dispatch()
+        return ticket
+
+    def position(self, ticket: DownloadTicket) -> int:
+        """1-based place of a waiting ticket in grant order (0 once granted)."""
+        if ticket.granted.is_set():
+            return 0
+        with self._lock:
+            key = ticket.sort_key()
+            return 1 + sum(1 for other_key, _ in self._waiting if other_key < key)
+
+    def release(self, ticket: DownloadTicket) -> None:
+        """Return a ticket's slot (or withdraw it from the queue). Idempotent."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted.is_set():
+                self._active[ticket.priority] -= 1
+                self._completed[ticket.priority] += 1
+            else:
+                self._waiting = [(key, t) for key, t in self._waiting if t is not ticket]
+                heapq.heapify(self._waiting)
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant slots to the best waiting tickets that fit the caps (lock held)."""
+        deferred = []
+        while self._waiting and sum(self._active.values()) < self.max_concurrent:
+            key, ticket = heapq.heappop(self._waiting)
+            if self._active[ticket.priority] >= self.class_limits[ticket.priority]:
+                # Class is full; a lower class may still fit
+                deferred.append((key, ticket))
+                continue
+            self._active[ticket.priority] += 1
+            ticket.started_at = self.clock()
+            self._wait_total[ticket.priority] += ticket.started_at - ticket.enqueued_at
+            ticket.granted.set()
+        for item in deferred:
+            heapq.heappush(self._waiting, item)
+
+    async def throttle(self, ticket: DownloadTicket, amount: int) -> None:
+        """Apply bandwidth shaping to ``amount`` bytes received for a ticket."""
+        if ticket.priority == BULK and self.bulk_bucket is not None:
+            await self.bulk_bucket.consume(amount)
+
+    def stats(self) -> dict:
+        """Queue depth and throughput per class, for the metrics endpoint."""
+        with self._lock:
+            queued = {name: 0 for name in PRIORITIES}
+            for _, ticket in self._waiting:
+                queued[ticket.priority] += 1
+            classes = {}
+            for name in PRIORITIES:
+                granted = self._active[name] + self._completed[name]
+                classes[name] = {
+                    "active": self._active[name],
+                    "queued": queued[name],
+                    "limit": self.class_limits[name],
+                    "completed": self._completed[name],
+                    "avg_wait_seconds": round(self._wait_total[name] / granted, 3) if granted else None,
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": sum(self._active.values()),
+                "queued": len(self._waiting),
+                "bulk_bandwidth_bytes": int(self.bulk_bucket.rate) if self.bulk_bucket else 0,
+                "classes": classes,
+            }
+
+
+# Singleton instance
+download_scheduler = DownloadScheduler.from_config()
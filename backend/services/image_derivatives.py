@@ -0,0 +1,184 @@
+"""
+Resized, re-encoded derivatives of beatmap images.
+
+Backgrounds are often 4K PNGs of several megabytes, while the preview shows
+them dimmed behind the playfield. At extraction time each background is
+encoded to WebP (and AVIF, when Pillow was built with it) at a few widths,
+and its dominant colour is recorded so the page can paint a placeholder
+before any image arrives. Storyboard sprites get a same-size WebP copy
+when that is smaller than the original; their dimensions must not change,
+as the renderer positions sprites by texture size.
+
+Derivatives live in the set's hidden ``.derived/`` directory under names
+derived from the source bytes (``{hash}-{width}.{format}``), so a URL
+always refers to the same bytes and can be cached forever.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+from pathlib import Path
+from typing import TypedDict
+
+try:
+    from PIL import Image, features
+except ImportError:  # Optional: without Pillow the originals are served as-is
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = ".derived"
+BACKGROUND_WIDTHS = (480, 960, 1920)
+ENCODED_FORMATS = ("avif", "webp")
+MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "png": "image/png"}
+FILENAME_PATTERN = re.compile(r"^[0-9a-f]{16}-\d+\.(avif|webp|png)$")
+
+# Pillow reads the whole image into memory; refuse absurd dimensions
+MAX_PIXELS = 64_000_000
+
+
+class ImageVariant(TypedDict):
+    """One encoded derivative."""
+    file: str
+    format: str
+    width: int
+    height: int
+    size: int
+
+
+class ImageInfo(TypedDict):
+    """Source dimensions, placeholder colour and derivatives of one image."""
+    source: str
+    width: int
+    height: int
+    color: str
+    variants: list[ImageVariant]
+
+
+def available_formats() -> list[str]:
+    """Derivative formats that can be produced in this environment, smallest first."""
+    if Image is None:
+        return []
+    return [fmt for fmt in ENCODED_FORMATS if features.check(fmt)]
+
+
+def derived_url(beatmapset_id: str, filename: str) -> str:
+    """URL of a derivative (relative to the API root)."""
+    return f"/mappools/images/{beatmapset_id}/{filename}"
+
+
+def dominant_color(image) -> str:
+    """
+    Most common colour of an image after quantizing it to a small palette.
+
+    Returns:
+        CSS hex colour, e.g. ``"#1d2b53"``.
+    """
+    small = image.convert("RGB")
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=8)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _encode(image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "avif":
+        image.save(buffer, format="AVIF", quality=quality, speed=8)
+    else:
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def write_derived(out_dir: Path, filename: str, data: bytes) -> None:
+    """Atomically write a derived file into ``out_dir`` (created if needed)."""
+    out_dir.mkdir(exist_ok=True)
+    target = out_dir / filename
+    tmp_path = out_dir / f".{filename}.{os.getpid()}.tmp"
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, target)
+
+
+def build_derivatives(
+    out_dir: Path,
+    source: str,
+    data: bytes,
+    widths: tuple[int, ...] | None = BACKGROUND_WIDTHS,
+    formats: list[str] | None = None,
+    quality: int = 80,
+    smaller_only: bool = False,
+) -> ImageInfo | None:
+    """
+    Encode derivatives of one image into ``out_dir``.
+
+    Widths above the source width are dropped (images are never upscaled);
+    if none remain, one derivative at the source width is made. Files that
+    already exist are reused, as their names are derived from the source.
+
+    Args:
+        out_dir: The set's ``.derived`` directory (created if needed).
+        source: Path of the image within the set, recorded in the result.
+        data: Source image bytes.
+        widths: Target widths; ``None`` keeps the source size.
+        formats: Formats to encode; unavailable ones are skipped (default:
+            all of :func:`available_formats`).
+        quality: Encoder quality (0-100).
+        smaller_only: Drop derivatives that are not smaller than ``data``.
+
+    Returns:
+        Image info, or None if Pillow is missing or the image is unreadable.
+    """
+    if Image is None:
+        return None
+    formats = [fmt for fmt in available_formats() if formats is None or fmt in formats]
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_PIXELS:
+            logger.warning(f"[IMAGES] Skipping {source}: {image.width}x{image.height} is too large")
+            return None
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"[IMAGES] Cannot read {source}: {e}")
+        return None
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    if widths is None:
+        targets = [image.width]
+    else:
+        targets = sorted({width for width in widths if width < image.width}) or [image.width]
+        if max(widths) >= image.width and image.width not in targets:
+            targets.append(image.width)
+
+    digest = hashlib.sha1(data).hexdigest()[:16]
+    variants: list[ImageVariant] = []
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            filename = f"{digest}-{width}.{fmt}"
+            target = out_dir / filename
+            if target.exists():
+                size = target.stat().st_size
+            else:
+                try:
+                    encoded = _encode(resized, fmt, quality)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"[IMAGES] Cannot encode {source} as {fmt}: {e}")
+                    continue
+                if smaller_only and len(encoded) >= len(data):
+                    continue
+                write_derived(out_dir, filename, encoded)
+                size = len(encoded)
+            variants.append({"file": filename, "format": fmt, "width": width, "height": height, "size": size})
+
+    return {
+        "source": source,
+        "width": image.width,
+        "height": image.height,
+        "color": dominant_color(image),
+        "variants": variants,
+    }
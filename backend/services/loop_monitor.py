@@ -0,0 +1,130 @@
+"""
+Event-loop lag monitoring.
+
+A background task sleeps for a short interval and measures how late it
+wakes up. Lateness means some callback held the loop: a handler calling
+blocking code directly. When the lag passes a threshold, the requests in
+flight at that moment are logged, oldest first, so the offending handler
+can be found. :class:`RequestTracker` is the ASGI middleware that keeps
+that list.
+"""
+import asyncio
+import itertools
+import logging
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag and logs stalls.
+
+    Args:
+        threshold: Lag in seconds above which a stall is logged.
+        interval: Seconds between probes.
+        clock: Monotonic clock, injectable for tests.
+
+    Example:
+        >>> loop_monitor.start()
+        >>> loop_monitor.stats()["max_lag_ms"]
+        0.4
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, clock=time.monotonic):
+        self.threshold = threshold
+        self.interval = interval
+        self.clock = clock
+        self._task: asyncio.Task | None = None
+        self._ids = itertools.count()
+        self._inflight: dict[int, tuple[str, float]] = {}
+        self.probes = 0
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.last_stall: dict | None = None
+
+    # --- Request tracking ---
+
+    def request_started(self, label: str) -> int:
+        token = next(self._ids)
+        self._inflight[token] = (label, self.clock())
+        return token
+
+    def request_finished(self, token: int) -> None:
+        self._inflight.pop(token, None)
+
+    def inflight(self) -> list[str]:
+        """Requests currently being handled, oldest first, with their age."""
+        now = self.clock()
+        return [
+            f"{label} ({(now - started) * 1000:.0f} ms)"
+            for label, started in sorted(self._inflight.values(), key=lambda item: item[1])
+        ]
+
+    # --- Probing ---
+
+    def record(self, lag: float) -> None:
+        """Record one probe's lag, logging it if it is a stall."""
+        self.probes += 1
+        self.max_lag = max(self.max_lag, lag)
+        if lag < self.threshold:
+            return
+        self.stalls += 1
+        inflight = self.inflight()
+        self.last_stall = {"lag_ms": round(lag * 1000, 1), "at": time.time(), "inflight": inflight}
+        logger.warning(
+            f"[LOOP] Event loop blocked for {lag * 1000:.0f} ms; in flight: {', '.join(inflight) or 'none'}"
+        )
+
+    async def _run(self) -> None:
+        while True:
+            expected = self.clock() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, self.clock() - expected))
+
+    def start(self) -> None:
+        """Start probing on the running loop (no-op if already started)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "threshold_ms": round(self.threshold * 1000),
+            "probes": self.probes,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "last_stall": self.last_stall,
+        }
+
+
+class RequestTracker:
+    """ASGI middleware recording in-flight HTTP requests for the lag monitor."""
+
+    def __init__(self, app: ASGIApp, monitor: LoopLagMonitor | None = None):
+        self.app = app
+        self.monitor = monitor or loop_monitor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = self.monitor.request_started(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.request_finished(token)
+
+
+# Singleton instance
+loop_monitor = LoopLagMonitor(threshold=Config.LOOP_LAG_THRESHOLD_MS / 1000)
@@ -12,6 +12,7 @@ from services.osu_parser import (
     StoryboardCommand,
     StoryboardData,
     StoryboardSprite,
+    decode_text,
 )
 
 
@@ -37,13 +38,19 @@ def parse_osb_file(file_path: str) -> StoryboardData | None:
     if not path.exists():
         return None
 
-    # Read file with UTF-8 encoding, handling BOM if present
-    try:
-        content = path.read_text(encoding="utf-8-sig")
-    except UnicodeDecodeError:
-        # Fallback to latin-1 for older files
-        content = path.read_text(encoding="latin-1")
+    return parse_osb_content(decode_text(path.read_bytes()))
 
+
+def parse_osb_content(content: str) -> StoryboardData | None:
+    """
+    Parse the text of a standalone .osb storyboard.
+
+    Args:
+        content: Decoded .osb file contents.
+
+    Returns:
+        StoryboardData dictionary, or None if no storyboard elements found.
+    """
     lines = content.splitlines()
 
     if not lines:
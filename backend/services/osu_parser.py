@@ -81,11 +81,34 @@ class MetadataDict(TypedDict):
     artist: str
     creator: str
     version: str
+    beatmap_id: int  # 0 for old maps without a BeatmapID
     keys: int
     audio_filename: str
     widescreen_storyboard: bool
 
 
+class NotesAnalysis(TypedDict):
+    """Type definition for per-difficulty chart statistics."""
+
+    notes_count: int
+    hold_count: int
+    first_note_ms: int
+    length_ms: int  # From the first note to the last note (or hold end)
+    avg_nps: float
+    peak_nps: int  # Most notes starting within any one-second window
+    column_counts: list[int]
+
+
+class PartialPreview(TypedDict):
+    """Type definition for the opening of a chart, sent before the set is ready."""
+
+    metadata: MetadataDict
+    timing_points: list[TimingPoint]
+    notes: list[NoteData]  # Notes starting before ``notes_until_ms``
+    notes_until_ms: int
+    notes_total: int
+
+
 class ParsedBeatmap(TypedDict):
     """Type definition for the complete parsed beatmap."""
 
@@ -103,13 +126,14 @@ def parse_metadata(lines: list[str]) -> dict[str, str | int]:
         lines: All lines from the .osu file.
 
     Returns:
-        Dictionary containing title, artist, creator, version, keys, and audio_filename.
+        Dictionary containing title, artist, creator, version, beatmap_id, keys, and audio_filename.
     """
     metadata: dict[str, str | int] = {
         "title": "",
         "artist": "",
         "creator": "",
         "version": "",
+        "beatmap_id": 0,
         "keys": 4,
         "audio_filename": "",
     }
@@ -147,6 +171,11 @@ def parse_metadata(lines: list[str]) -> dict[str, str | int]:
                 metadata["creator"] = value
             elif key == "Version":
                 metadata["version"] = value
+            elif key == "BeatmapID":
+                try:
+                    metadata["beatmap_id"] = int(value)
+                except ValueError:
+                    metadata["beatmap_id"] = 0
 
         elif current_section == "Difficulty":
             if key == "CircleSize":
@@ -612,6 +641,14 @@ def parse_storyboard(lines: list[str], widescreen: bool = False) -> StoryboardDa
     }
 
 
+def decode_text(data: bytes) -> str:
+    """Decode beatmap text as UTF-8 (BOM allowed), falling back to latin-1 for older files."""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
 def parse_osu_file(file_path: str) -> ParsedBeatmap:
     """
     Parse an osu!mania .osu file and extract note data.
@@ -631,22 +668,34 @@ def parse_osu_file(file_path: str) -> ParsedBeatmap:
     if not path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    # Read file with UTF-8 encoding, handling BOM if present
-    try:
-        content = path.read_text(encoding="utf-8-sig")
-    except UnicodeDecodeError:
-        # Fallback to latin-1 for older beatmaps
-        content = path.read_text(encoding="latin-1")
+    return parse_osu_content(decode_text(path.read_bytes()), source=file_path)
+
+
+def parse_osu_content(content: str, source: str = "<memory>") -> ParsedBeatmap:
+    """
+    Parse the text of an osu!mania .osu file.
+
+    Used directly for difficulties read from an archive without extracting.
+
+    Args:
+        content: Decoded .osu file contents.
+        source: Name used in error messages.
+
+    Returns:
+        Dictionary containing metadata and notes.
 
+    Raises:
+        ValueError: If the content cannot be parsed.
+    """
     lines = content.splitlines()
 
     if not lines:
-        raise ValueError(f"Empty file: {file_path}")
+        raise ValueError(f"Empty file: {source}")
 
     # Verify this is an osu file format
     first_line = lines[0].strip()
     if not first_line.startswith("osu file format"):
-        raise ValueError(f"Invalid osu file format: {file_path}")
+        raise ValueError(f"Invalid osu file format: {source}")
 
     # Parse metadata, timing points, hit objects, and storyboard
     metadata_dict = parse_metadata(lines)
@@ -662,6 +711,7 @@ def parse_osu_file(file_path: str) -> ParsedBeatmap:
             "artist": str(metadata_dict.get("artist", "")),
             "creator": str(metadata_dict.get("creator", "")),
             "version": str(metadata_dict.get("version", "")),
+            "beatmap_id": int(metadata_dict.get("beatmap_id", 0)),
             "keys": key_count,
             "audio_filename": str(metadata_dict.get("audio_filename", "")),
             "widescreen_storyboard": widescreen,
@@ -672,3 +722,72 @@ def parse_osu_file(file_path: str) -> ParsedBeatmap:
     }
 
     return result
+
+
+def analyze_notes(notes: list[NoteData], key_count: int) -> NotesAnalysis:
+    """
+    Compute chart statistics from parsed notes.
+
+    Args:
+        notes: Notes sorted by time, as returned by :func:`parse_hit_objects`.
+        key_count: Number of columns.
+
+    Returns:
+        Note counts, chart length, average and peak notes per second, and
+        notes per column.
+    """
+    column_counts = [0] * key_count
+    hold_count = 0
+    last_ms = 0
+    peak = 0
+    window_start = 0
+    for i, note in enumerate(notes):
+        if 0 <= note["col"] < key_count:
+            column_counts[note["col"]] += 1
+        if note["type"] == "hold":
+            hold_count += 1
+        last_ms = max(last_ms, note.get("end", note["time"]))
+        # Sliding one-second window over note start times
+        while note["time"] - notes[window_start]["time"] >= 1000:
+            window_start += 1
+        peak = max(peak, i - window_start + 1)
+
+    first_ms = notes[0]["time"] if notes else 0
+    length_ms = last_ms - first_ms if notes else 0
+    return {
+        "notes_count": len(notes),
+        "hold_count": hold_count,
+        "first_note_ms": first_ms,
+        "length_ms": length_ms,
+        "avg_nps": round(len(notes) / (length_ms / 1000), 2) if length_ms > 0 else 0.0,
+        "peak_nps": peak,
+        "column_counts": column_counts,
+    }
+
+
+def parse_partial_preview(content: str, seconds: float) -> PartialPreview:
+    """
+    Parse a .osu file and keep only the first ``seconds`` of notes.
+
+    Used to start a preview while the rest of the beatmapset downloads.
+
+    Args:
+        content: Decoded .osu file contents.
+        seconds: Length of the opening to keep, from the first note.
+
+    Returns:
+        Metadata, all timing points and the opening notes.
+
+    Raises:
+        ValueError: If the content cannot be parsed.
+    """
+    parsed = parse_osu_content(content)
+    notes = parsed["notes"]
+    until_ms = (notes[0]["time"] if notes else 0) + int(seconds * 1000)
+    return {
+        "metadata": parsed["metadata"],
+        "timing_points": parsed["timing_points"],
+        "notes": [note for note in notes if note["time"] < until_ms],
+        "notes_until_ms": until_ms,
+        "notes_total": len(notes),
+    }
@@ -0,0 +1,182 @@
+"""
+In-memory cache of ready-to-send preview payloads.
+
+``GET /mappools/preview/{beatmap_id}`` otherwise costs a DB query, a manifest
+lookup and a read of a possibly multi-MB notes file per request. Payloads
+are cached per beatmap ID and negotiated encoding, bounded by total bytes
+and evicted least-recently-used first. Each payload remembers the notes
+generation it was read from, so a set whose notes were regenerated (by this
+or another backend) is never served stale.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import Config
+
+
+class PreviewPayload:
+    """
+    A preview response body with its validators.
+
+    Attributes:
+        body: Bytes sent to the client (possibly compressed).
+        encoding: Content-Encoding of ``body``, or None.
+        beatmapset_id: The set the notes belong to.
+        generation: Notes generation the body was read from.
+        headers: Extra response headers (asset URLs).
+        etag: Strong ETag derived from the content hash.
+    """
+
+    def __init__(
+        self,
+        body: bytes,
+        encoding: str | None,
+        beatmapset_id: str,
+        generation: str | None,
+        headers: dict[str, str] | None = None,
+    ):
+        self.body = body
+        self.encoding = encoding
+        self.beatmapset_id = beatmapset_id
+        self.generation = generation
+        self.headers = headers or {}
+        # Strong validators are per representation, so the encoding is part of it
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an ``If-None-Match`` header matches ``etag``.
+
+    Weak comparison is used, as RFC 9110 requires for ``If-None-Match``.
+
+    Example:
+        >>> etag_matches('W/"abc", "def"', '"abc"')
+        True
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class PreviewCache:
+    """
+    LRU of preview payloads bounded by total body size.
+
+    Args:
+        max_bytes: Total size of cached bodies (0 disables the cache).
+
+    Example:
+        >>> cache = PreviewCache(max_bytes=64 * 1024 * 1024)
+        >>> cache.put("4243262", "gzip", payload)
+        >>> cache.get("4243262", "gzip", current_generation=payload.generation) is payload
+        True
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str | None], PreviewPayload] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, beatmap_id: str, encoding: str | None, current_generation=None) -> PreviewPayload | None:
+        """
+        Look up a payload.
+
+        Args:
+            beatmap_id: The osu! beatmap ID.
+            encoding: The encoding negotiated for the request.
+            current_generation: Callable ``(beatmapset_id) -> generation``;
+                a payload from another generation is dropped and missed.
+
+        Returns:
+            The cached payload, or None.
+        """
+        key = (str(beatmap_id), encoding)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+        if payload is not None and current_generation is not None:
+            if current_generation(payload.beatmapset_id) != payload.generation:
+                self._discard(key, payload)
+                payload = None
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    def put(self, beatmap_id: str, encoding: str | None, payload: PreviewPayload) -> None:
+        """Cache a payload, evicting least recently used ones beyond the byte budget."""
+        if payload.size > self.max_bytes:
+            return
+        key = (str(beatmap_id), encoding)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = payload
+            self._bytes += payload.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def _discard(self, key: tuple, payload: PreviewPayload) -> None:
+        with self._lock:
+            if self._entries.get(key) is payload:
+                del self._entries[key]
+                self._bytes -= payload.size
+
+    def invalidate(self, beatmap_id: str) -> None:
+        """Drop every encoding cached for a beatmap (its map row was edited)."""
+        beatmap_id = str(beatmap_id)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == beatmap_id]:
+                self._bytes -= self._entries.pop(key).size
+
+    def invalidate_set(self, beatmapset_id: str) -> None:
+        """Drop every payload read from a beatmapset (its notes were regenerated)."""
+        beatmapset_id = str(beatmapset_id)
+        with self._lock:
+            for key, payload in list(self._entries.items()):
+                if payload.beatmapset_id == beatmapset_id:
+                    self._bytes -= self._entries.pop(key).size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Entry count, size and hit ratio, for the metrics endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+# Singleton instance
+preview_cache = PreviewCache(max_bytes=Config.PREVIEW_CACHE_MB * 1024 * 1024)
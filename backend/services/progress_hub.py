@@ -0,0 +1,182 @@
+"""
+In-process pub/sub of background job progress.
+
+Long jobs (a beatmapset download) run as background tasks that publish
+events into a channel keyed by what they work on. Any number of SSE
+connections subscribe to the channel; a connection that drops does not
+cancel the job, and a reconnecting client resumes after the last event it
+saw (``Last-Event-ID``). Finished channels are kept for a while so late
+reconnects still get the outcome.
+
+Event IDs have the form ``"{job_id}:{seq}"``. ``job_id`` is random per job,
+so an ID from an earlier job (or an earlier process) is never mistaken for
+a position in the current one.
+"""
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def parse_event_id(event_id: str | None) -> tuple[str, int] | None:
+    """
+    Split a ``Last-Event-ID`` into job ID and sequence number.
+
+    Example:
+        >>> parse_event_id("3f2a9c1e:12")
+        ('3f2a9c1e', 12)
+    """
+    if not event_id:
+        return None
+    job_id, _, seq = event_id.strip().rpartition(":")
+    if not job_id or not seq.isdigit():
+        return None
+    return job_id, int(seq)
+
+
+class ProgressChannel:
+    """
+    Event log of one background job.
+
+    Args:
+        key: What the job works on (e.g. a beatmapset ID).
+        max_events: Events kept for replay; older ones are dropped.
+    """
+
+    def __init__(self, key: str, max_events: int = 200):
+        self.key = key
+        self.job_id = uuid.uuid4().hex[:8]
+        self.max_events = max_events
+        self.events: list[dict] = []
+        self.done = False
+        self._seq = 0
+        self._changed = asyncio.Event()
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.job_id}:{seq}"
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, event: str, data: dict) -> str:
+        """Append an event and wake subscribers. Returns its event ID."""
+        self._seq += 1
+        self.events.append({"id": self.event_id(self._seq), "seq": self._seq, "event": event, "data": data})
+        if len(self.events) > self.max_events:
+            del self.events[0]
+        self._wake()
+        return self.event_id(self._seq)
+
+    def close(self) -> None:
+        """Mark the job finished; subscribers end after the last event."""
+        self.done = True
+        self._wake()
+
+    @property
+    def last_event(self) -> dict | None:
+        return self.events[-1] if self.events else None
+
+    async def subscribe(self, after: int = 0):
+        """
+        Yield events with a sequence number above ``after`` until the job ends.
+
+        Args:
+            after: Last sequence number the subscriber has seen (0 = from the start).
+        """
+        while True:
+            changed = self._changed
+            for event in list(self.events):
+                if event["seq"] > after:
+                    after = event["seq"]
+                    yield event
+            if self.done:
+                return
+            await changed.wait()
+
+
+class ProgressHub:
+    """
+    Registry of job channels, one running job per key.
+
+    Args:
+        retention: Seconds a finished channel stays available for reconnects.
+        max_events: Events kept per channel.
+
+    Example:
+        >>> async def job(channel):
+        ...     channel.publish("progress", {"progress": 50})
+        >>> channel = progress_hub.start("2053359", job)
+        >>> async for event in channel.subscribe():
+        ...     print(event["event"], event["data"])
+        progress {'progress': 50}
+    """
+
+    def __init__(self, retention: float = 300.0, max_events: int = 200):
+        self.retention = retention
+        self.max_events = max_events
+        self._channels: dict[str, ProgressChannel] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, key: str) -> ProgressChannel | None:
+        return self._channels.get(str(key))
+
+    def start(self, key: str, job, resume: str | None = None) -> ProgressChannel:
+        """
+        Join the running job for ``key``, or start ``job`` in the background.
+
+        Must be called from a running event loop.
+
+        Args:
+            key: What the job works on.
+            job: ``async def job(channel)`` publishing its progress.
+            resume: Job ID from the client's ``Last-Event-ID``; a finished
+                job with that ID is returned instead of starting a new one.
+
+        Returns:
+            The job's channel.
+        """
+        key = str(key)
+        channel = self._channels.get(key)
+        if channel is not None and (not channel.done or channel.job_id == resume):
+            return channel
+
+        channel = ProgressChannel(key, self.max_events)
+        self._channels[key] = channel
+        task = asyncio.create_task(self._run(channel, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return channel
+
+    async def _run(self, channel: ProgressChannel, job) -> None:
+        try:
+            await job(channel)
+        except asyncio.CancelledError:
+            channel.publish("error", {"message": "Cancelled"})
+            raise
+        except Exception as e:
+            logger.exception(f"[HUB] Job {channel.key} failed")
+            channel.publish("error", {"message": str(e)})
+        finally:
+            channel.close()
+            asyncio.get_running_loop().call_later(self.retention, self._expire, channel)
+
+    def _expire(self, channel: ProgressChannel) -> None:
+        if self._channels.get(channel.key) is channel:
+            del self._channels[channel.key]
+
+    def stats(self) -> dict:
+        """Number of running and retained finished jobs."""
+        running = sum(1 for channel in self._channels.values() if not channel.done)
+        return {"running": running, "finished": len(self._channels) - running}
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# Singleton instance
+progress_hub = ProgressHub()
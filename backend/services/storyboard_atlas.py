@@ -0,0 +1,269 @@
+"""
+Texture atlases for storyboard sprites.
+
+Storyboard-heavy sets reference hundreds of small images, and the preview
+had to fetch every one before playback could start. At extraction time the
+referenced images are packed into a few atlas pages instead, and the
+storyboard payload gets a map from each image's path to its rectangle and
+UV coordinates on a page.
+
+Packing uses shelves (rows) filled in order of decreasing height. All
+frames of an animation are placed as one unit, on the same page where
+possible, so playing an animation never switches textures. Each sprite's
+border pixels are repeated into its padding so linear filtering at the
+edges does not pick up its neighbours.
+
+Pages are written as PNG into the set's ``.derived/`` directory, named by
+their content like the other derivatives.
+"""
+import copy
+import hashlib
+import io
+import logging
+from pathlib import Path
+from typing import TypedDict
+
+from services.image_derivatives import Image, write_derived
+from services.osu_parser import StoryboardData
+
+logger = logging.getLogger(__name__)
+
+ATLAS_SIZE = 2048
+ATLAS_PADDING = 2
+
+
+class AtlasPageInfo(TypedDict):
+    """One encoded atlas page."""
+    file: str
+    width: int
+    height: int
+    size: int
+
+
+class AtlasSprite(TypedDict):
+    """Location of one image on an atlas page."""
+    page: int
+    x: int
+    y: int
+    width: int
+    height: int
+    uv: list[float]  # [u0, v0, u1, v1]
+
+
+class AtlasInfo(TypedDict):
+    """Atlas pages and where each storyboard image sits on them."""
+    pages: list[AtlasPageInfo]
+    sprites: dict[str, AtlasSprite]
+
+
+def animation_groups(storyboard: StoryboardData) -> list[list[str]]:
+    """
+    Group a storyboard's images into packing units.
+
+    Each animation's frames form one unit (in frame order); every other
+    image is a unit of its own. Paths use forward slashes.
+    """
+    groups = []
+    grouped = set()
+    for sprite in storyboard["sprites"]:
+        if sprite["type"] != "animation" or not sprite["frame_count"]:
+            continue
+        filepath = sprite["filepath"].replace("\\", "/")
+        base, dot, ext = filepath.rpartition(".")
+        base, ext = (base, ext) if dot else (filepath, "png")
+        frames = [f"{base}{i}.{ext}" for i in range(sprite["frame_count"])]
+        frames = [frame for frame in frames if frame not in grouped]
+        if frames:
+            groups.append(frames)
+            grouped.update(frames)
+    for image in storyboard["images"]:
+        image = image.replace("\\", "/")
+        if image not in grouped:
+            groups.append([image])
+            grouped.add(image)
+    return groups
+
+
+class AtlasPage:
+    """
+    Shelf packer for one atlas page.
+
+    Args:
+        size: Largest width and height of the page.
+        padding: Pixels kept free around each sprite.
+    """
+
+    def __init__(self, size: int = ATLAS_SIZE, padding: int = ATLAS_PADDING):
+        self.size = size
+        self.padding = padding
+        self.shelves: list[list[int]] = []  # [y, height, next free x]
+        self.bottom = 0
+        self.placements: dict[str, tuple[int, int, int, int]] = {}
+
+    @property
+    def width(self) -> int:
+        return max((shelf[2] for shelf in self.shelves), default=0)
+
+    @property
+    def height(self) -> int:
+        return self.bottom
+
+    def place(self, key: str, width: int, height: int) -> bool:
+        """Place one image; returns False if the page has no room for it."""
+        w = width + 2 * self.padding
+        h = height + 2 * self.padding
+        for shelf in self.shelves:
+            y, shelf_height, x = shelf
+            if h <= shelf_height and x + w <= self.size:
+                shelf[2] += w
+                self.placements[key] = (x + self.padding, y + self.padding, width, height)
+                return True
+        if self.bottom + h > self.size or w > self.size:
+            return False
+        self.shelves.append([self.bottom, h, w])
+        self.placements[key] = (self.padding, self.bottom + self.padding, width, height)
+        self.bottom += h
+        return True
+
+    def place_all(self, keys: list[str], sizes: dict[str, tuple[int, int]]) -> bool:
+        """Place every image or none of them."""
+        state = (copy.deepcopy(self.shelves), self.bottom, dict(self.placements))
+        if all(self.place(key, *sizes[key]) for key in keys):
+            return True
+        self.shelves, self.bottom, self.placements = state
+        return False
+
+
+def pack(
+    sizes: dict[str, tuple[int, int]],
+    groups: list[list[str]],
+    size: int = ATLAS_SIZE,
+    padding: int = ATLAS_PADDING,
+) -> list[AtlasPage]:
+    """
+    Pack images into as few pages as the shelf heuristic manages.
+
+    Args:
+        sizes: ``{key: (width, height)}`` of every packable image.
+        groups: Units from :func:`animation_groups`; keys missing from
+            ``sizes`` are ignored.
+        size: Largest page width and height.
+        padding: Pixels kept free around each sprite.
+
+    Returns:
+        Pages with their placements.
+    """
+    units = [[key for key in group if key in sizes] for group in groups]
+    units = sorted((unit for unit in units if unit), key=lambda unit: max(sizes[k][1] for k in unit), reverse=True)
+
+    pages: list[AtlasPage] = []
+    for unit in units:
+        if any(page.place_all(unit, sizes) for page in pages):
+            continue
+        pages.append(AtlasPage(size, padding))
+        if pages[-1].place_all(unit, sizes):
+            continue
+        # Larger than a whole page: spread the frames over new pages
+        for key in unit:
+            if not pages[-1].place(key, *sizes[key]):
+                pages.append(AtlasPage(size, padding))
+                pages[-1].place(key, *sizes[key])
+    return pages
+
+
+def _paste_extruded(page, image, x: int, y: int, padding: int) -> None:
+    """Paste ``image`` at ``(x, y)`` and repeat its border pixels into the padding."""
+    width, height = image.size
+    page.paste(image, (x, y))
+    if not padding:
+        return
+    nearest = Image.Resampling.NEAREST
+    page.paste(image.crop((0, 0, 1, height)).resize((padding, height), nearest), (x - padding, y))
+    page.paste(image.crop((width - 1, 0, width, height)).resize((padding, height), nearest), (x + width, y))
+    # Rows include the side padding so the corners are filled too
+    left, right = x - padding, x + width + padding
+    top = page.crop((left, y, right, y + 1)).resize((right - left, padding), nearest)
+    bottom = page.crop((left, y + height - 1, right, y + height)).resize((right - left, padding), nearest)
+    page.paste(top, (left, y - padding))
+    page.paste(bottom, (left, y + height))
+
+
+def build_atlases(
+    out_dir: Path,
+    images: dict[str, bytes],
+    groups: list[list[str]],
+    size: int = ATLAS_SIZE,
+    padding: int = ATLAS_PADDING,
+    max_sprite: int | None = None,
+) -> AtlasInfo | None:
+    """
+    Pack storyboard images into atlas pages written to ``out_dir``.
+
+    Images that cannot be read, or that are larger than ``max_sprite`` in
+    either dimension (default: half a page), are left out and keep being
+    served on their own.
+
+    Args:
+        out_dir: The set's ``.derived`` directory (created if needed).
+        images: ``{storyboard path: image bytes}``.
+        groups: Packing units from :func:`animation_groups`.
+        size: Largest page width and height.
+        padding: Pixels kept around each sprite.
+        max_sprite: Largest sprite dimension packed.
+
+    Returns:
+        Pages and sprite locations, or None if Pillow is missing or fewer
+        than two images could be packed.
+    """
+    if Image is None:
+        return None
+    max_sprite = max_sprite or size // 2
+
+    # Headers only; pixels are decoded page by page
+    sizes = {}
+    for key, data in images.items():
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+        except (OSError, ValueError) as e:
+            logger.warning(f"[ATLAS] Cannot read {key}: {e}")
+            continue
+        if 0 < width <= max_sprite and 0 < height <= max_sprite:
+            sizes[key] = (width, height)
+    if len(sizes) < 2:
+        return None
+
+    pages: list[AtlasPageInfo] = []
+    sprites: dict[str, AtlasSprite] = {}
+    for index, page in enumerate(pack(sizes, groups, size, padding)):
+        canvas = Image.new("RGBA", (page.width, page.height), (0, 0, 0, 0))
+        for key, (x, y, width, height) in page.placements.items():
+            try:
+                with Image.open(io.BytesIO(images[key])) as image:
+                    _paste_extruded(canvas, image.convert("RGBA"), x, y, padding)
+            except (OSError, ValueError) as e:
+                logger.warning(f"[ATLAS] Cannot decode {key}: {e}")
+                continue
+            sprites[key] = {
+                "page": index,
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+                "uv": [
+                    round(x / page.width, 6),
+                    round(y / page.height, 6),
+                    round((x + width) / page.width, 6),
+                    round((y + height) / page.height, 6),
+                ],
+            }
+
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="PNG", compress_level=6)
+        data = buffer.getvalue()
+        filename = f"{hashlib.sha1(data).hexdigest()[:16]}-{page.width}.png"
+        write_derived(out_dir, filename, data)
+        pages.append({"file": filename, "width": page.width, "height": page.height, "size": len(data)})
+
+    logger.info(f"[ATLAS] Packed {len(sprites)} of {len(images)} images into {len(pages)} page(s)")
+    return {"pages": pages, "sprites": sprites}
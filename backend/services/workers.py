@@ -0,0 +1,111 @@
+"""
+Managed worker pools for blocking work started from async handlers.
+
+Handlers must never run filesystem or parsing work on the event loop: one
+slow extraction would stall every other request in the worker. Blocking
+calls go through one of two bounded thread pools instead of the default
+executor:
+
+- ``io``: short filesystem work (reading notes files, manifests, locks).
+- ``cpu``: archive extraction, .osu parsing and notes generation. Kept
+  separate and small so a burst of new sets can never occupy the threads
+  that cheap reads need.
+
+Example:
+    >>> body = await workers.run_io(path.read_bytes)
+    >>> result = await workers.run_cpu(downloader.generate_notes_json, "2053359")
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+IO = "io"
+CPU = "cpu"
+
+
+class WorkerPools:
+    """
+    Bounded thread pools with usage counters.
+
+    Args:
+        io_workers: Threads for filesystem work.
+        cpu_workers: Threads for extraction and parsing. Defaults to the
+            number of CPUs.
+    """
+
+    def __init__(self, io_workers: int = 8, cpu_workers: int | None = None):
+        self.limits = {IO: io_workers, CPU: cpu_workers or os.cpu_count() or 2}
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+        self._active = {IO: 0, CPU: 0}
+        self._pending = {IO: 0, CPU: 0}
+        self._completed = {IO: 0, CPU: 0}
+
+    @classmethod
+    def from_config(cls) -> "WorkerPools":
+        """Build the pools from application configuration."""
+        return cls(io_workers=Config.WORKER_IO_THREADS, cpu_workers=Config.WORKER_CPU_THREADS or None)
+
+    def _executor(self, kind: str) -> ThreadPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(kind)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=self.limits[kind], thread_name_prefix=f"pmc-{kind}")
+                self._executors[kind] = executor
+            return executor
+
+    def _track(self, kind: str, func, *args, **kwargs):
+        with self._lock:
+            self._pending[kind] -= 1
+            self._active[kind] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active[kind] -= 1
+                self._completed[kind] += 1
+
+    async def run(self, kind: str, func, *args, **kwargs):
+        """Run ``func`` in the ``kind`` pool and await its result (context variables are kept)."""
+        with self._lock:
+            self._pending[kind] += 1
+        call = functools.partial(contextvars.copy_context().run, self._track, kind, func, *args, **kwargs)
+        # If the awaiter is cancelled, the call still finishes in its thread
+        return await asyncio.get_running_loop().run_in_executor(self._executor(kind), call)
+
+    async def run_io(self, func, *args, **kwargs):
+        """Run short blocking filesystem work off the event loop."""
+        return await self.run(IO, func, *args, **kwargs)
+
+    async def run_cpu(self, func, *args, **kwargs):
+        """Run extraction/parsing work off the event loop."""
+        return await self.run(CPU, func, *args, **kwargs)
+
+    def stats(self) -> dict:
+        """Threads, running and queued calls per pool."""
+        with self._lock:
+            return {
+                kind: {
+                    "threads": self.limits[kind],
+                    "active": self._active[kind],
+                    "queued": max(0, self._pending[kind]),
+                    "completed": self._completed[kind],
+                }
+                for kind in (IO, CPU)
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pools (they are recreated on next use)."""
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Singleton instance
+workers = WorkerPools.from_config()
@@ -1,12 +1,21 @@
-"""Test configuration and shared fixtures for bracket system tests."""
+"""Test configuration and shared fixtures for bracket and beatmap tests."""
+import asyncio
+import io
+import os
 import sys
+import zipfile
 from pathlib import Path
 
+# No background warm-up jobs in tests (they would call the osu! API)
+os.environ.setdefault("BEATMAP_WARMUP", "False")
+
 import pytest
+from fastapi import Depends
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -16,32 +25,44 @@ from models.user import User
 from models.bracket import Bracket
 from models.match import Match
 from models.map import Map
-from utils.database import get_db
+from utils.database import async_url, get_db
 from utils.auth import get_current_user, get_current_staff_user
 from main import app
+from services.beatmap_downloader import BeatmapDownloader, beatmap_downloader
+from services.beatmap_storage import BeatmapStorage, beatmap_storage
+from services.blob_store import BLOB_DIR, BlobStore, blob_store
+from services.bracket_read_model import bracket_read_model
+from services.preview_cache import preview_cache
 
 
 # --- Database fixtures ---
 
+def _disable_foreign_keys(dbapi_conn, connection_record):
+    """Disable FK enforcement to allow player_id=0 as "empty slot" sentinel.
+
+    ORM cascade handles relationship cleanup instead.
+    """
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA foreign_keys=OFF")
+    cursor.close()
+
+
 @pytest.fixture
-def engine():
-    """Create in-memory SQLite engine for testing."""
-    engine = create_engine(
-        "sqlite://",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
-    # Disable FK enforcement to allow player_id=0 as "empty slot" sentinel.
-    # ORM cascade handles relationship cleanup instead.
-    @event.listens_for(engine, "connect")
-    def set_sqlite_pragma(dbapi_conn, connection_record):
-        cursor = dbapi_conn.cursor()
-        cursor.execute("PRAGMA foreign_keys=OFF")
-        cursor.close()
+def engine(tmp_path_factory):
+    """
+    Create a file-backed SQLite engine for testing.
+
+    The file is shared with :func:`async_session_factory`, so rows the test
+    code commits are visible to the app's async sessions and vice versa.
+    """
+    path = tmp_path_factory.mktemp("db") / "test.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _disable_foreign_keys)
 
     Base.metadata.create_all(bind=engine)
     yield engine
     Base.metadata.drop_all(bind=engine)
+    engine.dispose()
 
 
 @pytest.fixture
@@ -56,6 +77,15 @@ def db(engine) -> Session:
         session.close()
 
 
+@pytest.fixture
+def async_session_factory(engine) -> async_sessionmaker:
+    """Async sessions (aiosqlite) on the test database, as the app uses them."""
+    async_engine = create_async_engine(async_url(str(engine.url)), poolclass=NullPool)
+    event.listen(async_engine.sync_engine, "connect", _disable_foreign_keys)
+    yield async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+
+
 # --- User fixtures ---
 
 @pytest.fixture
@@ -321,18 +351,37 @@ def gf_match_setup(db: Session, gf_bracket: Bracket, default_map: Map, registere
 
 # --- FastAPI TestClient fixtures ---
 
-@pytest.fixture
-def client(db: Session, staff_user: User) -> TestClient:
-    """Create a TestClient with DB and staff auth overrides."""
-    def override_get_db():
-        yield db
+def _override_get_db(db: Session, async_session_factory: async_sessionmaker):
+    """
+    ``get_db`` override yielding an async session on the test database.
+
+    Afterwards the test's own session is expired, so assertions made
+    through it see what the request wrote.
+    """
+    async def override_get_db():
+        async with async_session_factory() as session:
+            yield session
+        db.expire_all()
+
+    return override_get_db
+
 
-    def override_get_staff_user():
-        return staff_user
+def _override_user(user: User):
+    """Auth override returning ``user`` as loaded by the request's own session."""
+    user_id = user.id
 
-    app.dependency_overrides[get_db] = override_get_db
-    app.dependency_overrides[get_current_staff_user] = override_get_staff_user
-    app.dependency_overrides[get_current_user] = override_get_staff_user
+    async def override_get_user(session: AsyncSession = Depends(get_db)):
+        return await session.get(User, user_id)
+
+    return override_get_user
+
+
+@pytest.fixture
+def client(db: Session, async_session_factory, staff_user: User) -> TestClient:
+    """Create a TestClient with DB and staff auth overrides."""
+    app.dependency_overrides[get_db] = _override_get_db(db, async_session_factory)
+    app.dependency_overrides[get_current_staff_user] = _override_user(staff_user)
+    app.dependency_overrides[get_current_user] = _override_user(staff_user)
 
     with TestClient(app) as c:
         yield c
@@ -341,12 +390,9 @@ def client(db: Session, staff_user: User) -> TestClient:
 
 
 @pytest.fixture
-def public_client(db: Session) -> TestClient:
+def public_client(db: Session, async_session_factory) -> TestClient:
     """Create a TestClient with DB override only (no auth, for public endpoints)."""
-    def override_get_db():
-        yield db
-
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db] = _override_get_db(db, async_session_factory)
 
     with TestClient(app) as c:
         yield c
@@ -355,18 +401,101 @@ def public_client(db: Session) -> TestClient:
 
 
 @pytest.fixture
-def unauth_client(db: Session, regular_user: User) -> TestClient:
+def unauth_client(db: Session, async_session_factory, regular_user: User) -> TestClient:
     """Create a TestClient with non-staff auth (for permission tests)."""
-    def override_get_db():
-        yield db
-
-    def override_get_user():
-        return regular_user
-
-    app.dependency_overrides[get_db] = override_get_db
-    app.dependency_overrides[get_current_user] = override_get_user
+    app.dependency_overrides[get_db] = _override_get_db(db, async_session_factory)
+    app.dependency_overrides[get_current_user] = _override_user(regular_user)
 
     with TestClient(app) as c:
         yield c
 
     app.dependency_overrides.clear()
+
+
+# --- Beatmap fixtures ---
+
+@pytest.fixture(autouse=True)
+def clear_preview_cache():
+    """Start every test with an empty preview cache (a process-wide singleton)."""
+    preview_cache.clear()
+    yield
+    preview_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def beatmap_store(tmp_path_factory, monkeypatch) -> Path:
+    """
+    Point the beatmap store singletons at a temporary directory.
+
+    The storage manager, blob store and downloader are rebuilt there and
+    their state swapped into the shared instances, so the app's routers see
+    them and the repository's own beatmaps directory is never written.
+    """
+    root = tmp_path_factory.mktemp("beatmaps")
+    for singleton, fresh in (
+        (beatmap_storage, BeatmapStorage(root, owner="tests")),
+        (blob_store, BlobStore(root / BLOB_DIR)),
+    ):
+        for name, value in vars(fresh).items():
+            monkeypatch.setattr(singleton, name, value)
+    downloader = BeatmapDownloader(storage_path=str(root), storage=beatmap_storage, blobs=blob_store)
+    for name, value in vars(downloader).items():
+        monkeypatch.setattr(beatmap_downloader, name, value)
+    return root
+
+
+@pytest.fixture(autouse=True)
+def stale_bracket_read_model():
+    """Every test starts from a fresh database, so the bracket snapshot must be rebuilt."""
+    bracket_read_model.invalidate()
+
+
+def _osu_file(version: str, beatmap_id: int, audio: str = "audio.mp3", notes: int = 8) -> str:
+    """Build a minimal 4K osu!mania .osu file."""
+    hit_objects = "\n".join(f"{64 + 128 * (i % 4)},192,{1000 + 250 * i},1,0,0:0:0:0:" for i in range(notes))
+    return (
+        "osu file format v14\n\n"
+        "[General]\n"
+        f"AudioFilename: {audio}\n"
+        "Mode: 3\n\n"
+        "[Metadata]\n"
+        "Title:Test Song\n"
+        "Artist:Test Artist\n"
+        "Creator:TestMapper\n"
+        f"Version:{version}\n"
+        f"BeatmapID:{beatmap_id}\n"
+        "BeatmapSetID:100\n\n"
+        "[Difficulty]\n"
+        "CircleSize:4\n\n"
+        "[TimingPoints]\n"
+        "0,500,4,1,0,100,1,0\n\n"
+        "[HitObjects]\n"
+        f"{hit_objects}\n"
+    )
+
+
+@pytest.fixture
+def make_osz():
+    """
+    Factory building an in-memory .osz archive.
+
+    ``difficulties`` maps difficulty names to beatmap IDs; ``extra_files``
+    maps member names to raw bytes; ``compression`` is the ZIP method used
+    for every member.
+    """
+    def _make(
+        difficulties: dict[str, int] | None = None,
+        extra_files: dict[str, bytes] | None = None,
+        compression: int = zipfile.ZIP_STORED,
+    ) -> bytes:
+        difficulties = difficulties or {"Normal": 1001, "Hard": 1002}
+        extra_files = {"audio.mp3": b"ID3" + b"\x00" * 512, "bg.jpg": b"\xff\xd8" + b"\x00" * 256, **(extra_files or {})}
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=compression) as zf:
+            for version, beatmap_id in difficulties.items():
+                zf.writestr(f"Test Artist - Test Song (TestMapper) [{version}].osu", _osu_file(version, beatmap_id))
+            for name, data in extra_files.items():
+                zf.writestr(name, data)
+        return buffer.getvalue()
+
+    return _make
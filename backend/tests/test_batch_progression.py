@@ -0,0 +1,231 @@
+"""Tests for batch result import and bracket progression."""
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models.match import Match
+from models.user import User
+from services.batch_progression import parse_results_csv, plan_batch
+
+
+def state(match_id, player1=None, player2=None, next_id=None, loser_next_id=None, bracket_type="winner"):
+    """In-memory match state as loaded by ``load_subgraph``."""
+    return {
+        "row": None,
+        "bracket_id": 1,
+        "bracket_type": bracket_type,
+        "map_id": 1,
+        "player1_id": player1,
+        "player2_id": player2,
+        "next_match_id": next_id,
+        "loser_next_match_id": loser_next_id,
+        "is_completed": False,
+        "is_grandfinals_reset": False,
+    }
+
+
+def generate(client, size=8) -> None:
+    """Generate a tournament for the registered players."""
+    client.post("/brackets/generate", json={"bracket_size": size})
+
+
+def rounds(db: Session) -> dict[str, list[Match]]:
+    """Current matches by round name, in ID order."""
+    db.expire_all()
+    by_round: dict[str, list[Match]] = {}
+    for match in db.scalars(select(Match).order_by(Match.id)):
+        by_round.setdefault(match.round_name, []).append(match)
+    return by_round
+
+
+class TestParseResultsCsv:
+    """Tests for CSV parsing."""
+
+    def test_parse(self):
+        """Rows become results; an empty winner_id is left out."""
+        results = parse_results_csv("match_id,player1_score,player2_score,winner_id\n1,3,1,\n2,0,0,7\n")
+
+        assert results == [
+            {"match_id": 1, "player1_score": 3, "player2_score": 1},
+            {"match_id": 2, "player1_score": 0, "player2_score": 0, "winner_id": 7},
+        ]
+
+    def test_header_spacing_and_case(self):
+        """Headers pasted with spaces or capitals are recognised."""
+        results = parse_results_csv("Match_ID, player1_score , Player2_Score, winner_id\n1, 3, 1, 5\n")
+
+        assert results == [{"match_id": 1, "player1_score": 3, "player2_score": 1, "winner_id": 5}]
+
+    @pytest.mark.parametrize("text", ["match_id,player1_score\n1,2", "match_id,player1_score,player2_score\n1,x,2"])
+    def test_invalid(self, text):
+        """Missing columns and non-integer values raise ValueError."""
+        with pytest.raises(ValueError):
+            parse_results_csv(text)
+
+
+class TestPlanBatch:
+    """Tests for applying results in memory."""
+
+    def test_topological_order(self):
+        """A match fed by another reported match is applied after it, whatever the input order."""
+        matches = {1: state(1, 10, 11, next_id=3), 2: state(2, 12, 13, next_id=3), 3: state(3)}
+
+        outcome = plan_batch(matches, [
+            {"match_id": 3, "player1_score": 1, "player2_score": 2},
+            {"match_id": 1, "player1_score": 2, "player2_score": 0},
+            {"match_id": 2, "player1_score": 0, "player2_score": 2},
+        ])
+
+        assert outcome["errors"] == []
+        assert [c["match_id"] for c in outcome["completed"]] == [1, 2, 3]
+        assert (matches[3]["player1_id"], matches[3]["player2_id"]) == (10, 13)
+        assert outcome["completed"][-1]["winner_id"] == 13
+        assert outcome["eliminated"] == [11, 12, 10]
+
+    def test_slot_conflict(self):
+        """A result whose winner has nowhere to go is rejected and changes nothing."""
+        matches = {1: state(1, 10, 11, next_id=2), 2: state(2, 20, 21)}
+
+        outcome = plan_batch(matches, [{"match_id": 1, "player1_score": 2, "player2_score": 0}])
+
+        assert outcome["errors"] == [{"match_id": 1, "error": "winner cannot move to match 2: both slots are already taken"}]
+        assert outcome["completed"] == [] and not matches[1]["is_completed"]
+
+    def test_winner_and_loser_share_target(self):
+        """In a two-player final both players move into the grand final."""
+        matches = {1: state(1, 10, 11, next_id=2, loser_next_id=2), 2: state(2, bracket_type="grandfinals")}
+
+        outcome = plan_batch(matches, [{"match_id": 1, "player1_score": 0, "player2_score": 1}])
+
+        assert [(p["role"], p["slot"]) for p in outcome["placements"]] == [("winner", "player1"), ("loser", "player2")]
+
+    @pytest.mark.parametrize("results,error", [
+        ([{"match_id": 1, "player1_score": 1, "player2_score": 1}], "scores are tied and no winner_id was given"),
+        ([{"match_id": 1, "player1_score": 1, "player2_score": 0, "winner_id": 99}], "winner 99 is not playing this match"),
+        ([{"match_id": 2, "player1_score": 1, "player2_score": 0}], "match is missing a player"),
+        ([{"match_id": 5, "player1_score": 1, "player2_score": 0}], "match not found"),
+        ([{"match_id": 1, "player1_score": 1, "player2_score": 0}] * 2, "reported more than once"),
+    ])
+    def test_rejected(self, results, error):
+        """Invalid results are reported per match."""
+        matches = {1: state(1, 10, 11, next_id=2), 2: state(2)}
+        assert plan_batch(matches, results)["errors"][0]["error"] == error
+
+
+class TestSubmitResults:
+    """Tests for ``POST /matches/results``."""
+
+    def test_round_from_csv_in_one_commit(self, client, db: Session, async_session_factory, registered_players, default_map):
+        """A whole round is read once, applied, and committed once."""
+        generate(client)
+        first_round = rounds(db)["Round of 8"]
+        csv = "match_id,player1_score,player2_score\n" + "\n".join(f"{m.id},2,1" for m in first_round)
+
+        statements = []
+        commits = []
+        sync_engine = async_session_factory.kw["bind"].sync_engine
+
+        def record(conn, clauseelement, multiparams, params, execution_options):
+            statements.append(str(clauseelement))
+
+        def record_commit(conn):
+            commits.append(conn)
+
+        event.listen(sync_engine, "before_execute", record)
+        event.listen(sync_engine, "commit", record_commit)
+        try:
+            resp = client.post("/matches/results", json={"csv": csv})
+        finally:
+            event.remove(sync_engine, "before_execute", record)
+            event.remove(sync_engine, "commit", record_commit)
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["applied"] is True
+        assert len(data["completed"]) == 4
+        assert sorted(p["role"] for p in data["placements"]) == ["loser"] * 4 + ["winner"] * 4
+        selects = [s for s in statements if s.startswith("SELECT")]
+        assert len(selects) == 2  # The staff user, then the subgraph
+        assert sum("FROM matches" in s for s in selects) == 1
+        assert len(commits) == 1
+
+        by_round = rounds(db)
+        assert all(m.is_completed and m.match_status == "completed" for m in by_round["Round of 8"])
+        assert {m.player1_id for m in by_round["Round of 8"]} == {
+            p for m in by_round["Winner Semifinals"] for p in (m.player1_id, m.player2_id)
+        }
+        assert all(m.player1_id and m.player2_id for m in by_round["Loser Round 1"])
+
+    def test_several_rounds_at_once(self, client, db: Session, registered_players, default_map):
+        """Results of a round and the round it feeds can be sent together."""
+        generate(client)
+        by_round = rounds(db)
+        results = [
+            {"match_id": m.id, "player1_score": 1, "player2_score": 2}
+            for m in by_round["Winner Semifinals"] + by_round["Round of 8"]
+        ]
+
+        resp = client.post("/matches/results", json={"results": results})
+
+        assert resp.status_code == 200
+        assert len(resp.json()["completed"]) == 6
+        finals = rounds(db)["Winner Finals"][0]
+        assert finals.player1_id and finals.player2_id
+
+    def test_dry_run_writes_nothing(self, client, db: Session, registered_players, default_map):
+        """A dry run returns the diff but leaves the bracket untouched."""
+        generate(client)
+        match = rounds(db)["Round of 8"][0]
+
+        resp = client.post("/matches/results", json={
+            "results": [{"match_id": match.id, "player1_score": 3, "player2_score": 0}], "dry_run": True,
+        })
+
+        data = resp.json()
+        assert (data["dry_run"], data["applied"]) == (True, False)
+        assert data["placements"][0]["player_id"] == match.player1_id
+        db.refresh(match)
+        assert not match.is_completed
+
+    def test_error_saves_nothing(self, client, db: Session, registered_players, default_map):
+        """One bad result rejects the batch."""
+        generate(client)
+        first, second = rounds(db)["Round of 8"][:2]
+
+        resp = client.post("/matches/results", json={"results": [
+            {"match_id": first.id, "player1_score": 3, "player2_score": 0},
+            {"match_id": second.id, "player1_score": 1, "player2_score": 1},
+        ]})
+
+        assert resp.status_code == 400
+        assert resp.json()["detail"]["errors"] == [{"match_id": second.id, "error": "scores are tied and no winner_id was given"}]
+        db.refresh(first)
+        assert not first.is_completed
+
+    def test_rest_of_tournament_in_one_batch(self, client, db: Session, four_players, default_map):
+        """Finals, loser rounds and grand finals apply in order; losers are eliminated and the reset is created."""
+        db.query(User).update({"stays_playing": True})
+        db.commit()
+        generate(client, size=4)
+        by_round = rounds(db)
+        client.post("/matches/results", json={"results": [
+            {"match_id": m.id, "player1_score": 2, "player2_score": 0} for m in by_round["Round of 4"]
+        ]})
+        remaining = [by_round[name][0] for name in ("Grand Finals", "Loser Finals", "Winner Finals", "Loser Semifinals")]
+
+        resp = client.post("/matches/results", json={"results": [
+            {"match_id": m.id, "player1_score": 2, "player2_score": 0} for m in remaining
+        ]})
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert [c["match_id"] for c in data["completed"]][-1] == remaining[0].id
+        assert len(data["eliminated"]) == 2
+        assert all(db.get(User, player_id).stays_playing is False for player_id in data["eliminated"])
+        reset = db.get(Match, data["grandfinals_reset"]["match_id"])
+        assert reset.is_grandfinals_reset and reset.player1_id and reset.player2_id
+
+    def test_requires_one_source(self, client):
+        """Exactly one of results and csv must be sent."""
+        assert client.post("/matches/results", json={}).status_code == 400
+        assert client.post("/matches/results", json={"results": [], "csv": "x"}).status_code == 400
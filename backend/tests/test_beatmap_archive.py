@@ -0,0 +1,197 @@
+"""Tests for serving beatmap assets straight from .osz archives."""
+import asyncio
+import io
+import os
+import zipfile
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.beatmap_archive import ArchiveIndexCache, OszArchive, StreamScanner
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_extraction import ARCHIVE_FILE
+from services.beatmap_mirrors import MirrorRegistry
+from services.beatmap_static import BeatmapStaticFiles, parse_range
+
+AUDIO = bytes(range(256)) * 64  # 16 KiB with a recognisable pattern
+
+
+@pytest.fixture
+def archive_path(tmp_path, make_osz):
+    path = tmp_path / "set.osz"
+    path.write_bytes(make_osz(extra_files={"audio.mp3": AUDIO, "SB/Star.png": b"\x89PNG" * 8}))
+    return path
+
+
+def download_archive_mode(tmp_path, payload: bytes) -> BeatmapDownloader:
+    """Download set 100 in archive storage mode from a stand-in mirror."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=payload))
+    downloader = BeatmapDownloader(
+        storage_path=str(tmp_path),
+        mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+        transport=transport,
+        storage_mode="archive",
+    )
+    result = asyncio.run(downloader.download("100"))
+    assert result["status"] == "downloaded"
+    return downloader
+
+
+class TestOszArchive:
+    """Tests for the central-directory index and member reads."""
+
+    def test_stored_member_offsets(self, archive_path):
+        """Stored members are located by offset in the raw archive bytes."""
+        archive = OszArchive(archive_path)
+        member = archive.find("audio.mp3")
+        raw = archive_path.read_bytes()
+
+        assert member.is_stored
+        assert raw[member.data_offset:member.data_offset + member.file_size] == AUDIO
+        assert b"".join(archive.iter_range(member, 1000, 1999)) == AUDIO[1000:2000]
+
+    def test_compressed_member_ranges(self, tmp_path, make_osz):
+        """Ranges of deflated members are decompressed correctly."""
+        path = tmp_path / "deflated.osz"
+        path.write_bytes(make_osz(extra_files={"audio.mp3": AUDIO}, compression=zipfile.ZIP_DEFLATED))
+        archive = OszArchive(path)
+        member = archive.find("audio.mp3")
+
+        assert not member.is_stored
+        assert b"".join(archive.iter_range(member, 5000, 9999, chunk_size=1024)) == AUDIO[5000:10000]
+        assert archive.read("audio.mp3") == AUDIO
+
+    def test_case_insensitive_lookup(self, archive_path):
+        archive = OszArchive(archive_path)
+        assert archive.find("sb/star.png").name == "SB/Star.png"
+        assert archive.find("missing.png") is None
+
+    def test_cache_reuses_and_invalidates(self, archive_path, make_osz):
+        """The index is reused until the archive file changes."""
+        cache = ArchiveIndexCache(max_entries=2)
+        first = cache.get(archive_path)
+        assert cache.get(archive_path) is first
+
+        replacement = archive_path.with_name("new.osz")
+        replacement.write_bytes(make_osz(extra_files={"other.ogg": b"OggS"}))
+        os.replace(replacement, archive_path)
+
+        assert cache.get(archive_path).find("other.ogg") is not None
+        assert cache.get(archive_path.with_name("missing.osz")) is None
+
+
+class TestStreamScanner:
+    """Tests for reading members out of a partially downloaded archive."""
+
+    def scan(self, payload: bytes, chunk_size: int) -> list[tuple[int, str, bytes]]:
+        """Feed ``payload`` in chunks; return (bytes fed so far, name, data) per member."""
+        scanner = StreamScanner(lambda name: name.endswith(".osu"))
+        found = []
+        for offset in range(0, len(payload), chunk_size):
+            for name, data in scanner.feed(payload[offset:offset + chunk_size]):
+                found.append((offset + chunk_size, name, data))
+        return found
+
+    @pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+    def test_members_before_archive_ends(self, make_osz, compression):
+        """Difficulties are returned intact before the archive has fully arrived."""
+        audio = os.urandom(16 * 1024)  # Incompressible, like real audio
+        payload = make_osz(extra_files={"audio.mp3": audio}, compression=compression)
+        expected = {name: zipfile.ZipFile(io.BytesIO(payload)).read(name) for name in
+                    zipfile.ZipFile(io.BytesIO(payload)).namelist() if name.endswith(".osu")}
+
+        for chunk_size in (1, 7, 4096):
+            found = self.scan(payload, chunk_size)
+            assert {name: data for _, name, data in found} == expected
+            assert max(fed for fed, _, _ in found) < len(payload) - len(audio) // 2
+
+    def test_stops_on_data_descriptor(self, make_osz):
+        """Archives written as a stream (sizes after the data) are not scanned."""
+        class Unseekable(io.RawIOBase):
+            def __init__(self):
+                self.data = bytearray()
+
+            def writable(self):
+                return True
+
+            def write(self, b):
+                self.data += b
+                return len(b)
+
+        out = Unseekable()
+        with zipfile.ZipFile(out, "w") as zf:
+            zf.writestr("a [Hard].osu", "osu file format v14")
+        scanner = StreamScanner(lambda name: True)
+
+        assert scanner.feed(bytes(out.data)) == []
+        assert scanner.stopped
+
+
+class TestParseRange:
+    """Tests for Range header parsing."""
+
+    def test_forms(self):
+        assert parse_range(None, 100) is None
+        assert parse_range("bytes=10-19", 100) == (10, 19)
+        assert parse_range("bytes=90-", 100) == (90, 99)
+        assert parse_range("bytes=-10", 100) == (90, 99)
+        assert parse_range("bytes=50-500", 100) == (50, 99)
+        assert parse_range("bytes=0-1,5-6", 100) is None
+
+    def test_unsatisfiable(self):
+        with pytest.raises(ValueError):
+            parse_range("bytes=100-", 100)
+
+
+class TestArchiveStorageMode:
+    """Tests for downloading and serving in archive storage mode."""
+
+    @pytest.fixture
+    def client(self, tmp_path, make_osz):
+        payload = make_osz(extra_files={"audio.mp3": AUDIO})
+        downloader = download_archive_mode(tmp_path, payload)
+        app = FastAPI()
+        app.mount("/beatmaps", BeatmapStaticFiles(storage=downloader.storage, directory=str(tmp_path)))
+        self.downloader = downloader
+        return TestClient(app)
+
+    def test_archive_is_kept_without_extraction(self, client, tmp_path):
+        """Only the archive, manifest and derived notes are written."""
+        set_path = tmp_path / "100"
+        assert (set_path / ARCHIVE_FILE).exists()
+        assert not (set_path / "audio.mp3").exists()
+        manifest = self.downloader.get_manifest("100")
+        assert manifest["storage_mode"] == "archive"
+        assert len(manifest["difficulties"]) == 2
+        assert self.downloader.get_notes_json("100", beatmap_id=1002)["metadata"]["version"] == "Hard"
+
+    def test_full_and_range_requests(self, client):
+        """Members are served whole or by byte range."""
+        full = client.get("/beatmaps/100/audio.mp3")
+        assert full.status_code == 200
+        assert full.content == AUDIO
+        assert full.headers["accept-ranges"] == "bytes"
+        assert full.headers["content-type"] == "audio/mpeg"
+
+        partial = client.get("/beatmaps/100/audio.mp3", headers={"Range": "bytes=100-199"})
+        assert partial.status_code == 206
+        assert partial.content == AUDIO[100:200]
+        assert partial.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+
+        bad = client.get("/beatmaps/100/audio.mp3", headers={"Range": f"bytes={len(AUDIO)}-"})
+        assert bad.status_code == 416
+
+    def test_head_and_missing(self, client):
+        head = client.head("/beatmaps/100/bg.jpg")
+        assert head.status_code == 200
+        assert head.content == b""
+        assert client.get("/beatmaps/100/missing.png").status_code == 404
+        assert client.get("/beatmaps/100/.archive.osz").status_code == 404
+
+    def test_derived_notes_served_from_disk(self, client):
+        """Notes JSON written next to the archive is served as a normal file."""
+        response = client.get("/beatmaps/100/notes/1001.json")
+        assert response.status_code == 200
+        assert response.json()["metadata"]["beatmap_id"] == 1001
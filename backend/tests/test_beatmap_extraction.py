@@ -0,0 +1,86 @@
+"""Tests for selective .osz extraction."""
+from services.beatmap_extraction import (
+    ARCHIVE_FILE,
+    ExtractionPolicy,
+    extract_archive,
+    extract_skipped_member,
+    retain_archive,
+)
+from services.beatmap_manifest import read_manifest, write_manifest
+
+POLICY = ExtractionPolicy({".osu", ".osb", ".mp3", ".jpg", ".png"}, max_member_bytes=1024)
+
+
+class TestExtractionPolicy:
+    """Tests for ExtractionPolicy.skip_reason."""
+
+    def test_allowed_type(self):
+        assert POLICY.skip_reason("bg.JPG", 100) is None
+
+    def test_disallowed_type(self):
+        assert POLICY.skip_reason("video.mp4", 100) == "type"
+
+    def test_oversized_member(self):
+        assert POLICY.skip_reason("sb/huge.png", 4096) == "size"
+
+    def test_no_size_cap(self):
+        assert ExtractionPolicy({".png"}).skip_reason("huge.png", 10**9) is None
+
+
+class TestExtractArchive:
+    """Tests for extract_archive and lazy extraction."""
+
+    def write_osz(self, tmp_path, make_osz, **extra):
+        osz_path = tmp_path / "100.osz"
+        osz_path.write_bytes(make_osz(extra_files=extra))
+        return osz_path
+
+    def test_skips_video_and_oversized(self, tmp_path, make_osz):
+        """Videos and members above the cap are not extracted."""
+        osz_path = self.write_osz(tmp_path, make_osz, **{
+            "video.mp4": b"\x00" * 64,
+            "sb/huge.png": b"\x00" * 4096,
+            "sb/small.png": b"\x00" * 16,
+        })
+        extract_path = tmp_path / "100"
+
+        result = extract_archive(osz_path, extract_path, POLICY)
+
+        skipped = {entry["name"]: entry["reason"] for entry in result["skipped"]}
+        assert skipped == {"video.mp4": "type", "sb/huge.png": "size"}
+        assert not (extract_path / "video.mp4").exists()
+        assert (extract_path / "sb" / "small.png").exists()
+        assert len(list(extract_path.glob("*.osu"))) == 2
+
+    def test_referenced_audio_is_always_extracted(self, tmp_path, make_osz):
+        """The AudioFilename of a difficulty bypasses the size cap."""
+        osz_path = self.write_osz(tmp_path, make_osz, **{"audio.mp3": b"\x00" * 4096})
+        extract_path = tmp_path / "100"
+
+        result = extract_archive(osz_path, extract_path, POLICY)
+
+        assert (extract_path / "audio.mp3").exists()
+        assert "audio.mp3" not in {entry["name"] for entry in result["skipped"]}
+
+    def test_lazy_extraction_from_retained_archive(self, tmp_path, make_osz):
+        """A skipped member is extracted on request when the archive is kept."""
+        osz_path = self.write_osz(tmp_path, make_osz, **{"video.mp4": b"\x01" * 64})
+        extract_path = tmp_path / "100"
+        result = extract_archive(osz_path, extract_path, POLICY)
+        retain_archive(osz_path, extract_path)
+        write_manifest(extract_path, {"skipped": result["skipped"], "lazy_extract": True})
+
+        assert (extract_path / ARCHIVE_FILE).exists()
+        assert extract_skipped_member(extract_path, "video.mp4") is True
+        assert (extract_path / "video.mp4").read_bytes() == b"\x01" * 64
+        assert extract_skipped_member(extract_path, "missing.png") is False
+
+    def test_lazy_extraction_without_archive(self, tmp_path, make_osz):
+        """Nothing is extracted once the archive was discarded."""
+        osz_path = self.write_osz(tmp_path, make_osz, **{"video.mp4": b"\x01" * 64})
+        extract_path = tmp_path / "100"
+        result = extract_archive(osz_path, extract_path, POLICY)
+        write_manifest(extract_path, {"skipped": result["skipped"], "lazy_extract": False})
+
+        assert extract_skipped_member(extract_path, "video.mp4") is False
+        assert read_manifest(extract_path)["skipped"][0]["name"] == "video.mp4"
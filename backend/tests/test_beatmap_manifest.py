@@ -0,0 +1,186 @@
+"""Tests for beatmapset manifests and the manifest cache."""
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_extraction import ExtractionPolicy, extract_archive
+from services.beatmap_manifest import ManifestCache, build_manifest, read_manifest, write_manifest
+
+
+@pytest.fixture
+def downloader(tmp_path) -> BeatmapDownloader:
+    return BeatmapDownloader(storage_path=str(tmp_path), policy=ExtractionPolicy({".osu", ".mp3", ".jpg"}))
+
+
+def install_set(downloader: BeatmapDownloader, make_osz, beatmapset_id: str = "100") -> Path:
+    """Extract an archive the way a download does and generate its notes."""
+    osz_path = downloader.storage_path / f"{beatmapset_id}.osz"
+    osz_path.write_bytes(make_osz(extra_files={"video.mp4": b"\x00" * 32}))
+    set_path = downloader.get_beatmapset_path(beatmapset_id)
+    extraction = extract_archive(osz_path, set_path, downloader.policy)
+    write_manifest(set_path, build_manifest(
+        beatmapset_id,
+        {e["name"]: e["size"] for e in extraction["extracted"]},
+        skipped=extraction["skipped"],
+    ))
+    downloader.generate_notes_json(beatmapset_id)
+    return set_path
+
+
+class TestManifest:
+    """Tests for manifest contents."""
+
+    def test_lists_difficulties_and_assets(self, downloader, make_osz):
+        """Notes generation records difficulties with beatmap IDs and files."""
+        install_set(downloader, make_osz)
+        manifest = downloader.get_manifest("100")
+
+        assert manifest["audio_files"] == ["audio.mp3"]
+        assert manifest["background_file"] == "bg.jpg"
+        assert manifest["skipped"][0]["name"] == "video.mp4"
+        by_id = {d["beatmap_id"]: d for d in manifest["difficulties"]}
+        assert set(by_id) == {1001, 1002}
+        assert by_id[1002]["version"] == "Hard"
+        assert by_id[1002]["audio_file"] == "audio.mp3"
+        assert by_id[1002]["notes_size"] > 0
+
+    def test_hot_paths_do_not_scan_directories(self, downloader, make_osz, monkeypatch):
+        """exists, get_beatmap_files and get_notes_json use only the manifest."""
+        install_set(downloader, make_osz)
+        downloader.storage.usage()  # The storage index is loaded (or rebuilt) once per process
+
+        def no_scan(*args, **kwargs):
+            raise AssertionError("directory scan on a hot path")
+
+        monkeypatch.setattr(Path, "glob", no_scan)
+        monkeypatch.setattr(Path, "iterdir", no_scan)
+
+        assert downloader.exists("100")
+        assert downloader.get_beatmap_files("100")["osu_files"]
+        assert downloader.get_notes_json("100", "Hard")["metadata"]["version"] == "Hard"
+
+    def test_legacy_set_gets_manifest(self, downloader, make_osz):
+        """A set extracted before manifests existed gets one built once."""
+        set_path = downloader.get_beatmapset_path("200")
+        osz_path = downloader.storage_path / "200.osz"
+        osz_path.write_bytes(make_osz())
+        with zipfile.ZipFile(osz_path) as zf:
+            zf.extractall(set_path)
+
+        assert read_manifest(set_path) is None
+        assert downloader.exists("200")
+        assert len(read_manifest(set_path)["osu_files"]) == 2
+
+    def test_missing_set(self, downloader):
+        assert downloader.exists("999") is False
+        assert downloader.get_beatmap_files("999") == {"exists": False}
+        assert downloader.get_notes_json("999") is None
+
+
+class TestManifestCache:
+    """Tests for mtime-based invalidation."""
+
+    def test_cache_reloads_after_rewrite(self, tmp_path):
+        """A rewritten manifest is picked up on the next lookup."""
+        cache = ManifestCache()
+        write_manifest(tmp_path, build_manifest("1", {"a.osu": 1}))
+        assert cache.get(tmp_path)["osu_files"] == ["a.osu"]
+
+        write_manifest(tmp_path, build_manifest("1", {"a.osu": 1, "b.osu": 1}))
+        assert cache.get(tmp_path)["osu_files"] == ["a.osu", "b.osu"]
+
+    def test_cache_serves_unchanged_manifest_from_memory(self, tmp_path, monkeypatch):
+        """An unchanged manifest is not re-read."""
+        cache = ManifestCache()
+        write_manifest(tmp_path, build_manifest("1", {"a.osu": 1}))
+        first = cache.get(tmp_path)
+
+        monkeypatch.setattr("services.beatmap_manifest.read_manifest", lambda path: pytest.fail("re-read"))
+        assert cache.get(tmp_path) is first
+
+    def test_deleted_manifest(self, tmp_path):
+        cache = ManifestCache()
+        write_manifest(tmp_path, build_manifest("1", {}))
+        cache.get(tmp_path)
+        (tmp_path / ".manifest.json").unlink()
+        assert cache.get(tmp_path) is None
+
+
+class TestNotesIndex:
+    """Tests for notes lookup by beatmap ID."""
+
+    def test_notes_files_keyed_by_beatmap_id(self, downloader, make_osz):
+        """Each difficulty's notes file is named after its BeatmapID."""
+        set_path = install_set(downloader, make_osz)
+        manifest = downloader.get_manifest("100")
+
+        assert manifest["notes_index"] == {"1001": "1001.json", "1002": "1002.json"}
+        assert (set_path / "notes" / "1002.json").exists()
+
+    def test_lookup_by_beatmap_id(self, downloader, make_osz):
+        """Overlapping names ("Hard" vs "Hard+") resolve to the right chart."""
+        osz_path = downloader.storage_path / "300.osz"
+        osz_path.write_bytes(make_osz(difficulties={"Hard+": 3001, "Hard": 3002}))
+        set_path = downloader.get_beatmapset_path("300")
+        extraction = extract_archive(osz_path, set_path, downloader.policy)
+        write_manifest(set_path, build_manifest("300", {e["name"]: e["size"] for e in extraction["extracted"]}))
+
+        assert downloader.get_notes_json("300", beatmap_id=3002)["metadata"]["version"] == "Hard"
+        assert downloader.get_notes_json("300", beatmap_id="3001")["metadata"]["version"] == "Hard+"
+        assert downloader.get_notes_json("300", "[4K] Hard")["metadata"]["version"] == "Hard"
+
+    def test_unknown_difficulty(self, downloader, make_osz):
+        """A selector that matches nothing does not fall back to another chart."""
+        install_set(downloader, make_osz)
+
+        assert downloader.get_notes_json("100", "Insane", beatmap_id=9999) is None
+        assert downloader.get_notes_json("100")["metadata"]["beatmap_id"] in (1001, 1002)
+
+    def test_unsubmitted_difficulty_uses_name(self, downloader, make_osz):
+        """Difficulties without a BeatmapID are stored and found by name."""
+        osz_path = downloader.storage_path / "400.osz"
+        osz_path.write_bytes(make_osz(difficulties={"Easy": 0}))
+        set_path = downloader.get_beatmapset_path("400")
+        extraction = extract_archive(osz_path, set_path, downloader.policy)
+        write_manifest(set_path, build_manifest("400", {e["name"]: e["size"] for e in extraction["extracted"]}))
+
+        assert downloader.get_notes_json("400", "Easy")["metadata"]["version"] == "Easy"
+        assert downloader.get_manifest("400")["notes_index"] == {}
+        assert (set_path / "notes" / "name-Easy.json").exists()
+
+    def test_single_unsubmitted_difficulty_fallback(self, downloader, make_osz):
+        """An ID lookup without a usable name falls back to the only difficulty lacking a BeatmapID."""
+        osz_path = downloader.storage_path / "600.osz"
+        osz_path.write_bytes(make_osz(difficulties={"Normal": 6001, "Hard": 0}))
+        set_path = downloader.get_beatmapset_path("600")
+        extraction = extract_archive(osz_path, set_path, downloader.policy)
+        write_manifest(set_path, build_manifest("600", {e["name"]: e["size"] for e in extraction["extracted"]}))
+
+        assert downloader.get_notes_json("600", beatmap_id=6002)["metadata"]["version"] == "Hard"
+        assert downloader.get_notes_json("600", beatmap_id=6001)["metadata"]["version"] == "Normal"
+
+    def test_numeric_name_does_not_collide(self, downloader, make_osz):
+        """An unsubmitted difficulty named like another's BeatmapID gets its own file."""
+        osz_path = downloader.storage_path / "500.osz"
+        osz_path.write_bytes(make_osz(difficulties={"Hard": 5001, "5001": 0}))
+        set_path = downloader.get_beatmapset_path("500")
+        extraction = extract_archive(osz_path, set_path, downloader.policy)
+        write_manifest(set_path, build_manifest("500", {e["name"]: e["size"] for e in extraction["extracted"]}))
+
+        assert downloader.get_notes_json("500", beatmap_id=5001)["metadata"]["version"] == "Hard"
+        assert downloader.get_notes_json("500", "5001")["metadata"]["version"] == "5001"
+
+    def test_regeneration_removes_stale_files(self, downloader, make_osz):
+        """Notes files left by an older naming scheme are removed when a set is regenerated."""
+        set_path = install_set(downloader, make_osz)
+        (set_path / "notes" / "Hard.json").write_text("{}")
+        (set_path / "notes" / "Hard.json.gz").write_bytes(b"")
+
+        downloader.generate_notes_json("100")
+
+        assert sorted(p.name for p in (set_path / "notes").iterdir() if not p.name.endswith((".gz", ".br"))) == [
+            "1001.json", "1002.json",
+        ]
+        assert not (set_path / "notes" / "Hard.json.gz").exists()
@@ -0,0 +1,195 @@
+"""Tests for the mirror registry and mirror racing in BeatmapDownloader."""
+import asyncio
+
+import httpx
+import pytest
+
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_mirrors import MirrorRegistry
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StandInMirror:
+    """A local mirror with injected delays and failures."""
+
+    def __init__(self, payload: bytes, first_byte_delay: float = 0.0, status: int = 200, broken: bool = False):
+        self.payload = payload
+        self.first_byte_delay = first_byte_delay
+        self.status = status
+        self.broken = broken
+        self.requests = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.broken:
+            raise httpx.ConnectError("connection refused", request=request)
+        if self.status != 200:
+            return httpx.Response(self.status)
+
+        async def body():
+            await asyncio.sleep(self.first_byte_delay)
+            yield self.payload
+
+        return httpx.Response(200, content=body())
+
+
+def make_downloader(tmp_path, mirrors: dict[str, StandInMirror], budget: float = 0.05) -> BeatmapDownloader:
+    """Build a downloader whose mirrors are served by the stand-ins, keyed by host."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return await mirrors[request.url.host].handle(request)
+
+    registry = MirrorRegistry([f"http://{host}/d/{{beatmapset_id}}" for host in mirrors])
+    downloader = BeatmapDownloader(
+        storage_path=str(tmp_path),
+        mirrors=registry,
+        transport=httpx.MockTransport(handler),
+    )
+    downloader.latency_budget = budget
+    return downloader
+
+
+class TestMirrorRegistry:
+    """Tests for health scoring and backoff."""
+
+    def test_unknown_mirrors_keep_configuration_order(self):
+        """Mirrors without samples are ranked in configuration order."""
+        registry = MirrorRegistry(["http://a/{beatmapset_id}", "http://b/{beatmapset_id}"])
+        assert [m.name for m in registry.ranked()] == ["a", "b"]
+
+    def test_faster_mirror_ranks_first(self):
+        """Lower rolling latency ranks first."""
+        registry = MirrorRegistry(["http://a/{beatmapset_id}", "http://b/{beatmapset_id}"])
+        a, b = registry.mirrors
+        registry.record_success(a, 2.0)
+        registry.record_success(b, 0.2)
+        assert registry.ranked()[0] is b
+
+    def test_error_rate_penalizes_score(self):
+        """A fast but unreliable mirror ranks below a slower reliable one."""
+        clock = FakeClock()
+        registry = MirrorRegistry(["http://a/{beatmapset_id}", "http://b/{beatmapset_id}"], clock=clock)
+        a, b = registry.mirrors
+        for _ in range(3):
+            registry.record_success(a, 0.1)
+            registry.record_failure(a)
+        registry.record_success(a, 0.1)  # Clears backoff, keeps error rate
+        registry.record_success(b, 0.2)
+        assert registry.ranked()[0] is b
+
+    def test_failure_backs_off_exponentially(self):
+        """Consecutive failures double the backoff up to the cap."""
+        clock = FakeClock()
+        registry = MirrorRegistry(["http://a/{beatmapset_id}"], base_backoff=5.0, max_backoff=12.0, clock=clock)
+        mirror = registry.mirrors[0]
+
+        registry.record_failure(mirror)
+        assert mirror.backoff_until == clock.now + 5.0
+        registry.record_failure(mirror)
+        assert mirror.backoff_until == clock.now + 10.0
+        registry.record_failure(mirror)
+        assert mirror.backoff_until == clock.now + 12.0
+
+    def test_backed_off_mirror_ranks_last_until_expired(self):
+        """A backed-off mirror is skipped until its backoff expires."""
+        clock = FakeClock()
+        registry = MirrorRegistry(["http://a/{beatmapset_id}", "http://b/{beatmapset_id}"], clock=clock)
+        a, b = registry.mirrors
+        registry.record_failure(a)
+        assert registry.ranked() == [b, a]
+
+        clock.now += registry.base_backoff + 1
+        assert not registry.is_backed_off(a)
+        registry.record_success(a, 0.1)
+        assert registry.ranked()[0] is a
+
+    def test_requires_a_mirror(self):
+        """An empty registry is a configuration error."""
+        with pytest.raises(ValueError):
+            MirrorRegistry([])
+
+
+class TestMirrorRacing:
+    """Tests for racing and failover using local stand-in mirrors."""
+
+    def test_downloads_from_best_mirror(self, tmp_path, make_osz):
+        """A fast primary mirror serves the download alone."""
+        primary = StandInMirror(make_osz())
+        secondary = StandInMirror(make_osz())
+        downloader = make_downloader(tmp_path, {"primary": primary, "secondary": secondary})
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["status"] == "downloaded"
+        assert result["mirror"] == "primary"
+        assert secondary.requests == 0
+        assert downloader.exists("100")
+
+    def test_slow_mirror_is_raced(self, tmp_path, make_osz):
+        """A second mirror is raced when the first exceeds the latency budget."""
+        slow = StandInMirror(make_osz(), first_byte_delay=1.0)
+        fast = StandInMirror(make_osz())
+        downloader = make_downloader(tmp_path, {"slow": slow, "fast": fast}, budget=0.05)
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["status"] == "downloaded"
+        assert result["mirror"] == "fast"
+        assert slow.requests == 1
+        assert fast.requests == 1
+
+    def test_failed_mirror_fails_over_and_backs_off(self, tmp_path, make_osz):
+        """A broken mirror is replaced immediately and backed off."""
+        broken = StandInMirror(make_osz(), broken=True)
+        healthy = StandInMirror(make_osz())
+        downloader = make_downloader(tmp_path, {"broken": broken, "healthy": healthy}, budget=5.0)
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["status"] == "downloaded"
+        assert result["mirror"] == "healthy"
+        broken_mirror = downloader.mirrors.mirrors[0]
+        assert downloader.mirrors.is_backed_off(broken_mirror)
+        assert downloader.mirrors.ranked()[0].name == "healthy"
+
+    def test_server_error_counts_as_failure(self, tmp_path, make_osz):
+        """HTTP 5xx responses count against the mirror's health."""
+        erroring = StandInMirror(make_osz(), status=503)
+        healthy = StandInMirror(make_osz())
+        downloader = make_downloader(tmp_path, {"erroring": erroring, "healthy": healthy})
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["mirror"] == "healthy"
+        assert downloader.mirrors.mirrors[0].error_rate == 1.0
+
+    def test_not_found_everywhere(self, tmp_path):
+        """Returns not_found when every mirror answers 404, without backing off."""
+        a = StandInMirror(b"", status=404)
+        b = StandInMirror(b"", status=404)
+        downloader = make_downloader(tmp_path, {"a": a, "b": b})
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["status"] == "not_found"
+        assert a.requests == 1 and b.requests == 1
+        assert not any(downloader.mirrors.is_backed_off(m) for m in downloader.mirrors.mirrors)
+
+    def test_all_mirrors_failing(self, tmp_path):
+        """Returns an error when every mirror fails."""
+        downloader = make_downloader(tmp_path, {
+            "a": StandInMirror(b"", broken=True),
+            "b": StandInMirror(b"", status=500),
+        })
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["status"] == "error"
@@ -0,0 +1,216 @@
+"""Tests for staged publication of beatmapsets in a shared store."""
+import asyncio
+import threading
+import time
+import zipfile
+
+import httpx
+
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_extraction import ExtractionPolicy
+from services.beatmap_manifest import build_manifest, write_manifest
+from services.beatmap_mirrors import MirrorRegistry
+from services.beatmap_publish import STAGING_DIR, SetLocks, make_staging_path, publish, sweep_staging
+
+
+def make_downloader(tmp_path, payload: bytes, delay: float = 0.0) -> tuple[BeatmapDownloader, list]:
+    """Downloader whose single mirror serves ``payload``; returns it with a request log."""
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, content=payload)
+
+    downloader = BeatmapDownloader(
+        storage_path=str(tmp_path),
+        mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+        transport=httpx.MockTransport(handler),
+        policy=ExtractionPolicy({".osu", ".mp3", ".jpg"}),
+    )
+    return downloader, requests
+
+
+class TestPublish:
+    """Tests for the staging and rename helpers."""
+
+    def test_publish_new_and_replace(self, tmp_path):
+        """A staged directory replaces the target without leftovers."""
+        target = tmp_path / "100"
+        first = make_staging_path(tmp_path, "100")
+        (first / "a.osu").write_text("one")
+        publish(first, target)
+        assert (target / "a.osu").read_text() == "one"
+
+        second = make_staging_path(tmp_path, "100")
+        (second / "b.osu").write_text("two")
+        publish(second, target)
+        assert not (target / "a.osu").exists()
+        assert (target / "b.osu").read_text() == "two"
+        assert list((tmp_path / STAGING_DIR).iterdir()) == []
+
+    def test_sweep_keeps_recent_staging(self, tmp_path):
+        make_staging_path(tmp_path, "100")
+        assert sweep_staging(tmp_path, max_age=3600) == 0
+        assert sweep_staging(tmp_path, max_age=-1) == 1
+
+
+class TestSetLocks:
+    """Tests for the per-set writer lock."""
+
+    def test_lock_excludes_other_lock_holders(self, tmp_path):
+        """Two lock managers on the same store (as two backends) exclude each other."""
+        production, staging = SetLocks(tmp_path), SetLocks(tmp_path)
+        acquired = threading.Event()
+
+        def contender():
+            with staging.hold("100"):
+                acquired.set()
+
+        with production.hold("100"):
+            thread = threading.Thread(target=contender)
+            thread.start()
+            assert not acquired.wait(0.2)
+        assert acquired.wait(2)
+        thread.join()
+
+    def test_released_locks_are_dropped(self, tmp_path):
+        """Per-set thread locks do not accumulate once their holders are gone."""
+        locks = SetLocks(tmp_path)
+        for beatmapset_id in ("100", "200", "300"):
+            with locks.hold(beatmapset_id):
+                assert beatmapset_id in locks._thread_locks
+        with locks.try_hold("400") as held:
+            assert held
+
+        assert locks._thread_locks == {}
+
+    def test_cancelled_waiter_does_not_strand_lock(self, tmp_path):
+        """A request cancelled while waiting for the lock leaves the set acquirable."""
+        downloader, _ = make_downloader(tmp_path, b"")
+        other_backend = SetLocks(tmp_path)
+
+        async def scenario():
+            async def wait_for_set():
+                async with downloader._exclusive("100"):
+                    pass
+
+            with other_backend.hold("100"):
+                waiter = asyncio.create_task(wait_for_set())
+                await asyncio.sleep(0.1)
+                waiter.cancel()
+                await asyncio.gather(waiter, return_exceptions=True)
+            # The orphaned acquire completes now and must hand the lock back
+            await asyncio.sleep(0.1)
+
+            async def acquire_again():
+                async with downloader._exclusive("100"):
+                    pass
+
+            await asyncio.wait_for(acquire_again(), timeout=2)
+            with other_backend.hold("100"):
+                pass
+
+        asyncio.run(scenario())
+
+    def test_different_sets_do_not_block(self, tmp_path):
+        locks = SetLocks(tmp_path)
+        with locks.hold("100"):
+            with SetLocks(tmp_path).hold("200"):
+                pass
+
+
+class TestStagedDownload:
+    """Tests for downloads published through staging."""
+
+    def test_download_leaves_no_staging(self, tmp_path, make_osz):
+        """A published set carries a generation and the staging area is empty."""
+        downloader, _ = make_downloader(tmp_path, make_osz())
+
+        assert asyncio.run(downloader.download("100"))["status"] == "downloaded"
+
+        manifest = downloader.get_manifest("100")
+        assert manifest["generation"]
+        assert len(manifest["difficulties"]) == 2
+        assert list((tmp_path / STAGING_DIR).iterdir()) == []
+
+    def test_failed_download_is_discarded(self, tmp_path):
+        """An invalid archive never becomes visible in the store."""
+        downloader, _ = make_downloader(tmp_path, b"not a zip")
+
+        result = asyncio.run(downloader.download("100"))
+
+        assert result["status"] == "error"
+        assert not (tmp_path / "100").exists()
+        assert list((tmp_path / STAGING_DIR).iterdir()) == []
+
+    def test_concurrent_downloads_fetch_once(self, tmp_path, make_osz):
+        """Simultaneous requests for one set share a single download."""
+        downloader, requests = make_downloader(tmp_path, make_osz(), delay=0.05)
+
+        async def download_three():
+            return await asyncio.gather(*(downloader.download("100") for _ in range(3)))
+
+        statuses = sorted(result["status"] for result in asyncio.run(download_three()))
+
+        assert statuses == ["downloaded", "exists", "exists"]
+        assert len(requests) == 1
+
+    def test_forced_download_replaces_published_set(self, tmp_path, make_osz):
+        downloader, _ = make_downloader(tmp_path, make_osz())
+        asyncio.run(downloader.download("100"))
+        first = downloader.get_manifest("100")["generation"]
+
+        asyncio.run(downloader.download("100", force=True))
+
+        assert downloader.get_manifest("100")["generation"] != first
+        assert downloader.exists("100")
+
+
+class TestSingleRegeneration:
+    """Tests for notes regeneration by concurrent readers."""
+
+    def test_legacy_set_regenerated_once(self, tmp_path, make_osz, monkeypatch):
+        """Many readers of an unstamped set trigger exactly one regeneration."""
+        downloader, _ = make_downloader(tmp_path, b"")
+        set_path = tmp_path / "100"
+        osz_path = tmp_path / "100.osz"
+        osz_path.write_bytes(make_osz())
+        with zipfile.ZipFile(osz_path) as zf:
+            zf.extractall(set_path)
+            files = {info.filename: info.file_size for info in zf.infolist()}
+        write_manifest(set_path, build_manifest("100", files))
+
+        calls = []
+        generate = downloader._generate_notes
+
+        def slow_generate(*args):
+            calls.append(1)
+            time.sleep(0.1)
+            return generate(*args)
+
+        monkeypatch.setattr(downloader, "_generate_notes", slow_generate)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(downloader.get_notes_json("100", beatmap_id=1002)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert [r["metadata"]["version"] for r in results] == ["Hard"] * 4
+
+    def test_missing_difficulty_does_not_regenerate(self, tmp_path, make_osz, monkeypatch):
+        """A lookup miss on a published set does not redo the parsing work."""
+        downloader, _ = make_downloader(tmp_path, make_osz())
+        asyncio.run(downloader.download("100"))
+
+        def fail(*args):
+            raise AssertionError("notes regenerated")
+
+        monkeypatch.setattr(downloader, "_generate_notes", fail)
+
+        assert downloader.get_notes_json("100", beatmap_id=9999) is None
@@ -0,0 +1,227 @@
+"""Tests for BeatmapStorage disk budget and LRU eviction."""
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from models.mappool import Mappool, MappoolMap
+from services.beatmap_publish import SetLocks
+from services.beatmap_storage import BeatmapStorage, load_pinned_beatmapsets
+from services.blob_store import BLOB_DIR, BlobStore
+
+
+class FakeClock:
+    """Manually advanced wall clock."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def write_set(root: Path, beatmapset_id: str, size: int) -> None:
+    """Create a fake extracted beatmapset of ``size`` bytes."""
+    path = root / beatmapset_id
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "audio.mp3").write_bytes(b"\x00" * size)
+
+
+def make_storage(tmp_path: Path, budget: int, clock: FakeClock, owner: str = "production") -> BeatmapStorage:
+    return BeatmapStorage(tmp_path, budget_bytes=budget, grace_seconds=60, clock=clock, owner=owner)
+
+
+def add_sets(storage: BeatmapStorage, clock: FakeClock, ids: list[str], size: int = 100) -> None:
+    """Record sets one second apart so their LRU order is ``ids`` order."""
+    for beatmapset_id in ids:
+        write_set(storage.storage_path, beatmapset_id, size)
+        storage.record(beatmapset_id)
+        clock.now += 1
+    clock.now += 3600  # Move past the grace period
+
+
+class TestBeatmapStorage:
+    """Tests for tracking and eviction."""
+
+    def test_record_tracks_size(self, tmp_path):
+        """Recording a set measures its size on disk."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 0, clock)
+        write_set(tmp_path, "1", 250)
+
+        assert storage.record("1") == 250
+        assert storage.usage() == 250
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Oldest sets are evicted first until usage fits the budget."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 250, clock)
+        add_sets(storage, clock, ["1", "2", "3", "4"])
+
+        evicted = storage.enforce_budget()
+
+        assert evicted == ["1", "2"]
+        assert not (tmp_path / "1").exists()
+        assert (tmp_path / "3").exists()
+        assert storage.usage() == 200
+
+    def test_touch_refreshes_lru_order(self, tmp_path):
+        """Accessing a set moves it to the back of the eviction order."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 250, clock)
+        add_sets(storage, clock, ["1", "2", "3"])
+        storage.touch("1")
+        clock.now += 3600
+
+        assert storage.enforce_budget() == ["2"]
+
+    def test_pinned_sets_are_kept(self, tmp_path):
+        """Sets in visible mappools are never evicted."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 150, clock)
+        add_sets(storage, clock, ["1", "2", "3"])
+        storage.set_pins({"1"})
+
+        assert storage.enforce_budget() == ["2", "3"]
+        assert (tmp_path / "1").exists()
+
+    def test_leased_sets_are_kept(self, tmp_path):
+        """A set being served or downloaded is not evicted."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 150, clock)
+        add_sets(storage, clock, ["1", "2"])
+
+        with storage.lease("1"):
+            assert storage.enforce_budget() == ["2"]
+        assert not storage.is_leased("1")
+
+    def test_recently_accessed_sets_are_kept(self, tmp_path):
+        """Sets inside the grace period are not evicted."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 100, clock)
+        add_sets(storage, clock, ["1"])
+        write_set(tmp_path, "2", 100)
+        storage.record("2")
+
+        assert storage.enforce_budget() == ["1"]
+        assert storage.enforce_budget() == []
+
+    def test_unlimited_budget(self, tmp_path):
+        """A budget of 0 disables eviction."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 0, clock)
+        add_sets(storage, clock, ["1", "2"])
+
+        assert storage.enforce_budget() == []
+
+    def test_index_persists_and_rebuilds(self, tmp_path):
+        """The index survives restarts and is rebuilt from disk when missing."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 0, clock)
+        add_sets(storage, clock, ["1", "2"])
+
+        reloaded = make_storage(tmp_path, 0, clock)
+        assert reloaded.usage() == 200
+
+        (tmp_path / BeatmapStorage.INDEX_FILE).unlink()
+        rebuilt = make_storage(tmp_path, 0, clock)
+        assert rebuilt.usage() == 200
+
+
+    def test_index_loaded_on_first_use(self, tmp_path):
+        """Creating a storage manager (as at import) neither reads nor scans the store."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 0, clock)
+        write_set(tmp_path, "1", 100)
+
+        assert not (tmp_path / BeatmapStorage.INDEX_FILE).exists()
+        assert storage.usage() == 100
+
+    def test_shared_blobs_counted_once(self, tmp_path):
+        """Sets linking the same blob split its size instead of each paying for it in full."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 300, clock)
+        blobs = BlobStore(tmp_path / BLOB_DIR)
+        for beatmapset_id in ("1", "2"):
+            write_set(tmp_path, beatmapset_id, 300)
+            blobs.add_files(tmp_path / beatmapset_id, ["audio.mp3"])
+            storage.record(beatmapset_id)
+        clock.now += 3600
+
+        # One 300-byte inode; counted in full for each set it would be 600
+        assert storage.usage() <= 300
+        assert storage.enforce_budget() == []
+
+class TestSharedStore:
+    """Tests for two backends (production and staging) sharing one store."""
+
+    def test_saves_merge_accesses(self, tmp_path):
+        """A set touched by one backend keeps that access after the other writes the index."""
+        clock = FakeClock()
+        production = make_storage(tmp_path, 250, clock)
+        add_sets(production, clock, ["1", "2", "3"])
+        staging = make_storage(tmp_path, 250, clock, owner="staging")
+
+        staging.touch("1")
+        staging.save()
+        production.record("3")
+
+        assert production.enforce_budget() == ["2"]
+        assert (tmp_path / "1").is_dir()
+
+    def test_eviction_is_seen_by_other_backend(self, tmp_path):
+        """A set evicted by one backend leaves the other's index on its next save."""
+        clock = FakeClock()
+        production = make_storage(tmp_path, 150, clock)
+        add_sets(production, clock, ["1", "2"])
+        staging = make_storage(tmp_path, 0, clock, owner="staging")
+
+        assert production.enforce_budget() == ["1"]
+        staging.save()
+
+        assert staging.usage() == 100
+
+    def test_other_backends_pins_are_kept(self, tmp_path):
+        """Sets pinned by staging are not evicted by production."""
+        clock = FakeClock()
+        production = make_storage(tmp_path, 150, clock)
+        add_sets(production, clock, ["1", "2", "3"])
+        staging = make_storage(tmp_path, 0, clock, owner="staging")
+
+        staging.set_pins({"1"})
+
+        assert production.enforce_budget() == ["2", "3"]
+        assert production.stats()["pinned"] == 1
+
+    def test_locked_sets_are_kept(self, tmp_path):
+        """A set whose lock another backend holds is being written and is skipped."""
+        clock = FakeClock()
+        storage = make_storage(tmp_path, 150, clock)
+        add_sets(storage, clock, ["1", "2", "3"])
+
+        with SetLocks(tmp_path).hold("1"):
+            evicted = storage.enforce_budget()
+
+        assert evicted == ["2", "3"]
+        assert (tmp_path / "1").is_dir()
+
+
+def test_load_pinned_beatmapsets(db: Session):
+    """Only beatmapsets of visible mappools are pinned."""
+    visible = Mappool(stage_name="Quarterfinals", is_visible=True)
+    hidden = Mappool(stage_name="Semifinals", is_visible=False)
+    db.add_all([visible, hidden])
+    db.commit()
+
+    def add_map(pool: Mappool, beatmapset_id: str | None) -> None:
+        db.add(MappoolMap(
+            mappool_id=pool.id, slot="NM1", beatmap_id="1", beatmapset_id=beatmapset_id,
+            artist="a", title="t", difficulty_name="d", star_rating=5, bpm=180,
+            length_seconds=120, od=8, hp=8, mapper="m",
+        ))
+
+    add_map(visible, "100")
+    add_map(visible, None)
+    add_map(hidden, "200")
+    db.commit()
+
+    assert load_pinned_beatmapsets(db) == {"100"}
@@ -0,0 +1,167 @@
+"""Tests for background warm-up of mappool maps."""
+import asyncio
+
+import httpx
+from sqlalchemy.orm import Session, sessionmaker
+
+from models.mappool import Mappool, MappoolMap
+from services import beatmap_warmup
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_mirrors import MirrorRegistry
+from services.beatmap_warmup import ERROR, READY, WarmupService
+from services.osu_parser import analyze_notes
+
+
+def make_service(tmp_path, engine, payload: bytes | None) -> WarmupService:
+    """Warm-up service over a stand-in mirror (404 when ``payload`` is None)."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404) if payload is None else httpx.Response(200, content=payload)
+
+    downloader = BeatmapDownloader(
+        storage_path=str(tmp_path),
+        mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+        transport=httpx.MockTransport(handler),
+    )
+    return WarmupService(downloader=downloader, session_factory=sessionmaker(bind=engine))
+
+
+def add_map(db: Session, pool: Mappool, beatmap_id: str, beatmapset_id: str | None = None) -> MappoolMap:
+    map_obj = MappoolMap(
+        mappool_id=pool.id, slot="NM1", beatmap_id=beatmap_id, beatmapset_id=beatmapset_id,
+        artist="a", title="t", difficulty_name="Hard", star_rating=5, bpm=180,
+        length_seconds=120, od=8, hp=8, mapper="m",
+    )
+    db.add(map_obj)
+    db.commit()
+    return map_obj
+
+
+class TestWarm:
+    """Tests for a single warm-up job."""
+
+    def test_known_set_becomes_ready(self, tmp_path, engine, make_osz):
+        """Download and parsing leave the map ready with its analysis built."""
+        service = make_service(tmp_path, engine, make_osz())
+
+        state = asyncio.run(service.warm("1002", "100"))
+
+        assert state["state"] == READY
+        assert state["difficulties"] == 2
+        manifest = service.downloader.get_manifest("100")
+        assert all("analysis" in d for d in manifest["difficulties"])
+
+    def test_resolves_and_saves_beatmapset(self, tmp_path, engine, db, make_osz, monkeypatch):
+        """A map without a set ID is resolved via the osu! API and saved."""
+        pool = Mappool(stage_name="Finals", is_visible=True)
+        db.add(pool)
+        db.commit()
+        map_obj = add_map(db, pool, "1002")
+
+        async def get_beatmap(beatmap_id):
+            return {"beatmapset_id": 100}
+
+        monkeypatch.setattr(beatmap_warmup.osu_api, "get_beatmap", get_beatmap)
+        service = make_service(tmp_path, engine, make_osz())
+
+        assert asyncio.run(service.warm("1002"))["state"] == READY
+        db.refresh(map_obj)
+        assert map_obj.beatmapset_id == "100"
+
+    def test_missing_set_is_an_error(self, tmp_path, engine):
+        service = make_service(tmp_path, engine, None)
+
+        state = asyncio.run(service.warm("1002", "100"))
+
+        assert state["state"] == ERROR
+        assert "not found" in state["error"].lower()
+
+
+class TestEnqueue:
+    """Tests for background job bookkeeping."""
+
+    def test_duplicate_jobs_are_skipped(self, tmp_path, engine, make_osz):
+        service = make_service(tmp_path, engine, make_osz())
+
+        async def run():
+            started = [service.enqueue("1002", "100"), service.enqueue("1002", "100")]
+            await asyncio.gather(*service._tasks)
+            return started
+
+        assert asyncio.run(run()) == [True, False]
+        assert service.get_state("1002")["state"] == READY
+        assert service.stats()["states"] == {READY: 1}
+
+    def test_disabled_service(self, tmp_path, engine):
+        service = make_service(tmp_path, engine, None)
+        service.enabled = False
+        assert service.enqueue("1002", "100") is False
+        assert service.get_state("1002") is None
+
+    def test_startup_pass_warms_visible_pools(self, tmp_path, engine, db, make_osz):
+        """Only maps in visible pools are warmed, and their sets are pinned."""
+        visible = Mappool(stage_name="Finals", is_visible=True)
+        hidden = Mappool(stage_name="Secret", is_visible=False)
+        db.add_all([visible, hidden])
+        db.commit()
+        add_map(db, visible, "1002", "100")
+        add_map(db, hidden, "2002", "200")
+        service = make_service(tmp_path, engine, make_osz())
+
+        async def run():
+            started = await service.warm_visible_pools()
+            await asyncio.gather(*service._tasks)
+            return started
+
+        assert asyncio.run(run()) == 1
+        assert service.get_state("1002")["state"] == READY
+        assert service.get_state("2002") is None
+        assert service.downloader.storage.stats()["pinned"] == 1
+
+
+class TestAnalyzeNotes:
+    """Tests for chart statistics."""
+
+    def test_statistics(self):
+        notes = [
+            {"col": 0, "time": 0, "type": "tap"},
+            {"col": 1, "time": 250, "type": "tap"},
+            {"col": 2, "time": 500, "type": "hold", "end": 1500},
+            {"col": 3, "time": 750, "type": "tap"},
+            {"col": 0, "time": 1900, "type": "tap"},
+        ]
+
+        analysis = analyze_notes(notes, 4)
+
+        assert analysis["notes_count"] == 5
+        assert analysis["hold_count"] == 1
+        assert analysis["length_ms"] == 1900
+        assert analysis["peak_nps"] == 4
+        assert analysis["column_counts"] == [2, 1, 1, 1]
+
+    def test_empty_chart(self):
+        assert analyze_notes([], 4)["avg_nps"] == 0.0
+
+
+def test_map_edits_enqueue_warmup(client, db, monkeypatch):
+    """Adding and editing a map start warm-ups; status reports their state."""
+    from routers import mappool as mappool_router
+
+    calls = []
+    monkeypatch.setattr(mappool_router.warmup_service, "enqueue", lambda *args: calls.append(args))
+    pool = Mappool(stage_name="Finals", is_visible=True)
+    db.add(pool)
+    db.commit()
+
+    response = client.post(f"/mappools/{pool.id}/maps", json={
+        "slot": "NM1", "beatmap_id": "1002", "artist": "a", "title": "t",
+        "difficulty_name": "Hard", "star_rating": 5.0, "bpm": 180,
+        "length_seconds": 120, "od": 8.0, "hp": 8.0, "mapper": "m",
+    })
+    assert response.status_code == 200
+    map_id = response.json()["id"]
+    assert client.put(f"/mappools/maps/{map_id}", json={"beatmap_id": "1003"}).status_code == 200
+
+    assert calls == [("1002", None), ("1003", None)]
+    status = client.get("/mappools/sync/status").json()
+    assert "warmup" in status
+    assert status["maps"][0]["warmup"] is None
@@ -0,0 +1,120 @@
+"""Tests for cross-set deduplication through the blob store."""
+import asyncio
+import os
+import shutil
+
+import httpx
+
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_mirrors import MirrorRegistry
+from services.blob_store import BlobStore
+
+AUDIO = os.urandom(4096)
+
+
+def make_downloader(tmp_path, payloads: dict[str, bytes]) -> BeatmapDownloader:
+    """Downloader whose mirror serves ``payloads[set_id]``."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=payloads[request.url.path.rsplit("/", 1)[-1]])
+
+    return BeatmapDownloader(
+        storage_path=str(tmp_path),
+        mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+class TestBlobStore:
+    """Tests for linking, collection and statistics."""
+
+    def test_identical_files_share_a_blob(self, tmp_path):
+        """The second copy of a file becomes a link to the first one's blob."""
+        blobs = BlobStore(tmp_path / ".blobs")
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "hit.wav").write_bytes(b"clap" * 100)
+            (tmp_path / name / f"{name}.osu").write_bytes(name.encode())
+
+        first = blobs.add_files(tmp_path / "a", ["hit.wav", "a.osu"])
+        second = blobs.add_files(tmp_path / "b", ["hit.wav", "b.osu", "missing.png"])
+
+        assert first["hit.wav"] == second["hit.wav"]
+        assert os.path.samefile(tmp_path / "a" / "hit.wav", tmp_path / "b" / "hit.wav")
+        stats = blobs.stats()
+        assert stats["blobs"] == 3
+        assert stats["shared_blobs"] == 1
+        assert stats["saved_bytes"] == 400
+        assert stats["dedup_ratio"] == round(802 / 402, 3)
+
+    def test_collect_unreferenced(self, tmp_path):
+        """Blobs are removed once no set links to them."""
+        blobs = BlobStore(tmp_path / ".blobs")
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "hit.wav").write_bytes(b"clap" * 100)
+            blobs.add_files(tmp_path / name, ["hit.wav"])
+
+        shutil.rmtree(tmp_path / "a")
+        assert blobs.collect() == {"removed": 0, "freed_bytes": 0}
+        shutil.rmtree(tmp_path / "b")
+        assert blobs.collect() == {"removed": 1, "freed_bytes": 400}
+        assert blobs.stats()["blobs"] == 0
+
+    def test_without_hard_links(self, tmp_path, monkeypatch):
+        """If the filesystem refuses links, files stay as they are."""
+        blobs = BlobStore(tmp_path / ".blobs")
+        (tmp_path / "hit.wav").write_bytes(b"clap")
+
+        def refuse(src, dst):
+            raise PermissionError("links not supported")
+
+        monkeypatch.setattr(os, "link", refuse)
+
+        assert blobs.add_files(tmp_path, ["hit.wav"]) == {}
+        assert (tmp_path / "hit.wav").read_bytes() == b"clap"
+        assert blobs.stats()["link_failures"] == 1
+
+
+class TestDownloadDedup:
+    """Tests for deduplication at extraction time."""
+
+    def test_sets_share_audio(self, tmp_path, make_osz):
+        """Two sets with the same audio store it once; the manifest records digests."""
+        payload = make_osz(extra_files={"audio.mp3": AUDIO})
+        downloader = make_downloader(tmp_path, {"100": payload, "200": payload})
+
+        asyncio.run(downloader.download("100"))
+        asyncio.run(downloader.download("200"))
+
+        assert os.path.samefile(tmp_path / "100" / "audio.mp3", tmp_path / "200" / "audio.mp3")
+        manifest = downloader.get_manifest("200")
+        assert set(manifest["blobs"]) == set(manifest["files"])
+        stats = downloader.blobs.stats()
+        assert stats["saved_bytes"] >= len(AUDIO)
+        assert stats["dedup_ratio"] == 2.0
+
+    def test_replaced_set_releases_blobs(self, tmp_path, make_osz):
+        """A forced re-download drops the blobs only the old copy used."""
+        payloads = {"100": make_osz(extra_files={"audio.mp3": AUDIO})}
+        downloader = make_downloader(tmp_path, payloads)
+        asyncio.run(downloader.download("100"))
+        old_audio = downloader.get_manifest("100")["blobs"]["audio.mp3"]
+
+        payloads["100"] = make_osz(extra_files={"audio.mp3": os.urandom(4096)})
+        asyncio.run(downloader.download("100", force=True))
+
+        assert not downloader.blobs.blob_path(old_audio).exists()
+        assert downloader.blobs.stats()["unreferenced_blobs"] == 0
+
+
+def test_blob_endpoints(client, tmp_path, make_osz, monkeypatch):
+    """Staff can read dedup figures and run a collection."""
+    from routers import mappool as mappool_router
+
+    downloader = make_downloader(tmp_path, {"100": make_osz()})
+    asyncio.run(downloader.download("100"))
+    monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+    shutil.rmtree(tmp_path / "100")
+
+    assert client.get("/mappools/sync/blobs").json()["blobs"] == 0
+    assert client.post("/mappools/sync/blobs/gc").json()["removed"] == 4
@@ -1,6 +1,7 @@
 """Tests for bracket API endpoints."""
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from models.bracket import Bracket
@@ -139,6 +140,69 @@ class TestGetBracketMatches:
         assert m["is_grandfinals_reset"] is False
 
 
+class TestGetBracketGraph:
+    """Tests for GET /brackets/graph."""
+
+    def test_graph_empty(self, public_client: TestClient):
+        """Returns no brackets when none exist."""
+        resp = public_client.get("/brackets/graph")
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["brackets"] == []
+        assert data["total_matches"] == 0
+
+    def test_graph_includes_every_bracket_and_edge(self, public_client: TestClient, match_chain, all_brackets, registered_players: list[User]):
+        """Matches appear under their bracket with players and both edges."""
+        data = public_client.get("/brackets/graph").json()
+
+        assert [b["type"] for b in data["brackets"]] == ["winner", "loser", "grandfinals"]
+        assert data["total_matches"] == 3
+        winner = data["brackets"][0]
+        wr1 = next(m for m in winner["matches"] if m["id"] == match_chain["wr1"].id)
+        assert wr1["next_match_id"] == match_chain["wr2"].id
+        assert wr1["loser_next_match_id"] == match_chain["lr1"].id
+        assert wr1["winner_username"] == registered_players[0].username
+        assert [m["id"] for m in data["brackets"][1]["matches"]] == [match_chain["lr1"].id]
+
+    def test_graph_layout(self, public_client: TestClient, match_chain, winner_bracket: Bracket):
+        """Feeders sit one round left of the match they feed."""
+        winner = public_client.get("/brackets/graph").json()["brackets"][0]
+
+        layout = {m["id"]: (m["round"], m["position"]) for m in winner["matches"]}
+        assert layout[match_chain["wr1"].id] == (0, 0)
+        assert layout[match_chain["wr2"].id] == (1, 0)
+        assert winner["rounds"] == [
+            {"round": 0, "name": "Round of 8", "match_ids": [match_chain["wr1"].id]},
+            {"round": 1, "name": "Winner Semifinals", "match_ids": [match_chain["wr2"].id]},
+        ]
+
+    def test_graph_query_count(self, public_client: TestClient, async_session_factory, match_chain, all_brackets):
+        """The graph is loaded in two queries, not one per match and player."""
+        statements = []
+        sync_engine = async_session_factory.kw["bind"].sync_engine
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(sync_engine, "before_cursor_execute", record)
+        try:
+            public_client.get("/brackets/graph")
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", record)
+
+        assert len(statements) == 2
+
+    def test_generated_bracket_rounds(self, client: TestClient, registered_players: list[User], default_map: Map):
+        """An 8-player double elimination lays out as 4-2-1 and 2-2-1-1."""
+        client.post("/brackets/generate", json={"bracket_size": 8})
+        winner, loser, grand_finals = client.get("/brackets/graph").json()["brackets"]
+
+        assert [len(r["match_ids"]) for r in winner["rounds"]] == [4, 2, 1]
+        assert [len(r["match_ids"]) for r in loser["rounds"]] == [2, 2, 1, 1]
+        assert loser["rounds"][-1]["name"] == "Loser Finals"
+        assert [len(r["match_ids"]) for r in grand_finals["rounds"]] == [1]
+
+
 class TestCreateBracket:
     """Tests for POST /brackets."""
 
@@ -283,7 +347,7 @@ class TestGenerateBrackets:
         resp = client.post("/brackets/generate", json={"bracket_size": 5})
         assert resp.status_code == 400
 
-        resp = client.post("/brackets/generate", json={"bracket_size": 64})
+        resp = client.post("/brackets/generate", json={"bracket_size": 512})
         assert resp.status_code == 400
 
     def test_generate_brackets_too_few_players(self, client: TestClient, db: Session):
@@ -297,10 +361,9 @@ class TestGenerateBrackets:
         assert resp.status_code == 400
 
     def test_generate_brackets_fewer_players_than_size(self, client: TestClient, db: Session, four_players: list[User], default_map: Map):
-        """Works when bracket_size > number of players (uses placeholder)."""
+        """Works when bracket_size > number of players (empty slots are byes)."""
         resp = client.post("/brackets/generate", json={"bracket_size": 8})
         assert resp.status_code == 200
-        # Should use first player as placeholder for missing slots
         assert resp.json()["players_seeded"] == 4
 
     def test_generate_brackets_size_4(self, client: TestClient, db: Session, four_players: list[User], default_map: Map):
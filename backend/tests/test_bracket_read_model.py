@@ -0,0 +1,142 @@
+"""Tests for the versioned bracket read model and change-based polling."""
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+
+from models.match import Match
+from models.user import User
+from services.bracket_read_model import bracket_read_model
+
+
+def count_queries(async_session_factory, request):
+    """Run ``request()`` and return its response and the number of SQL statements it issued."""
+    statements = []
+    sync_engine = async_session_factory.kw["bind"].sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(sync_engine, "before_cursor_execute", record)
+    try:
+        response = request()
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", record)
+    return response, len(statements)
+
+
+class TestPolling:
+    """Tests for ?since_version= on the graph endpoint."""
+
+    def test_idle_poll_is_free(self, public_client, async_session_factory, match_chain, all_brackets):
+        """Once built, polls touch no database and return 304 for the current version."""
+        version = public_client.get("/brackets/graph").json()["version"]
+
+        response, queries = count_queries(
+            async_session_factory, lambda: public_client.get(f"/brackets/graph?since_version={version}")
+        )
+        assert response.status_code == 304
+        assert queries == 0
+        _, queries = count_queries(async_session_factory, lambda: public_client.get("/brackets/graph"))
+        assert queries == 0
+
+    def test_score_update_returns_changed_match(self, client, match_chain, all_brackets):
+        """After a score update, only that match is sent."""
+        version = client.get("/brackets/graph").json()["version"]
+        wr2 = match_chain["wr2"]
+
+        client.patch(f"/matches/{wr2.id}/score", json={
+            "player1_score": 1, "player2_score": 2, "winner_id": wr2.player2_id,
+        })
+        data = client.get(f"/brackets/graph?since_version={version}").json()
+
+        assert data["partial"] is True
+        assert data["version"] > version
+        assert [m["id"] for m in data["matches"]] == [wr2.id]
+        assert data["matches"][0]["player2_score"] == 2
+
+    def test_seed_change_returns_matches_of_that_player(self, public_client, db: Session, match_chain, all_brackets, registered_players):
+        """Changing a player's seed marks the matches showing it as changed."""
+        version = public_client.get("/brackets/graph").json()["version"]
+
+        registered_players[0].seed_number = 99
+        db.commit()
+        data = public_client.get(f"/brackets/graph?since_version={version}").json()
+
+        assert [m["id"] for m in data["matches"]] == [match_chain["wr1"].id]
+        assert data["matches"][0]["player1_seed"] == 99
+
+    def test_unrelated_user_change_keeps_version(self, public_client, db: Session, match_chain, all_brackets, registered_players):
+        """Profile fields not shown in brackets do not invalidate the snapshot."""
+        version = public_client.get("/brackets/graph").json()["version"]
+
+        registered_players[0].discord_username = "someone"
+        db.commit()
+
+        assert not bracket_read_model.is_stale
+        assert public_client.get(f"/brackets/graph?since_version={version}").status_code == 304
+
+    def test_generation_returns_full_graph(self, client, match_chain, all_brackets, registered_players, default_map):
+        """Regenerating brackets changes the structure, so the full graph is sent."""
+        version = client.get("/brackets/graph").json()["version"]
+
+        client.post("/brackets/generate", json={"bracket_size": 8})
+        data = client.get(f"/brackets/graph?since_version={version}").json()
+
+        assert "partial" not in data
+        assert data["total_matches"] == 14
+
+    def test_unknown_version_returns_full_graph(self, public_client, match_chain, all_brackets):
+        """A version from before the first build (or another process) gets the full graph."""
+        data = public_client.get("/brackets/graph?since_version=1").json()
+
+        assert data["total_matches"] == 3
+
+
+class TestInvalidation:
+    """Tests for the session hooks that mark the snapshot stale."""
+
+    def test_rollback_does_not_invalidate(self, public_client, db: Session, match_chain, all_brackets):
+        """Changes that are rolled back leave the snapshot as it is."""
+        public_client.get("/brackets/graph")
+
+        match_chain["wr2"].player1_score = 5
+        db.flush()
+        db.rollback()
+
+        assert not bracket_read_model.is_stale
+
+    def test_bulk_delete_invalidates(self, public_client, db: Session, match_chain, all_brackets):
+        """ORM bulk statements invalidate on commit like flushed changes."""
+        public_client.get("/brackets/graph")
+
+        db.execute(delete(Match))
+        assert not bracket_read_model.is_stale
+        db.commit()
+
+        assert bracket_read_model.is_stale
+        assert public_client.get("/brackets/graph").json()["total_matches"] == 0
+
+    def test_new_user_invalidates(self, public_client, db: Session):
+        """Inserting a user invalidates (it may be referenced by a match)."""
+        public_client.get("/brackets/graph")
+
+        db.add(User(osu_id=424242, username="New", flag_code="PE"))
+        db.commit()
+
+        assert bracket_read_model.is_stale
+
+
+class TestBracketMatches:
+    """Tests for ?since_version= on GET /brackets/{id}/matches."""
+
+    def test_other_bracket_change_is_not_modified(self, client, match_chain, winner_bracket, loser_bracket):
+        """A change in another bracket answers 304 for this one."""
+        version = client.get(f"/brackets/{winner_bracket.id}/matches").json()["version"]
+        lr1 = match_chain["lr1"]
+
+        client.patch(f"/matches/{lr1.id}/score", json={
+            "player1_score": 3, "player2_score": 1, "winner_id": lr1.player1_id,
+        })
+
+        assert client.get(f"/brackets/{winner_bracket.id}/matches?since_version={version}").status_code == 304
+        data = client.get(f"/brackets/{loser_bracket.id}/matches?since_version={version}").json()
+        assert [m["id"] for m in data["matches"]] == [lr1.id]
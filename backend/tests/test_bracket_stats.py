@@ -0,0 +1,97 @@
+"""Tests for grouped bracket statistics and the endpoints using them."""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import Config
+from models.match import Match
+from models.tournament_state import TournamentState
+
+
+def in_progress_match(db: Session, bracket, default_map, players) -> Match:
+    """Add an in-progress match to ``bracket``."""
+    match = Match(
+        bracket_id=bracket.id,
+        player1_id=players[0].id,
+        player2_id=players[1].id,
+        map_id=default_map.id,
+        round_name="Winner Semifinals",
+        match_status="in_progress",
+    )
+    db.add(match)
+    db.commit()
+    return match
+
+
+class TestBracketStats:
+    """Tests for counts per bracket, round and status."""
+
+    def test_counts(self, public_client, db: Session, match_chain, all_brackets, default_map, registered_players):
+        """Totals, completed and in-progress counts add up per bracket and round."""
+        in_progress_match(db, all_brackets["winner"], default_map, registered_players)
+
+        brackets = public_client.get("/brackets").json()["brackets"]
+
+        winner, loser, grand_finals = brackets
+        assert (winner["total_matches"], winner["completed_matches"], winner["in_progress_matches"]) == (3, 1, 1)
+        assert winner["by_status"] == {"completed": 1, "scheduled": 1, "in_progress": 1}
+        assert [(r["round_name"], r["total_matches"]) for r in winner["rounds"]] == [
+            ("Winner Semifinals", 2), ("Round of 8", 1),
+        ]
+        assert loser["total_matches"] == 1
+        assert grand_finals["total_matches"] == 0
+        assert grand_finals["rounds"] == []
+
+    def test_one_query_then_cached(self, public_client, async_session_factory, match_chain, all_brackets):
+        """Statistics take one query and are then served from cache until a match changes."""
+        statements = []
+        sync_engine = async_session_factory.kw["bind"].sync_engine
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(sync_engine, "before_cursor_execute", record)
+        try:
+            public_client.get("/brackets")
+            assert len(statements) == 1
+            public_client.get("/brackets")
+            assert len(statements) == 1
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", record)
+
+    def test_match_update_refreshes(self, client, match_chain, all_brackets):
+        """Completing a match is reflected on the next read."""
+        assert client.get("/brackets").json()["brackets"][0]["completed_matches"] == 1
+        wr2 = match_chain["wr2"]
+
+        client.patch(f"/matches/{wr2.id}/score", json={
+            "player1_score": 1, "player2_score": 2, "winner_id": wr2.player2_id,
+        })
+
+        assert client.get("/brackets").json()["brackets"][0]["completed_matches"] == 2
+
+
+class TestStatsEndpoints:
+    """Tests for the tournament status and admin state endpoints."""
+
+    def test_tournament_status(self, public_client, db: Session, match_chain, all_brackets):
+        """Tournament status includes match counts and the current bracket's progress."""
+        db.add(TournamentState(id=1, status="in_progress", current_bracket_id=match_chain["wr1"].bracket_id))
+        db.commit()
+
+        data = public_client.get("/tournament/status").json()
+
+        assert data["matches"]["total"] == 3
+        assert data["matches"]["completed"] == 1
+        assert data["current_bracket"]["total_matches"] == 2
+        assert data["current_bracket"]["completed_matches"] == 1
+
+    def test_admin_tournament_state(self, public_client, match_chain, all_brackets, registered_players):
+        """The admin state endpoint reports the same counts without loading matches."""
+        data = public_client.get(
+            "/internal/admin/tournament-state", headers={"X-Admin-Password": Config.INTERNAL_SECRET}
+        ).json()
+
+        assert data["total_matches"] == 3
+        assert data["completed_matches"] == 1
+        assert data["registered_players"] == len(registered_players)
+        assert [b["total_matches"] for b in data["brackets"]] == [2, 1, 0]
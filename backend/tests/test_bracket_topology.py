@@ -0,0 +1,301 @@
+"""Tests for the in-memory double elimination topology, seeding and bulk generation."""
+import random
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from config import Config
+from models.bracket import Bracket
+from models.match import Match
+from models.user import User
+from services.bracket_topology import (
+    CROSSOVER_PATTERNS,
+    SUPPORTED_SIZES,
+    build_double_elimination,
+    smallest_bracket,
+    standard_seed_order,
+)
+
+
+def play_out(topology, pick=lambda a, b: (a, b)) -> dict[int, int]:
+    """
+    Play every match, checking slots never overfill.
+
+    Args:
+        pick: Returns ``(winner, loser)`` for two players; player 1 wins by default.
+
+    Returns:
+        Losses per player.
+    """
+    matches = topology["matches"]
+    slots = [[m["player1_id"], m["player2_id"]] for m in matches]
+    losses: dict[int, int] = {}
+    for index, match in enumerate(matches):
+        assert None not in slots[index], f"match {index} is missing a player"
+        winner, loser = pick(*slots[index])
+        losses[loser] = losses.get(loser, 0) + 1
+        match["players"] = (winner, loser)
+        for player, target in ((winner, match["next_index"]), (loser, match["loser_next_index"])):
+            if target is None:
+                continue
+            assert target > index
+            free = slots[target].index(None)
+            slots[target][free] = player
+    return losses
+
+
+def size_cases():
+    for size in SUPPORTED_SIZES:
+        for players in sorted({size, size - 1, size // 2 + 1, 3, 2}):
+            if players <= size:
+                yield size, players
+
+
+class TestBuildDoubleElimination:
+    """Tests for the topology engine."""
+
+    @pytest.mark.parametrize("size,players", list(size_cases()))
+    def test_every_match_is_playable(self, size, players):
+        """2P-2 matches; each fills exactly; everyone but the champion loses out."""
+        topology = build_double_elimination(list(range(1, players + 1)), size)
+
+        assert len(topology["matches"]) == 2 * players - 2
+        assert topology["byes"] == size - players
+        losses = play_out(topology)
+        assert list(losses.values()).count(2) == players - 1
+        assert all(count in (1, 2) for count in losses.values())
+
+    @pytest.mark.parametrize("size", SUPPORTED_SIZES)
+    def test_full_bracket_shape(self, size):
+        """A full bracket has N-1 winner, N-2 loser and one grand finals match."""
+        matches = build_double_elimination(list(range(size)), size)["matches"]
+
+        counts = {t: sum(m["bracket_type"] == t for m in matches) for t in ("winner", "loser", "grandfinals")}
+        assert counts == {"winner": size - 1, "loser": size - 2, "grandfinals": 1}
+        assert matches[0]["round_name"] == f"Round of {size}"
+        assert matches[-1]["round_name"] == "Grand Finals"
+
+    def test_byes_place_top_seeds_in_round_two(self):
+        """With 6 of 8 slots filled, seeds 1 and 2 skip the first round."""
+        matches = build_double_elimination([1, 2, 3, 4, 5, 6], 8)["matches"]
+
+        first_round = [m for m in matches if m["round_name"] == "Round of 8"]
+        semifinals = [m for m in matches if m["round_name"] == "Winner Semifinals"]
+        assert len(first_round) == 2
+        assert [(m["player1_id"], m["player2_id"]) for m in semifinals] == [(1, None), (2, None)]
+
+    def test_default_size(self):
+        """Without a size, the smallest power of two that fits is used."""
+        assert smallest_bracket(2) == 4
+        assert smallest_bracket(9) == 16
+        assert smallest_bracket(256) == 256
+        assert build_double_elimination(list(range(20)))["bracket_size"] == 32
+
+    def test_extra_players_left_out(self):
+        """Players beyond the bracket size are not seeded."""
+        topology = build_double_elimination(list(range(10)), 8)
+        assert topology["players"] == 8
+
+    @pytest.mark.parametrize("players,size", [([1], 4), ([1, 2], 6), ([1, 2], 512)])
+    def test_invalid(self, players, size):
+        """Too few players or an unsupported size raise ValueError."""
+        with pytest.raises(ValueError):
+            build_double_elimination(players, size)
+
+
+class TestStandardSeeding:
+    """Property tests for standard seeding placement, for every supported size."""
+
+    @pytest.mark.parametrize("size", SUPPORTED_SIZES)
+    def test_order_pairs_and_halves(self, size):
+        """Every seed appears once, pairs add up to N-1, and the top N/b seeds sit one per block of b slots."""
+        order = standard_seed_order(size)
+
+        assert sorted(order) == list(range(size))
+        assert all(a + b == size - 1 for a, b in zip(order[::2], order[1::2]))
+        block = size
+        while block > 1:
+            top = size // block
+            for start in range(0, size, block):
+                assert sum(seed < top for seed in order[start:start + block]) == 1
+            block //= 2
+
+    @pytest.mark.parametrize("size", SUPPORTED_SIZES)
+    def test_favourites_reach_each_round(self, size):
+        """When the better seed always wins, round r is the top N/2^r seeds; 1 and 2 meet only in the final."""
+        topology = build_double_elimination(list(range(size)), size)
+        play_out(topology, pick=lambda a, b: (min(a, b), max(a, b)))
+
+        winner_matches = [m for m in topology["matches"] if m["bracket_type"] == "winner"]
+        first = 0
+        count = size // 2
+        while count:
+            round_players = {p for m in winner_matches[first:first + count] for p in m["players"]}
+            assert round_players == set(range(2 * count))
+            first += count
+            count //= 2
+        assert winner_matches[-1]["players"] == (0, 1)
+
+    @pytest.mark.parametrize("size", SUPPORTED_SIZES)
+    def test_byes_go_to_top_seeds(self, size):
+        """With just over half the slots filled, the top seeds are the ones skipping round 1."""
+        players = size // 2 + 1
+        topology = build_double_elimination(list(range(players)), size)
+
+        first_round = {
+            p for m in topology["matches"] if m["round_name"] == f"Round of {size}"
+            for p in (m["player1_id"], m["player2_id"])
+        }
+        assert first_round == set(range(size - players, players))
+
+
+class TestCrossoverPatterns:
+    """Tests for loser bracket crossover patterns."""
+
+    @pytest.mark.parametrize("crossover", list(CROSSOVER_PATTERNS))
+    @pytest.mark.parametrize("size", SUPPORTED_SIZES)
+    def test_every_pattern_is_playable(self, size, crossover):
+        """Every pattern yields a valid tournament, with and without byes."""
+        for players in (size, size // 2 + 1):
+            topology = build_double_elimination(list(range(players)), size, crossover)
+            assert len(topology["matches"]) == 2 * players - 2
+            play_out(topology)
+
+    @pytest.mark.parametrize("size", SUPPORTED_SIZES)
+    def test_standard_avoids_early_rematches(self, size):
+        """With the standard pattern nobody meets an earlier opponent in the first half of the loser rounds."""
+        rng = random.Random(size)
+        loser_rounds = []
+        for _ in range(50):
+            topology = build_double_elimination(list(range(size)), size, "standard")
+            play_out(topology, pick=lambda a, b: (a, b) if rng.random() < 0.5 else (b, a))
+            loser_rounds = list(dict.fromkeys(
+                m["round_name"] for m in topology["matches"] if m["bracket_type"] == "loser"
+            ))
+            early = set(loser_rounds[:len(loser_rounds) // 2])
+            met = set()
+            for match in topology["matches"]:
+                pair = frozenset(match["players"])
+                if match["round_name"] in early:
+                    assert pair not in met, f"rematch in {match['round_name']}"
+                met.add(pair)
+
+    def test_unknown_pattern(self):
+        """An unknown pattern raises ValueError."""
+        with pytest.raises(ValueError):
+            build_double_elimination([1, 2, 3, 4], 4, "zigzag")
+
+
+@pytest.fixture
+def many_players(db: Session) -> list[User]:
+    """Create 64 registered, seeded players."""
+    players = [
+        User(osu_id=5000 + i, username=f"Seed{i + 1}", flag_code="PE", is_registered=True, seed_number=i + 1)
+        for i in range(64)
+    ]
+    db.add_all(players)
+    db.commit()
+    return players
+
+
+class TestBulkGeneration:
+    """Tests for persisting a topology through the generate endpoints."""
+
+    def test_generate_64_in_one_transaction(self, client, db: Session, async_session_factory, many_players, default_map):
+        """Generation issues a fixed number of statements and commits once, whatever the size."""
+        statements = []
+        commits = []
+        sync_engine = async_session_factory.kw["bind"].sync_engine
+
+        def record(conn, clauseelement, multiparams, params, execution_options):
+            statements.append(str(clauseelement).split()[0].upper())
+
+        def record_commit(conn):
+            commits.append(conn)
+
+        event.listen(sync_engine, "before_execute", record)
+        event.listen(sync_engine, "commit", record_commit)
+        try:
+            resp = client.post("/brackets/generate", json={"bracket_size": 64})
+        finally:
+            event.remove(sync_engine, "before_execute", record)
+            event.remove(sync_engine, "commit", record_commit)
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["total_matches"] == 126
+        assert data["loser_bracket_matches"] == 62
+        assert statements.count("INSERT") == 2
+        assert statements.count("UPDATE") == 1
+        assert len(statements) < 12
+        assert len(commits) == 1
+        assert db.scalar(select(func.count(Match.id))) == 126
+        assert db.scalar(select(func.count(Match.id)).where(Match.next_match_id.is_(None))) == 1
+
+    def test_links_match_topology(self, client, db: Session, many_players, default_map):
+        """Stored links point at the matches the engine planned."""
+        client.post("/brackets/generate", json={"bracket_size": 64})
+
+        matches = db.scalars(select(Match).order_by(Match.id)).all()
+        planned = build_double_elimination([p.id for p in many_players], 64)["matches"]
+        index_of = {m.id: i for i, m in enumerate(matches)}
+        for stored, plan in zip(matches, planned):
+            assert index_of.get(stored.next_match_id) == plan["next_index"]
+            assert index_of.get(stored.loser_next_match_id) == plan["loser_next_index"]
+            assert (stored.player1_id, stored.player2_id) == (plan["player1_id"], plan["player2_id"])
+
+    def test_admin_generate_uses_engine(self, public_client, db: Session, registered_players, default_map):
+        """The staff generator builds the same tournament, with byes."""
+        resp = public_client.post(
+            "/internal/admin/generate-brackets",
+            json={"bracket_size": 16},
+            headers={"X-Admin-Password": Config.INTERNAL_SECRET},
+        )
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["byes"] == 8
+        assert data["total_matches"] == 14
+        assert db.scalar(select(func.count(Bracket.id))) == 3
+
+
+class TestPreviewBrackets:
+    """Tests for previewing seedings before generating."""
+
+    def test_preview_does_not_write(self, client, db: Session, registered_players, default_map):
+        """The preview lays out the tournament in standard order and saves nothing."""
+        resp = client.post("/brackets/preview", json={})
+
+        assert resp.status_code == 200
+        data = resp.json()
+        assert (data["bracket_size"], data["byes"], data["crossover"]) == (8, 0, "standard")
+        assert len(data["matches"]) == 14
+        first = data["matches"][0]
+        assert (first["player1"]["seed_number"], first["player2"]["seed_number"]) == (1, 8)
+        assert data["matches"][1]["player1"]["seed_number"] == 4
+        assert db.scalar(select(func.count(Match.id))) == 0
+
+    def test_preview_then_generate(self, client, db: Session, registered_players, default_map):
+        """Generating with the previewed options stores the previewed pairings."""
+        order = [p.id for p in reversed(registered_players)]
+        options = {"bracket_size": 8, "crossover": "classic", "player_ids": order}
+
+        preview = client.post("/brackets/preview", json=options).json()
+        client.post("/brackets/generate", json=options)
+
+        stored = db.scalars(select(Match).order_by(Match.id)).all()
+        assert preview["matches"][0]["player1"]["id"] == order[0]
+        assert [(m.player1_id, m.player2_id) for m in stored] == [
+            (m["player1"] and m["player1"]["id"], m["player2"] and m["player2"]["id"]) for m in preview["matches"]
+        ]
+
+    @pytest.mark.parametrize("options", [
+        {"crossover": "zigzag"},
+        {"bracket_size": 12},
+        {"player_ids": [1, 1]},
+        {"player_ids": [999999]},
+    ])
+    def test_invalid_options(self, client, registered_players, options):
+        """Unknown patterns, bad sizes, repeated or unregistered players are rejected."""
+        assert client.post("/brackets/preview", json=options).status_code == 400
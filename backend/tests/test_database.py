@@ -0,0 +1,34 @@
+"""Tests for database URL handling and the async session dependency."""
+import asyncio
+
+from sqlalchemy import select
+
+from models.user import User
+from utils.database import async_url
+
+
+class TestAsyncUrl:
+    """Tests for mapping configured URLs onto asyncio drivers."""
+
+    def test_postgres_uses_asyncpg(self):
+        """Plain and psycopg2 PostgreSQL URLs switch to asyncpg, keeping credentials."""
+        assert async_url("postgresql://user:pass@db/pmc") == "postgresql+asyncpg://user:pass@db/pmc"
+        assert async_url("postgresql+psycopg2://user:pass@db/pmc") == "postgresql+asyncpg://user:pass@db/pmc"
+        assert async_url("postgres://user:pass@db/pmc") == "postgresql+asyncpg://user:pass@db/pmc"
+
+    def test_sqlite_uses_aiosqlite(self):
+        """SQLite URLs switch to aiosqlite."""
+        assert async_url("sqlite:///./pmc.db") == "sqlite+aiosqlite:///./pmc.db"
+
+    def test_explicit_driver_kept(self):
+        """A URL that already names an async driver is left alone."""
+        assert async_url("postgresql+asyncpg://db/pmc") == "postgresql+asyncpg://db/pmc"
+
+
+def test_async_session_sees_committed_rows(db, staff_user, async_session_factory):
+    """Rows committed by the test session are visible to the app's async sessions."""
+    async def load():
+        async with async_session_factory() as session:
+            return (await session.scalars(select(User.username))).all()
+
+    assert asyncio.run(load()) == ["StaffUser"]
@@ -0,0 +1,189 @@
+"""Tests for connection pool options and pool telemetry."""
+import threading
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+
+from config import Config
+from utils.db_pool import PGBOUNCER_CONNECT_ARGS, Histogram, PoolMonitor, engine_options
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_engine(tmp_path, monitor: PoolMonitor, **kwargs):
+    """SQLite file engine on a monitored queue pool."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=monitor.pool_class(QueuePool),
+        connect_args={"check_same_thread": False},
+        **kwargs,
+    )
+    monitor.attach(engine)
+    return engine
+
+
+class TestHistogram:
+    """Tests for bucketing and summaries."""
+
+    def test_buckets(self):
+        """Observations land in the first bucket whose bound they do not exceed."""
+        histogram = Histogram((1, 10))
+        for seconds in (0.0005, 0.001, 0.005, 0.5):
+            histogram.observe(seconds)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["buckets"] == {"<=1": 2, "<=10": 1, ">10": 1}
+        assert snapshot["count"] == 4
+        assert snapshot["max_ms"] == 500.0
+        assert snapshot["avg_ms"] == round(506.5 / 4, 2)
+
+
+class TestPoolMonitor:
+    """Tests for checkout metrics and the idle pre-ping."""
+
+    def test_checkout_metrics(self, tmp_path):
+        """Checked-out connections, waits and hold times are recorded."""
+        clock = FakeClock()
+        monitor = PoolMonitor("test", pre_ping="never", clock=clock)
+        engine = make_engine(tmp_path, monitor, pool_size=2, max_overflow=1)
+
+        first = engine.connect()
+        second = engine.connect()
+        third = engine.connect()
+        stats = monitor.stats()
+        assert stats["checked_out"] == 3
+        assert stats["overflow"] == 1
+        assert stats["size"] == 2
+        assert stats["pool"] == "QueuePool"
+
+        clock.now = 0.2
+        for connection in (first, second, third):
+            connection.close()
+        stats = monitor.stats()
+        assert stats["checked_out"] == 0
+        assert stats["wait"]["count"] == 3
+        assert stats["checkout_duration"]["buckets"]["<=250"] == 3
+        engine.dispose()
+
+    def test_timeout_counted(self, tmp_path):
+        """A caller that gives up waiting for a connection is counted."""
+        monitor = PoolMonitor("test", pre_ping="never")
+        engine = make_engine(tmp_path, monitor, pool_size=1, max_overflow=0, pool_timeout=0.05)
+
+        with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+
+        stats = monitor.stats()
+        assert stats["timeouts"] == 1
+        assert stats["wait"]["max_ms"] >= 50
+        engine.dispose()
+
+    def test_concurrent_checkouts(self, tmp_path):
+        """Counters stay exact when many threads check connections in and out."""
+        monitor = PoolMonitor("test", pre_ping="never")
+        engine = make_engine(tmp_path, monitor, pool_size=4, max_overflow=4)
+
+        def worker():
+            for _ in range(200):
+                with engine.connect():
+                    pass
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = monitor.stats()
+        assert stats["checked_out"] == 0
+        assert stats["checkout_duration"]["count"] == 1600
+        engine.dispose()
+
+    def test_idle_ping_only_after_threshold(self, tmp_path):
+        """Connections reused quickly skip the ping; idle ones are pinged."""
+        clock = FakeClock()
+        monitor = PoolMonitor("test", pre_ping="idle", idle_seconds=30, clock=clock)
+        engine = make_engine(tmp_path, monitor, pool_size=1)
+
+        for _ in range(3):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        assert monitor.pings == 0
+
+        clock.now = 31
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        assert monitor.pings == 1
+        assert monitor.ping_failures == 0
+        engine.dispose()
+
+    def test_stale_connection_replaced(self, tmp_path):
+        """A failed ping invalidates the connection and checkout retries with a new one."""
+        clock = FakeClock()
+        monitor = PoolMonitor("test", pre_ping="idle", idle_seconds=30, clock=clock)
+        engine = make_engine(tmp_path, monitor, pool_size=1)
+
+        with engine.connect() as connection:
+            stale = connection.connection.dbapi_connection
+        stale.close()  # Server dropped it while idle
+        clock.now = 60
+
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT 1")).scalar() == 1
+            assert connection.connection.dbapi_connection is not stale
+        assert monitor.ping_failures == 1
+        assert monitor.stats()["checked_out"] == 0
+        engine.dispose()
+
+    def test_unknown_strategy_rejected(self):
+        """A misspelled DB_PRE_PING fails at startup."""
+        with pytest.raises(ValueError):
+            PoolMonitor("test", pre_ping="sometimes")
+
+
+class TestEngineOptions:
+    """Tests for the engine keyword arguments built from Config."""
+
+    def test_sqlite_keeps_default_pool(self):
+        """SQLite gets no sizing, and pre-ping only for the "always" strategy."""
+        options = engine_options("sqlite:///./pmc.db", PoolMonitor("test", pre_ping="always"))
+
+        assert options == {"pool_recycle": Config.DB_POOL_RECYCLE, "pool_pre_ping": True}
+
+    def test_postgres_sized_from_config(self, monkeypatch):
+        """PostgreSQL gets a monitored queue pool sized from Config."""
+        monkeypatch.setattr(Config, "DB_POOL_SIZE", 20)
+        monkeypatch.setattr(Config, "DB_MAX_OVERFLOW", 5)
+        monitor = PoolMonitor("test", pre_ping="idle")
+
+        options = engine_options("postgresql://db/pmc", monitor)
+
+        assert options["pool_size"] == 20
+        assert options["max_overflow"] == 5
+        assert options["pool_pre_ping"] is False
+        assert issubclass(options["poolclass"], QueuePool)
+        assert options["poolclass"].monitor is monitor
+        assert "connect_args" not in options
+
+    def test_pgbouncer_mode(self, monkeypatch):
+        """PgBouncer mode disables asyncpg's prepared statement caches."""
+        monkeypatch.setattr(Config, "DB_PGBOUNCER", True)
+
+        async_options = engine_options("postgresql://db/pmc", PoolMonitor("test"), is_async=True)
+        sync_options = engine_options("postgresql://db/pmc", PoolMonitor("test"))
+
+        connect_args = async_options["connect_args"]
+        assert connect_args["statement_cache_size"] == 0
+        assert connect_args["prepared_statement_cache_size"] == 0
+        assert connect_args["prepared_statement_name_func"]() != PGBOUNCER_CONNECT_ARGS["prepared_statement_name_func"]()
+        assert "connect_args" not in sync_options
@@ -0,0 +1,186 @@
+"""Tests for the priority download scheduler."""
+import asyncio
+
+import httpx
+import pytest
+
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_mirrors import MirrorRegistry
+from services.download_scheduler import BULK, INTERACTIVE, STAFF, DownloadScheduler, TokenBucket
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDownloadScheduler:
+    """Tests for slot granting and metrics."""
+
+    def test_higher_priority_is_granted_first(self):
+        """Waiting previews overtake queued staff and bulk downloads."""
+        scheduler = DownloadScheduler(max_concurrent=1, class_limits={BULK: 1})
+        running = scheduler.enqueue(BULK, "1")
+        bulk = scheduler.enqueue(BULK, "2")
+        staff = scheduler.enqueue(STAFF, "3")
+        preview = scheduler.enqueue(INTERACTIVE, "4")
+
+        assert running.granted.is_set()
+        assert [scheduler.position(t) for t in (preview, staff, bulk)] == [1, 2, 3]
+
+        scheduler.release(running)
+        assert preview.granted.is_set()
+        assert not staff.granted.is_set()
+
+    def test_class_cap_leaves_room_for_previews(self):
+        """Bulk sync cannot take the slots previews need."""
+        scheduler = DownloadScheduler(max_concurrent=3, class_limits={BULK: 1})
+        first_bulk = scheduler.enqueue(BULK, "1")
+        second_bulk = scheduler.enqueue(BULK, "2")
+        preview = scheduler.enqueue(INTERACTIVE, "3")
+
+        assert first_bulk.granted.is_set()
+        assert not second_bulk.granted.is_set()
+        assert preview.granted.is_set()
+
+    def test_withdrawn_ticket_leaves_queue(self):
+        scheduler = DownloadScheduler(max_concurrent=1)
+        running = scheduler.enqueue(INTERACTIVE, "1")
+        waiting = scheduler.enqueue(INTERACTIVE, "2")
+
+        scheduler.release(waiting)
+        scheduler.release(waiting)  # Idempotent
+
+        assert scheduler.stats()["queued"] == 0
+        scheduler.release(running)
+        assert scheduler.stats()["active"] == 0
+
+    def test_stats(self):
+        """Metrics report queue depth and waiting time per class."""
+        clock = FakeClock()
+        scheduler = DownloadScheduler(max_concurrent=1, clock=clock)
+        running = scheduler.enqueue(BULK, "1")
+        scheduler.enqueue(INTERACTIVE, "2")
+        clock.now += 2
+        scheduler.release(running)
+
+        stats = scheduler.stats()
+        assert stats["active"] == 1
+        assert stats["classes"][BULK]["completed"] == 1
+        assert stats["classes"][INTERACTIVE]["avg_wait_seconds"] == 2.0
+
+    def test_unknown_priority(self):
+        with pytest.raises(ValueError):
+            DownloadScheduler().enqueue("vip", "1")
+
+
+class TestTokenBucket:
+    """Tests for bandwidth shaping."""
+
+    def test_delay_after_burst(self):
+        """Bytes beyond the burst wait for the bucket to refill."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1000, clock=clock)
+
+        assert bucket.delay_for(1000) == 0
+        assert bucket.delay_for(500) == pytest.approx(0.5)
+        clock.now += 1.5
+        assert bucket.delay_for(500) == 0
+
+
+class TestScheduledDownloads:
+    """Tests for downloads going through the scheduler."""
+
+    def test_queued_download_reports_position(self, tmp_path, make_osz):
+        """A download waiting for a slot yields queue events, then completes."""
+        scheduler = DownloadScheduler(max_concurrent=1)
+        downloader = BeatmapDownloader(
+            storage_path=str(tmp_path),
+            mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, content=make_osz())),
+            scheduler=scheduler,
+        )
+
+        async def run():
+            blocker = scheduler.enqueue(BULK, "0")
+            events = []
+
+            async def consume():
+                async for event in downloader.download_with_progress("100"):
+                    events.append(event)
+
+            task = asyncio.create_task(consume())
+            await asyncio.sleep(0.05)
+            scheduler.release(blocker)
+            await task
+            return events
+
+        events = asyncio.run(run())
+
+        assert events[0] == {"type": "queued", "position": 1}
+        assert events[-1]["result"]["status"] == "downloaded"
+        assert scheduler.stats()["classes"][INTERACTIVE]["completed"] == 1
+
+    def test_concurrent_requests_take_one_slot(self, tmp_path, make_osz):
+        """Requests for a set already queued wait behind it without taking a ticket."""
+        scheduler = DownloadScheduler(max_concurrent=1)
+        requests = []
+
+        def handler(request):
+            requests.append(request.url.path)
+            return httpx.Response(200, content=make_osz())
+
+        downloader = BeatmapDownloader(
+            storage_path=str(tmp_path),
+            mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+            transport=httpx.MockTransport(handler),
+            scheduler=scheduler,
+        )
+
+        async def run():
+            blocker = scheduler.enqueue(BULK, "0")
+            tasks = [asyncio.create_task(downloader.download("100")) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            queued = scheduler.stats()["queued"]
+            scheduler.release(blocker)
+            return queued, await asyncio.gather(*tasks)
+
+        queued, results = asyncio.run(run())
+
+        assert queued == 1
+        assert sorted(result["status"] for result in results) == ["downloaded", "exists", "exists"]
+        assert requests == ["/d/100"]
+        assert scheduler.stats()["classes"][INTERACTIVE]["completed"] == 1
+
+    def test_retry_after_failure_is_scheduled(self, tmp_path, make_osz):
+        """A request that finds the download it waited for failed retries through the scheduler."""
+        scheduler = DownloadScheduler(max_concurrent=1)
+        responses = [httpx.Response(500), httpx.Response(200, content=make_osz())]
+        downloader = BeatmapDownloader(
+            storage_path=str(tmp_path),
+            mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+            transport=httpx.MockTransport(lambda request: responses.pop(0)),
+            scheduler=scheduler,
+        )
+
+        async def run():
+            return await asyncio.gather(downloader.download("100"), downloader.download("100"))
+
+        first, second = asyncio.run(run())
+
+        assert first["status"] == "error"
+        assert second["status"] == "downloaded"
+        assert scheduler.stats()["classes"][INTERACTIVE]["completed"] == 2
+
+
+def test_queue_metrics_endpoint(client):
+    """Staff can read the scheduler metrics."""
+    response = client.get("/mappools/sync/queue")
+
+    assert response.status_code == 200
+    assert set(response.json()["classes"]) == {INTERACTIVE, STAFF, BULK}
@@ -0,0 +1,131 @@
+"""Tests for background and storyboard sprite derivatives."""
+import asyncio
+import io
+
+import httpx
+import pytest
+
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_mirrors import MirrorRegistry
+from services.image_derivatives import DERIVED_DIR, available_formats, build_derivatives
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+STORYBOARD = '[Events]\nSprite,Foreground,Centre,"sb\\star.png",320,240\n F,0,1000,2000,0,1\n'
+
+
+def make_image(width: int, height: int, color=(200, 30, 40), fmt: str = "PNG", mode: str = "RGB") -> bytes:
+    """Encode a solid image with a contrasting stripe."""
+    image = Image.new(mode, (width, height), color)
+    image.paste((10, 10, 10), (0, 0, width // 10, height))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def download_set(tmp_path, payload: bytes) -> BeatmapDownloader:
+    """Download set 100 from a stand-in mirror with the default extraction policy."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=payload))
+    downloader = BeatmapDownloader(
+        storage_path=str(tmp_path),
+        mirrors=MirrorRegistry(["http://mirror/d/{beatmapset_id}"]),
+        transport=transport,
+    )
+    result = asyncio.run(downloader.download("100"))
+    assert result["status"] == "downloaded"
+    return downloader
+
+
+class TestBuildDerivatives:
+    """Tests for resizing, encoding and colour extraction."""
+
+    def test_widths_and_formats(self, tmp_path):
+        """Each width below the source is encoded in every available format."""
+        info = build_derivatives(tmp_path, "bg.png", make_image(2400, 1350))
+
+        assert info["width"] == 2400
+        assert info["color"] == "#c81e28"
+        widths = sorted({variant["width"] for variant in info["variants"]})
+        assert widths == [480, 960, 1920]
+        assert {variant["format"] for variant in info["variants"]} == set(available_formats())
+        small = next(variant for variant in info["variants"] if variant["width"] == 480)
+        assert small["height"] == 270
+        with Image.open(tmp_path / small["file"]) as derived:
+            assert derived.size == (480, 270)
+
+    def test_never_upscales(self, tmp_path):
+        """A small image gets its own width instead of the larger targets."""
+        info = build_derivatives(tmp_path, "bg.jpg", make_image(800, 600, fmt="JPEG"), formats=["webp"])
+
+        assert [variant["width"] for variant in info["variants"]] == [480, 800]
+
+    def test_names_follow_content(self, tmp_path):
+        """Identical sources reuse files; different sources get different names."""
+        first = build_derivatives(tmp_path, "a.png", make_image(600, 400), formats=["webp"])
+        again = build_derivatives(tmp_path, "b.png", make_image(600, 400), formats=["webp"])
+        other = build_derivatives(tmp_path, "c.png", make_image(600, 400, color=(0, 90, 0)), formats=["webp"])
+
+        assert first["variants"] == again["variants"]
+        assert first["variants"][0]["file"] != other["variants"][0]["file"]
+
+    def test_smaller_only_and_alpha(self, tmp_path):
+        """Same-size derivatives keep transparency and are dropped if not smaller."""
+        sprite = make_image(256, 256, color=(255, 255, 255, 0), mode="RGBA")
+        info = build_derivatives(tmp_path, "star.png", sprite, widths=None, formats=["webp"])
+        with Image.open(tmp_path / info["variants"][0]["file"]) as derived:
+            assert derived.mode == "RGBA"
+
+        tiny = make_image(2, 2, fmt="GIF")  # Already smaller than any WebP
+        assert build_derivatives(tmp_path, "dot.png", tiny, widths=None, smaller_only=True)["variants"] == []
+
+    def test_unreadable_image(self, tmp_path):
+        """Data that is not an image yields no derivatives."""
+        assert build_derivatives(tmp_path, "bg.jpg", b"\xff\xd8" + b"\x00" * 256) is None
+        assert not (tmp_path / DERIVED_DIR).exists()
+
+
+class TestDerivativePipeline:
+    """Tests for derivatives generated at extraction time and their endpoint."""
+
+    @pytest.fixture
+    def downloader(self, tmp_path, make_osz, monkeypatch):
+        from routers import mappool as mappool_router
+
+        payload = make_osz(extra_files={
+            "bg.jpg": make_image(2400, 1350, fmt="JPEG"),
+            "SB/Star.png": make_image(300, 300, mode="RGBA", color=(255, 255, 0, 128)),
+            "Test.osb": STORYBOARD.encode(),
+        })
+        downloader = download_set(tmp_path, payload)
+        monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+        return downloader
+
+    def test_recorded_in_notes(self, downloader):
+        """Notes carry the background's derivatives and a sprite derivative map."""
+        notes = downloader.get_notes_json("100", beatmap_id=1002)
+
+        background = notes["background_image"]
+        assert background["source"] == "bg.jpg"
+        assert background["color"].startswith("#")
+        assert all(variant["url"].startswith("/mappools/images/100/") for variant in background["variants"])
+        # Matched case-insensitively against SB/Star.png, keyed by the storyboard's path
+        assert list(notes["storyboard"]["image_derivatives"]) == ["sb/star.png"]
+        assert downloader.get_manifest("100")["images"]["sprites"]["sb/star.png"]["source"] == "SB/Star.png"
+
+    def test_endpoint_serves_immutable(self, public_client, downloader):
+        """Derivatives are served with long-lived cache headers."""
+        url = downloader.get_notes_json("100", beatmap_id=1002)["background_image"]["variants"][0]["url"]
+
+        response = public_client.get(url)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("image/")
+        assert "immutable" in response.headers["cache-control"]
+        assert Image.open(io.BytesIO(response.content)).width == 480
+
+    def test_endpoint_rejects_other_files(self, public_client, downloader):
+        """Only derivative names are served; the directory stays hidden otherwise."""
+        assert public_client.get("/mappools/images/100/.manifest.json").status_code == 404
+        assert public_client.get("/mappools/images/100/0000000000000000-480.webp").status_code == 404
+        assert public_client.get("/beatmaps/100/.derived/").status_code == 404
@@ -0,0 +1,162 @@
+"""Tests for precompressed notes and how the preview endpoint serves them."""
+import gzip
+import json
+
+import pytest
+
+from models.mappool import Mappool, MappoolMap
+from services import notes_encoding
+from services.beatmap_downloader import NOTES_FORMAT, BeatmapDownloader
+from services.beatmap_extraction import ExtractionPolicy
+from services.notes_encoding import choose_encoding, variant_path, write_variants
+from tests.test_beatmap_manifest import install_set
+
+
+@pytest.fixture
+def downloader(tmp_path) -> BeatmapDownloader:
+    return BeatmapDownloader(storage_path=str(tmp_path), policy=ExtractionPolicy({".osu", ".mp3", ".jpg"}))
+
+
+class TestChooseEncoding:
+    """Tests for Accept-Encoding negotiation."""
+
+    def test_prefers_first_available(self):
+        """The first stored encoding the client accepts wins."""
+        assert choose_encoding("gzip, deflate, br", ["br", "gzip"]) == "br"
+        assert choose_encoding("gzip, deflate", ["br", "gzip"]) == "gzip"
+
+    def test_q_values(self):
+        """q=0 refuses an encoding; a wildcard accepts the rest."""
+        assert choose_encoding("br;q=0, gzip;q=0.5", ["br", "gzip"]) == "gzip"
+        assert choose_encoding("*;q=0.1", ["gzip"]) == "gzip"
+        assert choose_encoding("gzip;q=0", ["gzip"]) is None
+
+    def test_no_header(self):
+        """Without Accept-Encoding the uncompressed file is sent."""
+        assert choose_encoding(None, ["gzip"]) is None
+        assert choose_encoding("identity", ["gzip"]) is None
+
+
+class TestVariants:
+    """Tests for writing compressed variants."""
+
+    def test_gzip_round_trip(self, tmp_path):
+        """The gzip variant decompresses to the original bytes."""
+        data = json.dumps({"notes": [[0, 100, None]] * 500}).encode()
+        json_path = tmp_path / "1001.json"
+        json_path.write_bytes(data)
+
+        sizes = write_variants(json_path, data)
+
+        assert gzip.decompress(variant_path(json_path, "gzip").read_bytes()) == data
+        assert sizes["gzip"] < len(data) / 10
+        # Fixed mtime: regenerating identical notes yields identical bytes
+        first = variant_path(json_path, "gzip").read_bytes()
+        write_variants(json_path, data)
+        assert variant_path(json_path, "gzip").read_bytes() == first
+
+    @pytest.mark.skipif(notes_encoding.brotli is None, reason="brotli not installed")
+    def test_brotli_round_trip(self, tmp_path):
+        """The brotli variant decompresses to the original bytes."""
+        data = b'{"notes": []}' * 100
+        json_path = tmp_path / "1001.json"
+        write_variants(json_path, data)
+
+        assert notes_encoding.brotli.decompress(variant_path(json_path, "br").read_bytes()) == data
+
+    def test_brotli_quality(self, tmp_path, monkeypatch):
+        """Variants written on demand use the fast brotli level; offline ones the maximum."""
+        qualities = []
+
+        class FakeBrotli:
+            @staticmethod
+            def compress(data, quality):
+                qualities.append(quality)
+                return data
+
+        monkeypatch.setattr(notes_encoding, "brotli", FakeBrotli)
+        write_variants(tmp_path / "1001.json", b"{}")
+        write_variants(tmp_path / "1002.json", b"{}", offline=True)
+
+        assert qualities == [notes_encoding.BROTLI_QUALITY, notes_encoding.BROTLI_OFFLINE_QUALITY]
+        assert notes_encoding.BROTLI_QUALITY < 10
+
+    def test_gzip_level(self, tmp_path, monkeypatch):
+        """Variants written on demand use the fast gzip level; offline ones the maximum."""
+        levels = []
+        compress = gzip.compress
+
+        def record_level(data, compresslevel, mtime):
+            levels.append(compresslevel)
+            return compress(data, compresslevel, mtime=mtime)
+
+        monkeypatch.setattr(notes_encoding, "brotli", None)
+        monkeypatch.setattr(notes_encoding.gzip, "compress", record_level)
+        write_variants(tmp_path / "1001.json", b"{}")
+        write_variants(tmp_path / "1002.json", b"{}", offline=True)
+
+        assert levels == [notes_encoding.GZIP_LEVEL, notes_encoding.GZIP_OFFLINE_LEVEL]
+        assert notes_encoding.GZIP_LEVEL <= 6
+
+    def test_notes_generation_records_encodings(self, downloader, make_osz):
+        """Each difficulty lists its variants and the notes carry their URLs."""
+        set_path = install_set(downloader, make_osz)
+        manifest = downloader.get_manifest("100")
+        entry = manifest["difficulties"][0]
+
+        assert manifest["notes_format"] == NOTES_FORMAT
+        assert "gzip" in entry["encodings"]
+        assert (set_path / "notes" / f"{entry['notes_file']}.gz").exists()
+        notes = downloader.get_notes_json("100", beatmap_id=1001)
+        assert notes["audio_url"] == "/beatmaps/100/audio.mp3"
+        assert notes["background_url"] == "/beatmaps/100/bg.jpg"
+        assert "storyboard_base_url" not in notes
+
+
+class TestPreviewEndpoint:
+    """Tests for GET /mappools/preview/{beatmap_id}."""
+
+    @pytest.fixture
+    def preview_map(self, db, downloader, make_osz, monkeypatch):
+        from routers import mappool as mappool_router
+
+        monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+        install_set(downloader, make_osz)
+        pool = Mappool(stage_name="Finals", is_visible=True)
+        db.add(pool)
+        db.flush()
+        db.add(MappoolMap(
+            mappool_id=pool.id, slot="NM1", beatmap_id="1002", beatmapset_id="100",
+            artist="a", title="t", difficulty_name="Hard", star_rating=5.0, bpm=180,
+            length_seconds=120, od=8.0, hp=8.0, mapper="m",
+        ))
+        db.commit()
+
+    def test_served_gzip_encoded(self, public_client, preview_map):
+        """Clients accepting gzip get the stored variant with Content-Encoding."""
+        response = public_client.get("/mappools/preview/1002", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        # httpx decodes the body transparently
+        data = response.json()
+        assert data["metadata"]["beatmap_id"] == 1002
+        assert data["audio_url"] == "/beatmaps/100/audio.mp3"
+        assert response.headers["x-beatmapset-id"] == "100"
+        assert response.headers["x-background-url"] == "/beatmaps/100/bg.jpg"
+
+    def test_served_identity(self, public_client, preview_map):
+        """Clients that accept no compression get the plain JSON file."""
+        response = public_client.get("/mappools/preview/1002", headers={"Accept-Encoding": "identity"})
+
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.json()["metadata"]["version"] == "Hard"
+
+    def test_unknown_difficulty(self, public_client, db, preview_map):
+        """A map whose difficulty is not in the set is a 404."""
+        db.query(MappoolMap).update({MappoolMap.beatmap_id: "9999", MappoolMap.difficulty_name: "Insane"})
+        db.commit()
+
+        assert public_client.get("/mappools/preview/9999").status_code == 404
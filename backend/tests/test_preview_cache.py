@@ -0,0 +1,156 @@
+"""Tests for the preview payload cache and conditional preview requests."""
+import pytest
+
+from models.mappool import Mappool, MappoolMap
+from services.beatmap_downloader import BeatmapDownloader
+from services.beatmap_extraction import ExtractionPolicy
+from services.preview_cache import PreviewCache, PreviewPayload, etag_matches, preview_cache
+from tests.test_beatmap_manifest import install_set
+
+
+def payload(body: bytes = b"{}", beatmapset_id: str = "100", generation: str = "g1") -> PreviewPayload:
+    return PreviewPayload(body, None, beatmapset_id, generation)
+
+
+class TestPreviewCache:
+    """Tests for the byte-bounded LRU."""
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Entries are evicted oldest-first once the byte budget is exceeded."""
+        cache = PreviewCache(max_bytes=250)
+        cache.put("1", None, payload(b"a" * 100))
+        cache.put("2", None, payload(b"b" * 100))
+        cache.get("1", None)  # 1 is now more recent than 2
+        cache.put("3", None, payload(b"c" * 100))
+
+        assert cache.get("2", None) is None
+        assert cache.get("1", None) is not None
+        assert cache.stats()["bytes"] == 200
+
+    def test_oversized_and_disabled(self):
+        """A payload larger than the budget (or a zero budget) is not cached."""
+        cache = PreviewCache(max_bytes=0)
+        cache.put("1", None, payload())
+
+        assert cache.get("1", None) is None
+
+    def test_generation_mismatch_misses(self):
+        """A payload from an older notes generation is dropped on lookup."""
+        cache = PreviewCache()
+        cache.put("1", "gzip", payload(generation="g1"))
+
+        assert cache.get("1", "gzip", current_generation=lambda set_id: "g1") is not None
+        assert cache.get("1", "gzip", current_generation=lambda set_id: "g2") is None
+        assert cache.stats()["entries"] == 0
+
+    def test_invalidate(self):
+        """Invalidation by beatmap drops every encoding; by set, every beatmap."""
+        cache = PreviewCache()
+        cache.put("1", None, payload(beatmapset_id="100"))
+        cache.put("1", "gzip", payload(beatmapset_id="100"))
+        cache.put("2", None, payload(beatmapset_id="100"))
+        cache.put("3", None, payload(beatmapset_id="300"))
+
+        cache.invalidate("1")
+        assert cache.stats()["entries"] == 2
+        cache.invalidate_set("100")
+        assert cache.get("3", None) is not None
+        assert cache.stats()["entries"] == 1
+
+    def test_etag(self):
+        """ETags are strong, content-derived and differ per encoding."""
+        plain = PreviewPayload(b"{}", None, "100", "g1")
+        gzipped = PreviewPayload(b"{}", "gzip", "100", "g1")
+
+        assert plain.etag == PreviewPayload(b"{}", None, "100", "g2").etag
+        assert plain.etag != gzipped.etag
+        assert etag_matches(f'W/"x", {plain.etag}', plain.etag)
+        assert etag_matches("*", plain.etag)
+        assert not etag_matches(gzipped.etag, plain.etag)
+        assert not etag_matches(None, plain.etag)
+
+
+class TestConditionalPreview:
+    """Tests for cached, conditional GET /mappools/preview/{beatmap_id}."""
+
+    @pytest.fixture
+    def downloader(self, tmp_path, monkeypatch) -> BeatmapDownloader:
+        from routers import mappool as mappool_router
+
+        downloader = BeatmapDownloader(storage_path=str(tmp_path), policy=ExtractionPolicy({".osu", ".mp3", ".jpg"}))
+        monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+        return downloader
+
+    @pytest.fixture
+    def preview_map(self, db, downloader, make_osz) -> MappoolMap:
+        install_set(downloader, make_osz)
+        pool = Mappool(stage_name="Finals", is_visible=True)
+        db.add(pool)
+        db.flush()
+        map_obj = MappoolMap(
+            mappool_id=pool.id, slot="NM1", beatmap_id="1002", beatmapset_id="100",
+            artist="a", title="t", difficulty_name="Hard", star_rating=5.0, bpm=180,
+            length_seconds=120, od=8.0, hp=8.0, mapper="m",
+        )
+        db.add(map_obj)
+        db.commit()
+        return map_obj
+
+    def test_osu_api_only_map(self, public_client, downloader, make_osz, monkeypatch):
+        """A map not in any pool, whose .osu files lack BeatmapIDs, is found by the API's difficulty name."""
+        from routers import mappool as mappool_router
+
+        install_set(downloader, lambda **kwargs: make_osz({"Normal": 0, "Hard": 0}, **kwargs))
+
+        async def get_beatmap(beatmap_id):
+            return {"beatmapset_id": 100, "difficulty_name": "Hard"}
+
+        monkeypatch.setattr(mappool_router.osu_api, "get_beatmap", get_beatmap)
+        response = public_client.get("/mappools/preview/1002")
+
+        assert response.status_code == 200
+        assert response.json()["metadata"]["version"] == "Hard"
+
+    def test_second_request_is_cached(self, public_client, preview_map):
+        """The second request is a cache hit with identical validators."""
+        first = public_client.get("/mappools/preview/1002")
+        second = public_client.get("/mappools/preview/1002")
+
+        assert first.status_code == second.status_code == 200
+        assert first.headers["etag"] == second.headers["etag"]
+        assert "max-age" in first.headers["cache-control"]
+        assert preview_cache.stats()["hits"] == 1
+
+    def test_if_none_match_returns_304(self, public_client, preview_map):
+        """A matching If-None-Match is answered without a body."""
+        etag = public_client.get("/mappools/preview/1002").headers["etag"]
+
+        response = public_client.get("/mappools/preview/1002", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert public_client.get(
+            "/mappools/preview/1002", headers={"If-None-Match": '"stale"'}
+        ).status_code == 200
+
+    def test_regeneration_invalidates(self, public_client, downloader, preview_map):
+        """Regenerating a set's notes drops its cached payloads."""
+        public_client.get("/mappools/preview/1002")
+        assert preview_cache.stats()["entries"] == 1
+
+        downloader.generate_notes_json("100")
+
+        assert preview_cache.stats()["entries"] == 0
+
+    def test_map_edit_invalidates(self, client, preview_map, monkeypatch):
+        """Editing the map row drops its cached payloads."""
+        from routers import mappool as mappool_router
+
+        monkeypatch.setattr(mappool_router.warmup_service, "enqueue", lambda *args: None)
+        client.get("/mappools/preview/1002")
+        assert preview_cache.stats()["entries"] == 1
+
+        client.put(f"/mappools/maps/{preview_map.id}", json={"difficulty_name": "Normal"})
+
+        assert preview_cache.stats()["entries"] == 0
@@ -0,0 +1,249 @@
+"""Tests for the progress hub and the preview SSE stream built on it."""
+import asyncio
+import json
+
+import pytest
+
+from main import app
+from models.mappool import Mappool, MappoolMap
+from services.osu_parser import parse_partial_preview
+from services.progress_hub import ProgressHub, parse_event_id
+from tests.test_beatmap_publish import make_downloader
+from utils.database import get_db
+
+
+def parse_sse(text: str) -> list[dict]:
+    """Split an SSE body into ``{"id", "event", "data"}`` dicts."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        event = {"id": None}
+        for line in block.splitlines():
+            field, _, value = line.partition(": ")
+            event[field] = value
+        events.append(event)
+    return events
+
+
+class TestProgressHub:
+    """Tests for channels, subscriptions and resume."""
+
+    def test_subscribe_and_resume(self):
+        """Subscribers get every event; resuming skips what was already seen."""
+        hub = ProgressHub()
+
+        async def job(channel):
+            for percent in (25, 50, 75):
+                channel.publish("progress", {"progress": percent})
+                await asyncio.sleep(0)
+
+        async def main():
+            channel = hub.start("100", job)
+            seen = [event async for event in channel.subscribe()]
+            resumed = [event async for event in channel.subscribe(after=seen[1]["seq"])]
+            return channel, seen, resumed
+
+        channel, seen, resumed = asyncio.run(main())
+
+        assert [event["data"]["progress"] for event in seen] == [25, 50, 75]
+        assert [event["data"]["progress"] for event in resumed] == [75]
+        assert parse_event_id(seen[0]["id"]) == (channel.job_id, 1)
+
+    def test_job_survives_disconnect(self):
+        """Cancelling a subscriber does not cancel the job."""
+        hub = ProgressHub()
+        finished = asyncio.Event()
+
+        async def job(channel):
+            for step in range(5):
+                channel.publish("progress", {"step": step})
+                await asyncio.sleep(0.01)
+            finished.set()
+
+        async def main():
+            channel = hub.start("100", job)
+
+            async def first_event():
+                async for event in channel.subscribe():
+                    return event
+
+            await first_event()  # The client disconnects after one event
+            await asyncio.wait_for(finished.wait(), timeout=1)
+            return channel
+
+        channel = asyncio.run(main())
+
+        assert channel.done
+        assert len(channel.events) == 5
+
+    def test_joins_running_job(self):
+        """A second start for the same key joins the running job."""
+        hub = ProgressHub()
+        runs = []
+
+        async def job(channel):
+            runs.append(channel.job_id)
+            await asyncio.sleep(0.02)
+
+        async def main():
+            first = hub.start("100", job)
+            second = hub.start("100", job)
+            await asyncio.sleep(0.05)
+            # Finished: a resume of that job returns it, a fresh start runs again
+            resumed = hub.start("100", job, resume=first.job_id)
+            fresh = hub.start("100", job)
+            await asyncio.sleep(0.05)
+            return first, second, resumed, fresh
+
+        first, second, resumed, fresh = asyncio.run(main())
+
+        assert first is second is resumed
+        assert fresh is not first
+        assert len(runs) == 2
+
+    def test_failed_job_publishes_error(self):
+        """An exception in a job ends the channel with an error event."""
+        hub = ProgressHub()
+
+        async def job(channel):
+            raise RuntimeError("mirror exploded")
+
+        async def main():
+            channel = hub.start("100", job)
+            return [event async for event in channel.subscribe()]
+
+        events = asyncio.run(main())
+
+        assert events[-1]["event"] == "error"
+        assert events[-1]["data"]["message"] == "mirror exploded"
+
+    def test_parse_event_id(self):
+        """Malformed IDs are ignored."""
+        assert parse_event_id("ab12cd34:7") == ("ab12cd34", 7)
+        assert parse_event_id("7") is None
+        assert parse_event_id("ab:x") is None
+        assert parse_event_id(None) is None
+
+
+class TestPreviewStream:
+    """Tests for GET /mappools/preview/{beatmap_id}/stream."""
+
+    @pytest.fixture
+    def stream_setup(self, db, tmp_path, make_osz, monkeypatch):
+        from routers import mappool as mappool_router
+
+        downloader, requests = make_downloader(tmp_path, make_osz())
+        monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+        monkeypatch.setattr(mappool_router, "progress_hub", ProgressHub())
+        pool = Mappool(stage_name="Finals", is_visible=True)
+        db.add(pool)
+        db.flush()
+        db.add(MappoolMap(
+            mappool_id=pool.id, slot="NM1", beatmap_id="1002", beatmapset_id="100",
+            artist="a", title="t", difficulty_name="Hard", star_rating=5.0, bpm=180,
+            length_seconds=120, od=8.0, hp=8.0, mapper="m",
+        ))
+        db.commit()
+        return downloader, requests
+
+    def test_stream_downloads_and_completes(self, public_client, stream_setup):
+        """Download events carry IDs and the stream ends with the notes."""
+        downloader, requests = stream_setup
+
+        events = parse_sse(public_client.get("/mappools/preview/1002/stream").text)
+
+        download_events = [event for event in events if event["id"]]
+        assert download_events and all(parse_event_id(event["id"]) for event in download_events)
+        assert events[-1]["event"] == "complete"
+        assert '"beatmap_id": 1002' in events[-1]["data"]
+        assert requests == ["/d/100"]
+        # A second load finds the set installed and skips the job
+        events = parse_sse(public_client.get("/mappools/preview/1002/stream").text)
+        assert not any(event["id"] for event in events)
+        assert requests == ["/d/100"]
+
+    def test_progressive_events(self, public_client, stream_setup):
+        """Metadata and the requested difficulty's opening arrive before extraction."""
+        events = parse_sse(public_client.get("/mappools/preview/1002/stream").text)
+        names = [event["event"] for event in events]
+
+        assert json.loads(events[names.index("metadata")]["data"])["version"] == "Hard"
+        partials = [json.loads(event["data"]) for event in events if event["event"] == "partial"]
+        assert [partial["metadata"]["beatmap_id"] for partial in partials] == [1002]
+        assert partials[0]["notes"] and partials[0]["timing_points"]
+        extracting = next(i for i, event in enumerate(events) if "Extrayendo" in event.get("data", ""))
+        assert names.index("partial") < extracting < names.index("complete")
+
+    def test_osu_api_difficulty_name(self, public_client, tmp_path, make_osz, monkeypatch):
+        """A map found through the osu! API is matched by its difficulty name when the .osu has no ID."""
+        from routers import mappool as mappool_router
+
+        downloader, _ = make_downloader(tmp_path, make_osz({"Normal": 0, "Hard": 0}))
+        monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+        monkeypatch.setattr(mappool_router, "progress_hub", ProgressHub())
+
+        async def get_beatmap(beatmap_id):
+            return {"beatmapset_id": 100, "difficulty_name": "Hard", "title": "Test Song", "artist": "Test Artist"}
+
+        monkeypatch.setattr(mappool_router.osu_api, "get_beatmap", get_beatmap)
+        events = parse_sse(public_client.get("/mappools/preview/1002/stream").text)
+
+        partials = [json.loads(event["data"]) for event in events if event["event"] == "partial"]
+        assert [partial["metadata"]["version"] for partial in partials] == ["Hard"]
+        assert events[-1]["event"] == "complete"
+        assert json.loads(events[-1]["data"])["metadata"]["version"] == "Hard"
+
+    def test_partial_preview_cuts_notes(self):
+        """Only notes in the opening window are kept; the total is reported."""
+        from tests.conftest import _osu_file
+
+        partial = parse_partial_preview(_osu_file("Hard", 1002, notes=40), seconds=2)
+
+        # Notes are 250 ms apart from 1000 ms: 8 start in the first two seconds
+        assert len(partial["notes"]) == 8
+        assert partial["notes_total"] == 40
+        assert partial["notes_until_ms"] == 3000
+
+    def test_resume_with_last_event_id(self, public_client, stream_setup, monkeypatch):
+        """A reconnect with Last-Event-ID replays only the events after it."""
+        from routers import mappool as mappool_router
+
+        downloader, _ = stream_setup
+
+        async def failing_download(beatmapset_id, force=False, priority="interactive"):
+            for loaded in (10, 20, 30):
+                yield {"type": "progress", "loaded": loaded, "total": 40}
+            yield {"type": "error", "result": {"status": "error", "error": "mirror died"}}
+
+        monkeypatch.setattr(downloader, "download_with_progress", failing_download)
+        first = parse_sse(public_client.get("/mappools/preview/1002/stream").text)
+        download_events = [event for event in first if event["id"]]
+        assert first[-1]["event"] == "error"
+
+        second = parse_sse(public_client.get(
+            "/mappools/preview/1002/stream",
+            headers={"Last-Event-ID": download_events[1]["id"]},
+        ).text)
+        replayed = [event for event in second if event["id"]]
+
+        assert [event["id"] for event in replayed] == [event["id"] for event in download_events[2:]]
+        assert mappool_router.progress_hub.stats() == {"running": 0, "finished": 1}
+
+    def test_db_session_released_before_download(self, async_session_factory, public_client, stream_setup, monkeypatch):
+        """The request's DB session is closed before the download starts."""
+        downloader, _ = stream_setup
+        timeline = []
+
+        async def override_get_db():
+            async with async_session_factory() as session:
+                yield session
+            timeline.append("db closed")
+
+        async def download(beatmapset_id, force=False, priority="interactive"):
+            timeline.append("download")
+            yield {"type": "error", "result": {"status": "error", "error": "offline"}}
+
+        app.dependency_overrides[get_db] = override_get_db
+        monkeypatch.setattr(downloader, "download_with_progress", download)
+        public_client.get("/mappools/preview/1002/stream")
+
+        assert timeline == ["db closed", "download"]
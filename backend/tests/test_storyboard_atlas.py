@@ -0,0 +1,150 @@
+"""Tests for storyboard texture atlas packing."""
+import io
+import itertools
+
+import pytest
+
+from services.storyboard_atlas import AtlasPage, animation_groups, build_atlases, pack
+from tests.test_image_derivatives import download_set, make_image
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+STORYBOARD = """[Events]
+Sprite,Foreground,Centre,"sb\\star.png",320,240
+ F,0,1000,2000,0,1
+Sprite,Foreground,Centre,"sb\\ring.png",320,240
+ F,0,1000,2000,0,1
+Animation,Foreground,Centre,"sb\\fire.png",320,240,3,50,LoopForever
+ F,0,1000,2000,0,1
+"""
+
+
+def storyboard(images, animations=()):
+    """Minimal StoryboardData with the given images and ``(filepath, frames)`` animations."""
+    sprites = [
+        {"type": "animation", "filepath": filepath, "frame_count": frames}
+        for filepath, frames in animations
+    ]
+    return {"sprites": sprites, "commands": [], "images": images, "widescreen": False}
+
+
+def overlaps(a, b) -> bool:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+class TestPacking:
+    """Tests for grouping and shelf packing."""
+
+    def test_animation_groups(self):
+        """Animation frames form one unit; other images are single units."""
+        groups = animation_groups(storyboard(
+            ["sb\\a.png", "sb\\fire0.png", "sb\\fire1.png"],
+            animations=[("sb\\fire.png", 2)],
+        ))
+
+        assert groups == [["sb/fire0.png", "sb/fire1.png"], ["sb/a.png"]]
+
+    def test_no_overlaps_within_page(self):
+        """Placements stay on the page and keep their padding apart."""
+        sizes = {f"s{i}.png": (30 + i * 7 % 50, 20 + i * 13 % 60) for i in range(60)}
+
+        pages = pack(sizes, [[key] for key in sizes], size=512, padding=2)
+
+        placed = {key for page in pages for key in page.placements}
+        assert placed == set(sizes)
+        for page in pages:
+            assert page.width <= 512 and page.height <= 512
+            padded = [(x - 2, y - 2, w + 4, h + 4) for x, y, w, h in page.placements.values()]
+            assert not any(overlaps(a, b) for a, b in itertools.combinations(padded, 2))
+
+    def test_animation_kept_on_one_page(self):
+        """A unit that does not fit the current page moves whole to a new one."""
+        sizes = {"big.png": (200, 200), **{f"fire{i}.png": (100, 100) for i in range(4)}}
+        groups = [["big.png"], [f"fire{i}.png" for i in range(4)]]
+
+        pages = pack(sizes, groups, size=256, padding=0)
+
+        assert len(pages) == 2
+        assert set(pages[1].placements) == {f"fire{i}.png" for i in range(4)}
+
+    def test_place_all_rolls_back(self):
+        """A unit that does not fit leaves the page unchanged."""
+        page = AtlasPage(size=100, padding=0)
+        page.place("a", 60, 60)
+
+        assert not page.place_all(["b", "c"], {"b": (30, 30), "c": (80, 80)})
+        assert list(page.placements) == ["a"]
+        assert page.height == 60
+
+
+class TestBuildAtlases:
+    """Tests for rendering atlas pages."""
+
+    def test_pixels_and_uv(self, tmp_path):
+        """Sprites are drawn at their rectangle and their borders fill the padding."""
+        images = {
+            "red.png": make_image(40, 20, color=(255, 0, 0)),
+            "blue.png": make_image(10, 10, color=(0, 0, 255)),
+        }
+
+        atlas = build_atlases(tmp_path, images, [["red.png"], ["blue.png"]], size=256, padding=2)
+
+        page = atlas["pages"][0]
+        canvas = Image.open(tmp_path / page["file"]).convert("RGBA")
+        red = atlas["sprites"]["red.png"]
+        assert canvas.getpixel((red["x"] + 30, red["y"] + 5)) == (255, 0, 0, 255)
+        # Extruded border: the padding at the blue sprite's corner repeats its edge
+        blue = atlas["sprites"]["blue.png"]
+        assert canvas.getpixel((blue["x"] + 5, blue["y"] + 5)) == (0, 0, 255, 255)
+        assert canvas.getpixel((blue["x"] + 10, blue["y"] - 1)) == (0, 0, 255, 255)
+        assert red["uv"] == pytest.approx([
+            red["x"] / page["width"],
+            red["y"] / page["height"],
+            (red["x"] + 40) / page["width"],
+            (red["y"] + 20) / page["height"],
+        ], abs=1e-6)
+
+    def test_skips_unreadable_and_large(self, tmp_path):
+        """Unreadable and oversized images stay out; one packable image is not worth a page."""
+        images = {
+            "a.png": make_image(10, 10),
+            "huge.png": make_image(300, 40),
+            "broken.png": b"\x89PNG" * 8,
+        }
+
+        assert build_atlases(tmp_path, images, [[key] for key in images], size=256) is None
+
+
+class TestAtlasPipeline:
+    """Tests for atlases generated at extraction time."""
+
+    def test_atlas_in_storyboard(self, tmp_path, make_osz, public_client, monkeypatch):
+        """The storyboard payload carries pages and UVs; packed images get no separate derivative."""
+        from routers import mappool as mappool_router
+
+        extra = {
+            "SB/star.png": make_image(64, 64, mode="RGBA", color=(255, 255, 0, 255)),
+            "SB/ring.png": make_image(48, 48, mode="RGBA", color=(0, 255, 255, 255)),
+            "Test.osb": STORYBOARD.encode(),
+        }
+        for frame in range(3):
+            extra[f"SB/fire{frame}.png"] = make_image(32, 32, color=(frame * 80, 0, 0))
+        downloader = download_set(tmp_path, make_osz(extra_files=extra))
+        monkeypatch.setattr(mappool_router, "beatmap_downloader", downloader)
+
+        board = downloader.get_notes_json("100", beatmap_id=1002)["storyboard"]
+
+        assert len(board["atlas"]["pages"]) == 1
+        assert set(board["atlas"]["sprites"]) == {
+            "sb/star.png", "sb/ring.png", "sb/fire0.png", "sb/fire1.png", "sb/fire2.png",
+        }
+        assert board["image_derivatives"] == {}
+        response = public_client.get(board["atlas"]["pages"][0]["url"])
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert Image.open(io.BytesIO(response.content)).size == (
+            board["atlas"]["pages"][0]["width"], board["atlas"]["pages"][0]["height"],
+        )
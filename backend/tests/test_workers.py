@@ -0,0 +1,142 @@
+"""Tests for the worker pools and the event-loop lag monitor."""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.loop_monitor import LoopLagMonitor, RequestTracker
+from services.workers import CPU, IO, WorkerPools
+
+request_label = contextvars.ContextVar("request_label", default=None)
+
+
+class TestWorkerPools:
+    """Tests for running blocking calls off the event loop."""
+
+    def test_runs_in_named_threads(self):
+        """Calls run in the pool's own threads and return their result."""
+        pools = WorkerPools(io_workers=2, cpu_workers=1)
+
+        async def main():
+            io_thread = await pools.run_io(lambda: threading.current_thread().name)
+            cpu_thread = await pools.run_cpu(lambda: threading.current_thread().name)
+            return io_thread, cpu_thread
+
+        try:
+            io_thread, cpu_thread = asyncio.run(main())
+        finally:
+            pools.shutdown()
+
+        assert io_thread.startswith("pmc-io")
+        assert cpu_thread.startswith("pmc-cpu")
+        assert pools.stats()[IO]["completed"] == 1
+        assert pools.stats()[CPU]["completed"] == 1
+
+    def test_cpu_limit(self):
+        """CPU work is limited to its own threads; IO calls are not queued behind it."""
+        pools = WorkerPools(io_workers=2, cpu_workers=1)
+        release = threading.Event()
+
+        async def main():
+            slow = [asyncio.ensure_future(pools.run_cpu(release.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            stats = pools.stats()[CPU]
+            # IO still answers while the CPU pool is saturated
+            assert await pools.run_io(lambda: "read") == "read"
+            release.set()
+            await asyncio.gather(*slow)
+            return stats
+
+        try:
+            stats = asyncio.run(main())
+        finally:
+            pools.shutdown()
+
+        assert stats["active"] == 1
+        assert stats["queued"] == 1
+
+    def test_keeps_context_and_exceptions(self):
+        """Context variables reach the worker; exceptions reach the awaiter."""
+        pools = WorkerPools(io_workers=1)
+
+        async def main():
+            request_label.set("GET /preview")
+            label = await pools.run_io(request_label.get)
+            try:
+                await pools.run_io(int, "not a number")
+            except ValueError:
+                return label, True
+            return label, False
+
+        try:
+            assert asyncio.run(main()) == ("GET /preview", True)
+        finally:
+            pools.shutdown()
+
+
+class TestLoopLagMonitor:
+    """Tests for stall detection."""
+
+    def test_record_logs_stall_with_inflight_requests(self, caplog):
+        """A stall is logged with the requests in flight, oldest first."""
+        monitor = LoopLagMonitor(threshold=0.1)
+        first = monitor.request_started("GET /mappools/preview/1")
+        monitor.request_started("GET /health")
+
+        with caplog.at_level(logging.WARNING, logger="services.loop_monitor"):
+            monitor.record(0.02)
+            monitor.record(0.25)
+
+        assert monitor.stalls == 1
+        assert monitor.stats()["max_lag_ms"] == 250.0
+        assert monitor.last_stall["inflight"][0].startswith("GET /mappools/preview/1")
+        assert "blocked for 250 ms" in caplog.text
+        monitor.request_finished(first)
+        assert len(monitor.inflight()) == 1
+
+    def test_detects_blocking_call(self):
+        """A handler sleeping on the loop is seen as lag."""
+        monitor = LoopLagMonitor(threshold=0.1, interval=0.01)
+
+        async def main():
+            monitor.start()
+            await asyncio.sleep(0.03)
+            time.sleep(0.2)  # Blocks the loop
+            await asyncio.sleep(0.03)
+            await monitor.stop()
+
+        asyncio.run(main())
+
+        assert monitor.stalls >= 1
+        assert monitor.max_lag >= 0.15
+
+    def test_request_tracker(self):
+        """The middleware registers requests while they are handled."""
+        monitor = LoopLagMonitor()
+        app = FastAPI()
+        seen = []
+
+        @app.get("/probe")
+        def probe():
+            seen.extend(monitor.inflight())
+            return {}
+
+        app.add_middleware(RequestTracker, monitor=monitor)
+        TestClient(app).get("/probe")
+
+        assert seen[0].startswith("GET /probe")
+        assert monitor.inflight() == []
+
+
+def test_worker_stats_endpoint(client):
+    """Staff can read pool, event-loop and database pool metrics."""
+    response = client.get("/mappools/sync/workers")
+
+    assert response.status_code == 200
+    assert set(response.json()["pools"]) == {"io", "cpu"}
+    assert "stalls" in response.json()["event_loop"]
+    assert set(response.json()["database"]) == {"requests", "background"}
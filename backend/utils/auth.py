@@ -11,7 +11,8 @@ from typing import TYPE_CHECKING, Optional, Dict, Any
 import jwt
 from fastapi import HTTPException, Depends, status, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import Config
 from models.user import User
@@ -71,7 +72,7 @@ def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     FastAPI dependency to get the current authenticated user.
@@ -102,7 +103,7 @@ async def get_current_user(
             detail="Invalid token payload"
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -137,7 +138,7 @@ async def get_current_staff_user(
 
 async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """
     FastAPI dependency to optionally get authenticated user.
@@ -183,7 +184,7 @@ def hash_api_key(key: str) -> str:
     return hashlib.sha256(key.encode()).hexdigest()
 
 
-async def validate_api_key(x_api_key: str, db: Session) -> APIKey:
+async def validate_api_key(x_api_key: str, db: AsyncSession) -> APIKey:
     """
     Validate an API key and update last_used_at.
 
@@ -200,10 +201,12 @@ async def validate_api_key(x_api_key: str, db: Session) -> APIKey:
     from models.api_key import APIKey
 
     key_hash = hash_api_key(x_api_key)
-    api_key = db.query(APIKey).filter(
-        APIKey.key_hash == key_hash,
-        APIKey.is_active.is_(True)
-    ).first()
+    api_key = await db.scalar(
+        select(APIKey).where(
+            APIKey.key_hash == key_hash,
+            APIKey.is_active.is_(True)
+        )
+    )
 
     if api_key is None:
         raise HTTPException(
@@ -218,7 +221,7 @@ async def validate_api_key(x_api_key: str, db: Session) -> APIKey:
         )
 
     api_key.last_used_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
 
     return api_key
 
@@ -226,7 +229,7 @@ async def validate_api_key(x_api_key: str, db: Session) -> APIKey:
 async def get_user_or_api_key(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User | APIKey:
     """
     FastAPI dependency accepting JWT token or API key.
@@ -1,38 +1,92 @@
 """
 Database session management
+
+Request handlers use the asyncio engine through :func:`get_db`, so a slow
+query awaits instead of blocking the event loop (and with it every other
+request and SSE stream on the worker). The synchronous engine stays for
+code that runs in worker threads (beatmap warm-up) and for Alembic.
+
+Pool sizing, the pre-ping strategy and PgBouncer mode come from ``Config``
+(see :mod:`utils.db_pool`); :func:`pool_stats` reports both pools.
 """
-from typing import Generator
+from typing import AsyncGenerator
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
 from config import Config
+from utils.db_pool import PoolMonitor, engine_options
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
 
-# Create engine
+
+def async_url(url: str) -> str:
+    """
+    Map a synchronous database URL onto its asyncio driver.
+
+    ``postgresql://`` and ``postgresql+psycopg2://`` become
+    ``postgresql+asyncpg://``; ``sqlite://`` becomes ``sqlite+aiosqlite://``.
+    URLs that already name another driver are returned unchanged.
+
+    Args:
+        url: Database URL as configured in ``DATABASE_URL``.
+
+    Returns:
+        URL string for :func:`~sqlalchemy.ext.asyncio.create_async_engine`.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername in (backend, f"{backend}+psycopg2") and backend in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    return parsed.render_as_string(hide_password=False)
+
+
+# Create engine (worker threads, Alembic)
+background_pool = PoolMonitor("background")
 engine = create_engine(
     Config.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
     echo=Config.SQLALCHEMY_ECHO,
+    **engine_options(Config.DATABASE_URL, background_pool),
 )
+background_pool.attach(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create asyncio engine (request handlers)
+request_pool = PoolMonitor("requests")
+async_engine = create_async_engine(
+    async_url(Config.DATABASE_URL),
+    echo=Config.SQLALCHEMY_ECHO,
+    **engine_options(Config.DATABASE_URL, request_pool, is_async=True),
+)
+request_pool.attach(async_engine.sync_engine)
+
+# Objects stay usable after commit: handlers commit and then serialize them
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
-def get_db() -> Generator[Session, None, None]:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
-    FastAPI dependency providing database session.
+    FastAPI dependency providing an asyncio database session.
 
     Yields:
-        SQLAlchemy Session that auto-closes after request.
+        SQLAlchemy AsyncSession that auto-closes after request.
 
     Example:
         >>> @app.get("/users")
-        >>> def get_users(db: Session = Depends(get_db)):
-        >>>     return db.query(User).all()
+        >>> async def get_users(db: AsyncSession = Depends(get_db)):
+        >>>     return (await db.execute(select(User))).scalars().all()
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def pool_stats() -> dict:
+    """Connection pool metrics of the request and background engines."""
+    return {"requests": request_pool.stats(), "background": background_pool.stats()}
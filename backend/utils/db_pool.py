@@ -0,0 +1,256 @@
+"""
+Connection pool tuning and telemetry.
+
+Both engines (asyncio for request handlers, synchronous for worker
+threads) get their pool settings from :func:`engine_options` and a
+:class:`PoolMonitor` that records, per pool:
+
+- how long callers waited for a connection (``wait``) and how many gave
+  up after ``DB_POOL_TIMEOUT`` (``timeouts``);
+- how long connections stayed checked out (``checkout_duration``), which
+  is what drives exhaustion under the frontend's polling;
+- the current checked-out, idle and overflow counts.
+
+Pre-ping strategies (``DB_PRE_PING``):
+
+- ``always``: SQLAlchemy's ``pool_pre_ping``, a round trip on every checkout.
+- ``idle``: ping only connections that sat in the pool longer than
+  ``DB_PRE_PING_IDLE_SECONDS``. A connection reused within a polling
+  interval skips the round trip; one that has been idle long enough for
+  the server or a proxy to drop it is still checked.
+- ``never``: rely on ``pool_recycle`` and error handling alone.
+
+PgBouncer mode (``DB_PGBOUNCER``) turns off asyncpg's prepared statement
+cache and names statements uniquely, since a transaction-pooling
+PgBouncer may run consecutive statements on different server
+connections. psycopg2 keeps no server-side prepared state, so the
+synchronous engine needs no change.
+"""
+import logging
+import threading
+import time
+from uuid import uuid4
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+# Histogram bucket upper bounds in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+HOLD_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# asyncpg connect arguments for a transaction-pooling PgBouncer
+PGBOUNCER_CONNECT_ARGS = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+}
+
+
+class Histogram:
+    """
+    Thread-safe latency histogram with fixed millisecond buckets.
+
+    Args:
+        bounds_ms: Ascending bucket upper bounds; one more bucket collects
+            everything above the last bound.
+    """
+
+    def __init__(self, bounds_ms: tuple[int, ...]):
+        self.bounds_ms = bounds_ms
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.bounds_ms) if ms <= bound), len(self.bounds_ms))
+        with self._lock:
+            self.counts[index] += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def snapshot(self) -> dict:
+        """Count, mean, maximum and per-bucket counts (keyed ``<=N`` / ``>N`` ms)."""
+        with self._lock:
+            counts = list(self.counts)
+            total_ms = self.total_ms
+            max_ms = self.max_ms
+        count = sum(counts)
+        buckets = {f"<={bound}": n for bound, n in zip(self.bounds_ms, counts)}
+        buckets[f">{self.bounds_ms[-1]}"] = counts[-1]
+        return {
+            "count": count,
+            "avg_ms": round(total_ms / count, 2) if count else 0.0,
+            "max_ms": round(max_ms, 2),
+            "buckets": buckets,
+        }
+
+
+class _TimedPool:
+    """Pool mixin timing :meth:`_do_get`, i.e. the wait for a connection."""
+
+    monitor: "PoolMonitor"
+
+    def _do_get(self):
+        start = self.monitor.clock()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.monitor.count("timeouts")
+            logger.warning(f"[DB] {self.monitor.name} pool exhausted: {self.status()}")
+            raise
+        finally:
+            self.monitor.wait.observe(self.monitor.clock() - start)
+
+
+class PoolMonitor:
+    """
+    Metrics and the idle pre-ping for one engine's pool.
+
+    Args:
+        name: Label used in logs and stats.
+        pre_ping: One of :data:`PRE_PING_STRATEGIES`.
+        idle_seconds: Idle time after which the ``idle`` strategy pings.
+        clock: Monotonic clock, injectable for tests.
+
+    Example:
+        >>> monitor = PoolMonitor("requests")
+        >>> engine = create_engine(url, **engine_options(url, monitor))
+        >>> monitor.attach(engine)
+        >>> monitor.stats()["checked_out"]
+        0
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pre_ping: str = Config.DB_PRE_PING,
+        idle_seconds: float = Config.DB_PRE_PING_IDLE_SECONDS,
+        clock=time.monotonic,
+    ):
+        if pre_ping not in PRE_PING_STRATEGIES:
+            raise ValueError(f"DB_PRE_PING must be one of {', '.join(PRE_PING_STRATEGIES)}, not {pre_ping!r}")
+        self.name = name
+        self.pre_ping = pre_ping
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self.engine: Engine | None = None
+        self.wait = Histogram(WAIT_BUCKETS_MS)
+        self.hold = Histogram(HOLD_BUCKETS_MS)
+        # Guards the counters below: pool events fire on request and worker threads
+        self._lock = threading.Lock()
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.in_use = 0
+
+    def count(self, counter: str, delta: int = 1) -> None:
+        """Add ``delta`` to one of the counters (``timeouts``, ``pings``, ``ping_failures``, ``in_use``)."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + delta)
+
+    def pool_class(self, base: type) -> type:
+        """Subclass of ``base`` whose connection waits are recorded here."""
+        return type(f"Timed{base.__name__}", (_TimedPool, base), {"monitor": self})
+
+    def attach(self, engine: Engine) -> None:
+        """
+        Listen to checkout/checkin on ``engine``'s pool.
+
+        For an asyncio engine pass ``async_engine.sync_engine``. The
+        listeners carry over to the new pool when the engine is disposed.
+        """
+        self.engine = engine
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, record, proxy) -> None:
+        now = self.clock()
+        idle_since = record.info.get("pmc_checked_in_at")
+        if self.pre_ping == "idle" and idle_since is not None and now - idle_since > self.idle_seconds:
+            self.count("pings")
+            try:
+                self.engine.dialect.do_ping(dbapi_connection)
+            except Exception as e:
+                # The pool invalidates this connection and retries with another
+                self.count("ping_failures")
+                logger.info(f"[DB] Dropping stale {self.name} connection idle for {now - idle_since:.0f}s: {e}")
+                raise exc.DisconnectionError() from e
+        record.info["pmc_checked_out_at"] = now
+        self.count("in_use")
+
+    def _on_checkin(self, dbapi_connection, record) -> None:
+        now = self.clock()
+        checked_out_at = record.info.pop("pmc_checked_out_at", None)
+        if checked_out_at is not None:
+            self.count("in_use", -1)
+            self.hold.observe(now - checked_out_at)
+        record.info["pmc_checked_in_at"] = now
+
+    def stats(self) -> dict:
+        pool = self.engine.pool if self.engine is not None else None
+        sized = isinstance(pool, QueuePool)
+        with self._lock:
+            in_use, timeouts, pings, ping_failures = self.in_use, self.timeouts, self.pings, self.ping_failures
+        return {
+            "pool": pool.__class__.__name__.removeprefix("Timed") if pool is not None else None,
+            "size": pool.size() if sized else None,
+            "checked_out": in_use,
+            "idle": pool.checkedin() if sized else None,
+            "overflow": max(pool.overflow(), 0) if sized else None,
+            "max_overflow": pool._max_overflow if sized else None,
+            "timeout_s": pool.timeout() if sized else None,
+            "timeouts": timeouts,
+            "wait": self.wait.snapshot(),
+            "checkout_duration": self.hold.snapshot(),
+            "pre_ping": self.pre_ping,
+            "pings": pings,
+            "ping_failures": ping_failures,
+        }
+
+
+def engine_options(url: str, monitor: PoolMonitor, is_async: bool = False) -> dict:
+    """
+    Keyword arguments for ``create_engine`` / ``create_async_engine``.
+
+    SQLite keeps the dialect's default pool (sizing does not apply to a
+    file or memory database); other backends get a queue pool sized from
+    ``Config`` whose waits are recorded by ``monitor``.
+
+    Args:
+        url: Database URL the engine is created for.
+        monitor: Monitor that will be attached to the engine.
+        is_async: Whether the engine is an asyncio engine.
+
+    Returns:
+        Engine keyword arguments.
+    """
+    options = {
+        "pool_recycle": Config.DB_POOL_RECYCLE,
+        "pool_pre_ping": monitor.pre_ping == "always",
+    }
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        return options
+
+    options.update(
+        poolclass=monitor.pool_class(AsyncAdaptedQueuePool if is_async else QueuePool),
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+    )
+    if Config.DB_PGBOUNCER and is_async and backend == "postgresql":
+        options["connect_args"] = dict(PGBOUNCER_CONNECT_ARGS)
+    return options
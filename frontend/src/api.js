@@ -53,6 +53,11 @@ export const api = {
         headers,
       });
 
+      // Nothing changed since the version the caller sent (?since_version=)
+      if (response.status === 304) {
+        return null;
+      }
+
       if (!response.ok) {
         const responseBody = await response.json().catch(() => ({ detail: 'Request failed' }));
         const error = new APIError(
@@ -116,9 +121,17 @@ export const api = {
   getBrackets: () => api.fetch('/brackets'),
   getBracket: (id) => api.fetch(`/brackets/${id}`),
   getBracketMatches: (id) => api.fetch(`/brackets/${id}/matches`),
-  generateBrackets: (bracketSize = 8) => api.fetch('/brackets/generate', {
+  getBracketGraph: (sinceVersion) => api.fetch(
+    sinceVersion == null ? '/brackets/graph' : `/brackets/graph?since_version=${sinceVersion}`
+  ),
+  generateBrackets: (bracketSize = 8, options = {}) => api.fetch('/brackets/generate', {
+    method: 'POST',
+    body: JSON.stringify({ bracket_size: bracketSize, ...options }),
+  }),
+  // options: { bracket_size, crossover, player_ids } - nothing is saved
+  previewBrackets: (options = {}) => api.fetch('/brackets/preview', {
     method: 'POST',
-    body: JSON.stringify({ bracket_size: bracketSize }),
+    body: JSON.stringify(options),
   }),
 
   // Matches
@@ -135,6 +148,11 @@ export const api = {
     method: 'PUT',
     body: JSON.stringify(data),
   }),
+  // batch: { results: [{ match_id, player1_score, player2_score, winner_id? }] } or { csv }, plus dry_run
+  submitResults: (batch) => api.fetch('/matches/results', {
+    method: 'POST',
+    body: JSON.stringify(batch),
+  }),
 
   // Users
   getRegisteredPlayers: () => api.fetch('/users/registered'),
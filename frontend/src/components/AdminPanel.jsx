@@ -309,6 +309,9 @@ export default function AdminPanel() {
                   <option value={8}>8 jugadores</option>
                   <option value={16}>16 jugadores</option>
                   <option value={32}>32 jugadores</option>
+                  <option value={64}>64 jugadores</option>
+                  <option value={128}>128 jugadores</option>
+                  <option value={256}>256 jugadores</option>
                 </select>
                 <button onClick={handleGenerateBrackets} className="admin-btn" disabled={loading}>
                   Generar Brackets
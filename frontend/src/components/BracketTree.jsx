@@ -1,4 +1,4 @@
-import { useEffect, useState, useRef } from 'react';
+import { useCallback, useEffect, useState, useRef } from 'react';
 import { Bracket } from 'react-tournament-bracket';
 import { Pencil, Plus, Trophy, ChevronDown } from 'lucide-react';
 import Spinner from './Spinner';
@@ -252,6 +252,47 @@ function MobileBracketView({ matches, bracketId, user, onEditMatch, onCreateMatc
   );
 }
 
+// Last tournament graph received; polls send its version and get a 304
+// (null) while nothing changes, or just the matches that changed
+let graphCache = null;
+// Poll in flight, shared by every BracketTree on the page
+let graphRequest = null;
+
+const refreshGraph = (api) => {
+  graphRequest ??= api.getBracketGraph(graphCache?.version)
+    .then((changes) => {
+      if (changes?.partial) {
+        const changed = new Map(changes.matches.map(m => [m.id, m]));
+        graphCache = {
+          ...graphCache,
+          version: changes.version,
+          // Brackets without changed matches keep their object, so their trees skip the update
+          brackets: graphCache.brackets.map(b => (
+            b.matches.some(m => changed.has(m.id))
+              ? { ...b, matches: b.matches.map(m => changed.get(m.id) || m) }
+              : b
+          )),
+        };
+      } else if (changes) {
+        graphCache = changes;
+      }
+    })
+    .finally(() => {
+      graphRequest = null;
+    });
+  return graphRequest;
+};
+
+// Returns what /brackets/{id}/matches returned, from the shared graph,
+// or null if the bracket is still the `shown` one
+const fetchBracket = async (api, bracketId, shown = null) => {
+  await refreshGraph(api);
+  const bracket = graphCache.brackets.find(b => b.id === bracketId);
+  if (!bracket) throw new Error(`Bracket ${bracketId} not found`);
+  if (bracket === shown) return null;
+  return { bracket, matches: bracket.matches, total: bracket.matches.length };
+};
+
 export default function BracketTree({ bracketId, api, defaultBracket, hideTitle = false, user, onEditMatch, onCreateMatch, refreshKey }) {
   const [data, setData] = useState(() => {
     if (!bracketId) {
@@ -262,6 +303,14 @@ export default function BracketTree({ bracketId, api, defaultBracket, hideTitle
   const [loading, setLoading] = useState(() => !!bracketId);
   const [ctxMenu, setCtxMenu] = useState(null); // { x, y, matchData, playerId, playerName }
   const containerRef = useRef(null);
+  const shownRef = useRef(null); // Bracket object from the shared graph currently rendered
+
+  // Render a fetched bracket; null means unchanged, so nothing re-renders
+  const showBracket = useCallback((fresh) => {
+    if (!fresh) return;
+    shownRef.current = fresh.bracket;
+    setData(fresh);
+  }, []);
 
   useEffect(() => {
     if (!bracketId) {
@@ -271,20 +320,20 @@ export default function BracketTree({ bracketId, api, defaultBracket, hideTitle
     }
 
     const fetchData = () => {
-      api.getBracketMatches(bracketId)
-        .then(setData)
+      fetchBracket(api, bracketId, shownRef.current)
+        .then(showBracket)
         .catch(console.error);
     };
 
     setLoading(true);
-    api.getBracketMatches(bracketId)
-      .then(setData)
+    fetchBracket(api, bracketId)
+      .then(showBracket)
       .catch(console.error)
       .finally(() => setLoading(false));
 
     const interval = setInterval(fetchData, 3000);
     return () => clearInterval(interval);
-  }, [bracketId, api, defaultBracket, refreshKey]);
+  }, [bracketId, api, defaultBracket, refreshKey, showBracket]);
 
   // Context menu handlers
   const handleContextMenu = (e, matchData, playerId, playerName) => {
@@ -300,8 +349,7 @@ export default function BracketTree({ bracketId, api, defaultBracket, hideTitle
     try {
       await api.updateMatch(matchData.id, { winner_id: playerId, match_status: 'completed' });
       // Immediate refetch
-      const fresh = await api.getBracketMatches(bracketId);
-      setData(fresh);
+      showBracket(await fetchBracket(api, bracketId, shownRef.current));
     } catch (err) {
       console.error('Error marking winner:', err);
     }
@@ -578,43 +626,12 @@ export default function BracketTree({ bracketId, api, defaultBracket, hideTitle
   if (bracketType === 'loser' && data.matches?.length > 0) {
     const matches = data.matches;
 
-    // Group matches into structural rounds using topological sort
-    const matchMap = {};
-    matches.forEach(m => { matchMap[m.id] = m; });
-
-    // Find feeders for each match (within this bracket)
-    const feedersOf = {};
-    matches.forEach(m => { feedersOf[m.id] = []; });
-    matches.forEach(m => {
-      if (m.next_match_id && matchMap[m.next_match_id]) {
-        feedersOf[m.next_match_id].push(m.id);
-      }
-    });
-
-    // Assign round index: matches with no feeders = round 0, then increment
-    const roundOf = {};
-    const assignRound = (matchId, visited = new Set()) => {
-      if (roundOf[matchId] !== undefined) return roundOf[matchId];
-      if (visited.has(matchId)) return 0;
-      visited.add(matchId);
-      const feeders = feedersOf[matchId] || [];
-      if (feeders.length === 0) {
-        roundOf[matchId] = 0;
-      } else {
-        roundOf[matchId] = Math.max(...feeders.map(fid => assignRound(fid, visited))) + 1;
-      }
-      return roundOf[matchId];
-    };
-    matches.forEach(m => assignRound(m.id));
-
-    // Group by round
-    const numRounds = Math.max(...Object.values(roundOf)) + 1;
+    // Rounds (columns) and rows come precomputed from the bracket graph
+    const numRounds = Math.max(...matches.map(m => m.round)) + 1;
     const rounds = Array.from({ length: numRounds }, () => []);
     matches.forEach(m => {
-      rounds[roundOf[m.id]].push(m);
+      rounds[m.round][m.position] = m;
     });
-    // Sort matches within each round by ID for consistent ordering
-    rounds.forEach(r => r.sort((a, b) => a.id - b.id));
 
     // Layout constants
     const matchWidth = 310;
@@ -1469,6 +1469,7 @@ export default function ManiaPreview({
           className="mania-preview-background"
           style={{
             backgroundImage: `url(${notesData.background_url_full})`,
+            backgroundColor: notesData.background_image?.color,
             opacity: bgOpacity,
           }}
         />
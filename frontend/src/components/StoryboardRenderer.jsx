@@ -8,6 +8,9 @@ const OSU_HEIGHT = 480;
 const ORIGIN_X = [0, 0.5, 0, 1, 0.5, 0.5, 0.5, 1, 0, 1];
 const ORIGIN_Y = [0, 0.5, 0.5, 0, 1, 0, 0.5, 0.5, 1, 1];
 
+// UV rectangle (x, y, width, height) of a sprite that fills its own texture
+const FULL_UV = [0, 0, 1, 1];
+
 // Vertex shader - transforms sprite vertices
 const VERTEX_SHADER = `
   attribute vec2 a_position;
@@ -18,6 +21,7 @@ const VERTEX_SHADER = `
   uniform vec2 u_scale;
   uniform vec2 u_origin;
   uniform float u_rotation;
+  uniform vec4 u_uvRect; // x, y, width, height of the sprite within its texture
 
   varying vec2 v_texCoord;
 
@@ -43,7 +47,7 @@ const VERTEX_SHADER = `
     vec2 clipSpace = (position / u_resolution) * 2.0 - 1.0;
     gl_Position = vec4(clipSpace * vec2(1, -1), 0, 1);
 
-    v_texCoord = a_texCoord;
+    v_texCoord = u_uvRect.xy + a_texCoord * u_uvRect.zw;
   }
 `;
 
@@ -475,63 +479,92 @@ function StoryboardRenderer({
       return;
     }
 
+    // Images packed into atlas pages are cut out of the page textures;
+    // the rest are loaded one by one
+    const atlas = storyboard.atlas;
+    const packed = atlas?.sprites || {};
+    const singles = imageList
+      .map(path => path.replace(/\\/g, '/'))
+      .filter(path => !packed[path]);
+    const pages = atlas?.pages || [];
+
     let loaded = 0;
-    const total = imageList.length;
+    const total = pages.length + singles.length;
     const textures = {};
+    const pageTextures = [];
 
     onProgress?.(0, total);
 
-    for (let i = 0; i < total; i++) {
-      const path = imageList[i];
-      // Normalize path for consistent key lookup
-      const normalizedPath = path.replace(/\\/g, '/');
+    const finishOne = () => {
+      loaded++;
+      onProgress?.(loaded, total);
+      if (loaded === total) {
+        // Map packed sprites to their page and UV rectangle
+        for (const path in packed) {
+          const entry = packed[path];
+          const page = pageTextures[entry.page];
+          if (!page) continue;
+          const [u0, v0, u1, v1] = entry.uv;
+          textures[path] = { texture: page, width: entry.width, height: entry.height, uv: [u0, v0, u1 - u0, v1 - v0] };
+        }
+        texturesRef.current = textures;
+        setReady(true);
+      }
+    };
+
+    const createTexture = (img) => {
+      const texture = gl.createTexture();
+      gl.bindTexture(gl.TEXTURE_2D, texture);
+      gl.texImage2D(gl.TEXTURE_2D, 0, gl.RGBA, gl.RGBA, gl.UNSIGNED_BYTE, img);
+
+      // Set texture parameters for non-power-of-2 images
+      gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_S, gl.CLAMP_TO_EDGE);
+      gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_T, gl.CLAMP_TO_EDGE);
+      gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.LINEAR);
+      gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.LINEAR);
+      return texture;
+    };
+
+    pages.forEach((page, index) => {
       const img = new Image();
       img.crossOrigin = 'anonymous';
-
       img.onload = () => {
-        // Create texture
-        const texture = gl.createTexture();
-        gl.bindTexture(gl.TEXTURE_2D, texture);
-        gl.texImage2D(gl.TEXTURE_2D, 0, gl.RGBA, gl.RGBA, gl.UNSIGNED_BYTE, img);
+        pageTextures[index] = createTexture(img);
+        finishOne();
+      };
+      img.onerror = finishOne;
+      img.src = page.url;
+    });
 
-        // Set texture parameters for non-power-of-2 images
-        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_S, gl.CLAMP_TO_EDGE);
-        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_T, gl.CLAMP_TO_EDGE);
-        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.LINEAR);
-        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.LINEAR);
+    for (const normalizedPath of singles) {
+      const img = new Image();
+      img.crossOrigin = 'anonymous';
 
+      img.onload = () => {
         // Store with normalized path as key
-        textures[normalizedPath] = { texture, width: img.width, height: img.height };
-        loaded++;
-        onProgress?.(loaded, total);
-
-        if (loaded === total) {
-          texturesRef.current = textures;
-          setReady(true);
-        }
+        textures[normalizedPath] = { texture: createTexture(img), width: img.width, height: img.height, uv: FULL_UV };
+        finishOne();
       };
 
-      img.onerror = () => {
-        loaded++;
-        onProgress?.(loaded, total);
-        if (loaded === total) {
-          texturesRef.current = textures;
-          setReady(true);
-        }
-      };
+      img.onerror = finishOne;
 
-      // Normalize path separators and encode special characters
-      img.src = `${storyboardBaseUrl}${encodeURI(normalizedPath)}`;
+      // Use the smaller derivative when there is one; otherwise the original
+      // (normalized path separators, special characters encoded)
+      img.src = storyboard.image_derivatives?.[normalizedPath]
+        || `${storyboardBaseUrl}${encodeURI(normalizedPath)}`;
     }
 
     return () => {
-      // Cleanup textures
+      // Cleanup textures (atlas pages are shared by their sprites)
       for (const path in textures) {
-        gl.deleteTexture(textures[path].texture);
+        if (!packed[path]) gl.deleteTexture(textures[path].texture);
+      }
+      for (const texture of pageTextures) {
+        if (texture) gl.deleteTexture(texture);
       }
       setReady(false);
     };
-  }, [imageList, storyboardBaseUrl, onProgress]);
+  }, [imageList, storyboard, storyboardBaseUrl, onProgress]);
 
   // Animation loop with WebGL rendering
   useEffect(() => {
@@ -557,6 +590,7 @@ function StoryboardRenderer({
     const uRotation = gl.getUniformLocation(program, 'u_rotation');
     const uAlpha = gl.getUniformLocation(program, 'u_alpha');
     const uColor = gl.getUniformLocation(program, 'u_color');
+    const uUvRect = gl.getUniformLocation(program, 'u_uvRect');
     const uTexture = gl.getUniformLocation(program, 'u_texture');
 
     gl.useProgram(program);
@@ -718,6 +752,8 @@ function StoryboardRenderer({
         }
 
         // Set uniforms and draw
+        const uv = item.texInfo.uv;
+        gl.uniform4f(uUvRect, uv[0], uv[1], uv[2], uv[3]);
         gl.uniform2f(uOrigin, item.originX, item.originY);
         gl.uniform2f(uTranslation, item.x, item.y);
         gl.uniform2f(uScale, item.scX, item.scY);
@@ -738,6 +774,7 @@ function StoryboardRenderer({
         gl.blendFunc(gl.SRC_ALPHA, gl.ONE_MINUS_SRC_ALPHA);
 
         // Black color, full opacity
+        gl.uniform4f(uUvRect, 0, 0, 1, 1);
         gl.uniform3f(uColor, 0, 0, 0);
         gl.uniform1f(uAlpha, 1);
         gl.uniform1f(uRotation, 0);
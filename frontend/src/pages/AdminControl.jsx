@@ -493,6 +493,9 @@ export default function AdminControl({ user }) {
               <option value={8}>8</option>
               <option value={16}>16</option>
               <option value={32}>32</option>
+              <option value={64}>64</option>
+              <option value={128}>128</option>
+              <option value={256}>256</option>
             </select>
             <button onClick={generateBrackets}>Generar Brackets</button>{' '}
             <button onClick={deleteAllBrackets}>Eliminar Todo</button>
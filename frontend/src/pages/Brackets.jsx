@@ -164,6 +164,9 @@ export default function Brackets({ user }) {
                 <option value={8}>8 jugadores</option>
                 <option value={16}>16 jugadores</option>
                 <option value={32}>32 jugadores</option>
+                <option value={64}>64 jugadores</option>
+                <option value={128}>128 jugadores</option>
+                <option value={256}>256 jugadores</option>
               </select>
               <button
                 onClick={handleGenerateBrackets}
@@ -63,6 +63,33 @@ const formatTime = (ms) => {
   return `${minutes.toString().padStart(2, '0')}:${seconds.toString().padStart(2, '0')}:${millis.toString().padStart(3, '0')}`;
 };
 
+// Tiny images probing which background variant formats the browser decodes, best first
+const IMAGE_FORMAT_PROBES = [
+  ['avif', 'data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADybWV0YQAAAAAAAAAoaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAGxpYmF2aWYAAAAADnBpdG0AAAAAAAEAAAAeaWxvYwAAAABEAAABAAEAAAABAAABGgAAAB0AAAAoaWluZgAAAAAAAQAAABppbmZlAgAAAAABAABhdjAxQ29sb3IAAAAAamlwcnAAAABLaXBjbwAAABRpc3BlAAAAAAAAAAIAAAACAAAAEHBpeGkAAAAAAwgICAAAAAxhdjFDgQ0MAAAAABNjb2xybmNseAACAAIAAYAAAAAXaXBtYQAAAAAAAAABAAEEAQKDBAAAACVtZGF0EgAKCBgANogQEAwgMg8f8D///8WfhwB8+ErK42A='],
+  ['webp', 'data:image/webp;base64,UklGRhoAAABXRUJQVlA4TA0AAAAvAAAAEAcQERGIiP4HAA=='],
+];
+let imageFormatsPromise = null;
+
+// Formats the browser can decode, in preference order (probed once per page load)
+const supportedImageFormats = () => {
+  imageFormatsPromise ??= Promise.all(IMAGE_FORMAT_PROBES.map(([format, src]) => new Promise((resolve) => {
+    const img = new Image();
+    img.onload = () => resolve(img.width > 0 ? format : null);
+    img.onerror = () => resolve(null);
+    img.src = src;
+  }))).then(formats => formats.filter(Boolean));
+  return imageFormatsPromise;
+};
+
+// Smallest variant covering the screen in the best supported format, or null to keep the original
+const pickBackgroundVariant = (variants, formats) => {
+  const format = formats.find(f => variants.some(v => v.format === f));
+  if (!format) return null;
+  const candidates = variants.filter(v => v.format === format).sort((a, b) => a.width - b.width);
+  const screenWidth = window.innerWidth * (window.devicePixelRatio || 1);
+  return candidates.find(v => v.width >= screenWidth) || candidates[candidates.length - 1];
+};
+
 export default function Preview({ user }) {
   const [searchParams] = useSearchParams();
   const navigate = useNavigate();
@@ -86,6 +113,10 @@ export default function Preview({ user }) {
   });
   const [allAssetsReady, setAllAssetsReady] = useState(false);
 
+  // Shown while loading: map metadata (from the lookup, then the .osu file) and the chart's opening
+  const [mapInfo, setMapInfo] = useState(null);
+  const [openingChart, setOpeningChart] = useState(null); // { notes, keys, startMs, untilMs, total }
+
   // Storyboard prompt state: null = no storyboard, 'pending' = awaiting user choice, 'accepted' = load it, 'rejected' = skip it
   const [storyboardChoice, setStoryboardChoice] = useState(null);
   const [storyboardInfo, setStoryboardInfo] = useState(null); // { imageCount, spriteCount }
@@ -152,7 +183,10 @@ export default function Preview({ user }) {
       return;
     }
 
+    let cancelled = false;
     setError(null);
+    setMapInfo(null);
+    setOpeningChart(null);
 
     // Use SSE for progress streaming
     const eventSource = new EventSource(`${apiBaseUrl}/mappools/preview/${beatmapId}/stream`);
@@ -167,13 +201,70 @@ export default function Preview({ user }) {
       }));
     });
 
-    eventSource.addEventListener('complete', (event) => {
+    eventSource.addEventListener('queue', (event) => {
+      const { message } = JSON.parse(event.data);
+
+      setLoadingStatus(prev => ({
+        ...prev,
+        download: { loading: true, text: message, progress: 0 },
+      }));
+    });
+
+    eventSource.addEventListener('metadata', (event) => {
+      const { title, artist, version } = JSON.parse(event.data);
+      setMapInfo({ title, artist, version });
+    });
+
+    eventSource.addEventListener('partial', (event) => {
+      // Opening of the chart, parsed before the rest of the set arrived
+      const { metadata, notes, notes_until_ms, notes_total } = JSON.parse(event.data);
+
+      setMapInfo({ title: metadata.title, artist: metadata.artist, version: metadata.version, creator: metadata.creator });
+      setOpeningChart({
+        notes,
+        keys: metadata.keys,
+        startMs: notes.length ? notes[0].time : 0,
+        untilMs: notes_until_ms,
+        total: notes_total,
+      });
+      setLoadingStatus(prev => ({
+        ...prev,
+        parsing: { loading: true, text: `Primeras notas listas (${notes.length}/${notes_total})...`, progress: 0 },
+      }));
+    });
+
+    eventSource.addEventListener('complete', async (event) => {
       const data = JSON.parse(event.data);
+      eventSource.close();
 
       // Add full URLs for audio and background
       data.audio_url_full = `${apiBaseUrl}${data.audio_url}`;
       data.background_url_full = data.background_url ? `${apiBaseUrl}${data.background_url}` : null;
 
+      // Prefer a resized background (AVIF, then WebP) the browser can decode; otherwise the original
+      const variants = data.background_image?.variants || [];
+      if (variants.length) {
+        const variant = pickBackgroundVariant(variants, await supportedImageFormats());
+        if (cancelled) return;
+        if (variant) {
+          data.background_url_full = `${apiBaseUrl}${variant.url}`;
+        }
+      }
+
+      // Atlas pages holding most storyboard images
+      if (data.storyboard?.atlas) {
+        for (const page of data.storyboard.atlas.pages) {
+          page.url = `${apiBaseUrl}${page.url}`;
+        }
+      }
+
+      // Smaller copies of storyboard sprites, keyed by their storyboard path
+      if (data.storyboard?.image_derivatives) {
+        data.storyboard.image_derivatives = Object.fromEntries(
+          Object.entries(data.storyboard.image_derivatives).map(([path, url]) => [path, `${apiBaseUrl}${url}`])
+        );
+      }
+
       // Check if there's a storyboard and prompt user
       if (data.storyboard?.images?.length > 0) {
         setStoryboardInfo({
@@ -194,10 +285,12 @@ export default function Preview({ user }) {
 
       setNotesData(data);
       setAudioUrl(data.audio_url_full);
-      eventSource.close();
     });
 
     eventSource.addEventListener('error', (event) => {
+      // Dropped connections also fire 'error' (without data); EventSource
+      // reconnects by itself and the server resumes from Last-Event-ID
+      if (!event.data) return;
       try {
         const data = JSON.parse(event.data);
         setError(data.message || 'Error loading beatmap');
@@ -208,12 +301,14 @@ export default function Preview({ user }) {
     });
 
     eventSource.onerror = () => {
-      // EventSource error (connection failed)
-      setError('Error de conexión al servidor');
-      eventSource.close();
+      // Only give up once the browser stopped reconnecting
+      if (eventSource.readyState === EventSource.CLOSED) {
+        setError('Error de conexión al servidor');
+      }
     };
 
     return () => {
+      cancelled = true;
       eventSource.close();
     };
   }, [beatmapId, apiBaseUrl]);
@@ -550,6 +645,33 @@ export default function Preview({ user }) {
         <div className="preview-loading-overlay">
           <div className="preview-loading-content">
             <img src={catGif} alt="Loading..." className="preview-loading-cat" />
+            {mapInfo && (
+              <div className="preview-loading-map">
+                <div className="preview-loading-map-title">{mapInfo.artist} - {mapInfo.title}</div>
+                <div className="preview-loading-map-version">
+                  [{mapInfo.version}]{mapInfo.creator && ` por ${mapInfo.creator}`}
+                </div>
+              </div>
+            )}
+            {/* Opening of the chart, drawn before the full beatmapset (and its audio) arrives */}
+            {openingChart && openingChart.notes.length > 0 && (
+              <svg
+                className="preview-loading-chart"
+                viewBox={`0 0 ${openingChart.untilMs - openingChart.startMs} ${openingChart.keys}`}
+                preserveAspectRatio="none"
+              >
+                {openingChart.notes.map((note, i) => (
+                  <rect
+                    key={i}
+                    x={note.time - openingChart.startMs}
+                    y={note.col + 0.15}
+                    width={Math.max((note.end ?? note.time) - note.time, 40)}
+                    height={0.7}
+                    className={note.type === 'hold' ? 'hold' : ''}
+                  />
+                ))}
+              </svg>
+            )}
             <div className="preview-loading-steps">
               {/* Backend data loading steps */}
               {loadingStatus.database.text && (